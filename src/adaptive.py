@@ -0,0 +1,156 @@
+"""
+適応的な検索件数モジュール
+
+固定の max_results は、答えが 1 チャンクに集中する明確なクエリには多すぎ、
+関連チャンクが広く分布する曖昧なクエリには少なすぎる。
+
+max_results="auto" の場合は少ない件数（AUTO_INITIAL_RESULTS）から検索し、
+取得した最後のチャンクのスコアがまだ閾値以上（スコア分布の裾が平坦）で
+さらに関連チャンクがあり得る場合のみ、件数を倍に広げる（最大 AUTO_MAX_RESULTS）。
+広げる際は前回のレスポンスの nextToken で追加分のページのみを取得し、
+nextToken が無い（キャッシュやローカルバックエンドから返した）場合のみ
+広げた件数で検索し直す。
+閾値は先頭のスコアの RELATIVE_CUTOFF 倍と min_score の大きい方で、
+返す結果は閾値以上のチャンクのみに絞り込む。
+
+min_score のみを指定した場合は max_results 件を検索し、スコアが min_score 未満の
+チャンクを返さない（レスポンスの解析も min_score 未満になった時点で打ち切る）。
+
+メトリクス:
+    adaptive.rounds: auto モードで Retrieve API を呼び出した回数（観測値）
+    adaptive.dropped: 閾値未満のため返さなかったチャンク数
+"""
+
+from typing import Callable
+
+from src.deadline import DeadlineExceededError
+from src.metrics import Metrics, metrics
+from src.models import KBResponse, RetrievalResult
+
+
+# max_results に指定する適応モードの値
+AUTO = "auto"
+
+# auto モードで最初に取得する件数
+AUTO_INITIAL_RESULTS = 3
+
+# auto モードで取得する最大件数（max_results の上限と同じ）
+AUTO_MAX_RESULTS = 10
+
+# auto モードで返すチャンクのスコアの下限（先頭のスコアに対する比率）
+RELATIVE_CUTOFF = 0.8
+
+
+def score_threshold(
+    results: list[RetrievalResult],
+    min_score: float | None,
+    auto: bool,
+) -> float | None:
+    """
+    返すチャンクのスコアの下限を返す。
+
+    Args:
+        results: 検索結果
+        min_score: スコアの下限（オプション）
+        auto: auto モードかどうか（先頭のスコアに対する比率も適用する）
+
+    Returns:
+        float | None: 下限（制限しない場合は None）
+    """
+    thresholds = [min_score] if min_score is not None else []
+    scores = [result.score for result in results if result.score is not None]
+    if auto and scores:
+        thresholds.append(max(scores) * RELATIVE_CUTOFF)
+    return max(thresholds) if thresholds else None
+
+
+def cut_below(
+    results: list[RetrievalResult],
+    threshold: float | None,
+    registry: Metrics = metrics,
+) -> list[RetrievalResult]:
+    """
+    スコアが threshold 未満のチャンクを除く（スコアの無いチャンクは残す）。
+
+    Args:
+        results: 検索結果
+        threshold: スコアの下限（None の場合は全て残す）
+        registry: 除いた件数を記録するメトリクス
+
+    Returns:
+        list[RetrievalResult]: 順序を保って絞り込んだ結果
+    """
+    if threshold is None:
+        return results
+    kept = [r for r in results if r.score is None or r.score >= threshold]
+    if len(kept) < len(results):
+        registry.increment("adaptive.dropped", len(results) - len(kept))
+    return kept
+
+
+def has_flat_tail(response: KBResponse, requested: int, threshold: float | None) -> bool:
+    """
+    件数を増やせば閾値以上のチャンクがさらに得られる可能性があるか判定する。
+
+    取得件数が requested に達しており、最後のチャンクのスコアが閾値以上の場合に True。
+
+    Args:
+        response: requested 件で検索した結果
+        requested: 要求した件数
+        threshold: score_threshold で求めた下限
+    """
+    if response.partial or len(response.results) < requested:
+        return False
+    last = response.results[-1].score
+    return last is None or threshold is None or last >= threshold
+
+
+def adaptive_retrieve(
+    retrieve: Callable[[int, str | None], KBResponse],
+    min_score: float | None = None,
+    registry: Metrics = metrics,
+) -> KBResponse:
+    """
+    auto モードで検索し、閾値以上のチャンクのみを返す。
+
+    2 回目以降の検索で時間予算を使い切った場合は、前回の結果から返す。
+
+    Args:
+        retrieve: 件数と続きのページの nextToken（None の場合は先頭から）を受け取って
+            検索する関数
+        min_score: スコアの下限（オプション）
+        registry: メトリクス
+
+    Returns:
+        KBResponse: 閾値以上のチャンク（順位順）
+
+    Raises:
+        DeadlineExceededError: 最初の検索で時間予算を使い切った場合
+    """
+    requested = AUTO_INITIAL_RESULTS
+    rounds = 1
+    response = retrieve(requested, None)
+    while requested < AUTO_MAX_RESULTS and has_flat_tail(
+        response, requested, score_threshold(response.results, min_score, True)
+    ):
+        previous = requested
+        requested = min(requested * 2, AUTO_MAX_RESULTS)
+        try:
+            if response.next_token:
+                # 取得済みのチャンクは取り直さず、追加分のページのみを取得する
+                page = retrieve(requested - previous, response.next_token)
+                response = KBResponse(
+                    results=response.results + page.results,
+                    partial=page.partial,
+                    next_token=page.next_token,
+                )
+            else:
+                response = retrieve(requested, None)
+        except DeadlineExceededError:
+            break
+        rounds += 1
+    registry.observe("adaptive.rounds", rounds)
+    threshold = score_threshold(response.results, min_score, True)
+    return KBResponse(
+        results=cut_below(response.results, threshold, registry), partial=response.partial
+    )
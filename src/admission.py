@@ -0,0 +1,195 @@
+"""
+アドミッション制御モジュール
+
+Retrieve API の同時実行数を max_in_flight に制限し、超過分を優先度付きの
+待ち行列（最大 max_queue 件）で待機させる。待ち行列が満杯の場合は待たずに
+OverloadedError で拒否し、過負荷時にレイテンシが際限なく伸びることを防ぐ。
+
+優先度の高い呼び出しは常に先に実行枠を得る。待ち行列が満杯でも、
+より優先度の低い待機中の呼び出しがあればそれを拒否して代わりに並ぶ。
+
+メトリクス:
+    admission.in_flight: 実行中の呼び出し数（ゲージ）
+    admission.queue_depth: 待機中の呼び出し数（ゲージ）
+    admission.wait_ms: 実行枠を得るまでの待機時間（サマリー）
+    admission.rejected: 待ち行列が満杯で拒否した回数
+    admission.timeouts: 待機中にデッドラインを超過した回数
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from src.deadline import DeadlineExceededError
+from src.metrics import Metrics, metrics
+
+
+# 優先度名と待ち行列での順位（小さいほど先に実行する）
+PRIORITY_HIGH = "high"
+PRIORITY_NORMAL = "normal"
+PRIORITY_LOW = "low"
+PRIORITY_LEVELS = {PRIORITY_HIGH: 0, PRIORITY_NORMAL: 1, PRIORITY_LOW: 2}
+
+# 待機中の呼び出しの状態
+_WAITING = "waiting"
+_GRANTED = "granted"
+_REJECTED = "rejected"
+
+
+class OverloadedError(Exception):
+    """待ち行列が満杯で呼び出しを受け付けられないことを示す例外"""
+
+
+class AdmissionController:
+    """
+    同時実行数の上限と優先度付き待ち行列によるアドミッション制御（スレッドセーフ）。
+
+    Attributes:
+        max_in_flight: 同時に実行できる呼び出し数
+        max_queue: 実行枠を待機できる呼び出し数（0 の場合は待機せず拒否する）
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 8,
+        max_queue: int = 32,
+        registry: Metrics = metrics,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight は 1 以上である必要があります")
+        if max_queue < 0:
+            raise ValueError("max_queue は 0 以上である必要があります")
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self._registry = registry
+        self._clock = clock
+        self._in_flight = 0
+        # [順位, 到着順, 状態] のヒープ（状態はリストの要素を書き換えて通知する）
+        self._waiters: list[list[Any]] = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    @property
+    def in_flight(self) -> int:
+        """実行中の呼び出し数"""
+        with self._cond:
+            return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """待機中の呼び出し数"""
+        with self._cond:
+            return len(self._waiters)
+
+    def acquire(self, priority: str = PRIORITY_NORMAL, timeout: float | None = None) -> None:
+        """
+        実行枠を取得する（空きが無い場合は優先度順に待機する）。
+
+        Args:
+            priority: 優先度（"high" / "normal" / "low"）
+            timeout: 最大待機秒数（None の場合は無制限）
+
+        Raises:
+            OverloadedError: 待ち行列が満杯の場合、または優先度の高い呼び出しに
+                待ち行列の位置を譲った場合
+            DeadlineExceededError: timeout 秒以内に実行枠を得られなかった場合
+        """
+        level = PRIORITY_LEVELS.get(priority, PRIORITY_LEVELS[PRIORITY_NORMAL])
+        started = self._clock()
+        with self._cond:
+            if self._in_flight < self.max_in_flight and not self._waiters:
+                self._in_flight += 1
+                self._publish()
+                self._registry.observe("admission.wait_ms", 0.0)
+                return
+
+            if len(self._waiters) >= self.max_queue:
+                # 最も優先度の低い（同順位なら最も新しい）待機中の呼び出しと比べる
+                lowest = max(self._waiters, default=None)
+                if lowest is None or lowest[0] <= level:
+                    self._registry.increment("admission.rejected")
+                    raise OverloadedError(
+                        f"サーバーが過負荷です（実行中 {self._in_flight} 件、"
+                        f"待機中 {len(self._waiters)} 件）。しばらく待ってから再試行してください"
+                    )
+                self._remove(lowest)
+                lowest[2] = _REJECTED
+                self._cond.notify_all()
+
+            entry = [level, next(self._sequence), _WAITING]
+            heapq.heappush(self._waiters, entry)
+            self._publish()
+            while entry[2] == _WAITING:
+                remaining = None if timeout is None else started + timeout - self._clock()
+                if remaining is not None and remaining <= 0:
+                    self._remove(entry)
+                    self._publish()
+                    self._registry.increment("admission.timeouts")
+                    raise DeadlineExceededError(
+                        "実行枠を待機中にタイムアウトしました"
+                    )
+                self._cond.wait(remaining)
+
+            if entry[2] == _REJECTED:
+                self._publish()
+                self._registry.increment("admission.rejected")
+                raise OverloadedError(
+                    "優先度の高い呼び出しのため待機を打ち切りました。"
+                    "しばらく待ってから再試行してください"
+                )
+        self._registry.observe("admission.wait_ms", (self._clock() - started) * 1000)
+
+    def release(self) -> None:
+        """実行枠を返却し、最も優先度の高い待機中の呼び出しに引き渡す。"""
+        with self._cond:
+            if self._waiters:
+                # 実行中の数は変えずに実行枠をそのまま引き渡す
+                heapq.heappop(self._waiters)[2] = _GRANTED
+                self._cond.notify_all()
+            else:
+                self._in_flight = max(0, self._in_flight - 1)
+            self._publish()
+
+    @contextmanager
+    def admit(self, priority: str = PRIORITY_NORMAL, timeout: float | None = None) -> Iterator[None]:
+        """
+        実行枠を取得し、ブロックを抜けたら返却するコンテキストマネージャー。
+
+        Args:
+            priority: 優先度（"high" / "normal" / "low"）
+            timeout: 最大待機秒数（None の場合は無制限）
+        """
+        self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        アドミッション制御の状態を返す。
+
+        Returns:
+            dict: max_in_flight / max_queue / in_flight / queue_depth を含む辞書
+        """
+        with self._cond:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+            }
+
+    def _remove(self, entry: list[Any]) -> None:
+        """待ち行列から entry を取り除く（ロック取得済みで呼び出す）。"""
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+
+    def _publish(self) -> None:
+        """実行中・待機中の数をゲージに反映する（ロック取得済みで呼び出す）。"""
+        self._registry.set_gauge("admission.in_flight", self._in_flight)
+        self._registry.set_gauge("admission.queue_depth", len(self._waiters))
@@ -2,15 +2,45 @@
 Bedrock クライアントモジュール
 
 Amazon Bedrock Agent Runtime の Retrieve API を呼び出す。
+複製 Knowledge Base（BEDROCK_KB_REPLICAS）が設定されている場合は、
+ReplicaClient が呼び出しごとに最も良い複製を選び、失敗時は次の複製へ切り替える。
+boto3 クライアントは KB プロファイルごとの ClientPool から取得する。
+BEDROCK_KB_ADAPTIVE_CONCURRENCY が設定されている場合、各複製のクライアントは
+LimitedClient で包み、Retrieve API の呼び出し（試行ごと）を複製の
+(AWS プロファイル, リージョン) の AdaptiveConcurrencyLimiter の実行枠内で行う。
 """
 
-from typing import Any
+import hashlib
+import json
+import random
+import threading
+import time
+from typing import Any, Callable
 
-from botocore.exceptions import ClientError, BotoCoreError
+from botocore.config import Config
+from botocore.exceptions import (
+    ClientError,
+    BotoCoreError,
+    ConnectionError as BotocoreConnectionError,
+    HTTPClientError,
+)
 
-from src.config import KBConfig
-from src.models import KBResponse
+from src.cache import NegativeCache, ResultCache
+from src.client_pool import ClientPool
+from src.concurrency import (
+    OUTCOME_ERROR,
+    OUTCOME_OK,
+    OUTCOME_THROTTLED,
+    AdaptiveConcurrencyLimiter,
+)
+from src.config import BACKEND_LOCAL, KBConfig, Replica
+from src.credentials import get_credential_manager
+from src.deadline import Deadline, DeadlineExceededError, settings_to_config
+from src.keepalive import KeepalivePinger, instrument_client
+from src.local_index import get_local_knowledge_base
+from src.models import KBResponse, RetrievalResult
 from src.parser import parse_retrieve_response
+from src.replicas import ReplicaRouter
 
 
 # カスタム例外クラス
@@ -26,67 +56,775 @@ class BedrockServiceError(Exception):
     """Bedrock サービスの汎用エラーを示す例外"""
 
 
+class BedrockThrottlingError(BedrockServiceError):
+    """Bedrock のスロットリング（レート制限・クォータ超過）を示す例外"""
+
+
+# スロットリングとして扱うエラーコード
+THROTTLING_ERROR_CODES = (
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+)
+
+
+# 別の複製に切り替えずにそのまま送出するエラーコード（リクエスト自体の誤り）
+NON_FAILOVER_ERROR_CODES = ("ValidationException",)
+
+# 複製のプローブで送信するクエリと時間予算（ミリ秒）
+PROBE_QUERY = "health check"
+PROBE_TIMEOUT_MS = 5000
+
+
+def _is_throttling(error: BaseException) -> bool:
+    """例外が Retrieve API のスロットリングによるものか判定する。"""
+    return (
+        isinstance(error, ClientError)
+        and error.response.get("Error", {}).get("Code", "") in THROTTLING_ERROR_CODES
+    )
+
+
+class ReplicaClient:
+    """
+    複製 Knowledge Base に振り分ける Retrieve 互換クライアント。
+
+    呼び出しごとに ReplicaRouter の順位に従って複製を選び、knowledgeBaseId を
+    その複製の ID に置き換えて呼び出す。スロットリング・サービスエラー・
+    接続エラーの場合は次の複製で再試行する。nextToken による続きのページは
+    最初のページを返した複製に送る。
+    """
+
+    def __init__(
+        self,
+        router: ReplicaRouter,
+        client_factory: Callable[[Replica], Any],
+        deadline: Deadline | None = None,
+    ) -> None:
+        self._router = router
+        self._client_factory = client_factory
+        self._deadline = deadline
+        self._clients: dict[Replica, Any] = {}
+        self._pinned: Replica | None = None
+
+    def retrieve(self, **params: Any) -> dict[str, Any]:
+        """
+        最も良い複製で Retrieve API を呼び出す。
+
+        Raises:
+            ClientError, BotoCoreError: 全ての複製で失敗した場合（最後の例外）、
+                または切り替えの対象外のエラーの場合
+        """
+        if "nextToken" in params and self._pinned is not None:
+            candidates = [self._pinned]
+        else:
+            candidates = self._router.ranked()
+
+        last_error: Exception | None = None
+        for index, replica in enumerate(candidates):
+            if last_error is not None and self._deadline is not None and self._deadline.expired():
+                break
+            client = self._client(replica)
+            started = time.perf_counter()
+            try:
+                response = client.retrieve(**{**params, "knowledgeBaseId": replica.kb_id})
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code", "") in NON_FAILOVER_ERROR_CODES:
+                    raise
+                self._router.record_failure(replica, throttled=_is_throttling(e))
+                last_error = e
+                continue
+            except BotoCoreError as e:
+                self._router.record_failure(replica)
+                last_error = e
+                continue
+            self._router.record_success(replica, (time.perf_counter() - started) * 1000)
+            if index:
+                self._router.record_failover()
+            self._pinned = replica
+            return response
+        assert last_error is not None
+        raise last_error
+
+    def credential_identity(self) -> str:
+        """
+        全ての複製の (リージョン, KB ID, AWS プロファイル) と認証情報から識別子を作る。
+
+        呼び出しごとに作成される ReplicaClient でも、同じ複製・認証情報であれば同じ値になる。
+
+        Returns:
+            str: 認証情報の識別子（生のアクセスキーは含まない）
+        """
+        parts = [
+            f"{replica.region}/{replica.kb_id}/{replica.profile or ''}/"
+            f"{credential_identity(self._client(replica))}"
+            for replica in sorted(
+                self._router.replicas, key=lambda r: (r.region, r.kb_id, r.profile or "")
+            )
+        ]
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+    def _client(self, replica: Replica) -> Any:
+        """複製のクライアントを返す（初回はプールから取得する）。"""
+        client = self._clients.get(replica)
+        if client is None:
+            client = self._clients[replica] = self._client_factory(replica)
+        return client
+
+
+# KB プロファイル名 -> 共有する複製のルーター（複製が設定されている場合のみ作成）
+_replica_routers: dict[str | None, ReplicaRouter] = {}
+_replica_router_lock = threading.Lock()
+
+
+def get_replica_router(config: KBConfig) -> ReplicaRouter:
+    """
+    KB プロファイルごとに共有する ReplicaRouter を返す（初回呼び出し時にプローブスレッドを開始）。
+
+    複製の構成が変わった場合は計測値を破棄して作り直す。
+
+    Args:
+        config: Knowledge Base の設定
+
+    Returns:
+        ReplicaRouter: 共有ルーター
+    """
+    with _replica_router_lock:
+        router = _replica_routers.get(config.profile_name)
+        if router is None or router.replicas != config.replica_set:
+            if router is not None:
+                router.stop()
+            router = _replica_routers[config.profile_name] = ReplicaRouter(
+                config.replica_set,
+                probe_interval_seconds=config.replica_probe_interval_seconds,
+            )
+
+            def probe(replica: Replica) -> None:
+                client = _create_replica_client(config, replica, Deadline(PROBE_TIMEOUT_MS))
+                client.retrieve(**{
+                    **build_retrieve_request(config, PROBE_QUERY, max_results=1),
+                    "knowledgeBaseId": replica.kb_id,
+                })
+
+            router.start(probe, _is_throttling)
+        return router
+
+
+def replica_stats() -> dict[str, Any] | None:
+    """
+    共有ルーターの複製ごとの計測値を返す。
+
+    Returns:
+        dict | None: 全ルーターの ReplicaRouter.stats() をまとめた値（ルーターが未作成の場合は None）
+    """
+    with _replica_router_lock:
+        routers = list(_replica_routers.values())
+    if not routers:
+        return None
+    stats: dict[str, Any] = {}
+    for router in routers:
+        stats.update(router.stats())
+    return stats
+
+
+# KB プロファイル名 -> boto3 クライアントのプール
+_client_pools: dict[str | None, ClientPool] = {}
+_client_pools_lock = threading.Lock()
+
+
+def get_client_pool(config: KBConfig) -> ClientPool:
+    """
+    KB プロファイルのクライアントプールを返す（初回呼び出し時に作成）。
+
+    Args:
+        config: Knowledge Base の設定
+
+    Returns:
+        ClientPool: config.profile_name のプール
+    """
+    with _client_pools_lock:
+        pool = _client_pools.get(config.profile_name)
+        if pool is None:
+            pool = _client_pools[config.profile_name] = ClientPool(config.client_pool_size)
+        return pool
+
+
+def client_pool_stats() -> dict[str, int]:
+    """
+    KB プロファイルごとのプール済みクライアント数を返す。
+
+    Returns:
+        dict: プロファイル名（環境変数の設定は "default"）-> クライアント数
+    """
+    with _client_pools_lock:
+        pools = dict(_client_pools)
+    return {name or "default": len(pool) for name, pool in pools.items()}
+
+
+# プロセス内で共有するキープアライブ（BEDROCK_KB_KEEPALIVE_INTERVAL 設定時のみ作成）
+_keepalive: KeepalivePinger | None = None
+_keepalive_lock = threading.Lock()
+
+
+def get_keepalive_pinger(config: KBConfig) -> KeepalivePinger | None:
+    """
+    プロセス内で共有するキープアライブを返す（初回呼び出し時に作成して開始する）。
+
+    Args:
+        config: Knowledge Base の設定
+
+    Returns:
+        KeepalivePinger | None: キープアライブ（keepalive_interval_seconds が 0 の場合は None）
+    """
+    global _keepalive  # pylint: disable=global-statement
+    if config.keepalive_interval_seconds <= 0:
+        return None
+    with _keepalive_lock:
+        if _keepalive is None:
+            _keepalive = KeepalivePinger(
+                config.keepalive_interval_seconds,
+                max_idle_seconds=config.keepalive_max_idle_seconds,
+            )
+            _keepalive.start()
+        return _keepalive
+
+
+# (AWS プロファイル, リージョン) -> Retrieve API の呼び出しを制限する適応的な同時実行数の制限
+# （BEDROCK_KB_ADAPTIVE_CONCURRENCY 設定時のみ作成。クォータはアカウント・リージョンごとのため、
+# あるアカウントのスロットリングで他のアカウントの上限を下げない）
+_concurrency_limiters: dict[tuple[str | None, str], AdaptiveConcurrencyLimiter] = {}
+_concurrency_limiters_lock = threading.Lock()
+
+# 適応的な同時実行数の上限の初期値
+INITIAL_CONCURRENCY_LIMIT = 4
+
+
+# 同時実行数の制限を使用する場合の最大試行回数（botocore のリトライの代わりに行う）。
+# デッドラインが無い場合は botocore のデフォルト（legacy モード）と同じ回数とする
+DEFAULT_MAX_ATTEMPTS = 5
+
+# 再試行の待機時間の基準値と上限（秒、botocore の standard モードと同じ full jitter）
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_BACKOFF_SECONDS = 20.0
+
+
+def get_concurrency_limiter(
+    config: KBConfig, replica: Replica | None = None
+) -> AdaptiveConcurrencyLimiter | None:
+    """
+    複製の (AWS プロファイル, リージョン) の適応的な同時実行数の制限を返す（初回呼び出し時に作成）。
+
+    Args:
+        config: Knowledge Base の設定
+        replica: 呼び出す複製（None の場合は config の aws_region / kb_id / aws_profile）
+
+    Returns:
+        AdaptiveConcurrencyLimiter | None: 同時実行数の制限（adaptive_concurrency_max が
+            0 の場合、またはローカルバックエンドの場合は None）
+    """
+    if config.adaptive_concurrency_max <= 0 or config.backend == BACKEND_LOCAL:
+        return None
+    if replica is None:
+        replica = config.replica_set[0]
+    key = (replica.profile, replica.region)
+    with _concurrency_limiters_lock:
+        limiter = _concurrency_limiters.get(key)
+        if limiter is None:
+            limiter = _concurrency_limiters[key] = AdaptiveConcurrencyLimiter(
+                initial_limit=INITIAL_CONCURRENCY_LIMIT,
+                min_limit=min(config.adaptive_concurrency_min, config.adaptive_concurrency_max),
+                max_limit=config.adaptive_concurrency_max,
+                latency_tolerance=config.adaptive_latency_tolerance,
+                name=f"{replica.profile or 'default'}:{replica.region}",
+            )
+        return limiter
+
+
+def concurrency_stats() -> dict[str, Any] | None:
+    """
+    (AWS プロファイル, リージョン) ごとの同時実行数の制限の状態を返す。
+
+    Returns:
+        dict | None: "AWS プロファイル:リージョン" -> AdaptiveConcurrencyLimiter.stats()
+            （未作成の場合は None）
+    """
+    with _concurrency_limiters_lock:
+        limiters = list(_concurrency_limiters.values())
+    if not limiters:
+        return None
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+def _is_retryable(error: BaseException) -> bool:
+    """botocore の standard モードと同様に再試行するエラー（スロットリング・5xx・接続エラー）か判定する。"""
+    if isinstance(error, ClientError):
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return _is_throttling(error) or status >= 500
+    return isinstance(error, (BotocoreConnectionError, HTTPClientError))
+
+
+def _limited_retrieve(
+    client: Any,
+    params: dict[str, Any],
+    limiter: AdaptiveConcurrencyLimiter | None,
+    deadline: Deadline | None,
+    max_attempts: int = 1,
+    sleep: Callable[[float], None] = time.sleep,
+) -> dict[str, Any]:
+    """
+    同時実行数の制限の実行枠内で Retrieve API を呼び出し、結果を制限に反映する。
+
+    botocore のリトライを無効にしたクライアントで使用し、再試行できるエラーの場合は
+    max_attempts 回まで待機して再試行する。試行ごとに実行枠を取得するため、
+    スロットリングされた試行は全て制限に反映される。デッドラインまでに待機を
+    終えられない場合は再試行しない。
+    """
+    if limiter is None:
+        return client.retrieve(**params)
+    for attempt in range(1, max_attempts + 1):
+        started = limiter.acquire(deadline.remaining_seconds() if deadline is not None else None)
+        outcome = OUTCOME_ERROR
+        try:
+            response = client.retrieve(**params)
+            outcome = OUTCOME_OK
+            return response
+        except (ClientError, BotoCoreError) as e:
+            if _is_throttling(e):
+                outcome = OUTCOME_THROTTLED
+            if attempt >= max_attempts or not _is_retryable(e):
+                raise
+            delay = random.uniform(
+                0, min(RETRY_MAX_BACKOFF_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+            )
+            remaining = deadline.remaining_seconds() if deadline is not None else None
+            if remaining is not None and remaining <= delay:
+                raise
+        finally:
+            limiter.release(started, outcome)
+        sleep(delay)
+    raise AssertionError("unreachable")
+
+
+class LimitedClient:
+    """
+    複製の同時実行数の制限の実行枠内で Retrieve API を呼び出すクライアント。
+
+    botocore のリトライではスロットリングが全ての試行の失敗後にしか見えないため、
+    botocore のリトライを無効にしたクライアントを包み、_limited_retrieve で再試行する。
+    制限は複製の (AWS プロファイル, リージョン) ごとのため、切り替え先の複製の
+    スロットリングで元の複製の上限を下げることはない。
+
+    Attributes:
+        client: botocore のリトライを無効にした bedrock-agent-runtime クライアント
+        limiter: 複製の同時実行数の制限
+        max_attempts: 最大試行回数
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        limiter: AdaptiveConcurrencyLimiter,
+        deadline: Deadline | None = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> None:
+        self.client = client
+        self.limiter = limiter
+        self.max_attempts = max_attempts
+        self._deadline = deadline
+
+    def retrieve(self, **params: Any) -> dict[str, Any]:
+        """実行枠内で Retrieve API を呼び出す（再試行できるエラーは max_attempts 回まで再試行する）。"""
+        return _limited_retrieve(
+            self.client, params, self.limiter, self._deadline, self.max_attempts
+        )
+
+
+def _create_replica_client(config: KBConfig, replica: Replica, deadline: Deadline | None) -> Any:
+    """
+    複製のリージョン・プロファイルの bedrock-agent-runtime クライアントをプールから取得する。
+
+    同時実行数の制限を使用する場合は、botocore のリトライを無効にしたクライアントを
+    LimitedClient で包んで返す。
+    """
+    settings = deadline.client_settings() if deadline is not None else None
+    limiter = get_concurrency_limiter(config, replica)
+
+    def factory() -> Any:
+        manager = get_credential_manager(
+            refresh_margin_seconds=config.credential_refresh_margin_seconds,
+            check_interval_seconds=config.credential_check_interval_seconds,
+            profile_name=replica.profile,
+            model_bundle_path=config.model_bundle_path,
+        )
+        client_config = settings_to_config(settings)
+        if limiter is not None:
+            no_retries = Config(retries={"mode": "standard", "total_max_attempts": 1})
+            client_config = (
+                client_config.merge(no_retries) if client_config is not None else no_retries
+            )
+        client = manager.create_client(
+            "bedrock-agent-runtime",
+            replica.region,
+            client_config=client_config,
+        )
+        # 接続の確立・再利用を記録し、キープアライブが有効な場合は接続を維持する
+        instrument_client(client)
+        keepalive = get_keepalive_pinger(config)
+        if keepalive is not None:
+            keepalive.track(client)
+        return client
+
+    client = get_client_pool(config).get(
+        (replica.profile, replica.region, settings, limiter is not None), factory
+    )
+    if limiter is None:
+        return client
+    return LimitedClient(
+        client,
+        limiter,
+        deadline,
+        max_attempts=settings[2] if settings is not None else DEFAULT_MAX_ATTEMPTS,
+    )
+
+
+def create_agent_client(config: KBConfig) -> Any:
+    """
+    取り込みジョブの確認に使用する bedrock-agent クライアントを作成する。
+
+    Args:
+        config: Knowledge Base の設定
+
+    Returns:
+        Any: boto3 の bedrock-agent クライアント
+    """
+    manager = get_credential_manager(
+        refresh_margin_seconds=config.credential_refresh_margin_seconds,
+        check_interval_seconds=config.credential_check_interval_seconds,
+        profile_name=config.aws_profile,
+        model_bundle_path=config.model_bundle_path,
+    )
+    return manager.create_client("bedrock-agent", config.aws_region)
+
+
+def create_client(config: KBConfig, deadline: Deadline | None = None) -> Any:
+    """
+    設定されたバックエンドに応じて Retrieve API クライアントを作成する。
+
+    Args:
+        config: Knowledge Base の設定
+        deadline: 呼び出しのデッドライン（指定時は残り時間から botocore の
+            タイムアウト・リトライ回数を導出する）
+
+    Returns:
+        Any: retrieve(**params) を持つクライアント
+            （boto3 の bedrock-agent-runtime クライアント、複製が設定されている場合は
+            ReplicaClient、またはローカルバックエンドの LocalKnowledgeBase）
+
+    bedrock バックエンドのクライアントは CredentialManager の共有セッションから
+    作成するため、バックグラウンドで先行更新された認証情報を共有する。
+    作成したクライアントは KB プロファイルごとの ClientPool に保持して再利用する。
+    """
+    if config.backend == BACKEND_LOCAL:
+        return get_local_knowledge_base(
+            config.local_corpus_dir,
+            config.local_index_path,
+        )
+    replica_set = config.replica_set
+    if len(replica_set) > 1:
+        return ReplicaClient(
+            get_replica_router(config),
+            lambda replica: _create_replica_client(config, replica, deadline),
+            deadline,
+        )
+    return _create_replica_client(config, replica_set[0], deadline)
+
+
+def credential_identity(client: Any) -> str:
+    """
+    クライアントが使用している認証情報の識別子を返す。
+
+    boto3 クライアントの場合はアクセスキー ID の SHA-256 ハッシュ
+    （先頭 16 桁）を返すため、認証情報の更新やプロファイルの切り替えで
+    値が変わる。ReplicaClient の場合は全ての複製とそのクライアントの認証情報から
+    作る（呼び出しごとに作成されるため）。認証情報を持たないクライアント（ローカルバックエンドなど）は
+    クライアントの型とオブジェクト ID から識別子を作る。
+
+    Args:
+        client: retrieve(**params) を持つクライアント
+
+    Returns:
+        str: 認証情報の識別子（生のアクセスキーは含まない）
+    """
+    if isinstance(client, ReplicaClient):
+        return client.credential_identity()
+    if isinstance(client, LimitedClient):
+        client = client.client
+    signer = getattr(client, "_request_signer", None)
+    credentials = getattr(signer, "_credentials", None)
+    access_key = getattr(credentials, "access_key", None)
+    if isinstance(access_key, str) and access_key:
+        return hashlib.sha256(access_key.encode("utf-8")).hexdigest()[:16]
+    return f"{type(client).__name__}:{id(client)}"
+
+
 def build_retrieve_request(
     config: KBConfig,
     query: str,
-    max_results: int = 4
+    max_results: int = 4,
+    metadata_filter: dict[str, Any] | None = None,
+    search_type: str | None = None,
 ) -> dict[str, Any]:
     """
     Retrieve API 用のリクエストパラメータを構築する。
 
+    メタデータフィルターと検索タイプは vectorSearchConfiguration に
+    設定され、サーバー側で絞り込みが行われる。
+
     Args:
         config: Knowledge Base の設定
         query: ユーザーからのクエリ文字列
         max_results: 取得するソースチャンクの最大数（デフォルト: 4）
+        metadata_filter: バリデーション済みのメタデータフィルター（オプション）
+        search_type: overrideSearchType（"HYBRID" / "SEMANTIC"、オプション）
 
     Returns:
         dict: API リクエスト用のパラメータ辞書
     """
+    vector_search_config: dict[str, Any] = {
+        "numberOfResults": max_results
+    }
+    if metadata_filter:
+        vector_search_config["filter"] = metadata_filter
+    if search_type:
+        vector_search_config["overrideSearchType"] = search_type
+
     return {
         "knowledgeBaseId": config.kb_id,
         "retrievalQuery": {
             "text": query
         },
         "retrievalConfiguration": {
-            "vectorSearchConfiguration": {
-                "numberOfResults": max_results
-            }
+            "vectorSearchConfiguration": vector_search_config
         }
     }
 
 
+def overfetch_size(config: KBConfig, max_results: int) -> int:
+    """
+    キャッシュを使用する場合に Retrieve API で取得する件数を返す。
+
+    config.overfetch_results 件（上限）まで取得してキャッシュすることで、
+    同じ条件で max_results だけが異なる呼び出しを先頭からの切り出しで返せる。
+
+    Args:
+        config: Knowledge Base の設定
+        max_results: 呼び出し元が必要とする件数
+
+    Returns:
+        int: max_results と config.overfetch_results の大きい方
+    """
+    return max(max_results, config.overfetch_results)
+
+
+def build_cache_key(
+    config: KBConfig,
+    query: str,
+    max_results: int = 4,
+    metadata_filter: dict[str, Any] | None = None,
+    search_type: str | None = None,
+) -> tuple[Any, ...]:
+    """
+    検索結果キャッシュのキーを構築する。
+
+    フィルターはキー順を正規化した JSON 文字列としてキーに含めるため、
+    同じ条件であれば辞書のキー順が異なっても同じキーになる。
+    KB プロファイル名もキーに含めるため、同じ Knowledge Base を異なる
+    AWS プロファイルで検索するプロファイル同士でも結果は共有されない。
+    件数は overfetch_size で正規化するため、上限以下の max_results は全て同じキーになる。
+
+    Args:
+        config: Knowledge Base の設定
+        query: ユーザーからのクエリ文字列
+        max_results: 取得するソースチャンクの最大数
+        metadata_filter: バリデーション済みのメタデータフィルター（オプション）
+        search_type: overrideSearchType（オプション）
+
+    Returns:
+        tuple: ハッシュ可能なキャッシュキー
+    """
+    filter_key = (
+        json.dumps(metadata_filter, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        if metadata_filter else ""
+    )
+    return (
+        config.aws_region,
+        config.kb_id,
+        query,
+        overfetch_size(config, max_results),
+        filter_key,
+        search_type or "",
+        config.profile_name or "",
+    )
+
+
+def is_cache_key_for(key: tuple[Any, ...], config: KBConfig) -> bool:
+    """
+    キャッシュキーが config の Knowledge Base のものか判定する。
+
+    Args:
+        key: build_cache_key で構築したキー
+        config: Knowledge Base の設定
+
+    Returns:
+        bool: リージョンと KB ID が一致する場合は True
+    """
+    return key[:2] == (config.aws_region, config.kb_id)
+
+
+def _prefix(response: KBResponse, max_results: int) -> KBResponse:
+    """レスポンスの先頭 max_results 件を返す（件数以下の場合はそのまま返す）。"""
+    if len(response.results) <= max_results:
+        return response
+    return KBResponse(results=response.results[:max_results], partial=response.partial)
+
+
+def _above(response: KBResponse, min_score: float | None) -> KBResponse:
+    """スコアが min_score 未満の結果を除いたレスポンスを返す（スコアの無い結果は残す）。"""
+    if min_score is None:
+        return response
+    return KBResponse(
+        results=[r for r in response.results if r.score is None or r.score >= min_score],
+        partial=response.partial,
+    )
+
+
 def query_knowledge_base(
     client: Any,
     config: KBConfig,
     query: str,
-    max_results: int = 4
+    max_results: int = 4,
+    metadata_filter: dict[str, Any] | None = None,
+    search_type: str | None = None,
+    cache: ResultCache | None = None,
+    negative_cache: NegativeCache | None = None,
+    deadline: Deadline | None = None,
+    partial_results: list[RetrievalResult] | None = None,
+    min_score: float | None = None,
+    next_token: str | None = None,
 ) -> KBResponse:
     """
     Bedrock Knowledge Base に対して Retrieve API を呼び出す。
 
+    cache が指定された場合は同一条件の結果をキャッシュから返し、
+    API 呼び出しに成功した結果をキャッシュに格納する。キャッシュを使用する場合は
+    overfetch_size の件数を取得して格納し、先頭 max_results 件を返すため、
+    上限以下の max_results の呼び出しは件数が異なってもキャッシュから返せる。
+    negative_cache が指定された場合は、認証エラー・KB 未検出を
+    (リージョン, KB ID, 認証情報) 単位で記憶し、期限内は API を呼ばずに
+    同じ例外を送出する。
+
+    レスポンスに nextToken が含まれ max_results に満たない場合は続きのページを
+    取得する。deadline を過ぎた場合はそれまでに取得した結果を partial=True の
+    レスポンスとして返す（キャッシュには格納しない）。
+
     Args:
         client: boto3 の bedrock-agent-runtime クライアント
         config: Knowledge Base の設定
         query: ユーザーからのクエリ文字列
         max_results: 取得するソースチャンクの最大数（デフォルト: 4）
+        metadata_filter: バリデーション済みのメタデータフィルター（オプション）
+        search_type: overrideSearchType（"HYBRID" / "SEMANTIC"、オプション）
+        cache: 検索結果キャッシュ（オプション）
+        negative_cache: 決定的な失敗のキャッシュ（オプション）
+        deadline: 呼び出しのデッドライン（オプション）
+        partial_results: 取得済みの結果を逐次追加するリスト（オプション）。
+            呼び出し元が待機を打ち切った場合に途中結果を参照するために使用する
+        min_score: スコアの下限（オプション）。下限未満の結果は返さない。
+            キャッシュを使用しない場合は下限未満に達した時点で解析と続きのページの取得を
+            打ち切る（キャッシュには他の下限の呼び出しと共有するため全件を格納する）
+        next_token: 前回のレスポンスの next_token（オプション）。指定した場合は
+            続きのページから max_results 件を取得する（キャッシュは使用しない）
 
     Returns:
-        KBResponse: パース済みの検索結果を含むレスポンス
+        KBResponse: パース済みの検索結果を含むレスポンス。max_results 件ちょうどで
+            打ち切り、さらに結果がある場合は next_token に続きのトークンを含む
 
     Raises:
         BedrockAuthenticationError: 認証エラーが発生した場合
         BedrockKBNotFoundError: Knowledge Base が見つからない場合
+        BedrockThrottlingError: スロットリングが発生した場合
         BedrockServiceError: その他の Bedrock サービスエラーが発生した場合
+        DeadlineExceededError: 結果を 1 件も取得する前にデッドラインを過ぎた場合
     """
+    # キャッシュを確認（キャッシュには上限件数まで取得した結果を格納する）
+    cache_key = None
+    generation = None
+    requested = max_results
+    if next_token is not None:
+        # 続きのページはクエリ全体の結果ではないためキャッシュしない
+        cache = None
+    if cache is not None:
+        max_results = overfetch_size(config, max_results)
+        cache_key = build_cache_key(
+            config, query, max_results, metadata_filter, search_type
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return _above(_prefix(cached, requested), min_score)
+        # 検索中に同期完了で無効化された場合は結果を格納しない
+        generation = cache.generation
+
+    # 記憶している決定的な失敗を確認
+    negative_key = None
+    if negative_cache is not None:
+        negative_key = (config.aws_region, config.kb_id, credential_identity(client))
+        cached_error = negative_cache.get(negative_key)
+        if cached_error is not None:
+            raise cached_error
+
     # リクエストパラメータを構築
-    request_params = build_retrieve_request(config, query, max_results)
+    request_params = build_retrieve_request(
+        config, query, max_results, metadata_filter, search_type
+    )
+    if next_token is not None:
+        request_params["nextToken"] = next_token
+
+    results = partial_results if partial_results is not None else []
+    partial = False
+    parse_cutoff = min_score if cache is None else None
 
     try:
-        # Bedrock Agent Runtime Retrieve API を呼び出し
-        response = client.retrieve(**request_params)
+        if deadline is not None:
+            deadline.check()
+        while True:
+            # Bedrock Agent Runtime Retrieve API を呼び出し
+            response = client.retrieve(**request_params)
+
+            # レスポンスをパースして結果を追加
+            page = parse_retrieve_response(response, parse_cutoff).results
+            results.extend(page)
+            next_token = response.get("nextToken")
+            if not next_token or len(results) >= max_results:
+                if len(results) != max_results:
+                    # 打ち切った結果の続きからは再開できない
+                    next_token = None
+                break
+            if parse_cutoff is not None and len(page) < len(response.get("retrievalResults") or []):
+                # 下限未満に達したため、続きのページにも返す結果は無い
+                next_token = None
+                break
+            if deadline is not None and deadline.expired():
+                partial = True
+                next_token = None
+                break
+            request_params = {**request_params, "nextToken": next_token}
+
+        result = KBResponse(results=results[:max_results], partial=partial, next_token=next_token)
+        if cache is not None and not partial:
+            cache.put(cache_key, result, generation)
+        return _above(_prefix(result, requested), min_score)
 
-        # レスポンスをパースして返す
-        return parse_retrieve_response(response)
+    except DeadlineExceededError:
+        raise
 
     except ClientError as e:
         # エラーコードを取得
@@ -102,15 +840,27 @@ def query_knowledge_base(
             "UnrecognizedClientException",
         ]
         if error_code in auth_error_codes:
-            raise BedrockAuthenticationError(
+            error = BedrockAuthenticationError(
                 f"認証エラー: AWS 認証情報を確認してください。詳細: {error_message}"
-            ) from e
+            )
+            if negative_cache is not None:
+                negative_cache.put(negative_key, error)
+            raise error from e
 
         # ResourceNotFound エラーの判定
         if error_code == "ResourceNotFoundException":
-            raise BedrockKBNotFoundError(
+            error = BedrockKBNotFoundError(
                 f"Knowledge Base が見つかりません: KB ID '{config.kb_id}' を確認してください。"
                 f"詳細: {error_message}"
+            )
+            if negative_cache is not None:
+                negative_cache.put(negative_key, error)
+            raise error from e
+
+        # スロットリングの判定
+        if error_code in THROTTLING_ERROR_CODES:
+            raise BedrockThrottlingError(
+                f"Bedrock API エラー ({error_code}): {error_message}"
             ) from e
 
         # その他の ClientError は汎用エラーとして処理
@@ -119,6 +869,11 @@ def query_knowledge_base(
         ) from e
 
     except BotoCoreError as e:
+        # 残り時間から導出したタイムアウトによる失敗はデッドライン超過として扱う
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceededError(
+                f"タイムアウトしました（timeout_ms={deadline.timeout_ms:g}）: {str(e)}"
+            ) from e
         # ネットワークエラーなど boto3 の低レベルエラー
         raise BedrockServiceError(
             f"AWS サービス接続エラー: {str(e)}"
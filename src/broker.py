@@ -0,0 +1,554 @@
+"""
+ブローカーモジュール
+
+MCP クライアント（IDE のウィンドウなど）ごとに stdio サーバーを起動すると、
+プロセスごとに boto3 の初期化・接続・キャッシュのウォームアップが行われ、
+キャッシュもアドミッション制御も共有されない。
+
+BEDROCK_KB_BROKER を有効にすると、stdio サーバーは薄いシムとして動作し、
+ツールの呼び出しをユーザーごとに 1 つのブローカーデーモンへ Unix ドメインソケットで
+転送する。デーモンはクライアントプール・検索結果キャッシュ・同時実行数の制限を
+1 か所で保持するため、全てのウィンドウが同じ温まったキャッシュを使う。
+デーモンが起動していない場合はシムが起動する。
+
+ソケットは環境変数（BEDROCK_KB_* と AWS_*）の内容ごとに分かれるため、
+異なる Knowledge Base や認証情報を使うウィンドウ同士がデーモンを共有することはない。
+デーモンは idle_timeout_seconds の間リクエストが無ければ終了する。
+
+ソケットとロックファイルは現在のユーザーのみがアクセスできるディレクトリ
+（$XDG_RUNTIME_DIR、未設定時は一時ディレクトリ配下に作成するユーザーごとの
+ディレクトリ）に置く。他のユーザーが所有・アクセスできるディレクトリでは、
+ソケットを差し替えてクエリを盗み見たり偽の応答を返したりできるため、
+接続・待ち受けの前にディレクトリの所有者と権限を確認する。
+Unix ドメインソケットとファイルロックを使用できない環境（Windows）では使用できない。
+
+プロトコル（1 接続につき 1 リクエスト、いずれも JSON 1 行）:
+    リクエスト: {"tool": ツール名, "arguments": {引数}}
+    応答: {"result": 戻り値} または {"error": メッセージ, "error_type": 例外クラス名}
+
+メトリクス:
+    broker.requests: デーモンが処理したリクエスト数
+    broker.errors: デーモンで例外となったリクエスト数
+    broker.spawned: シムが起動したデーモンの数
+    broker.read_timeouts: リクエストを io_timeout_seconds 以内に送らなかった接続の数
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Mapping
+
+from src.metrics import Metrics, metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+
+# 疎通確認に使用する予約済みのツール名
+PING = "_ping"
+
+# ソケットを分ける環境変数の接頭辞（ブローカー自体の設定は除く）
+_FINGERPRINT_PREFIXES = ("BEDROCK_KB_", "AWS_")
+_FINGERPRINT_EXCLUDED_PREFIX = "BEDROCK_KB_BROKER"
+
+# 応答の最大バイト数（これを超える行は不正な応答として扱う）
+_MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+class BrokerError(Exception):
+    """ブローカーとの通信に失敗したことを示す例外"""
+
+
+class BrokerUnavailableError(BrokerError):
+    """ブローカーに接続できない（リクエストは送信されていない）ことを示す例外"""
+
+
+class BrokerRemoteError(BrokerError):
+    """
+    デーモンでツールが例外を送出したことを示す例外。
+
+    Attributes:
+        error_type: デーモンで送出された例外のクラス名
+    """
+
+    def __init__(self, error_type: str, message: str) -> None:
+        super().__init__(message)
+        self.error_type = error_type
+
+
+def is_supported() -> bool:
+    """この環境でブローカーを使用できる場合は True を返す。"""
+    return hasattr(socket, "AF_UNIX") and fcntl is not None
+
+
+def config_fingerprint(environ: Mapping[str, str] | None = None) -> str:
+    """
+    デーモンの設定に影響する環境変数のハッシュを返す。
+
+    Args:
+        environ: 環境変数（None の場合は os.environ）
+
+    Returns:
+        str: 12 文字の 16 進数文字列
+    """
+    environ = os.environ if environ is None else environ
+    items = sorted(
+        (key, value)
+        for key, value in environ.items()
+        if key.startswith(_FINGERPRINT_PREFIXES)
+        and not key.startswith(_FINGERPRINT_EXCLUDED_PREFIX)
+    )
+    return hashlib.sha256(json.dumps(items).encode("utf-8")).hexdigest()[:12]
+
+
+def default_socket_path(environ: Mapping[str, str] | None = None) -> str:
+    """
+    ユーザー・設定ごとのデフォルトのソケットの場所を返す。
+
+    Args:
+        environ: 環境変数（None の場合は os.environ）
+
+    Returns:
+        str: $XDG_RUNTIME_DIR 配下のパス（未設定時は一時ディレクトリ配下の
+            ユーザーごとのディレクトリ bedrock-kb-mcp-<UID> 配下のパス）
+    """
+    environ = os.environ if environ is None else environ
+    uid = getattr(os, "getuid", lambda: 0)()
+    fingerprint = config_fingerprint(environ)
+    runtime_dir = environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, f"bedrock-kb-mcp-{uid}-{fingerprint}.sock")
+    # 一時ディレクトリは全ユーザーが書き込めるため、直下には置かない
+    return os.path.join(tempfile.gettempdir(), f"bedrock-kb-mcp-{uid}", f"{fingerprint}.sock")
+
+
+def check_socket_directory(socket_path: str) -> None:
+    """
+    ソケットのディレクトリが現在のユーザーのみアクセスできることを確認する。
+
+    Args:
+        socket_path: ソケットのパス
+
+    Raises:
+        BrokerUnavailableError: ディレクトリが存在しない、ディレクトリではない（シンボリック
+            リンクを含む）、他のユーザーが所有している、またはグループ・他のユーザーに
+            権限がある場合
+    """
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    try:
+        info = os.lstat(directory)
+    except OSError as e:
+        raise BrokerUnavailableError(
+            f"ソケットのディレクトリがありません: {directory}（{e}）"
+        ) from e
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise BrokerUnavailableError(
+            f"ソケットのディレクトリが現在のユーザーが所有するディレクトリではありません: {directory}"
+        )
+    if info.st_mode & 0o077:
+        raise BrokerUnavailableError(
+            "ソケットのディレクトリにグループ・他のユーザーの権限があります"
+            f"（chmod 700 が必要です）: {directory}"
+        )
+
+
+def _read_message(sock: socket.socket) -> Any:
+    """ソケットから JSON 1 行を読み込む（接続が閉じられた場合は None）。"""
+    with sock.makefile("rb") as stream:
+        line = stream.readline(_MAX_MESSAGE_BYTES + 1)
+    if not line:
+        return None
+    if len(line) > _MAX_MESSAGE_BYTES:
+        raise ValueError("メッセージが大きすぎます")
+    return json.loads(line)
+
+
+def _send_message(sock: socket.socket, message: Any) -> None:
+    """ソケットに JSON 1 行を書き込む。"""
+    sock.sendall(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+
+
+class BrokerClient:
+    """
+    ブローカーデーモンにツールの呼び出しを転送するクライアント（スレッドセーフ）。
+
+    Attributes:
+        socket_path: デーモンのソケットのパス
+        timeout_seconds: 1 回の呼び出しの応答を待つ最大秒数
+        autostart: 接続できない場合にデーモンを起動して再試行するかどうか
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        timeout_seconds: float = 300.0,
+        autostart: bool = False,
+        start_timeout_seconds: float = 10.0,
+        registry: Metrics = metrics,
+    ) -> None:
+        self.socket_path = socket_path
+        self.timeout_seconds = timeout_seconds
+        self.autostart = autostart
+        self.start_timeout_seconds = start_timeout_seconds
+        self._metrics = registry
+        self._start_lock = threading.Lock()
+
+    def _request(self, payload: dict[str, Any], timeout_seconds: float) -> Any:
+        """
+        リクエストを 1 件送信して応答の result を返す。
+
+        Raises:
+            BrokerUnavailableError: 接続できない場合（ソケットのディレクトリが安全でない場合を含む）
+            BrokerRemoteError: デーモンでツールが例外を送出した場合
+            BrokerError: 送信後に通信が失敗した場合
+        """
+        check_socket_directory(self.socket_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeout_seconds)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                raise BrokerUnavailableError(
+                    f"ブローカーに接続できません: {self.socket_path}（{e}）"
+                ) from e
+            try:
+                _send_message(sock, payload)
+                response = _read_message(sock)
+            except (OSError, ValueError) as e:
+                # 送信後の失敗はツールが実行された可能性があるため再試行しない
+                raise BrokerError(f"ブローカーとの通信に失敗しました: {e}") from e
+        finally:
+            sock.close()
+        if not isinstance(response, dict):
+            raise BrokerError("ブローカーから応答がありません")
+        if "error" in response:
+            raise BrokerRemoteError(str(response.get("error_type", "")), str(response["error"]))
+        return response.get("result")
+
+    def ping(self) -> bool:
+        """デーモンが応答する場合は True を返す。"""
+        try:
+            return self._request({"tool": PING, "arguments": {}}, 1.0) == "pong"
+        except BrokerError:
+            return False
+
+    def ensure_started(self) -> None:
+        """
+        デーモンが応答しない場合は起動し、応答するまで待つ。
+
+        Raises:
+            BrokerUnavailableError: start_timeout_seconds 以内に応答しない場合、または
+                ソケットのディレクトリが安全でない場合
+        """
+        with self._start_lock:
+            if self.ping():
+                return
+            directory = os.path.dirname(os.path.abspath(self.socket_path))
+            if os.path.lexists(directory):
+                # 安全でないディレクトリではデーモンも起動できないため、起動する前に確認する
+                check_socket_directory(self.socket_path)
+            spawn_broker(self.socket_path)
+            self._metrics.increment("broker.spawned")
+            deadline = time.monotonic() + self.start_timeout_seconds
+            while time.monotonic() < deadline:
+                if self.ping():
+                    return
+                time.sleep(0.05)
+        raise BrokerUnavailableError(
+            f"ブローカーが {self.start_timeout_seconds} 秒以内に起動しませんでした: {self.socket_path}"
+        )
+
+    def call(self, tool: str, arguments: dict[str, Any]) -> Any:
+        """
+        デーモンでツールを実行して戻り値を返す。
+
+        デーモンが終了していた場合（アイドル終了など）、autostart が有効なら
+        起動し直して 1 回だけ再試行する。
+
+        Args:
+            tool: ツール名
+            arguments: キーワード引数（JSON に変換できる値）
+
+        Returns:
+            Any: ツールの戻り値
+
+        Raises:
+            BrokerUnavailableError: 接続できない場合
+            BrokerRemoteError: デーモンでツールが例外を送出した場合
+            BrokerError: 送信後に通信が失敗した場合
+        """
+        payload = {"tool": tool, "arguments": arguments}
+        try:
+            return self._request(payload, self.timeout_seconds)
+        except BrokerUnavailableError:
+            if not self.autostart:
+                raise
+        self.ensure_started()
+        return self._request(payload, self.timeout_seconds)
+
+
+def connect_or_start(
+    socket_path: str,
+    timeout_seconds: float = 300.0,
+    start_timeout_seconds: float = 10.0,
+) -> BrokerClient:
+    """
+    デーモンに接続する（起動していない場合は起動する）。
+
+    Args:
+        socket_path: デーモンのソケットのパス
+        timeout_seconds: 1 回の呼び出しの応答を待つ最大秒数
+        start_timeout_seconds: デーモンの起動を待つ最大秒数
+
+    Returns:
+        BrokerClient: 接続を確認したクライアント（以降も必要に応じて起動し直す）
+
+    Raises:
+        BrokerUnavailableError: デーモンが起動しない場合
+    """
+    client = BrokerClient(
+        socket_path,
+        timeout_seconds=timeout_seconds,
+        autostart=True,
+        start_timeout_seconds=start_timeout_seconds,
+    )
+    client.ensure_started()
+    return client
+
+
+def spawn_broker(socket_path: str) -> subprocess.Popen:
+    """
+    ブローカーデーモンを切り離したプロセスとして起動する。
+
+    デーモンは起動したシムの環境変数を引き継ぐ。シム（MCP クライアント）が
+    終了してもデーモンは終了しない。
+
+    Args:
+        socket_path: デーモンのソケットのパス
+
+    Returns:
+        subprocess.Popen: 起動したプロセス
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(  # pylint: disable=consider-using-with
+        [sys.executable, "-m", "src.broker", "--socket", socket_path],
+        cwd=root,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+class BrokerServer:
+    """
+    Unix ドメインソケットでツールの呼び出しを受け付けるデーモン側のサーバー。
+
+    接続ごとにデーモンスレッドでツールを実行する。リクエストの読み込みと応答の
+    書き込みは io_timeout_seconds で打ち切るため、接続したまま送信しないシム
+    （異常終了・ハングしたシムなど）がスレッドを占有し続けたり、アイドル終了を
+    妨げたりすることはない。ツールの実行自体には時間制限を設けない。
+
+    Attributes:
+        socket_path: ソケットのパス
+        idle_timeout_seconds: リクエストが無い場合に終了するまでの秒数（0 で終了しない）
+        io_timeout_seconds: リクエスト 1 行の読み込み・応答の書き込みを待つ最大秒数
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        handlers: Mapping[str, Callable[..., Any]],
+        idle_timeout_seconds: float = 0.0,
+        registry: Metrics = metrics,
+        io_timeout_seconds: float = 10.0,
+    ) -> None:
+        self.socket_path = socket_path
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.io_timeout_seconds = io_timeout_seconds
+        self._handlers = dict(handlers)
+        self._metrics = registry
+        self._sock: socket.socket | None = None
+        self._inode: int | None = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._last_activity = time.monotonic()
+
+    def bind(self) -> None:
+        """
+        ソケットを作成して待ち受けを開始する。
+
+        同じパスで応答するデーモンがある場合は失敗する。応答しない古いソケットは
+        削除して作り直す（ロックファイルで同時起動したデーモン同士の競合を防ぐ）。
+        ディレクトリが無い場合は権限 0700 で作成する。ソケットとロックファイルは
+        umask 0o077 で作成するため、作成した時点から現在のユーザーのみがアクセスできる。
+
+        Raises:
+            BrokerUnavailableError: ソケットのディレクトリが安全でない場合
+            BrokerError: 同じパスで別のデーモンが起動している場合
+        """
+        directory = os.path.dirname(os.path.abspath(self.socket_path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        check_socket_directory(self.socket_path)
+        previous_umask = os.umask(0o077)
+        try:
+            with open(self.socket_path + ".lock", "a", encoding="utf-8") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if BrokerClient(self.socket_path).ping():
+                    raise BrokerError(f"ブローカーは既に起動しています: {self.socket_path}")
+                if os.path.exists(self.socket_path):
+                    os.unlink(self.socket_path)
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.bind(self.socket_path)
+                sock.listen(64)
+        finally:
+            os.umask(previous_umask)
+        sock.settimeout(0.5)
+        self._sock = sock
+        self._inode = os.stat(self.socket_path).st_ino
+        self._last_activity = time.monotonic()
+
+    def serve_forever(self) -> None:
+        """stop() が呼ばれるかアイドル終了するまで接続を受け付ける。"""
+        if self._sock is None:
+            self.bind()
+        assert self._sock is not None
+        try:
+            while not self._stop_event.is_set():
+                if self._idle_expired():
+                    break
+                try:
+                    conn, _ = self._sock.accept()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    if self._stop_event.is_set():
+                        break
+                    raise
+                with self._lock:
+                    self._active += 1
+                    self._last_activity = time.monotonic()
+                threading.Thread(
+                    target=self._handle, args=(conn,), name="kb-broker-conn", daemon=True
+                ).start()
+        finally:
+            self._close()
+
+    def stop(self) -> None:
+        """待ち受けを停止する。"""
+        self._stop_event.set()
+
+    def _idle_expired(self) -> bool:
+        """実行中のリクエストが無く、最後のリクエストから idle_timeout_seconds 経過したか。"""
+        if self.idle_timeout_seconds <= 0:
+            return False
+        with self._lock:
+            return (
+                self._active == 0
+                and time.monotonic() - self._last_activity >= self.idle_timeout_seconds
+            )
+
+    def _close(self) -> None:
+        """ソケットを閉じ、自分が作成したソケットファイルであれば削除する。"""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        try:
+            if os.stat(self.socket_path).st_ino == self._inode:
+                os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+    def _dispatch(self, request: Any) -> dict[str, Any]:
+        """リクエスト 1 件を実行して応答を返す。"""
+        if not isinstance(request, dict) or not isinstance(request.get("arguments", {}), dict):
+            return {"error": "リクエストの形式が不正です", "error_type": "ValueError"}
+        tool = request.get("tool")
+        if tool == PING:
+            return {"result": "pong"}
+        handler = self._handlers.get(tool) if isinstance(tool, str) else None
+        if handler is None:
+            return {"error": f"不明なツールです: '{tool}'", "error_type": "ValueError"}
+        self._metrics.increment("broker.requests")
+        try:
+            return {"result": handler(**request.get("arguments", {}))}
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # ツールの例外はシムで同じ種類の例外として送出する
+            self._metrics.increment("broker.errors")
+            return {"error": str(e), "error_type": type(e).__name__}
+
+    def _handle(self, conn: socket.socket) -> None:
+        """接続 1 件のリクエストを処理する。"""
+        try:
+            with conn:
+                conn.settimeout(self.io_timeout_seconds)
+                try:
+                    request = _read_message(conn)
+                except ValueError as e:
+                    _send_message(conn, {"error": str(e), "error_type": "ValueError"})
+                    return
+                except socket.timeout:
+                    self._metrics.increment("broker.read_timeouts")
+                    return
+                if request is not None:
+                    _send_message(conn, self._dispatch(request))
+        except OSError:
+            # シムが応答を待たずに終了した場合など
+            pass
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._last_activity = time.monotonic()
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    ブローカーデーモンのエントリーポイント。
+
+    サーバーのバックグラウンド処理（ウォームアップ・取り込みジョブ監視など）を
+    開始し、ソケットでツールの呼び出しを受け付ける。通常はシムが自動的に起動する。
+    """
+    # 循環 import を避けるため、デーモンの起動時のみ読み込む
+    from src import server  # pylint: disable=import-outside-toplevel
+    from src.config import load_config  # pylint: disable=import-outside-toplevel
+
+    config = load_config()
+    parser = argparse.ArgumentParser(
+        prog="bedrock-kb-broker",
+        description="stdio サーバー間でキャッシュ・クライアントを共有するブローカーデーモン",
+    )
+    parser.add_argument(
+        "--socket", default=config.broker_socket_path,
+        help="ソケットのパス（デフォルト: BEDROCK_KB_BROKER_SOCKET またはユーザーごとの場所）",
+    )
+    parser.add_argument(
+        "--idle-timeout", type=float, default=config.broker_idle_timeout_seconds,
+        help="リクエストが無い場合に終了するまでの秒数（0 で終了しない）",
+    )
+    args = parser.parse_args(argv)
+
+    server.start_logging()
+    broker = BrokerServer(args.socket, server.broker_handlers(), args.idle_timeout)
+    try:
+        broker.bind()
+    except BrokerError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+    server.start_background_tasks()
+    broker.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+検索結果キャッシュモジュール
+
+query_knowledge_base の結果を TTL 付き LRU キャッシュに保持する。
+キーには bedrock_client.build_cache_key で構築したタプルを使用する。
+ChunkStore を指定した場合はチャンク本文を重複排除して保持し、
+各エントリはチャンクへの参照とスコアのみを持つ。
+
+キャッシュの大きさはバイト数（max_bytes）で制限する。ChunkStore 使用時は
+ストアの格納バイト数（重複排除・圧縮後）に参照とエントリのおおよそのオーバーヘッドを
+加えた値で判定するため、重複排除・圧縮で 1 エントリが小さくなるほど多くのクエリを
+保持できる。エントリ数（max_entries）は補助的な上限とする。
+
+Knowledge Base の同期完了時は invalidate でエントリを削除し、世代番号を進める。
+無効化前に開始した検索の結果は、古い世代番号を指定した put で破棄される。
+"""
+
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from src.chunk_store import ChunkStore
+from src.models import KBResponse
+
+
+# ChunkStore 使用時のエントリ: ((チャンクのハッシュ, スコア) のタプル, partial)
+_StoredResponse = tuple[tuple[tuple[str, float | None], ...], bool]
+
+# エントリ 1 件あたりのおおよそのオーバーヘッド（キー・有効期限・OrderedDict のノード、バイト）
+ENTRY_OVERHEAD_BYTES = 512
+
+# チャンクへの参照 1 件あたりのおおよそのオーバーヘッド（(ハッシュ, スコア) のタプル、バイト）
+REFERENCE_OVERHEAD_BYTES = 96
+
+
+class ResultCache:
+    """
+    スレッドセーフな TTL 付き LRU キャッシュ。
+
+    Attributes:
+        max_entries: 保持する最大エントリ数
+        ttl_seconds: エントリの有効期間（秒）
+        chunk_store: チャンク本文を共有するストア（None の場合はレスポンスをそのまま保持）
+        max_bytes: 保持するおおよその最大バイト数（0 の場合はエントリ数のみで制限）
+        generation: 世代番号（invalidate のたびに 1 増える）
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        chunk_store: ChunkStore | None = None,
+        max_bytes: int = 0,
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries は 1 以上である必要があります")
+        if ttl_seconds <= 0:
+            raise ValueError("ttl_seconds は正の値である必要があります")
+        if max_bytes < 0:
+            raise ValueError("max_bytes は 0 以上である必要があります")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.chunk_store = chunk_store
+        self.max_bytes = max_bytes
+        self._clock = clock
+        # キー -> (有効期限, 格納データ, オーバーヘッドを含むバイト数（ストアの本文は除く）)
+        self._entries: OrderedDict[Any, tuple[float, Any, int]] = OrderedDict()
+        self._entry_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+
+    def _pack(self, response: KBResponse) -> tuple[Any, int]:
+        """
+        格納用にレスポンスを変換する（ChunkStore 使用時はチャンクを参照に置き換える）。
+
+        Returns:
+            tuple: (格納データ, エントリのバイト数)。ChunkStore 使用時のバイト数は
+                参照とエントリのオーバーヘッドのみ（本文はストアで数える）
+        """
+        if self.chunk_store is None:
+            size = ENTRY_OVERHEAD_BYTES + sum(
+                len(result.content.encode("utf-8"))
+                + len(json.dumps(result.location, ensure_ascii=False).encode("utf-8"))
+                for result in response.results
+            )
+            return response, size
+        refs = tuple(
+            (self.chunk_store.acquire(result), result.score) for result in response.results
+        )
+        return (refs, response.partial), ENTRY_OVERHEAD_BYTES + len(refs) * REFERENCE_OVERHEAD_BYTES
+
+    def _unpack(self, stored: Any) -> KBResponse:
+        """格納データからレスポンスを復元する。"""
+        if self.chunk_store is None:
+            return stored
+        refs, partial = stored
+        return KBResponse(
+            results=[self.chunk_store.get(key, score) for key, score in refs],
+            partial=partial,
+        )
+
+    def _release(self, stored: Any) -> None:
+        """削除するエントリが参照していたチャンクを解放する。"""
+        if self.chunk_store is None:
+            return
+        for key, _score in stored[0]:
+            self.chunk_store.release(key)
+
+    def _remove(self, key: Any) -> None:
+        """エントリを削除してチャンクを解放する（ロック取得済みで呼び出す）。"""
+        _expires_at, stored, size = self._entries.pop(key)
+        self._entry_bytes -= size
+        self._release(stored)
+
+    def _evict_oldest(self) -> None:
+        """最も古く使われたエントリを削除する（ロック取得済みで呼び出す）。"""
+        self._remove(next(iter(self._entries)))
+
+    def _bytes(self) -> int:
+        """保持しているおおよそのバイト数（ロック取得済みで呼び出す）。"""
+        stored = self.chunk_store.stored_bytes if self.chunk_store is not None else 0
+        return self._entry_bytes + stored
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key: Any) -> KBResponse | None:
+        """
+        キーに対応するレスポンスを返す。期限切れの場合は削除して None を返す。
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            KBResponse | None: キャッシュ済みのレスポンス、または None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, stored, _size = entry
+            if expires_at <= self._clock():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._unpack(stored)
+
+    def contains(self, key: Any) -> bool:
+        """
+        有効なエントリが存在するか判定する（ヒット率の統計には含めない）。
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            bool: 期限内のエントリが存在する場合は True
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > self._clock()
+
+    def put(self, key: Any, response: KBResponse, generation: int | None = None) -> None:
+        """
+        レスポンスを格納する。
+
+        バイト数またはエントリ数の上限を超えた場合は、最も古く使われたエントリから
+        削除する（格納したエントリだけで max_bytes を超える場合も、そのエントリは残す）。
+
+        Args:
+            key: キャッシュキー
+            response: 格納するレスポンス
+            generation: 検索を開始した時点の世代番号（現在の世代と異なる場合は格納しない）
+        """
+        if generation is not None and generation != self.generation:
+            return
+        stored, size = self._pack(response)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self._release(stored)
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self._clock() + self.ttl_seconds, stored, size)
+            self._entry_bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes and self._bytes() > self.max_bytes and len(self._entries) > 1
+            ):
+                self._evict_oldest()
+
+    def clear(self) -> None:
+        """全エントリを削除する。"""
+        with self._lock:
+            for _expires_at, stored, _size in self._entries.values():
+                self._release(stored)
+            self._entries.clear()
+            self._entry_bytes = 0
+
+    def shrink(self, fraction: float = 0.5) -> int:
+        """
+        最も古く使われたエントリから fraction の割合を削除する（メモリ予算の超過時に使用）。
+
+        Args:
+            fraction: 削除する割合（0 から 1）
+
+        Returns:
+            int: 削除したエントリ数
+        """
+        with self._lock:
+            count = math.ceil(len(self._entries) * min(max(fraction, 0.0), 1.0))
+            for _ in range(count):
+                self._evict_oldest()
+            return count
+
+    def invalidate(self, predicate: Callable[[Any], bool] | None = None) -> int:
+        """
+        条件に一致するエントリを削除し、世代番号を進める。
+
+        Args:
+            predicate: キーを受け取り、削除する場合に True を返す関数（None の場合は全エントリ）
+
+        Returns:
+            int: 削除したエントリ数
+        """
+        with self._lock:
+            self.generation += 1
+            keys = [key for key in self._entries if predicate is None or predicate(key)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        キャッシュの統計情報を返す。
+
+        Returns:
+            dict: entries / bytes（おおよそのバイト数）/ max_bytes / hits / misses /
+                hit_rate を含む辞書（ChunkStore 使用時は chunk_store に重複排除率などを含む）
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            stats: dict[str, Any] = {
+                "entries": len(self._entries),
+                "bytes": self._bytes(),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+        if self.chunk_store is not None:
+            stats["chunk_store"] = self.chunk_store.stats()
+        return stats
+
+
+class NegativeCache:
+    """
+    決定的な失敗（認証エラー・KB 未検出など）を短時間記憶するキャッシュ。
+
+    キーには (リージョン, KB ID, 認証情報の識別子) を使用するため、
+    設定や認証情報が変わると別キーとなり、記憶した失敗は自動的に無効になる。
+
+    Attributes:
+        ttl_seconds: 失敗を記憶する期間（秒）
+        max_entries: 保持する最大エントリ数
+        hits: 記憶した失敗をそのまま返した回数
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 30.0,
+        max_entries: int = 64,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if ttl_seconds <= 0:
+            raise ValueError("ttl_seconds は正の値である必要があります")
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: OrderedDict[Any, tuple[float, type[Exception], str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key: Any) -> Exception | None:
+        """
+        記憶している失敗があれば、同じ型・メッセージの新しい例外を返す。
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            Exception | None: 送出すべき例外、または None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, error_type, message = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self.hits += 1
+        return error_type(message)
+
+    def put(self, key: Any, error: Exception) -> None:
+        """
+        失敗を記憶する。
+
+        Args:
+            key: キャッシュキー
+            error: 記憶する例外（型とメッセージのみ保持する）
+        """
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl_seconds, type(error), str(error))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """全エントリを削除する。"""
+        with self._lock:
+            self._entries.clear()
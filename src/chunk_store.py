@@ -0,0 +1,283 @@
+"""
+チャンクストアモジュール
+
+検索結果のチャンク本文（content と location）を内容のハッシュで一意に保持する。
+異なるクエリが同じチャンクを返しても本文は 1 つだけ格納され、
+キャッシュ済みレスポンスはハッシュへの参照のみを持つ。
+参照カウントが 0 になったチャンクは即座に削除する。
+
+圧縮方式:
+    none: 圧縮しない
+    zlib: 標準ライブラリの zlib で圧縮
+    zstd: zstandard パッケージで圧縮（pip install bedrock-kb-mcp-server[zstd]）
+"""
+
+import hashlib
+import json
+import math
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable
+
+from src.models import RetrievalResult
+
+
+# 利用可能な圧縮方式
+COMPRESSION_NONE = "none"
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_ZSTD = "zstd"
+SUPPORTED_COMPRESSIONS = (COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_ZSTD)
+
+
+def chunk_hash(content: str, location: dict[str, Any]) -> str:
+    """
+    チャンクの内容ハッシュを計算する。
+
+    Args:
+        content: チャンクのテキスト
+        location: ソースの場所情報（キー順を正規化してハッシュに含める）
+
+    Returns:
+        str: SHA-256 の 16 進文字列
+    """
+    digest = hashlib.sha256(content.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(
+        json.dumps(location, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        .encode("utf-8")
+    )
+    return digest.hexdigest()
+
+
+def _codec(compression: str) -> tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    """圧縮方式に対応する (圧縮関数, 展開関数) を返す。"""
+    if compression == COMPRESSION_NONE:
+        return bytes, bytes
+    if compression == COMPRESSION_ZLIB:
+        return zlib.compress, zlib.decompress
+    if compression == COMPRESSION_ZSTD:
+        try:
+            import zstandard  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            raise ValueError(
+                "zstd 圧縮には zstandard パッケージが必要です"
+                "（pip install bedrock-kb-mcp-server[zstd]）"
+            ) from None
+        compressor = zstandard.ZstdCompressor()
+        decompressor = zstandard.ZstdDecompressor()
+        return compressor.compress, decompressor.decompress
+    raise ValueError(
+        f"未対応の圧縮方式です: '{compression}'"
+        f"（{' / '.join(SUPPORTED_COMPRESSIONS)} のいずれかを指定してください）"
+    )
+
+
+class ChunkStore:
+    """
+    参照カウント付きの内容アドレス型チャンクストア（スレッドセーフ）。
+
+    Attributes:
+        compression: 圧縮方式
+    """
+
+    def __init__(self, compression: str = COMPRESSION_NONE) -> None:
+        self.compression = compression
+        self._compress, self._decompress = _codec(compression)
+        # ハッシュ -> [格納データ, 参照カウント, 非圧縮時のバイト数]
+        self._chunks: dict[str, list[Any]] = {}
+        self._stored_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._chunks)
+
+    def acquire(self, result: RetrievalResult) -> str:
+        """
+        チャンクを格納（または既存チャンクの参照を追加）し、ハッシュを返す。
+
+        Args:
+            result: 格納する検索結果（score は参照側で保持する）
+
+        Returns:
+            str: チャンクのハッシュ
+        """
+        key = chunk_hash(result.content, result.location)
+        with self._lock:
+            entry = self._chunks.get(key)
+            if entry is not None:
+                entry[1] += 1
+                return key
+        raw = json.dumps(
+            [result.content, result.location], ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        data = self._compress(raw)
+        with self._lock:
+            entry = self._chunks.get(key)
+            if entry is not None:
+                # 圧縮中に他スレッドが同じチャンクを格納した場合
+                entry[1] += 1
+            else:
+                self._chunks[key] = [data, 1, len(raw)]
+                self._stored_bytes += len(data)
+        return key
+
+    def release(self, key: str) -> None:
+        """
+        チャンクの参照を 1 つ減らし、0 になった場合は削除する。
+
+        Args:
+            key: チャンクのハッシュ
+        """
+        with self._lock:
+            entry = self._chunks.get(key)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._chunks[key]
+                self._stored_bytes -= len(entry[0])
+
+    @property
+    def stored_bytes(self) -> int:
+        """格納している本文（圧縮後）の合計バイト数"""
+        with self._lock:
+            return self._stored_bytes
+
+    def get(self, key: str, score: float | None = None) -> RetrievalResult:
+        """
+        チャンクを復元する。
+
+        Args:
+            key: チャンクのハッシュ
+            score: 復元した結果に設定するスコア
+
+        Returns:
+            RetrievalResult: 復元した検索結果
+
+        Raises:
+            KeyError: チャンクが存在しない場合
+        """
+        with self._lock:
+            data = self._chunks[key][0]
+        content, location = json.loads(self._decompress(data))
+        return RetrievalResult(content=content, location=location, score=score)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        チャンクストアの統計情報を返す。
+
+        Returns:
+            dict: chunks / references / logical_bytes / stored_bytes /
+                dedup_ratio（参照数 / チャンク数）/ space_saving_ratio
+                （重複排除・圧縮なしの場合のバイト数 / 格納バイト数）を含む辞書
+        """
+        with self._lock:
+            chunks = len(self._chunks)
+            references = sum(entry[1] for entry in self._chunks.values())
+            logical = sum(entry[1] * entry[2] for entry in self._chunks.values())
+            stored = self._stored_bytes
+        return {
+            "compression": self.compression,
+            "chunks": chunks,
+            "references": references,
+            "logical_bytes": logical,
+            "stored_bytes": stored,
+            "dedup_ratio": references / chunks if chunks else 1.0,
+            "space_saving_ratio": logical / stored if stored else 1.0,
+        }
+
+
+class RecentChunkCache:
+    """
+    最近返したチャンクの全文をハッシュで引ける LRU キャッシュ（スレッドセーフ）。
+
+    スニペットモードで返した kb://chunk/<hash> リソースの読み込みに使用する。
+
+    Attributes:
+        max_entries: 保持する最大チャンク数
+        max_bytes: 保持するチャンク本文の合計バイト数の上限
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 8 * 1024 * 1024) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries は 1 以上である必要があります")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._chunks: OrderedDict[str, tuple[RetrievalResult, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._chunks)
+
+    def put(self, result: RetrievalResult) -> str:
+        """
+        チャンクを格納し、ハッシュを返す。
+
+        Args:
+            result: 格納する検索結果
+
+        Returns:
+            str: チャンクのハッシュ
+        """
+        key = chunk_hash(result.content, result.location)
+        size = len(result.content.encode("utf-8"))
+        with self._lock:
+            previous = self._chunks.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._chunks[key] = (result, size)
+            self._bytes += size
+            while len(self._chunks) > self.max_entries or (
+                self._bytes > self.max_bytes and len(self._chunks) > 1
+            ):
+                _key, (_result, evicted_size) = self._chunks.popitem(last=False)
+                self._bytes -= evicted_size
+        return key
+
+    def get(self, key: str) -> RetrievalResult | None:
+        """
+        チャンクを返す。
+
+        Args:
+            key: チャンクのハッシュ
+
+        Returns:
+            RetrievalResult | None: チャンク（存在しない場合は None）
+        """
+        with self._lock:
+            entry = self._chunks.get(key)
+            if entry is None:
+                return None
+            self._chunks.move_to_end(key)
+            return entry[0]
+
+    def shrink(self, fraction: float = 0.5) -> int:
+        """
+        最も古く使われたチャンクから fraction の割合を削除する（メモリ予算の超過時に使用）。
+
+        Args:
+            fraction: 削除する割合（0 から 1）
+
+        Returns:
+            int: 削除したチャンク数
+        """
+        with self._lock:
+            count = math.ceil(len(self._chunks) * min(max(fraction, 0.0), 1.0))
+            for _ in range(count):
+                _key, (_result, evicted_size) = self._chunks.popitem(last=False)
+                self._bytes -= evicted_size
+            return count
+
+    def stats(self) -> dict[str, Any]:
+        """
+        キャッシュの統計情報を返す。
+
+        Returns:
+            dict: chunks / bytes を含む辞書
+        """
+        with self._lock:
+            return {"chunks": len(self._chunks), "bytes": self._bytes}
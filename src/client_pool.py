@@ -0,0 +1,85 @@
+"""
+クライアントプールモジュール
+
+boto3 クライアントの作成はサービス定義の読み込みやエンドポイント解決を伴い、
+呼び出しごとに作成すると Retrieve API 本体より時間がかかることがある。
+ClientPool は (AWS プロファイル, リージョン, タイムアウト設定) ごとに作成済みの
+クライアントを保持して再利用する。タイムアウト設定は Deadline.client_settings で
+段階的な値に切り下げられるため、同じ時間予算の呼び出しは同じクライアントを使う。
+
+プールは KB プロファイルごとに分け、最大数を超えた場合は最も長く使われていない
+クライアントを破棄する（LRU）。
+
+メトリクス:
+    client_pool.created: 作成したクライアント数
+    client_pool.evicted: 上限超過で破棄したクライアント数
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from src.metrics import Metrics, metrics
+
+
+# クライアント 1 つあたりのおおよそのメモリ使用量（バイト）。
+# bedrock-agent-runtime クライアントを tracemalloc で計測した値（約 169 KB、
+# セッションで共有するサービス定義の読み込み分を除く）。kb_memory の見積もりに使う
+CLIENT_ESTIMATED_BYTES = 170 * 1024
+
+
+class ClientPool:
+    """
+    キーごとに作成済みのクライアントを LRU で保持する（スレッドセーフ）。
+
+    Attributes:
+        max_clients: 保持するクライアントの最大数
+    """
+
+    def __init__(self, max_clients: int = 16, registry: Metrics = metrics) -> None:
+        if max_clients < 1:
+            raise ValueError("max_clients は 1 以上である必要があります")
+        self.max_clients = max_clients
+        self._metrics = registry
+        self._clients: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        キーに対応するクライアントを返す（無い場合は factory で作成して保持する）。
+
+        作成はロックの外で行うため、同じキーを同時に要求した場合は
+        複数作成されることがある（先に格納されたクライアントを返す）。
+
+        Args:
+            key: クライアントの設定を表すハッシュ可能なキー
+            factory: クライアントを作成する関数
+
+        Returns:
+            Any: 作成済みまたは新しく作成したクライアント
+        """
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+
+        created = factory()
+        with self._lock:
+            client = self._clients.setdefault(key, created)
+            self._clients.move_to_end(key)
+            if client is created:
+                self._metrics.increment("client_pool.created")
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+                self._metrics.increment("client_pool.evicted")
+            return client
+
+    def clear(self) -> None:
+        """保持しているクライアントを全て破棄する。"""
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._clients)
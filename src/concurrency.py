@@ -0,0 +1,192 @@
+"""
+適応的な同時実行数制限モジュール
+
+固定の同時実行数の上限は、低すぎればアカウントのクォータを使い切れず、
+高すぎれば ThrottlingException が連続する。AdaptiveConcurrencyLimiter は
+Retrieve API の呼び出しごとの結果から同時実行数の上限を調整する（AIMD）。
+
+- 成功した場合は上限を 1 / limit ずつ上げる（上限まで実行している間の
+  1 往復あたり約 +increase）。上限の半分も使っていない場合は上げない
+- スロットリングされた場合は上限を decrease 倍に下げる
+- レイテンシが直近の最小値（混雑していない場合のレイテンシ）の
+  latency_tolerance 倍を超えた場合も、キューイングが始まったとみなして
+  decrease 倍に下げる（TCP Vegas と同様の遅延に基づく検知）
+
+同じ混雑で実行中の呼び出しが一斉に失敗しても 1 回のみ下げるため、
+前回下げた時点より前に開始した呼び出しの結果では下げない。
+
+クォータはアカウント・リージョンごとのため、制限は (AWS プロファイル, リージョン) ごとに
+作成し、name でメトリクスを分ける。
+
+メトリクス（<name> は制限の名前、例: "support:ap-northeast-1"）:
+    concurrency.<name>.limit: 現在の同時実行数の上限（ゲージ）
+    concurrency.<name>.in_flight: 実行中の呼び出し数（ゲージ）
+    concurrency.<name>.wait_ms: 実行枠を得るまでの待機時間（サマリー）
+    concurrency.<name>.throttled: スロットリングで上限を下げた回数
+    concurrency.<name>.throttled_calls: スロットリングされた呼び出し（試行）の数
+    concurrency.<name>.latency_inflated: レイテンシの増加で上限を下げた回数
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+
+from src.deadline import DeadlineExceededError
+from src.metrics import Metrics, metrics
+
+
+# 呼び出しの結果
+OUTCOME_OK = "ok"
+OUTCOME_THROTTLED = "throttled"
+OUTCOME_ERROR = "error"
+
+# 混雑していない場合のレイテンシとして最小値をとる直近の成功数
+LATENCY_WINDOW = 100
+
+# レイテンシの増加を判定し始める成功数
+MIN_LATENCY_SAMPLES = 10
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    呼び出しの結果に応じて同時実行数の上限を調整する制限（スレッドセーフ）。
+
+    Attributes:
+        name: メトリクス名に含める制限の名前（空の場合は concurrency.limit など）
+        min_limit: 上限の最小値
+        max_limit: 上限の最大値
+        latency_tolerance: 最小レイテンシの何倍を超えたら上限を下げるか（0 で判定しない）
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_tolerance: float = 2.0,
+        registry: Metrics = metrics,
+        clock: Callable[[], float] = time.monotonic,
+        name: str = "",
+    ) -> None:
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("min_limit は 1 以上 max_limit 以下である必要があります")
+        if not 0 < decrease < 1:
+            raise ValueError("decrease は 0 より大きく 1 未満である必要があります")
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self._prefix = f"concurrency.{name}." if name else "concurrency."
+        self.latency_tolerance = latency_tolerance
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._increase = increase
+        self._decrease = decrease
+        self._registry = registry
+        self._clock = clock
+        self._in_flight = 0
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+        self._publish()
+
+    @property
+    def limit(self) -> int:
+        """現在の同時実行数の上限"""
+        with self._cond:
+            return int(self._limit)
+
+    def acquire(self, timeout: float | None = None) -> float:
+        """
+        実行枠を取得する（上限まで実行中の場合は空くまで待機する）。
+
+        Args:
+            timeout: 最大待機秒数（None の場合は無制限）
+
+        Returns:
+            float: 実行枠を得た時刻（release に渡す）
+
+        Raises:
+            DeadlineExceededError: timeout 秒以内に実行枠を得られなかった場合
+        """
+        started = self._clock()
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                remaining = None if timeout is None else started + timeout - self._clock()
+                if remaining is not None and remaining <= 0:
+                    raise DeadlineExceededError(
+                        "Retrieve API の実行枠を待機中にタイムアウトしました"
+                    )
+                self._cond.wait(remaining)
+            self._in_flight += 1
+            self._publish()
+            granted = self._clock()
+        self._registry.observe(self._prefix + "wait_ms", (granted - started) * 1000)
+        return granted
+
+    def release(self, started: float, outcome: str = OUTCOME_OK) -> None:
+        """
+        実行枠を返却し、呼び出しの結果から上限を調整する。
+
+        Args:
+            started: acquire が返した時刻
+            outcome: 呼び出しの結果（OUTCOME_OK / OUTCOME_THROTTLED / OUTCOME_ERROR）。
+                OUTCOME_ERROR の場合は上限を変えない
+        """
+        latency = self._clock() - started
+        with self._cond:
+            busy = self._in_flight * 2 >= self._limit
+            self._in_flight = max(0, self._in_flight - 1)
+            if outcome == OUTCOME_THROTTLED:
+                self._registry.increment(self._prefix + "throttled_calls")
+                self._decrease_limit(started, "throttled")
+            elif outcome == OUTCOME_OK:
+                if self._inflated(latency):
+                    self._decrease_limit(started, "latency_inflated")
+                elif busy:
+                    self._limit = min(
+                        float(self.max_limit), self._limit + self._increase / self._limit
+                    )
+                self._latencies.append(latency)
+            self._publish()
+            self._cond.notify_all()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        同時実行数の制限の状態を返す。
+
+        Returns:
+            dict: limit / min_limit / max_limit / in_flight / base_latency_ms
+                （成功した呼び出しが無い場合は None）を含む辞書
+        """
+        with self._cond:
+            return {
+                "limit": int(self._limit),
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "in_flight": self._in_flight,
+                "base_latency_ms": (
+                    round(min(self._latencies) * 1000, 1) if self._latencies else None
+                ),
+            }
+
+    def _inflated(self, latency: float) -> bool:
+        """レイテンシが最小値の latency_tolerance 倍を超えたか判定する（ロック取得済みで呼び出す）。"""
+        if self.latency_tolerance <= 0 or len(self._latencies) < MIN_LATENCY_SAMPLES:
+            return False
+        return latency > min(self._latencies) * self.latency_tolerance
+
+    def _decrease_limit(self, started: float, counter: str) -> None:
+        """上限を乗算的に下げ、counter（throttled / latency_inflated）を数える（ロック取得済みで呼び出す）。"""
+        if started <= self._last_decrease:
+            # 前回下げた時点で実行中だった呼び出しは、同じ混雑の結果とみなす
+            return
+        self._last_decrease = self._clock()
+        self._limit = max(float(self.min_limit), self._limit * self._decrease)
+        self._registry.increment(self._prefix + counter)
+
+    def _publish(self) -> None:
+        """上限・実行中の数をゲージに反映する（ロック取得済みで呼び出す）。"""
+        self._registry.set_gauge(self._prefix + "limit", int(self._limit))
+        self._registry.set_gauge(self._prefix + "in_flight", self._in_flight)
@@ -7,6 +7,38 @@ Retrieve API を使用するため、基盤モデル ARN は不要。
 
 import os
 from dataclasses import dataclass
+from typing import Any
+
+from src.broker import default_socket_path
+from src.chunk_store import COMPRESSION_NONE, SUPPORTED_COMPRESSIONS
+from src.model_bundle import BUNDLE_OFF, default_bundle_path
+from src.structured_log import DEFAULT_SAMPLE_RATES, LOG_LEVELS, parse_sample_rates
+
+
+# 利用可能なバックエンド
+BACKEND_BEDROCK = "bedrock"
+BACKEND_LOCAL = "local"
+SUPPORTED_BACKENDS = (BACKEND_BEDROCK, BACKEND_LOCAL)
+
+
+@dataclass(frozen=True)
+class Replica:
+    """
+    同じ内容を複製した Knowledge Base の 1 つ。
+
+    Attributes:
+        region: AWS リージョン
+        kb_id: Knowledge Base ID
+        profile: 使用する AWS プロファイル（None の場合はデフォルトの認証情報）
+    """
+    region: str
+    kb_id: str
+    profile: str | None = None
+
+    @property
+    def name(self) -> str:
+        """メトリクスなどで使用する識別名（リージョン:KB ID）"""
+        return f"{self.region}:{self.kb_id}"
 
 
 @dataclass(frozen=True)
@@ -17,9 +49,238 @@ class KBConfig:
     Attributes:
         aws_region: AWS リージョン
         kb_id: Knowledge Base ID
+        backend: 検索バックエンド（"bedrock" または "local"）
+        local_corpus_dir: ローカルバックエンドでインデックスするディレクトリ
+        local_index_path: ローカルインデックスファイルのパス（None の場合はコーパス直下）
+        cache_ttl_seconds: 検索結果キャッシュの有効期間（秒、0 で無効）
+        cache_max_entries: 検索結果キャッシュの最大エントリ数（max_bytes を補う上限）
+        cache_max_bytes: 検索結果キャッシュのおおよその最大バイト数（0 でエントリ数のみで制限）
+        cache_compression: キャッシュ内チャンク本文の圧縮方式（"none" / "zlib" / "zstd"）
+        negative_cache_ttl_seconds: 認証エラー・KB 未検出を記憶する期間（秒、0 で無効）
+        warmup_log_path: 起動時ウォームアップに使用するクエリログのパス
+        warmup_top_n: ウォームアップで事前実行するクエリ数
+        warmup_rate_per_second: ウォームアップの実行レート（1 秒あたりのクエリ数）
+        query_log_path: クエリログの出力先（None の場合は記録しない）
+        query_log_hash: クエリをハッシュ化して記録するかどうか
+        query_log_max_bytes: クエリログをローテーションするサイズ（バイト）
+        query_log_backups: 保持するローテーション済みクエリログの数
+        credential_refresh_margin_seconds: 認証情報を有効期限の何秒前に先行更新するか
+        credential_check_interval_seconds: 認証情報の有効期限を確認する間隔（秒、0 で無効）
+        request_timeout_ms: kb_answer 1 回あたりの時間予算のデフォルト（ミリ秒、0 で無制限）
+        decompose_queries: 複合的な質問をサブクエリに分解するかどうかのデフォルト
+        decompose_max_sub_queries: 分解するサブクエリの最大数
+        fetch_limit: kb_answer でオーバーフェッチする件数のデフォルト（0 でページングしない）
+        result_set_ttl_seconds: ページング用結果セットの有効期間（秒、最後のアクセスから）
+        result_set_max_sets: 保持する結果セットの最大数
+        result_set_max_bytes: 保持する結果セットの合計バイト数の上限
+        snippet_mode: 全文の代わりにスニペットと kb://chunk リソース URI を返すかどうかのデフォルト
+        snippet_chars: スニペットの最大文字数
+        max_in_flight: Retrieve API の同時実行数の上限（0 でアドミッション制御なし）
+        max_queue: 実行枠を待機できる呼び出し数の上限（超過分は Overloaded で拒否）
+        replicas: aws_region / kb_id に加えて検索先にできる複製 Knowledge Base
+        replica_probe_interval_seconds: 使われていない複製を計測する間隔（秒、0 で無効）
+        ingestion_poll_interval_seconds: 取り込みジョブの完了を確認する間隔（秒、0 で無効）
+        data_source_ids: 監視するデータソース ID（空の場合は Knowledge Base の全データソース）
+        memory_budget_bytes: RSS のメモリ予算（バイト、超過時はキャッシュを削除、0 で無効）
+        memory_check_interval_seconds: メモリ予算を確認する間隔（秒）
+        profiles_path: KB プロファイルファイルのパス（None の場合は kb パラメータを使用できない）
+        profile_name: 選択中の KB プロファイル名（環境変数の設定の場合は None）
+        aws_profile: 使用する AWS プロファイル（None の場合はデフォルトの認証情報）
+        default_search_type: search_type 未指定時に使用する検索タイプ
+        default_metadata_filter: metadata_filter 未指定時に使用するメタデータフィルター
+        client_pool_size: KB プロファイルごとに保持する boto3 クライアントの最大数
+        overfetch_results: キャッシュ使用時に取得してキャッシュする件数の上限（0 で無効）
+        model_bundle_path: botocore モデルバンドルのパス（None の場合は使用しない）
+        session_ttl_seconds: セッションの送信済みチャンクの記録の有効期間（秒、最後の使用から）
+        session_max_sessions: 送信済みチャンクを記録する最大セッション数
+        broker_mode: ツールの呼び出しをブローカーデーモンに転送するかどうか
+        broker_socket_path: ブローカーデーモンのソケットのパス
+        broker_idle_timeout_seconds: ブローカーデーモンがアイドル終了するまでの秒数（0 で終了しない）
+        log_path: 構造化ログの出力先（None の場合は記録しない）
+        log_level: サーバーのイベントを構造化ログに記録する最小のレベル
+        log_sample_rates: 成功時のイベントのサンプリング割合（(イベント名, 割合) の組）
+        log_max_bytes: 構造化ログをローテーションするサイズ（バイト）
+        log_backups: 保持するローテーション済み構造化ログの数
+        keepalive_interval_seconds: この秒数以上通信していない接続にキープアライブを送る（0 で無効）
+        keepalive_max_idle_seconds: 最後の呼び出しからキープアライブを送り続ける最大の秒数
+        adaptive_concurrency_max: Retrieve API の適応的な同時実行数の上限の最大値（0 で無効）
+        adaptive_concurrency_min: 適応的な同時実行数の上限の最小値
+        adaptive_latency_tolerance: 最小レイテンシの何倍を超えたら同時実行数を下げるか（0 で判定しない）
     """
     aws_region: str
     kb_id: str
+    backend: str = BACKEND_BEDROCK
+    local_corpus_dir: str | None = None
+    local_index_path: str | None = None
+    cache_ttl_seconds: float = 300.0
+    cache_max_entries: int = 4096
+    cache_max_bytes: int = 32 * 1024 * 1024
+    cache_compression: str = COMPRESSION_NONE
+    negative_cache_ttl_seconds: float = 30.0
+    warmup_log_path: str | None = None
+    warmup_top_n: int = 100
+    warmup_rate_per_second: float = 2.0
+    query_log_path: str | None = None
+    query_log_hash: bool = False
+    query_log_max_bytes: int = 10 * 1024 * 1024
+    query_log_backups: int = 5
+    credential_refresh_margin_seconds: float = 1200.0
+    credential_check_interval_seconds: float = 60.0
+    request_timeout_ms: int = 30000
+    decompose_queries: bool = False
+    decompose_max_sub_queries: int = 4
+    fetch_limit: int = 0
+    result_set_ttl_seconds: float = 600.0
+    result_set_max_sets: int = 128
+    result_set_max_bytes: int = 16 * 1024 * 1024
+    snippet_mode: bool = False
+    snippet_chars: int = 240
+    max_in_flight: int = 8
+    max_queue: int = 32
+    replicas: tuple[Replica, ...] = ()
+    replica_probe_interval_seconds: float = 30.0
+    ingestion_poll_interval_seconds: float = 0.0
+    data_source_ids: tuple[str, ...] = ()
+    memory_budget_bytes: int = 0
+    memory_check_interval_seconds: float = 10.0
+    profiles_path: str | None = None
+    profile_name: str | None = None
+    aws_profile: str | None = None
+    default_search_type: str | None = None
+    default_metadata_filter: dict[str, Any] | None = None
+    client_pool_size: int = 16
+    overfetch_results: int = 0
+    model_bundle_path: str | None = None
+    session_ttl_seconds: float = 3600.0
+    session_max_sessions: int = 256
+    broker_mode: bool = False
+    broker_socket_path: str | None = None
+    broker_idle_timeout_seconds: float = 1800.0
+    log_path: str | None = None
+    log_level: str = "INFO"
+    log_sample_rates: tuple[tuple[str, float], ...] = ()
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backups: int = 5
+    keepalive_interval_seconds: float = 0.0
+    keepalive_max_idle_seconds: float = 600.0
+    adaptive_concurrency_max: int = 0
+    adaptive_concurrency_min: int = 1
+    adaptive_latency_tolerance: float = 2.0
+
+    @property
+    def replica_set(self) -> tuple[Replica, ...]:
+        """aws_region / kb_id を先頭とする検索先の Knowledge Base（重複を除く）"""
+        primary = Replica(region=self.aws_region, kb_id=self.kb_id, profile=self.aws_profile)
+        return tuple(dict.fromkeys((primary, *self.replicas)))
+
+
+def _read_int_env(name: str, default: int, minimum: int = 0) -> int:
+    """
+    整数の環境変数を読み込む。
+
+    Args:
+        name: 環境変数名
+        default: 未設定時のデフォルト値
+        minimum: 許容する最小値
+
+    Returns:
+        int: 読み込んだ値
+
+    Raises:
+        ValueError: 整数として解釈できないか最小値未満の場合
+    """
+    raw = os.environ.get(name)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f"{name} は整数で指定してください: '{raw}'") from None
+    if value < minimum:
+        raise ValueError(f"{name} は {minimum} 以上で指定してください: '{raw}'")
+    return value
+
+
+def _read_float_env(name: str, default: float, minimum: float = 0.0) -> float:
+    """
+    数値の環境変数を読み込む。
+
+    Args:
+        name: 環境変数名
+        default: 未設定時のデフォルト値
+        minimum: 許容する最小値
+
+    Returns:
+        float: 読み込んだ値
+
+    Raises:
+        ValueError: 数値として解釈できないか最小値未満の場合
+    """
+    raw = os.environ.get(name)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        raise ValueError(f"{name} は数値で指定してください: '{raw}'") from None
+    if not value >= minimum:
+        raise ValueError(f"{name} は {minimum} 以上で指定してください: '{raw}'")
+    return value
+
+
+def _read_bool_env(name: str, default: bool) -> bool:
+    """
+    真偽値の環境変数を読み込む（1/true/yes/on を真とみなす）。
+
+    Args:
+        name: 環境変数名
+        default: 未設定時のデフォルト値
+
+    Returns:
+        bool: 読み込んだ値
+
+    Raises:
+        ValueError: 真偽値として解釈できない場合
+    """
+    raw = os.environ.get(name)
+    if raw is None or not raw.strip():
+        return default
+    value = raw.strip().lower()
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"{name} は true / false で指定してください: '{raw}'")
+
+
+def parse_replicas(raw: str) -> tuple[Replica, ...]:
+    """
+    BEDROCK_KB_REPLICAS（"リージョン:KB ID[:プロファイル]" のカンマ区切り）を解釈する。
+
+    Args:
+        raw: 環境変数の値
+
+    Returns:
+        tuple[Replica, ...]: 複製 Knowledge Base
+
+    Raises:
+        ValueError: 形式が不正な場合
+    """
+    replicas = []
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        parts = [part.strip() for part in item.split(":")]
+        if len(parts) not in (2, 3) or not all(parts):
+            raise ValueError(
+                f"BEDROCK_KB_REPLICAS の形式が不正です: '{item}'"
+                "（リージョン:KB ID[:プロファイル] のカンマ区切りで指定してください）"
+            )
+        replicas.append(Replica(
+            region=parts[0], kb_id=parts[1], profile=parts[2] if len(parts) == 3 else None,
+        ))
+    return tuple(replicas)
 
 
 def load_config() -> KBConfig:
@@ -28,7 +289,70 @@ def load_config() -> KBConfig:
     
     環境変数:
         AWS_REGION: AWS リージョン（デフォルト: ap-northeast-1）
-        BEDROCK_KB_ID: Knowledge Base ID（必須）
+        BEDROCK_KB_ID: Knowledge Base ID（bedrock バックエンドで BEDROCK_KB_PROFILES が無い場合は必須）
+        BEDROCK_KB_BACKEND: 検索バックエンド（デフォルト: bedrock）
+        BEDROCK_KB_LOCAL_DIR: ローカルバックエンドのコーパスディレクトリ
+        BEDROCK_KB_LOCAL_INDEX: ローカルインデックスファイルのパス（オプション）
+        BEDROCK_KB_CACHE_TTL: 検索結果キャッシュの有効期間秒数（デフォルト: 300、0 で無効）
+        BEDROCK_KB_CACHE_SIZE: 検索結果キャッシュの最大エントリ数（デフォルト: 4096）
+        BEDROCK_KB_CACHE_MAX_BYTES: 検索結果キャッシュのおおよその最大バイト数
+            （デフォルト: 33554432、0 でエントリ数のみで制限）
+        BEDROCK_KB_CACHE_COMPRESSION: チャンク本文の圧縮方式（none / zlib / zstd、デフォルト: none）
+        BEDROCK_KB_NEGATIVE_CACHE_TTL: 認証エラー・KB 未検出の記憶秒数（デフォルト: 30、0 で無効）
+        BEDROCK_KB_WARMUP_LOG: ウォームアップ用クエリログのパス（オプション）
+        BEDROCK_KB_WARMUP_TOP_N: ウォームアップするクエリ数（デフォルト: 100）
+        BEDROCK_KB_WARMUP_RATE: ウォームアップの 1 秒あたりクエリ数（デフォルト: 2）
+        BEDROCK_KB_QUERY_LOG: クエリログの出力先（オプション、未設定時は記録しない）
+        BEDROCK_KB_QUERY_LOG_HASH: クエリをハッシュ化して記録する（デフォルト: false）
+        BEDROCK_KB_QUERY_LOG_MAX_BYTES: ローテーションサイズ（デフォルト: 10485760）
+        BEDROCK_KB_QUERY_LOG_BACKUPS: 保持するローテーション数（デフォルト: 5）
+        BEDROCK_KB_CREDENTIAL_REFRESH_MARGIN: 認証情報の先行更新秒数（デフォルト: 1200）
+        BEDROCK_KB_CREDENTIAL_CHECK_INTERVAL: 有効期限の確認間隔秒数（デフォルト: 60、0 で無効）
+        BEDROCK_KB_TIMEOUT_MS: kb_answer の時間予算ミリ秒（デフォルト: 30000、0 で無制限）
+        BEDROCK_KB_DECOMPOSE: 複合的な質問をサブクエリに分解する（デフォルト: false）
+        BEDROCK_KB_DECOMPOSE_MAX: サブクエリの最大数（デフォルト: 4）
+        BEDROCK_KB_FETCH_LIMIT: オーバーフェッチする件数（デフォルト: 0 = ページングしない、最大 100）
+        BEDROCK_KB_RESULT_SET_TTL: 結果セットの有効期間秒数（デフォルト: 600）
+        BEDROCK_KB_RESULT_SET_MAX: 保持する結果セット数（デフォルト: 128）
+        BEDROCK_KB_RESULT_SET_MAX_BYTES: 結果セットの合計バイト数上限（デフォルト: 16777216）
+        BEDROCK_KB_SNIPPET: スニペットモードをデフォルトにする（デフォルト: false）
+        BEDROCK_KB_SNIPPET_CHARS: スニペットの最大文字数（デフォルト: 240）
+        BEDROCK_KB_MAX_IN_FLIGHT: Retrieve API の同時実行数の上限（デフォルト: 8、0 で無制限）
+        BEDROCK_KB_MAX_QUEUE: 実行枠を待機できる呼び出し数（デフォルト: 32）
+        BEDROCK_KB_REPLICAS: 複製 Knowledge Base（"リージョン:KB ID[:プロファイル]" のカンマ区切り）
+        BEDROCK_KB_REPLICA_PROBE_INTERVAL: 使われていない複製の計測間隔秒数（デフォルト: 30、0 で無効）
+        BEDROCK_KB_INGESTION_POLL_INTERVAL: 取り込みジョブの確認間隔秒数（デフォルト: 0 = 監視しない）
+        BEDROCK_KB_DATA_SOURCE_IDS: 監視するデータソース ID のカンマ区切り（未設定時は全データソース）
+        BEDROCK_KB_MEMORY_BUDGET_MB: RSS のメモリ予算 MB（デフォルト: 0 = 無効）
+        BEDROCK_KB_MEMORY_CHECK_INTERVAL: メモリ予算の確認間隔秒数（デフォルト: 10）
+        BEDROCK_KB_PROFILES: KB プロファイルファイル（JSON）のパス（オプション）
+        BEDROCK_KB_AWS_PROFILE: BEDROCK_KB_ID の検索に使用する AWS プロファイル（オプション）
+        BEDROCK_KB_CLIENT_POOL_SIZE: KB プロファイルごとの boto3 クライアント数の上限（デフォルト: 16）
+        BEDROCK_KB_OVERFETCH: キャッシュ使用時に取得する件数の上限（デフォルト: 0 = 無効、最大 100）
+        BEDROCK_KB_MODEL_BUNDLE: botocore モデルバンドルのパス
+            （デフォルト: ~/.cache/bedrock-kb-mcp/botocore-<バージョン>.bundle、off で無効）
+        BEDROCK_KB_SESSION_TTL: セッションの送信済みチャンクの記録の有効秒数（デフォルト: 3600）
+        BEDROCK_KB_SESSION_MAX: 送信済みチャンクを記録する最大セッション数（デフォルト: 256）
+        BEDROCK_KB_BROKER: ツールの呼び出しをブローカーデーモンに転送する（デフォルト: false）
+        BEDROCK_KB_BROKER_SOCKET: ブローカーデーモンのソケットのパス
+            （デフォルト: $XDG_RUNTIME_DIR/bedrock-kb-mcp-<UID>-<設定のハッシュ>.sock、
+            未設定時は <一時ディレクトリ>/bedrock-kb-mcp-<UID>/<設定のハッシュ>.sock）
+        BEDROCK_KB_BROKER_IDLE_TIMEOUT: ブローカーデーモンがアイドル終了するまでの秒数
+            （デフォルト: 1800、0 で終了しない）
+        BEDROCK_KB_LOG: 構造化ログ（JSONL）の出力先（デフォルト: なし、未設定の場合は記録しない）
+        BEDROCK_KB_LOG_LEVEL: イベントを記録する最小のレベル（デフォルト: INFO）
+        BEDROCK_KB_LOG_SAMPLE: 成功時のイベントのサンプリング割合
+            （デフォルト: kb_answer.ok=0.1,kb_more.ok=0.1）
+        BEDROCK_KB_LOG_MAX_BYTES: 構造化ログをローテーションするサイズ（デフォルト: 10485760）
+        BEDROCK_KB_LOG_BACKUPS: 保持するローテーション済み構造化ログの数（デフォルト: 5）
+        BEDROCK_KB_KEEPALIVE_INTERVAL: 無通信の接続にキープアライブを送る間隔（秒）
+            （デフォルト: 0、0 で無効）
+        BEDROCK_KB_KEEPALIVE_MAX_IDLE: 最後の呼び出しからキープアライブを続ける秒数（デフォルト: 600）
+        BEDROCK_KB_ADAPTIVE_CONCURRENCY: Retrieve API の適応的な同時実行数の上限の最大値
+            （デフォルト: 0、0 で無効）
+        BEDROCK_KB_ADAPTIVE_CONCURRENCY_MIN: 適応的な同時実行数の上限の最小値（デフォルト: 1）
+        BEDROCK_KB_ADAPTIVE_LATENCY_TOLERANCE: 最小レイテンシの何倍を超えたら同時実行数を下げるか
+            （デフォルト: 2.0、0 で判定しない）
     
     Returns:
         KBConfig: 設定値を含むデータクラスインスタンス
@@ -36,17 +360,149 @@ def load_config() -> KBConfig:
     Raises:
         ValueError: 必須の環境変数が設定されていない場合
     """
-    # 必須変数のチェック（BEDROCK_KB_ID のみ必須）
+    backend = os.environ.get("BEDROCK_KB_BACKEND", BACKEND_BEDROCK).strip().lower()
+    if backend not in SUPPORTED_BACKENDS:
+        raise ValueError(
+            f"BEDROCK_KB_BACKEND の値が不正です: '{backend}'"
+            f"（{' / '.join(SUPPORTED_BACKENDS)} のいずれかを指定してください）"
+        )
+
+    # ローカルバックエンドではコーパスディレクトリが必須
+    local_corpus_dir = os.environ.get("BEDROCK_KB_LOCAL_DIR") or None
+    if backend == BACKEND_LOCAL and not local_corpus_dir:
+        raise ValueError(
+            "必須の環境変数が設定されていません: BEDROCK_KB_LOCAL_DIR"
+        )
+
+    # 必須変数のチェック（bedrock バックエンドでは BEDROCK_KB_ID のみ必須）
+    # KB プロファイルを使用する場合は kb パラメータで検索先を選ぶため省略できる
+    profiles_path = os.environ.get("BEDROCK_KB_PROFILES") or None
     kb_id = os.environ.get("BEDROCK_KB_ID")
     if not kb_id:
+        if backend == BACKEND_LOCAL:
+            kb_id = BACKEND_LOCAL
+        elif profiles_path is not None:
+            kb_id = ""
+        else:
+            raise ValueError(
+                "必須の環境変数が設定されていません: BEDROCK_KB_ID"
+            )
+    
+    cache_compression = (
+        os.environ.get("BEDROCK_KB_CACHE_COMPRESSION", COMPRESSION_NONE).strip().lower()
+        or COMPRESSION_NONE
+    )
+    if cache_compression not in SUPPORTED_COMPRESSIONS:
         raise ValueError(
-            "必須の環境変数が設定されていません: BEDROCK_KB_ID"
+            f"BEDROCK_KB_CACHE_COMPRESSION の値が不正です: '{cache_compression}'"
+            f"（{' / '.join(SUPPORTED_COMPRESSIONS)} のいずれかを指定してください）"
         )
-    
+
+    fetch_limit = _read_int_env("BEDROCK_KB_FETCH_LIMIT", 0)
+    if fetch_limit > 100:
+        raise ValueError(f"BEDROCK_KB_FETCH_LIMIT は 100 以下で指定してください: '{fetch_limit}'")
+    overfetch_results = _read_int_env("BEDROCK_KB_OVERFETCH", 0)
+    if overfetch_results > 100:
+        raise ValueError(
+            f"BEDROCK_KB_OVERFETCH は 100 以下で指定してください: '{overfetch_results}'"
+        )
+
+    model_bundle_path = os.environ.get("BEDROCK_KB_MODEL_BUNDLE", "").strip() or None
+    if model_bundle_path is None:
+        model_bundle_path = default_bundle_path()
+    elif model_bundle_path.lower() == BUNDLE_OFF:
+        model_bundle_path = None
+
+    broker_mode = _read_bool_env("BEDROCK_KB_BROKER", False)
+    broker_socket_path = os.environ.get("BEDROCK_KB_BROKER_SOCKET") or None
+    if broker_mode and broker_socket_path is None:
+        broker_socket_path = default_socket_path()
+
+    log_level = os.environ.get("BEDROCK_KB_LOG_LEVEL", "INFO").strip().upper() or "INFO"
+    if log_level not in LOG_LEVELS:
+        raise ValueError(
+            f"BEDROCK_KB_LOG_LEVEL は {' / '.join(LOG_LEVELS)} のいずれかで指定してください: "
+            f"'{log_level}'"
+        )
+
     # AWS_REGION はデフォルト値あり
     aws_region = os.environ.get("AWS_REGION", "ap-northeast-1")
     
     return KBConfig(
         aws_region=aws_region,
         kb_id=kb_id,
+        backend=backend,
+        local_corpus_dir=local_corpus_dir,
+        local_index_path=os.environ.get("BEDROCK_KB_LOCAL_INDEX") or None,
+        cache_ttl_seconds=_read_float_env("BEDROCK_KB_CACHE_TTL", 300.0),
+        cache_max_entries=_read_int_env("BEDROCK_KB_CACHE_SIZE", 4096, minimum=1),
+        cache_max_bytes=_read_int_env("BEDROCK_KB_CACHE_MAX_BYTES", 32 * 1024 * 1024),
+        cache_compression=cache_compression,
+        negative_cache_ttl_seconds=_read_float_env("BEDROCK_KB_NEGATIVE_CACHE_TTL", 30.0),
+        warmup_log_path=os.environ.get("BEDROCK_KB_WARMUP_LOG") or None,
+        warmup_top_n=_read_int_env("BEDROCK_KB_WARMUP_TOP_N", 100),
+        warmup_rate_per_second=_read_float_env("BEDROCK_KB_WARMUP_RATE", 2.0, minimum=0.01),
+        query_log_path=os.environ.get("BEDROCK_KB_QUERY_LOG") or None,
+        query_log_hash=_read_bool_env("BEDROCK_KB_QUERY_LOG_HASH", False),
+        query_log_max_bytes=_read_int_env("BEDROCK_KB_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024),
+        query_log_backups=_read_int_env("BEDROCK_KB_QUERY_LOG_BACKUPS", 5),
+        credential_refresh_margin_seconds=_read_float_env(
+            "BEDROCK_KB_CREDENTIAL_REFRESH_MARGIN", 1200.0
+        ),
+        credential_check_interval_seconds=_read_float_env(
+            "BEDROCK_KB_CREDENTIAL_CHECK_INTERVAL", 60.0
+        ),
+        request_timeout_ms=_read_int_env("BEDROCK_KB_TIMEOUT_MS", 30000),
+        decompose_queries=_read_bool_env("BEDROCK_KB_DECOMPOSE", False),
+        decompose_max_sub_queries=_read_int_env("BEDROCK_KB_DECOMPOSE_MAX", 4, minimum=1),
+        fetch_limit=fetch_limit,
+        result_set_ttl_seconds=_read_float_env("BEDROCK_KB_RESULT_SET_TTL", 600.0, minimum=1.0),
+        result_set_max_sets=_read_int_env("BEDROCK_KB_RESULT_SET_MAX", 128, minimum=1),
+        result_set_max_bytes=_read_int_env(
+            "BEDROCK_KB_RESULT_SET_MAX_BYTES", 16 * 1024 * 1024, minimum=1
+        ),
+        snippet_mode=_read_bool_env("BEDROCK_KB_SNIPPET", False),
+        snippet_chars=_read_int_env("BEDROCK_KB_SNIPPET_CHARS", 240, minimum=20),
+        max_in_flight=_read_int_env("BEDROCK_KB_MAX_IN_FLIGHT", 8),
+        max_queue=_read_int_env("BEDROCK_KB_MAX_QUEUE", 32),
+        replicas=parse_replicas(os.environ.get("BEDROCK_KB_REPLICAS", "")),
+        replica_probe_interval_seconds=_read_float_env(
+            "BEDROCK_KB_REPLICA_PROBE_INTERVAL", 30.0
+        ),
+        ingestion_poll_interval_seconds=_read_float_env(
+            "BEDROCK_KB_INGESTION_POLL_INTERVAL", 0.0
+        ),
+        data_source_ids=tuple(
+            item.strip()
+            for item in os.environ.get("BEDROCK_KB_DATA_SOURCE_IDS", "").split(",")
+            if item.strip()
+        ),
+        memory_budget_bytes=_read_int_env("BEDROCK_KB_MEMORY_BUDGET_MB", 0) * 1024 * 1024,
+        memory_check_interval_seconds=_read_float_env(
+            "BEDROCK_KB_MEMORY_CHECK_INTERVAL", 10.0, minimum=0.1
+        ),
+        profiles_path=profiles_path,
+        aws_profile=os.environ.get("BEDROCK_KB_AWS_PROFILE") or None,
+        client_pool_size=_read_int_env("BEDROCK_KB_CLIENT_POOL_SIZE", 16, minimum=1),
+        overfetch_results=overfetch_results,
+        model_bundle_path=model_bundle_path,
+        session_ttl_seconds=_read_float_env("BEDROCK_KB_SESSION_TTL", 3600.0, minimum=1.0),
+        session_max_sessions=_read_int_env("BEDROCK_KB_SESSION_MAX", 256, minimum=1),
+        broker_mode=broker_mode,
+        broker_socket_path=broker_socket_path,
+        broker_idle_timeout_seconds=_read_float_env("BEDROCK_KB_BROKER_IDLE_TIMEOUT", 1800.0),
+        log_path=os.environ.get("BEDROCK_KB_LOG") or None,
+        log_level=log_level,
+        log_sample_rates=parse_sample_rates(
+            os.environ.get("BEDROCK_KB_LOG_SAMPLE", DEFAULT_SAMPLE_RATES)
+        ),
+        log_max_bytes=_read_int_env("BEDROCK_KB_LOG_MAX_BYTES", 10 * 1024 * 1024),
+        log_backups=_read_int_env("BEDROCK_KB_LOG_BACKUPS", 5),
+        keepalive_interval_seconds=_read_float_env("BEDROCK_KB_KEEPALIVE_INTERVAL", 0.0),
+        keepalive_max_idle_seconds=_read_float_env("BEDROCK_KB_KEEPALIVE_MAX_IDLE", 600.0),
+        adaptive_concurrency_max=_read_int_env("BEDROCK_KB_ADAPTIVE_CONCURRENCY", 0),
+        adaptive_concurrency_min=_read_int_env(
+            "BEDROCK_KB_ADAPTIVE_CONCURRENCY_MIN", 1, minimum=1
+        ),
+        adaptive_latency_tolerance=_read_float_env("BEDROCK_KB_ADAPTIVE_LATENCY_TOLERANCE", 2.0),
     )
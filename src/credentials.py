@@ -0,0 +1,218 @@
+"""
+認証情報管理モジュール
+
+SSO / AssumeRole プロファイルなどの期限付き認証情報を、有効期限より前に
+バックグラウンドスレッドで更新する。全クライアントは同じ boto3 セッションから
+作成されるため、更新済みの認証情報を共有し、リクエストのパスで
+STS 呼び出しや期限切れが発生しない。
+モデルバンドル（model_bundle）が指定された場合は、セッションのデータローダーを
+バンドルから読み込むものに置き換えてクライアントの作成を速くする。
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+import boto3
+
+from src.metrics import Metrics, metrics
+from src.model_bundle import install_bundle
+from src.structured_log import error_fields, log_event
+
+
+# botocore の advisory 更新（有効期限の 15 分前）より先に更新するためのデフォルト余裕時間
+DEFAULT_REFRESH_MARGIN_SECONDS = 20 * 60
+
+# バックグラウンドで有効期限を確認する間隔
+DEFAULT_CHECK_INTERVAL_SECONDS = 60.0
+
+
+def _seconds_remaining(credentials: Any) -> float | None:
+    """期限付き認証情報の残り秒数を返す（期限の無い認証情報は None）。"""
+    seconds_remaining = getattr(credentials, "_seconds_remaining", None)
+    if seconds_remaining is None or getattr(credentials, "_expiry_time", None) is None:
+        return None
+    return float(seconds_remaining())
+
+
+def _force_refresh(credentials: Any) -> None:
+    """
+    RefreshableCredentials を即座に更新する。
+
+    botocore はリクエスト時に advisory / mandatory の閾値で更新するが、
+    ここではその閾値より前に更新するため、内部の更新処理をロック付きで呼び出す。
+    """
+    lock = getattr(credentials, "_refresh_lock", None)
+    refresh = getattr(credentials, "_protected_refresh", None)
+    if lock is None or refresh is None:
+        credentials.get_frozen_credentials()
+        return
+    with lock:
+        refresh(is_mandatory=True)
+
+
+class CredentialManager:
+    """
+    boto3 セッションと期限付き認証情報の先行更新を管理する。
+
+    Attributes:
+        session: 全クライアントが共有する boto3 セッション
+        refresh_margin_seconds: 有効期限の何秒前に更新するか
+        check_interval_seconds: バックグラウンドで確認する間隔（秒）
+        model_bundle_loaded: セッションがモデルバンドルを使用しているかどうか
+    """
+
+    def __init__(
+        self,
+        profile_name: str | None = None,
+        refresh_margin_seconds: float = DEFAULT_REFRESH_MARGIN_SECONDS,
+        check_interval_seconds: float = DEFAULT_CHECK_INTERVAL_SECONDS,
+        session_factory: Callable[..., Any] = boto3.Session,
+        registry: Metrics = metrics,
+        model_bundle_path: str | None = None,
+    ) -> None:
+        self.session = (
+            session_factory(profile_name=profile_name) if profile_name else session_factory()
+        )
+        self.model_bundle_loaded = (
+            install_bundle(self.session, model_bundle_path) if model_bundle_path else False
+        )
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self._metrics = registry
+        self._client_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def create_client(
+        self,
+        service_name: str,
+        region_name: str,
+        client_config: Any = None,
+    ) -> Any:
+        """
+        共有セッションからクライアントを作成する。
+
+        boto3 のセッションはクライアント作成がスレッドセーフではないため、
+        ロックで直列化する。
+
+        Args:
+            service_name: サービス名（例: bedrock-agent-runtime）
+            region_name: リージョン
+            client_config: botocore.config.Config（タイムアウト・リトライ設定、オプション）
+
+        Returns:
+            Any: boto3 クライアント
+        """
+        kwargs: dict[str, Any] = {"region_name": region_name}
+        if client_config is not None:
+            kwargs["config"] = client_config
+        with self._client_lock:
+            return self.session.client(service_name, **kwargs)
+
+    def check(self) -> bool:
+        """
+        認証情報の残り時間を確認し、余裕時間を切っていれば更新する。
+
+        Returns:
+            bool: 更新を実行した場合は True
+        """
+        credentials = self.session.get_credentials()
+        remaining = _seconds_remaining(credentials)
+        if remaining is None:
+            return False
+        self._metrics.set_gauge("credentials.seconds_to_expiry", remaining)
+        if remaining > self.refresh_margin_seconds:
+            return False
+
+        started = time.perf_counter()
+        try:
+            _force_refresh(credentials)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # 失敗しても次回の確認で再試行する（リクエスト時の更新にも委ねられる）
+            self._metrics.increment("credentials.refresh.failures")
+            log_event(
+                "credentials.refresh_failed", logging.WARNING,
+                error_type=type(e).__name__, message=str(e), **error_fields(e),
+            )
+            return False
+        finally:
+            self._metrics.observe(
+                "credentials.refresh.latency_ms", (time.perf_counter() - started) * 1000
+            )
+        self._metrics.increment("credentials.refresh.count")
+        remaining = _seconds_remaining(credentials)
+        if remaining is not None:
+            self._metrics.set_gauge("credentials.seconds_to_expiry", remaining)
+        return True
+
+    def start(self) -> None:
+        """バックグラウンドの更新スレッドを開始する（既に開始済みの場合は何もしない）。"""
+        if self.check_interval_seconds <= 0 or (
+            self._thread is not None and self._thread.is_alive()
+        ):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="kb-credential-refresh", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """バックグラウンドの更新スレッドを停止する。"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        """check_interval_seconds ごとに check() を実行する。"""
+        while not self._stop_event.is_set():
+            try:
+                self.check()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # 認証情報の取得自体に失敗した場合も更新スレッドは継続する
+                self._metrics.increment("credentials.refresh.failures")
+                log_event(
+                    "credentials.refresh_failed", logging.WARNING,
+                    error_type=type(e).__name__, message=str(e), **error_fields(e),
+                )
+            self._stop_event.wait(self.check_interval_seconds)
+
+
+# プロファイルごとに共有する CredentialManager（None はデフォルトの認証情報）
+_managers: dict[str | None, CredentialManager] = {}
+_manager_lock = threading.Lock()
+
+
+def get_credential_manager(
+    refresh_margin_seconds: float = DEFAULT_REFRESH_MARGIN_SECONDS,
+    check_interval_seconds: float = DEFAULT_CHECK_INTERVAL_SECONDS,
+    profile_name: str | None = None,
+    model_bundle_path: str | None = None,
+) -> CredentialManager:
+    """
+    プロセス内で共有する CredentialManager を返す（初回呼び出し時に更新スレッドを開始）。
+
+    Args:
+        refresh_margin_seconds: 有効期限の何秒前に更新するか
+        check_interval_seconds: バックグラウンドで確認する間隔（0 で無効）
+        profile_name: AWS プロファイル（None の場合はデフォルトの認証情報）
+        model_bundle_path: botocore モデルバンドルのパス（初回作成時のみ使用、オプション）
+
+    Returns:
+        CredentialManager: プロファイルごとの共有マネージャー
+    """
+    with _manager_lock:
+        manager = _managers.get(profile_name)
+        if manager is None:
+            manager = CredentialManager(
+                profile_name=profile_name,
+                refresh_margin_seconds=refresh_margin_seconds,
+                check_interval_seconds=check_interval_seconds,
+                model_bundle_path=model_bundle_path,
+            )
+            manager.start()
+            _managers[profile_name] = manager
+        return manager
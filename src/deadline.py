@@ -0,0 +1,145 @@
+"""
+デッドラインモジュール
+
+kb_answer 1 回分の処理時間の上限（バリデーション・クライアント取得・
+Retrieve 呼び出し・リトライ・パースを含む）を表す。botocore の
+接続・読み取りタイムアウトとリトライ回数は残り時間から導出する。
+"""
+
+import math
+import time
+from typing import Callable
+
+from botocore.config import Config
+
+
+# 残り時間に関わらず適用する botocore タイムアウトの上限（秒）
+MAX_CONNECT_TIMEOUT_SECONDS = 10.0
+MAX_READ_TIMEOUT_SECONDS = 60.0
+
+# 下回った場合はリトライせず 1 回だけ試行する残り時間（秒）
+MIN_SECONDS_FOR_RETRIES = 3.0
+
+# botocore に渡すタイムアウトの下限（0 は「無制限」と解釈されるため）
+_MIN_TIMEOUT_SECONDS = 0.05
+
+# タイムアウトを切り下げる段階の比率（同じ設定のクライアントを再利用できるようにする）
+_TIMEOUT_STEP_RATIO = 1.25
+
+
+def _quantize(seconds: float) -> float:
+    """タイムアウトを _MIN_TIMEOUT_SECONDS × 1.25^k の段階に切り下げる。"""
+    if seconds <= _MIN_TIMEOUT_SECONDS:
+        return _MIN_TIMEOUT_SECONDS
+    step = math.floor(math.log(seconds / _MIN_TIMEOUT_SECONDS, _TIMEOUT_STEP_RATIO) + 1e-9)
+    return round(_MIN_TIMEOUT_SECONDS * _TIMEOUT_STEP_RATIO ** step, 4)
+
+
+class DeadlineExceededError(Exception):
+    """デッドラインを超過したことを示す例外"""
+
+
+class Deadline:
+    """
+    単調時計に基づく処理時間の上限。
+
+    timeout_ms が None または 0 以下の場合は無制限として扱う。
+
+    Attributes:
+        timeout_ms: 全体の時間予算（ミリ秒）
+    """
+
+    def __init__(
+        self,
+        timeout_ms: float | None,
+        started_at: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.timeout_ms = timeout_ms if timeout_ms and timeout_ms > 0 else None
+        self._clock = clock
+        self._started_at = clock() if started_at is None else started_at
+
+    @property
+    def unlimited(self) -> bool:
+        """時間予算が無制限かどうか"""
+        return self.timeout_ms is None
+
+    def remaining_seconds(self) -> float | None:
+        """
+        残り時間を返す。
+
+        Returns:
+            float | None: 残り秒数（0 以上）、無制限の場合は None
+        """
+        if self.timeout_ms is None:
+            return None
+        elapsed = self._clock() - self._started_at
+        return max(0.0, self.timeout_ms / 1000 - elapsed)
+
+    def expired(self) -> bool:
+        """デッドラインを過ぎているかどうか"""
+        remaining = self.remaining_seconds()
+        return remaining is not None and remaining <= 0
+
+    def check(self) -> None:
+        """
+        デッドラインを過ぎていれば例外を送出する。
+
+        Raises:
+            DeadlineExceededError: デッドラインを過ぎている場合
+        """
+        if self.expired():
+            raise DeadlineExceededError(
+                f"タイムアウトしました（timeout_ms={self.timeout_ms:g}）"
+            )
+
+    def client_settings(self) -> tuple[float, float, int] | None:
+        """
+        残り時間から botocore の (接続タイムアウト, 読み取りタイムアウト, 試行回数) を導出する。
+
+        接続・読み取りタイムアウトは残り時間で打ち切り、残り時間が
+        MIN_SECONDS_FOR_RETRIES 未満の場合はリトライしない。タイムアウトは
+        段階的な値に切り下げるため、同じ時間予算の呼び出しは同じ設定になり、
+        プール済みのクライアントを再利用できる。
+
+        Returns:
+            tuple | None: 設定値のタプル（無制限の場合は None）
+        """
+        remaining = self.remaining_seconds()
+        if remaining is None:
+            return None
+        timeout = _quantize(remaining)
+        return (
+            min(timeout, MAX_CONNECT_TIMEOUT_SECONDS),
+            min(timeout, MAX_READ_TIMEOUT_SECONDS),
+            3 if remaining >= MIN_SECONDS_FOR_RETRIES else 1,
+        )
+
+    def botocore_config(self) -> Config | None:
+        """
+        残り時間から botocore のタイムアウト・リトライ設定を導出する（client_settings を参照）。
+
+        Returns:
+            Config | None: botocore の設定（無制限の場合は None）
+        """
+        return settings_to_config(self.client_settings())
+
+
+def settings_to_config(settings: tuple[float, float, int] | None) -> Config | None:
+    """
+    Deadline.client_settings の値を botocore の Config に変換する。
+
+    Args:
+        settings: (接続タイムアウト, 読み取りタイムアウト, 試行回数) または None
+
+    Returns:
+        Config | None: botocore の設定（settings が None の場合は None）
+    """
+    if settings is None:
+        return None
+    connect_timeout, read_timeout, attempts = settings
+    return Config(
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        retries={"mode": "standard", "total_max_attempts": attempts},
+    )
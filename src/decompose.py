@@ -0,0 +1,191 @@
+"""
+クエリ分解モジュール
+
+「返品ポリシーと保証期間と送料について」のような複合的な質問を、
+ローカルのルール（疑問符・句点、読点などの列挙記号、並列の接続詞）で
+サブクエリに分割し、サブクエリごとの検索結果を割り当て数に従って統合する。
+"""
+
+import re
+
+from src.chunk_store import chunk_hash
+from src.models import KBResponse, RetrievalResult
+
+
+# 文の区切り（疑問符・感嘆符・句点・改行）
+_SENTENCE_SPLIT = re.compile(r"[?？!！。\n]+")
+
+# 列挙記号
+_LIST_SPLIT = re.compile(r"[、，,／/；;]+")
+
+# 並列の接続詞（語として独立しているもの）
+_CONJUNCTION_SPLIT = re.compile(
+    r"\s*(?:および|及び|並びに|ならびに|それと|\band\b)\s*", re.IGNORECASE
+)
+
+# 名詞の直後に続く並列助詞「と」「や」（直前がひらがなの場合は語の一部とみなして分割しない。
+# 「とは」「という」「と一緒に」などの並列でない「と」も分割しない）
+_PARTICLE_SPLIT = re.compile(
+    r"(?<=[一-鿿゠-ヿA-Za-z0-9ー])[とや](?!は|いう|言う|一緒|共に|ともに|して|も)(?=[^\s])"
+)
+
+# 並列助詞で分割する場合の最後の要素（名詞に「の」「について」「は」が続くもの）。
+# 名詞以降の部分（「の方法」など）は全要素に共通する述部とみなす
+_NOUN_PHRASE = re.compile(
+    r"^(.+?[一-鿿゠-ヿA-Za-z0-9ー])((?:について|に関して|に関する|の|は).*)$"
+)
+
+# 比較の質問（「A と B の違い」など）は分割すると意味が失われるため分割しない
+_COMPARISON = re.compile(r"違い|比較|差異|\bvs\.?\b", re.IGNORECASE)
+
+# 全サブクエリに共通する述部（最後の要素にのみ付いているもの）
+_SHARED_TAIL = re.compile(
+    r"(について|に関して|に関する|の)?"
+    r"(詳しく)?(教えて(ください|下さい)?|知りたい(です)?|説明して(ください|下さい)?"
+    r"|とは|は何(ですか)?|はどう(なって)?(います|ます)?か?)?$"
+)
+
+# サブクエリとして扱う最小文字数
+MIN_SUB_QUERY_CHARS = 2
+
+
+def _split_particles(text: str) -> list[str]:
+    """
+    名詞句の間の並列助詞で分割し、最後の要素の述部（「の方法」など）を各要素に付与する。
+
+    最後の要素が名詞に「の」「について」「は」が続く形でない場合は分割しない。
+    """
+    items = [p.strip() for p in _PARTICLE_SPLIT.split(text)]
+    if len(items) <= 1 or not all(items):
+        return [text]
+    match = _NOUN_PHRASE.match(items[-1])
+    if match is None:
+        return [text]
+    tail = match.group(2)
+    return [item + tail for item in items[:-1]] + [items[-1]]
+
+
+def _split_list(text: str) -> list[str]:
+    """列挙記号・接続詞・並列助詞で分割する。"""
+    parts: list[str] = []
+    for segment in _LIST_SPLIT.split(text):
+        for piece in _CONJUNCTION_SPLIT.split(segment):
+            parts.extend(_split_particles(piece))
+    return [p.strip() for p in parts if p.strip()]
+
+
+def decompose_query(query: str, max_sub_queries: int = 4) -> list[str]:
+    """
+    クエリをサブクエリに分割する。
+
+    分割できない場合や、分割後の要素が短すぎる場合は元のクエリのみを返す。
+    最後の要素に付いた共通の述部（「について」など）は各サブクエリに付与する。
+
+    Args:
+        query: バリデーション済みのクエリ
+        max_sub_queries: サブクエリの最大数（超過分は最後のサブクエリにまとめる）
+
+    Returns:
+        list[str]: サブクエリのリスト（分解しない場合は [query]）
+    """
+    parts: list[str] = []
+    for sentence in _SENTENCE_SPLIT.split(query):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        items = [sentence] if _COMPARISON.search(sentence) else _split_list(sentence)
+        if len(items) > 1:
+            # 最後の要素に付いた述部を共通の述部として各要素に付与する
+            tail_match = _SHARED_TAIL.search(items[-1])
+            tail = tail_match.group(0) if tail_match else ""
+            if tail and len(items[-1]) - len(tail) >= MIN_SUB_QUERY_CHARS:
+                items[-1] = items[-1][: -len(tail)]
+                # 並列助詞の分割で述部を付与済みの要素には付与しない
+                items = [item if item.endswith(tail) else item + tail for item in items]
+        parts.extend(items)
+
+    # 重複と短すぎる要素を除外
+    sub_queries: list[str] = []
+    for part in parts:
+        if len(part) < MIN_SUB_QUERY_CHARS:
+            return [query]
+        if part not in sub_queries:
+            sub_queries.append(part)
+
+    if len(sub_queries) <= 1 or max_sub_queries <= 1:
+        return [query]
+    if len(sub_queries) > max_sub_queries:
+        sub_queries = sub_queries[: max_sub_queries - 1] + [
+            "、".join(sub_queries[max_sub_queries - 1:])
+        ]
+    return sub_queries
+
+
+def sub_query_quotas(count: int, max_results: int) -> list[int]:
+    """
+    サブクエリごとの結果の割り当て数を返す（余りは先頭のサブクエリから配分）。
+
+    Args:
+        count: サブクエリ数
+        max_results: 統合後の最大結果数
+
+    Returns:
+        list[int]: 各サブクエリの割り当て数（合計は max_results）
+    """
+    base, remainder = divmod(max_results, count)
+    return [base + (1 if i < remainder else 0) for i in range(count)]
+
+
+def merge_sub_results(
+    responses: list[KBResponse | None],
+    max_results: int,
+    partial: bool = False,
+) -> KBResponse:
+    """
+    サブクエリごとの検索結果を割り当て数に従って統合する。
+
+    各サブクエリの上位結果を割り当て数まで順番に取り出し（同じチャンクは
+    1 回だけ採用）、割り当てを使い切れなかった分は残りの結果から
+    スコアの高い順に補う。
+
+    Args:
+        responses: サブクエリごとのレスポンス（取得できなかったものは None）
+        max_results: 統合後の最大結果数
+        partial: 一部のサブクエリの結果が欠けているかどうか
+
+    Returns:
+        KBResponse: 統合したレスポンス
+    """
+    seen: set[str] = set()
+    merged: list[RetrievalResult] = []
+    leftovers: list[RetrievalResult] = []
+    quotas = sub_query_quotas(len(responses), max_results) if responses else []
+
+    for response, quota in zip(responses, quotas):
+        if response is None:
+            partial = True
+            continue
+        partial = partial or response.partial
+        taken = 0
+        for result in response.results:
+            key = chunk_hash(result.content, result.location)
+            if key in seen:
+                continue
+            if taken < quota:
+                seen.add(key)
+                merged.append(result)
+                taken += 1
+            else:
+                leftovers.append(result)
+
+    # 割り当てを使い切れなかった分をスコア順に補う
+    leftovers.sort(key=lambda r: r.score if r.score is not None else float("-inf"), reverse=True)
+    for result in leftovers:
+        if len(merged) >= max_results:
+            break
+        key = chunk_hash(result.content, result.location)
+        if key not in seen:
+            seen.add(key)
+            merged.append(result)
+
+    return KBResponse(results=merged[:max_results], partial=partial)
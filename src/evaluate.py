@@ -0,0 +1,587 @@
+"""
+一括検索評価モジュール
+
+正解ラベル付きの質問ファイル（JSONL / CSV）を読み込みながら query_knowledge_base を
+並列に実行し、1 問ごとの検索結果を JSONL に追記する。最後に出力ファイル全体から
+recall@k とレイテンシを集計する。
+
+出力ファイル自体がチェックポイントで、中断した実行を同じ出力先で再実行すると、
+結果を記録済みの質問（エラーになったものを除く）は読み飛ばして続きから実行する。
+書き込み途中で中断された最後の行は再開時に切り詰める。
+
+レイテンシは毎回 Retrieve API（またはローカルインデックス）を呼び出して計測するため、
+評価では検索結果キャッシュ・ネガティブキャッシュを使用しない。
+
+Retrieve API の呼び出しは AdaptiveRateLimiter で間隔を空ける。スロットリングされた場合は
+レートを半分に下げて同じ質問を再試行し、成功が続く間はレートを少しずつ上げる（AIMD）。
+
+質問ファイルの形式:
+    JSONL: {"id": "q1", "query": "返品ポリシー", "relevant": ["s3://docs/returns.md"],
+            "max_results": 10, "metadata_filter": {...}}
+    CSV:   id,query,relevant（relevant は "|" 区切り）
+    id を省略した場合は行番号（1 始まり）を使う。
+
+出力の 1 行（結果）の形式:
+    {"id": "q1", "query": "返品ポリシー", "relevant": ["s3://docs/returns.md"],
+     "retrieved": ["s3://docs/returns.md", ...], "scores": [0.82, ...],
+     "latency_ms": 182.4, "error_type": null, "attempts": 1}
+
+使用方法:
+    bedrock-kb-eval questions.jsonl -o results.jsonl --concurrency 8 --rate 10
+    bedrock-kb-eval questions.csv -o results.jsonl --backend local --local-dir ./samlpe
+    （samlpe はリポジトリに同梱しているサンプルコーパスのディレクトリ名）
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Callable
+
+from src.bedrock_client import (
+    create_client,
+    query_knowledge_base,
+    BedrockAuthenticationError,
+    BedrockKBNotFoundError,
+    BedrockServiceError,
+    BedrockThrottlingError,
+)
+from src.config import KBConfig, load_config
+from src.query_log import read_query_log
+from src.replay import percentile
+from src.validation import ValidationError, validate_metadata_filter, validate_query
+
+
+# recall@k を集計する k のデフォルト
+DEFAULT_KS = (1, 3, 5, 10)
+
+# CSV の relevant 列の区切り文字
+CSV_RELEVANT_SEPARATOR = "|"
+
+# 出力をディスクに同期する間隔（結果の行数）
+SYNC_EVERY = 100
+
+
+@dataclass(frozen=True)
+class Question:
+    """
+    評価用の質問。
+
+    Attributes:
+        id: 質問 ID（再開時の照合に使用）
+        query: 検索クエリ
+        relevant: 正解のドキュメント URI
+        max_results: 取得件数（None の場合は実行時の指定）
+        metadata_filter: メタデータフィルター（オプション）
+    """
+    id: str
+    query: str
+    relevant: tuple[str, ...] = ()
+    max_results: int | None = None
+    metadata_filter: dict[str, Any] | None = None
+
+
+def _to_question(row: dict[str, Any], line_number: int) -> Question | None:
+    """質問ファイルの 1 行を Question に変換する（不正な行は None）。"""
+    try:
+        query = validate_query(row.get("query"))
+        relevant = row.get("relevant") or []
+        if isinstance(relevant, str):
+            relevant = relevant.split(CSV_RELEVANT_SEPARATOR)
+        metadata_filter = row.get("metadata_filter")
+        if metadata_filter is not None:
+            metadata_filter = validate_metadata_filter(metadata_filter)
+        max_results = row.get("max_results")
+        if max_results not in (None, ""):
+            max_results = min(max(int(max_results), 1), 100)
+        else:
+            max_results = None
+    except (ValidationError, TypeError, ValueError, AttributeError):
+        return None
+    question_id = row.get("id")
+    return Question(
+        id=str(question_id) if question_id not in (None, "") else str(line_number),
+        query=query,
+        relevant=tuple(str(item).strip() for item in relevant if str(item).strip()),
+        max_results=max_results,
+        metadata_filter=metadata_filter,
+    )
+
+
+def read_questions(path: str | os.PathLike[str]) -> Iterator[Question]:
+    """
+    質問ファイルを 1 問ずつ読み込む（拡張子が .csv の場合は CSV、それ以外は JSONL）。
+
+    Args:
+        path: 質問ファイルのパス
+
+    Yields:
+        Question: 解釈できた質問（query の無い行・不正な行は読み飛ばす）
+    """
+    path = Path(path)
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            rows: Iterable[dict[str, Any]] = csv.DictReader(f)
+        else:
+            rows = _jsonl_rows(f)
+        for line_number, row in enumerate(rows, start=1):
+            question = _to_question(row, line_number) if isinstance(row, dict) else None
+            if question is not None:
+                yield question
+
+
+def _jsonl_rows(lines: Iterable[str]) -> Iterator[Any]:
+    """JSONL の各行を解釈する（空行は読み飛ばし、不正な行は None）。"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def location_uri(location: dict[str, Any]) -> str | None:
+    """
+    Retrieve API の location からドキュメントの URI を取り出す。
+
+    s3Location.uri・webLocation.url・customDocumentLocation.id などの
+    データソースごとの形式に対応する。
+
+    Args:
+        location: 検索結果の location
+
+    Returns:
+        str | None: URI（取り出せない場合は None）
+    """
+    for value in location.values():
+        if isinstance(value, dict):
+            for key in ("uri", "url", "id"):
+                if isinstance(value.get(key), str):
+                    return value[key]
+    return None
+
+
+def recall_at_k(retrieved: list[str], relevant: Iterable[str], k: int) -> float | None:
+    """
+    上位 k 件に含まれる正解ドキュメントの割合を求める。
+
+    Args:
+        retrieved: 検索結果の URI（順位順、同じドキュメントの複数チャンクを含み得る）
+        relevant: 正解のドキュメント URI
+        k: 評価する件数
+
+    Returns:
+        float | None: recall@k（正解が無い場合は None）
+    """
+    relevant = set(relevant)
+    if not relevant:
+        return None
+    return len(relevant & set(retrieved[:k])) / len(relevant)
+
+
+def load_checkpoint(path: str | os.PathLike[str]) -> set[str]:
+    """
+    出力ファイルから結果を記録済みの質問 ID を読み込む。
+
+    書き込み途中で中断された最後の行（改行で終わらない行）は切り詰める。
+    エラーになった質問は再実行するため含めない。
+
+    Args:
+        path: 出力ファイルのパス
+
+    Returns:
+        set[str]: 記録済みの質問 ID
+    """
+    path = Path(path)
+    if not path.is_file():
+        return set()
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+    return {
+        str(entry["id"])
+        for entry in read_query_log(path, include_rotated=False)
+        if "id" in entry and entry.get("error_type") is None
+    }
+
+
+def summarize(
+    entries: Iterable[dict[str, Any]],
+    ks: Iterable[int] = DEFAULT_KS,
+) -> dict[str, Any]:
+    """
+    出力ファイルの結果から recall@k とレイテンシを集計する。
+
+    同じ質問の結果が複数ある場合（再開時の再実行）は最後のものを使う。
+
+    Args:
+        entries: 出力ファイルの結果
+        ks: recall@k を求める k
+
+    Returns:
+        dict: questions / labeled / errors / recall / latency_ms を含む集計
+    """
+    latest: dict[str, dict[str, Any]] = {}
+    for entry in entries:
+        if "id" in entry:
+            latest[str(entry["id"])] = entry
+    ks = sorted(set(ks))
+    recalls: dict[int, list[float]] = {k: [] for k in ks}
+    latencies: list[float] = []
+    errors: Counter[str] = Counter()
+    for entry in latest.values():
+        if entry.get("error_type") is not None:
+            errors[str(entry["error_type"])] += 1
+            continue
+        if isinstance(entry.get("latency_ms"), (int, float)):
+            latencies.append(float(entry["latency_ms"]))
+        for k in ks:
+            recall = recall_at_k(
+                list(entry.get("retrieved") or []), entry.get("relevant") or [], k
+            )
+            if recall is not None:
+                recalls[k].append(recall)
+    return {
+        "questions": len(latest),
+        "labeled": len(recalls[ks[0]]) if ks else 0,
+        "errors": dict(errors),
+        "recall": {
+            f"@{k}": round(sum(values) / len(values), 4) if values else None
+            for k, values in recalls.items()
+        },
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+        },
+    }
+
+
+class AdaptiveRateLimiter:
+    """
+    スロットリングに応じてレートを調整する呼び出し間隔の制限（スレッドセーフ）。
+
+    acquire() は前回の呼び出し枠から 1 / rate 秒後まで待機する。
+    成功ごとにレートを increase / rate（1 秒あたり約 increase）ずつ上げ、
+    スロットリングされた場合は decrease 倍に下げる。
+
+    Attributes:
+        rate: 現在のレート（1 秒あたりの呼び出し数）
+        throttled: スロットリングの回数
+    """
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        min_rate: float = 0.1,
+        max_rate: float | None = None,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        if rate_per_second <= 0 or min_rate <= 0:
+            raise ValueError("rate_per_second と min_rate は正の値である必要があります")
+        if not 0 < decrease < 1:
+            raise ValueError("decrease は 0 より大きく 1 未満である必要があります")
+        self.rate = rate_per_second
+        self.min_rate = min(min_rate, rate_per_second)
+        self.max_rate = max_rate if max_rate is not None else rate_per_second * 4
+        self.throttled = 0
+        self._increase = increase
+        self._decrease = decrease
+        self._clock = clock
+        self._sleep = sleep
+        self._next_slot = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """次の呼び出し枠まで待機する。"""
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            self._sleep(slot - now)
+
+    def on_success(self) -> None:
+        """呼び出しの成功を記録し、レートを加算的に上げる。"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self._increase / self.rate)
+
+    def on_throttle(self) -> None:
+        """スロットリングを記録し、レートを乗算的に下げる。"""
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate * self._decrease)
+            # 既に割り当てた枠も新しいレートの間隔まで後ろにずらす
+            self._next_slot = max(self._next_slot, self._clock() + 1.0 / self.rate)
+
+
+def evaluate_question(
+    question: Question,
+    client: Any,
+    config: KBConfig,
+    max_results: int = 10,
+    limiter: AdaptiveRateLimiter | None = None,
+    max_attempts: int = 5,
+    clock: Callable[[], float] = time.perf_counter,
+) -> dict[str, Any]:
+    """
+    1 問を検索し、出力ファイルに記録する結果を返す。
+
+    スロットリングされた場合はレートを下げて max_attempts 回まで再試行する。
+
+    Args:
+        question: 質問
+        client: retrieve(**params) を持つクライアント
+        config: Knowledge Base の設定
+        max_results: 質問に max_results が無い場合の取得件数
+        limiter: 呼び出し間隔の制限（オプション）
+        max_attempts: スロットリング時を含む最大試行回数
+        clock: レイテンシの計測に使う時計（テスト用）
+
+    Returns:
+        dict: 結果（エラーの場合は error_type を含む）
+    """
+    entry: dict[str, Any] = {
+        "id": question.id,
+        "query": question.query,
+        "relevant": list(question.relevant),
+    }
+    for attempt in range(1, max_attempts + 1):
+        if limiter is not None:
+            limiter.acquire()
+        started = clock()
+        try:
+            response = query_knowledge_base(
+                client=client,
+                config=config,
+                query=question.query,
+                max_results=question.max_results or max_results,
+                metadata_filter=question.metadata_filter,
+            )
+        except BedrockThrottlingError:
+            if limiter is not None:
+                limiter.on_throttle()
+            if attempt < max_attempts:
+                continue
+            entry.update(error_type="BedrockThrottlingError", attempts=attempt)
+            return entry
+        except (BedrockAuthenticationError, BedrockKBNotFoundError, BedrockServiceError) as e:
+            entry.update(error_type=type(e).__name__, message=str(e), attempts=attempt)
+            return entry
+        if limiter is not None:
+            limiter.on_success()
+        entry.update(
+            retrieved=[location_uri(result.location) for result in response.results],
+            scores=[result.score for result in response.results],
+            latency_ms=round((clock() - started) * 1000, 3),
+            error_type=None,
+            attempts=attempt,
+        )
+        return entry
+    return entry
+
+
+def run_evaluation(
+    questions: Iterable[Question],
+    client: Any,
+    config: KBConfig,
+    output_path: str | os.PathLike[str],
+    concurrency: int = 4,
+    max_results: int = 10,
+    limiter: AdaptiveRateLimiter | None = None,
+    resume: bool = True,
+    limit: int | None = None,
+    stop_on: tuple[type[BaseException], ...] = (BedrockAuthenticationError, BedrockKBNotFoundError),
+    progress: Callable[[int], None] | None = None,
+) -> dict[str, Any]:
+    """
+    質問を並列に検索し、完了した順に結果を出力ファイルに追記する。
+
+    質問は実行中の数が concurrency の 2 倍を超えないように読み込むため、
+    大きな質問ファイルもメモリに載せずに処理できる。
+
+    Args:
+        questions: 質問（ファイルの順）
+        client: retrieve(**params) を持つクライアント（スレッド間で共有する）
+        config: Knowledge Base の設定（検索結果キャッシュ・ネガティブキャッシュは無効にして使う）
+        output_path: 出力ファイル（JSONL）のパス
+        concurrency: 同時に検索する質問数
+        max_results: 質問に max_results が無い場合の取得件数
+        limiter: 呼び出し間隔の制限（オプション）
+        resume: 出力ファイルに記録済みの質問を読み飛ばすかどうか
+        limit: 今回実行する最大の質問数
+        stop_on: 発生した時点で新しい質問の実行を止めるエラー（認証・KB 未検出）
+        progress: 結果を書き込むごとに今回の完了数を受け取る関数（オプション）
+
+    Returns:
+        dict: executed / resumed / errors / stopped_reason（と limiter 使用時は
+            rate_per_second / throttled）を含む今回の実行の統計
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency は 1 以上である必要があります")
+    output_path = Path(output_path)
+    done = load_checkpoint(output_path) if resume else set()
+    if not resume:
+        output_path.unlink(missing_ok=True)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    stop_names = {error.__name__ for error in stop_on}
+    # キャッシュから返した結果はレイテンシを歪めるため、全ての質問を実際に検索する
+    config = replace(config, cache_ttl_seconds=0, negative_cache_ttl_seconds=0)
+
+    stats: dict[str, Any] = {"executed": 0, "resumed": 0, "errors": 0, "stopped_reason": None}
+    pending: set[Future[dict[str, Any]]] = set()
+    question_iter = iter(questions)
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="kb-eval"
+    ) as executor:
+
+        def write(entry: dict[str, Any]) -> None:
+            out.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+            out.flush()
+            stats["executed"] += 1
+            if entry.get("error_type") is not None:
+                stats["errors"] += 1
+                if entry["error_type"] in stop_names and stats["stopped_reason"] is None:
+                    stats["stopped_reason"] = entry["error_type"]
+            if stats["executed"] % SYNC_EVERY == 0:
+                os.fsync(out.fileno())
+            if progress is not None:
+                progress(stats["executed"])
+
+        submitted = 0
+        exhausted = False
+        while True:
+            # 実行中の数が上限に達するまで質問を読み込んで投入する
+            while (
+                not exhausted
+                and stats["stopped_reason"] is None
+                and len(pending) < concurrency * 2
+                and (limit is None or submitted < limit)
+            ):
+                question = next(question_iter, None)
+                if question is None:
+                    exhausted = True
+                    break
+                if question.id in done:
+                    stats["resumed"] += 1
+                    continue
+                # 同じ ID の質問がファイル内で重複していても 1 回のみ実行する
+                done.add(question.id)
+                submitted += 1
+                pending.add(executor.submit(
+                    evaluate_question, question, client, config, max_results, limiter,
+                ))
+            if not pending:
+                break
+            completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in completed:
+                write(future.result())
+        os.fsync(out.fileno())
+
+    if limiter is not None:
+        stats["rate_per_second"] = round(limiter.rate, 3)
+        stats["throttled"] = limiter.throttled
+    return stats
+
+
+def _parse_ks(raw: str) -> tuple[int, ...]:
+    """--k の値（カンマ区切りの正の整数）を解析する。"""
+    try:
+        ks = tuple(int(item) for item in raw.split(",") if item.strip())
+    except ValueError:
+        ks = ()
+    if not ks or min(ks) < 1:
+        raise argparse.ArgumentTypeError(f"正の整数のカンマ区切りで指定してください: '{raw}'")
+    return ks
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    一括検索評価 CLI のエントリーポイント。
+
+    バックエンドは環境変数（BEDROCK_KB_BACKEND など）から読み込み、
+    --backend / --local-dir で上書きできる。集計結果は JSON で標準出力に書き出し、
+    進捗は標準エラー出力に書き出す。
+    """
+    parser = argparse.ArgumentParser(
+        prog="bedrock-kb-eval",
+        description="正解ラベル付きの質問ファイルで検索品質（recall@k）とレイテンシを評価する",
+    )
+    parser.add_argument("questions", help="質問ファイル（JSONL または .csv）のパス")
+    parser.add_argument("-o", "--output", required=True, help="結果（JSONL）の出力先")
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="同時に検索する質問数（デフォルト: 4）",
+    )
+    parser.add_argument(
+        "--rate", type=float, default=5.0,
+        help="Retrieve API の初期レート（1 秒あたり、スロットリングに応じて調整、デフォルト: 5）",
+    )
+    parser.add_argument(
+        "--max-results", type=int, default=10,
+        help="質問に max_results が無い場合の取得件数（デフォルト: 10、最大 100）",
+    )
+    parser.add_argument(
+        "--k", type=_parse_ks, default=DEFAULT_KS,
+        help="recall@k を求める k（カンマ区切り、デフォルト: 1,3,5,10）",
+    )
+    parser.add_argument("--limit", type=int, default=None, help="今回実行する最大の質問数")
+    parser.add_argument(
+        "--no-resume", action="store_true",
+        help="出力ファイルを削除して最初から実行する（デフォルトは記録済みの質問を読み飛ばす）",
+    )
+    parser.add_argument("--backend", choices=["bedrock", "local"], help="バックエンドの上書き")
+    parser.add_argument("--local-dir", help="local バックエンドのコーパスディレクトリ")
+    args = parser.parse_args(argv)
+
+    if args.backend:
+        os.environ["BEDROCK_KB_BACKEND"] = args.backend
+    if args.local_dir:
+        os.environ["BEDROCK_KB_LOCAL_DIR"] = args.local_dir
+
+    def report(count: int) -> None:
+        if count % SYNC_EVERY == 0:
+            print(f"{count} 件完了（{limiter.rate:.2f} 件/秒）", file=sys.stderr)
+
+    try:
+        config = load_config()
+        client = create_client(config)
+        limiter = AdaptiveRateLimiter(args.rate)
+        run = run_evaluation(
+            read_questions(args.questions),
+            client,
+            config,
+            args.output,
+            concurrency=args.concurrency,
+            max_results=min(max(args.max_results, 1), 100),
+            limiter=limiter,
+            resume=not args.no_resume,
+            limit=args.limit,
+            progress=report,
+        )
+    except (OSError, ValueError) as e:
+        print(f"設定エラー: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    summary = summarize(read_query_log(args.output, include_rotated=False), args.k)
+    summary["run"] = run
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
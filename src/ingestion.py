@@ -0,0 +1,170 @@
+"""
+取り込みジョブ監視モジュール
+
+bedrock-agent の ListDataSources / ListIngestionJobs API を定期的に呼び出し、
+Knowledge Base のデータソースで新しい同期（取り込みジョブ）が完了したことを
+検出する。検出時はコールバックで検索結果キャッシュを無効化するため、
+長い TTL を設定しても同期後に古い結果が返らない。
+
+初回のポーリングでは各データソースの最新の完了ジョブを記録するのみで、
+コールバックは呼ばない（起動前の同期で無効化するキャッシュは存在しないため）。
+
+メトリクス:
+    ingestion.polls: ポーリング回数
+    ingestion.poll_failures: ポーリングの失敗回数
+    ingestion.syncs: 検出した同期完了の回数
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from src.metrics import Metrics, metrics
+from src.structured_log import error_fields, log_event
+
+
+# 同期完了として扱う取り込みジョブのステータス
+COMPLETE_STATUS = "COMPLETE"
+
+
+@dataclass(frozen=True)
+class IngestionJob:
+    """
+    完了した取り込みジョブ。
+
+    Attributes:
+        data_source_id: データソース ID
+        ingestion_job_id: 取り込みジョブ ID
+        updated_at: ジョブの最終更新時刻（API が返す値）
+    """
+    data_source_id: str
+    ingestion_job_id: str
+    updated_at: Any = None
+
+
+class IngestionWatcher:
+    """
+    データソースの同期完了を検出してコールバックを呼び出す（スレッドセーフ）。
+
+    Attributes:
+        kb_id: 監視する Knowledge Base ID
+        data_source_ids: 監視するデータソース ID（空の場合は Knowledge Base の全データソース）
+        poll_interval_seconds: ポーリング間隔（秒）
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        kb_id: str,
+        on_sync: Callable[[IngestionJob], None],
+        data_source_ids: tuple[str, ...] = (),
+        poll_interval_seconds: float = 60.0,
+        registry: Metrics = metrics,
+    ) -> None:
+        self._client_factory = client_factory
+        self._client: Any = None
+        self.kb_id = kb_id
+        self._on_sync = on_sync
+        self.data_source_ids = tuple(data_source_ids)
+        self.poll_interval_seconds = poll_interval_seconds
+        self._metrics = registry
+        # データソース ID -> 最後に確認した完了ジョブ（None は完了ジョブなし）
+        self._latest: dict[str, IngestionJob | None] = {}
+        self._poll_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def poll(self) -> list[IngestionJob]:
+        """
+        各データソースの最新の完了ジョブを確認し、新しく完了したジョブのコールバックを呼ぶ。
+
+        Returns:
+            list[IngestionJob]: 新しく完了したジョブ（初回確認のデータソースは含まない）
+
+        Raises:
+            Exception: API 呼び出しに失敗した場合（boto3 の例外をそのまま送出する）
+        """
+        with self._poll_lock:
+            if self._client is None:
+                self._client = self._client_factory()
+            self._metrics.increment("ingestion.polls")
+            completed = []
+            for data_source_id in self.data_source_ids or self._list_data_sources():
+                job = self._latest_complete_job(data_source_id)
+                known = data_source_id in self._latest
+                previous = self._latest.get(data_source_id)
+                self._latest[data_source_id] = job
+                if known and job is not None and job != previous:
+                    completed.append(job)
+
+        for job in completed:
+            self._metrics.increment("ingestion.syncs")
+            self._on_sync(job)
+        return completed
+
+    def start(self) -> None:
+        """バックグラウンドのポーリングスレッドを開始する（開始済みの場合は何もしない）。"""
+        if self.poll_interval_seconds <= 0 or (
+            self._thread is not None and self._thread.is_alive()
+        ):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="kb-ingestion-watch", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """バックグラウンドのポーリングスレッドを停止する。"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        """poll_interval_seconds ごとに poll() を実行する。"""
+        while not self._stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # 権限不足や一時的な障害でも監視スレッドは継続する
+                self._metrics.increment("ingestion.poll_failures")
+                log_event(
+                    "ingestion.poll_failed", logging.WARNING,
+                    error_type=type(e).__name__, message=str(e), **error_fields(e),
+                )
+            self._stop_event.wait(self.poll_interval_seconds)
+
+    def _list_data_sources(self) -> list[str]:
+        """Knowledge Base の全データソース ID を返す。"""
+        data_source_ids = []
+        params: dict[str, Any] = {"knowledgeBaseId": self.kb_id}
+        while True:
+            response = self._client.list_data_sources(**params)
+            data_source_ids.extend(
+                summary["dataSourceId"] for summary in response.get("dataSourceSummaries", [])
+            )
+            next_token = response.get("nextToken")
+            if not next_token:
+                return data_source_ids
+            params = {**params, "nextToken": next_token}
+
+    def _latest_complete_job(self, data_source_id: str) -> IngestionJob | None:
+        """データソースの最新の完了ジョブを返す（完了ジョブが無い場合は None）。"""
+        response = self._client.list_ingestion_jobs(
+            knowledgeBaseId=self.kb_id,
+            dataSourceId=data_source_id,
+            filters=[{"attribute": "STATUS", "operator": "EQ", "values": [COMPLETE_STATUS]}],
+            sortBy={"attribute": "STARTED_AT", "order": "DESCENDING"},
+            maxResults=1,
+        )
+        summaries = response.get("ingestionJobSummaries", [])
+        if not summaries:
+            return None
+        summary = summaries[0]
+        return IngestionJob(
+            data_source_id=data_source_id,
+            ingestion_job_id=summary["ingestionJobId"],
+            updated_at=summary.get("updatedAt"),
+        )
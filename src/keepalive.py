@@ -0,0 +1,249 @@
+"""
+接続キープアライブモジュール
+
+IDE のエージェントの呼び出しは、数分の無通信の後に集中する。無通信の間に
+Bedrock 側がプール済みの HTTPS 接続を閉じるため、その後の最初の呼び出しは
+TCP 接続と TLS ハンドシェイクをやり直す。
+
+KeepalivePinger は追跡しているクライアントが interval_seconds 以上通信していない場合、
+クライアントの HTTP セッション（同じ接続プール）でエンドポイントに署名なしの HEAD
+リクエストを送り、最後に使った接続を維持する。HEAD は認証前に拒否されるため
+Retrieve API のクォータや課金を消費しない。最後の実際の呼び出しから
+max_idle_seconds を過ぎたクライアントには送らない（使われなくなった接続は閉じさせる）。
+
+instrument_client は接続プールのクラスを置き換え、リクエストごとに新しい接続
+（ハンドシェイク）か再利用かを記録する。キープアライブのリクエストは別に記録するため、
+http.* は実際の呼び出しのみの値になる。
+
+メトリクス:
+    http.handshakes: 新しい接続を確立した呼び出し数
+    http.reused: プール済みの接続を再利用した呼び出し数
+    keepalive.pings: キープアライブのリクエスト数
+    keepalive.handshakes: 接続が既に閉じられていたため確立し直したキープアライブの数
+    keepalive.failures: 失敗したキープアライブの数
+"""
+
+import threading
+import time
+import weakref
+from typing import Any, Callable
+
+from botocore.awsrequest import (
+    AWSHTTPConnectionPool,
+    AWSHTTPSConnectionPool,
+    AWSRequest,
+)
+
+from src.metrics import Metrics, metrics
+
+
+# キープアライブのリクエストのタイムアウト（秒）
+PING_TIMEOUT_SECONDS = 5.0
+
+# キープアライブのリクエストを送っているスレッドの印
+_pinging = threading.local()
+
+
+def _record_connection(conn: Any, registry: Metrics) -> None:
+    """リクエストに使う接続が新しい接続か再利用かを記録する。"""
+    new = getattr(conn, "sock", None) is None
+    if getattr(_pinging, "active", False):
+        registry.increment("keepalive.pings")
+        if new:
+            registry.increment("keepalive.handshakes")
+    else:
+        registry.increment("http.handshakes" if new else "http.reused")
+
+
+class _CountingHTTPConnectionPool(AWSHTTPConnectionPool):
+    """接続の確立・再利用を記録する HTTP 接続プール"""
+
+    registry: Metrics = metrics
+
+    def _validate_conn(self, conn: Any) -> None:
+        _record_connection(conn, self.registry)
+        super()._validate_conn(conn)
+
+
+class _CountingHTTPSConnectionPool(AWSHTTPSConnectionPool):
+    """接続の確立・再利用（TLS ハンドシェイク）を記録する HTTPS 接続プール"""
+
+    registry: Metrics = metrics
+
+    def _validate_conn(self, conn: Any) -> None:
+        _record_connection(conn, self.registry)
+        super()._validate_conn(conn)
+
+
+COUNTING_POOL_CLASSES = {
+    "http": _CountingHTTPConnectionPool,
+    "https": _CountingHTTPSConnectionPool,
+}
+
+
+def instrument_client(client: Any) -> bool:
+    """
+    boto3 クライアントの接続プールを、接続の確立・再利用を記録するものに置き換える。
+
+    最初のリクエストより前に呼び出す（既に作成された接続プールは置き換えない）。
+
+    Args:
+        client: boto3 クライアント
+
+    Returns:
+        bool: 置き換えた場合は True（botocore の内部構造が異なる場合は False）
+    """
+    try:
+        session = client._endpoint.http_session  # pylint: disable=protected-access
+        session._pool_classes_by_scheme = COUNTING_POOL_CLASSES  # pylint: disable=protected-access
+        session._manager.pool_classes_by_scheme = COUNTING_POOL_CLASSES  # pylint: disable=protected-access
+    except AttributeError:
+        return False
+    return True
+
+
+def ping_client(client: Any, timeout_seconds: float = PING_TIMEOUT_SECONDS) -> int:
+    """
+    クライアントの HTTP セッションでエンドポイントに署名なしの HEAD リクエストを送る。
+
+    Args:
+        client: boto3 クライアント
+        timeout_seconds: タイムアウト（秒）
+
+    Returns:
+        int: HTTP ステータス（認証前に拒否されるため通常は 4xx）
+
+    Raises:
+        Exception: 接続に失敗した場合（botocore の HTTPClientError など）
+    """
+    request = AWSRequest(method="HEAD", url=client.meta.endpoint_url).prepare()
+    request.stream_output = False
+    # 読み込みタイムアウトのみリクエストごとに上書きする（接続タイムアウトはクライアントの設定）
+    request.context = {"read_timeout": timeout_seconds}
+    _pinging.active = True
+    try:
+        return client._endpoint.http_session.send(request).status_code  # pylint: disable=protected-access
+    finally:
+        _pinging.active = False
+
+
+def connection_stats(registry: Metrics = metrics) -> dict[str, Any]:
+    """
+    実際の呼び出しの接続の確立数・再利用数と再利用率を返す。
+
+    Returns:
+        dict: handshakes / reused / reuse_ratio（呼び出しが無い場合は None）/ pings
+    """
+    counters = registry.snapshot()["counters"]
+    handshakes = counters.get("http.handshakes", 0)
+    reused = counters.get("http.reused", 0)
+    total = handshakes + reused
+    return {
+        "handshakes": handshakes,
+        "reused": reused,
+        "reuse_ratio": round(reused / total, 4) if total else None,
+        "pings": counters.get("keepalive.pings", 0),
+    }
+
+
+class KeepalivePinger:
+    """
+    通信していないクライアントの接続をキープアライブのリクエストで維持する（スレッドセーフ）。
+
+    Attributes:
+        interval_seconds: この秒数以上通信していないクライアントに送る
+            （Bedrock 側のアイドルタイムアウトより短くする）
+        max_idle_seconds: 最後の実際の呼び出しからこの秒数を過ぎたら送らない
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float = 20.0,
+        max_idle_seconds: float = 600.0,
+        ping: Callable[[Any], Any] = ping_client,
+        clock: Callable[[], float] = time.monotonic,
+        registry: Metrics = metrics,
+    ) -> None:
+        if interval_seconds <= 0:
+            raise ValueError("interval_seconds は正の値である必要があります")
+        self.interval_seconds = interval_seconds
+        self.max_idle_seconds = max_idle_seconds
+        self._ping = ping
+        self._clock = clock
+        self._metrics = registry
+        # クライアント -> [最後の実際の呼び出し, 最後の通信（キープアライブを含む）]
+        # （ClientPool から破棄されたクライアントは追跡しない）
+        self._clients: weakref.WeakKeyDictionary[Any, list[float]] = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def track(self, client: Any) -> None:
+        """
+        クライアントを追跡する（Retrieve API の呼び出しを botocore のイベントで検知する）。
+
+        Args:
+            client: boto3 クライアント
+        """
+        now = self._clock()
+        with self._lock:
+            if client in self._clients:
+                return
+            self._clients[client] = [now, now]
+        ref = weakref.ref(client)
+        client.meta.events.register(
+            "before-send.bedrock-agent-runtime",
+            lambda **_kwargs: self.touch(ref()),
+        )
+
+    def touch(self, client: Any) -> None:
+        """クライアントの実際の呼び出しを記録する。"""
+        now = self._clock()
+        with self._lock:
+            times = self._clients.get(client) if client is not None else None
+            if times is not None:
+                times[0] = times[1] = now
+
+    def tick(self) -> int:
+        """
+        キープアライブが必要なクライアントに送る（バックグラウンドスレッドから呼び出す）。
+
+        Returns:
+            int: 送ったキープアライブの数
+        """
+        now = self._clock()
+        with self._lock:
+            due = [
+                (client, times) for client, times in self._clients.items()
+                if now - times[1] >= self.interval_seconds
+                and now - times[0] <= self.max_idle_seconds
+            ]
+        for client, times in due:
+            try:
+                self._ping(client)
+            except Exception:  # pylint: disable=broad-exception-caught
+                # ネットワーク障害でも次の間隔で再試行する
+                self._metrics.increment("keepalive.failures")
+            with self._lock:
+                times[1] = max(times[1], self._clock())
+        return len(due)
+
+    def start(self) -> None:
+        """バックグラウンドのキープアライブスレッドを開始する（開始済みの場合は何もしない）。"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="kb-keepalive", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """バックグラウンドのキープアライブスレッドを停止する。"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        """interval_seconds の 1/4 ごとにキープアライブが必要なクライアントを確認する。"""
+        while not self._stop_event.wait(self.interval_seconds / 4):
+            self.tick()
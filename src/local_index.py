@@ -0,0 +1,735 @@
+"""
+ローカル転置インデックスモジュール
+
+Bedrock を使わずに kb_answer を動作させるためのオフラインバックエンド。
+Markdown / テキストのディレクトリをチャンク分割し、文字 n-gram による
+BM25 転置インデックスを構築する。インデックスはメモリマップ可能な
+単一ファイルとして永続化し、変更されたファイルのみ差分で再インデックスする。
+
+LocalKnowledgeBase は boto3 の bedrock-agent-runtime クライアントと同じ
+retrieve(**params) インターフェースを持つため、query_knowledge_base に
+そのまま渡すことができる。
+"""
+
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable
+
+from botocore.exceptions import ClientError
+
+
+# インデックス対象の拡張子
+INDEXED_SUFFIXES = (".md", ".markdown", ".txt")
+
+# Knowledge Base と同じメタデータサイドカーファイルの接尾辞（<file>.metadata.json）
+METADATA_SUFFIX = ".metadata.json"
+
+# デフォルトのインデックスファイル名（コーパスディレクトリ直下に作成）
+DEFAULT_INDEX_FILENAME = ".kb_index.bin"
+
+# チャンク分割のデフォルト値（Bedrock の固定サイズチャンキング相当）
+DEFAULT_CHUNK_CHARS = 600
+DEFAULT_OVERLAP_CHARS = 120
+
+# BM25 パラメータ
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# ファイルフォーマット: マジック + (meta, text, postings) 各領域のオフセットと長さ
+_MAGIC = b"KBLIDX01"
+_HEADER = struct.Struct("<8s6Q")
+
+
+def _is_cjk(char: str) -> bool:
+    """文字がひらがな・カタカナ・CJK 統合漢字のいずれかであるか判定する。"""
+    code = ord(char)
+    return (
+        0x3040 <= code <= 0x30FF      # ひらがな・カタカナ
+        or 0x3400 <= code <= 0x4DBF   # CJK 統合漢字拡張 A
+        or 0x4E00 <= code <= 0x9FFF   # CJK 統合漢字
+        or 0xF900 <= code <= 0xFAFF   # CJK 互換漢字
+        or code == 0x30FC             # 長音記号
+    )
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    テキストを BM25 用のトークン列に分割する。
+
+    NFKC 正規化後、日本語（ひらがな・カタカナ・漢字）の連続部分は
+    文字バイグラム（1 文字だけの場合はユニグラム）に、英数字の連続部分は
+    小文字化した単語に分割する。記号・空白は区切りとして扱う。
+
+    Args:
+        text: 分割対象のテキスト
+
+    Returns:
+        list[str]: トークンのリスト
+    """
+    normalized = unicodedata.normalize("NFKC", text).lower()
+    tokens: list[str] = []
+    run: list[str] = []
+    run_is_cjk = False
+
+    def flush() -> None:
+        if not run:
+            return
+        if run_is_cjk:
+            if len(run) == 1:
+                tokens.append(run[0])
+            else:
+                tokens.extend(run[i] + run[i + 1] for i in range(len(run) - 1))
+        else:
+            tokens.append("".join(run))
+        run.clear()
+
+    for char in normalized:
+        if _is_cjk(char):
+            if run and not run_is_cjk:
+                flush()
+            run_is_cjk = True
+            run.append(char)
+        elif char.isalnum():
+            if run and run_is_cjk:
+                flush()
+            run_is_cjk = False
+            run.append(char)
+        else:
+            flush()
+    flush()
+    return tokens
+
+
+def chunk_document(
+    text: str,
+    max_chars: int = DEFAULT_CHUNK_CHARS,
+    overlap_chars: int = DEFAULT_OVERLAP_CHARS,
+) -> list[str]:
+    """
+    ドキュメントを Knowledge Base の固定サイズチャンキングと同様に分割する。
+
+    段落（空行区切り）単位で max_chars まで詰め込み、見出し行では新しい
+    チャンクを開始する。max_chars を超える段落は強制的に分割し、
+    チャンク間には直前チャンク末尾の overlap_chars 文字を重複させる。
+
+    Args:
+        text: 分割対象のドキュメント全文
+        max_chars: 1 チャンクの最大文字数
+        overlap_chars: チャンク間で重複させる文字数
+
+    Returns:
+        list[str]: チャンクのリスト（空白のみのチャンクは含まない）
+    """
+    if max_chars < 1:
+        raise ValueError("max_chars は 1 以上である必要があります")
+    overlap_chars = max(0, min(overlap_chars, max_chars // 2))
+
+    # 段落に分割（見出しは独立した段落として扱う）
+    paragraphs: list[str] = []
+    current: list[str] = []
+    for line in text.replace("\r\n", "\n").split("\n"):
+        if not line.strip() or line.lstrip().startswith("#"):
+            if current:
+                paragraphs.append("\n".join(current))
+                current = []
+            if line.strip():
+                paragraphs.append(line.strip())
+            continue
+        current.append(line)
+    if current:
+        paragraphs.append("\n".join(current))
+
+    chunks: list[str] = []
+    buffer = ""
+
+    def emit() -> str:
+        # チャンクを確定し、次チャンクに引き継ぐ重複部分を返す
+        if buffer.strip():
+            chunks.append(buffer.strip())
+        return buffer[-overlap_chars:] if overlap_chars else ""
+
+    for paragraph in paragraphs:
+        is_heading = paragraph.startswith("#")
+        if is_heading and buffer.strip():
+            emit()
+            buffer = ""
+        candidate = f"{buffer}\n\n{paragraph}" if buffer else paragraph
+        if len(candidate) <= max_chars:
+            buffer = candidate
+            continue
+        carry = emit() if buffer.strip() else ""
+        buffer = f"{carry}\n\n{paragraph}" if carry else paragraph
+        # 1 段落がチャンクサイズを超える場合は強制分割
+        while len(buffer) > max_chars:
+            chunks.append(buffer[:max_chars].strip())
+            buffer = buffer[max_chars - overlap_chars:]
+    if buffer.strip():
+        chunks.append(buffer.strip())
+    return [chunk for chunk in chunks if chunk]
+
+
+def _read_metadata_attributes(path: Path) -> dict[str, Any]:
+    """
+    Knowledge Base 形式のメタデータサイドカーから属性を読み込む。
+
+    Args:
+        path: ドキュメントファイルのパス（<path>.metadata.json を参照する）
+
+    Returns:
+        dict: metadataAttributes の内容（サイドカーが無い・不正な場合は空辞書）
+    """
+    sidecar = path.with_name(path.name + METADATA_SUFFIX)
+    if not sidecar.is_file():
+        return {}
+    try:
+        data = json.loads(sidecar.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    attributes = data.get("metadataAttributes", {}) if isinstance(data, dict) else {}
+    return attributes if isinstance(attributes, dict) else {}
+
+
+def matches_filter(metadata_filter: dict[str, Any], metadata: dict[str, Any]) -> bool:
+    """
+    Retrieve API 形式のメタデータフィルターをチャンクのメタデータに適用する。
+
+    Args:
+        metadata_filter: バリデーション済みのフィルター
+        metadata: チャンクのメタデータ
+
+    Returns:
+        bool: フィルター条件を満たす場合は True
+    """
+    operator, operand = next(iter(metadata_filter.items()))
+    if operator == "andAll":
+        return all(matches_filter(item, metadata) for item in operand)
+    if operator == "orAll":
+        return any(matches_filter(item, metadata) for item in operand)
+
+    actual = metadata.get(operand["key"])
+    expected = operand["value"]
+    if operator == "equals":
+        return actual == expected
+    if operator == "in":
+        return actual in expected
+    if operator == "startsWith":
+        return isinstance(actual, str) and actual.startswith(expected)
+    return False
+
+
+class LocalIndex:
+    """
+    メモリマップされた BM25 転置インデックス。
+
+    ファイルは以下の 3 領域で構成される:
+    - meta: ファイル表・チャンク表・語彙表を含む JSON
+    - text: 全チャンクの UTF-8 テキストを連結したもの
+    - postings: (chunk_id, tf) を uint32 で並べた配列
+
+    Attributes:
+        path: インデックスファイルのパス
+        source_dir: インデックス対象のコーパスディレクトリ
+    """
+
+    def __init__(self, path: str | os.PathLike[str]) -> None:
+        self.path = Path(path)
+        self.source_dir: Path | None = None
+        self._file: Any = None
+        self._mm: mmap.mmap | None = None
+        self._files: dict[str, dict[str, Any]] = {}
+        self._chunks: list[list[Any]] = []
+        self._terms: dict[str, list[int]] = {}
+        self._avgdl = 0.0
+        self._text_off = 0
+        self._postings: Any = array("I")
+
+    @property
+    def chunk_count(self) -> int:
+        """インデックス内のチャンク数。"""
+        return len(self._chunks)
+
+    @property
+    def file_count(self) -> int:
+        """インデックス内のファイル数。"""
+        return len(self._files)
+
+    def load(self) -> bool:
+        """
+        既存のインデックスファイルをメモリマップで開く。
+
+        Returns:
+            bool: 読み込めた場合は True、ファイルが無いか不正な場合は False
+        """
+        self.close()
+        if not self.path.is_file() or self.path.stat().st_size < _HEADER.size:
+            return False
+        file = open(self.path, "rb")  # pylint: disable=consider-using-with
+        try:
+            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            file.close()
+            return False
+        view: memoryview | None = None
+        try:
+            magic, meta_off, meta_len, text_off, text_len, post_off, post_len = (
+                _HEADER.unpack_from(mm, 0)
+            )
+            if magic != _MAGIC or max(
+                meta_off + meta_len, text_off + text_len, post_off + post_len
+            ) > len(mm):
+                raise ValueError("インデックスファイルが不正または途中で切れています")
+            # 書き込み途中・破損したメタデータも不正なファイルとして扱う
+            meta = json.loads(mm[meta_off:meta_off + meta_len].decode("utf-8"))
+            source_dir = Path(meta["source_dir"]) if meta.get("source_dir") else None
+            files, chunks, terms, avgdl = (
+                meta["files"], meta["chunks"], meta["terms"], meta["avgdl"]
+            )
+            view = memoryview(mm)[post_off:post_off + post_len]
+            if sys.byteorder == "little":
+                postings: memoryview | array = view.cast("I")
+            else:
+                # ビッグエンディアン環境ではコピーしてバイト順を変換
+                postings = array("I", view.tobytes())
+                postings.byteswap()
+                view.release()
+        except (ValueError, KeyError, TypeError, AttributeError):
+            # JSONDecodeError・UnicodeDecodeError は ValueError のサブクラス
+            if view is not None:
+                view.release()
+            mm.close()
+            file.close()
+            return False
+        self._file, self._mm = file, mm
+        self.source_dir = source_dir
+        self._files = files
+        self._chunks = chunks
+        self._terms = terms
+        self._avgdl = avgdl
+        self._text_off = text_off
+        self._postings = postings
+        return True
+
+    def close(self) -> None:
+        """メモリマップとファイルハンドルを解放する。"""
+        if isinstance(self._postings, memoryview):
+            self._postings.release()
+        self._postings = array("I")
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def chunk_text(self, chunk_id: int) -> str:
+        """チャンク ID に対応するテキストを返す。"""
+        _, offset, length, _ = self._chunks[chunk_id]
+        start = self._text_off + offset
+        assert self._mm is not None
+        return self._mm[start:start + length].decode("utf-8")
+
+    def chunk_source(self, chunk_id: int) -> str:
+        """チャンク ID に対応するソースファイルの相対パスを返す。"""
+        return self._chunks[chunk_id][0]
+
+    def chunk_attributes(self, chunk_id: int) -> dict[str, Any]:
+        """チャンク ID に対応するソースファイルのメタデータ属性を返す。"""
+        return self._files[self._chunks[chunk_id][0]].get("attributes", {})
+
+    def update(
+        self,
+        source_dir: str | os.PathLike[str],
+        max_chars: int = DEFAULT_CHUNK_CHARS,
+        overlap_chars: int = DEFAULT_OVERLAP_CHARS,
+    ) -> dict[str, int]:
+        """
+        コーパスディレクトリを走査し、変更されたファイルのみ再インデックスする。
+
+        サイズと更新時刻が前回と同じファイルはチャンク・ポスティングを
+        既存インデックスから引き継ぎ、新規・変更ファイルだけを読み込んで
+        チャンク分割する。削除されたファイルのチャンクは取り除かれる。
+
+        Args:
+            source_dir: インデックス対象のディレクトリ
+            max_chars: 1 チャンクの最大文字数
+            overlap_chars: チャンク間で重複させる文字数
+
+        Returns:
+            dict[str, int]: added / updated / removed / unchanged のファイル数
+        """
+        root = Path(source_dir).resolve()
+        if not root.is_dir():
+            raise ValueError(f"コーパスディレクトリが存在しません: {root}")
+
+        scanned: dict[str, dict[str, int]] = {}
+        for path in sorted(root.rglob("*")):
+            if path.suffix.lower() not in INDEXED_SUFFIXES or not path.is_file():
+                continue
+            rel = path.relative_to(root).as_posix()
+            if rel.startswith(".") or path == self.path.resolve():
+                continue
+            stat = path.stat()
+            sidecar = path.with_name(path.name + METADATA_SUFFIX)
+            scanned[rel] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "metadata_mtime_ns": sidecar.stat().st_mtime_ns if sidecar.is_file() else 0,
+            }
+
+        # チャンキング設定が変わった場合やディレクトリが変わった場合は全件再構築
+        same_source = self.source_dir is not None and self.source_dir == root
+        unchanged = {
+            rel for rel, stat in scanned.items()
+            if same_source
+            and rel in self._files
+            and self._files[rel]["mtime_ns"] == stat["mtime_ns"]
+            and self._files[rel]["size"] == stat["size"]
+            and self._files[rel].get("metadata_mtime_ns", 0) == stat["metadata_mtime_ns"]
+            and self._files[rel].get("chunking") == [max_chars, overlap_chars]
+        }
+        stats = {
+            "added": sum(1 for rel in scanned if rel not in self._files or not same_source),
+            "updated": sum(
+                1 for rel in scanned
+                if same_source and rel in self._files and rel not in unchanged
+            ),
+            "removed": sum(1 for rel in self._files if rel not in scanned or not same_source),
+            "unchanged": len(unchanged),
+        }
+        if not stats["added"] and not stats["updated"] and not stats["removed"] \
+                and self._mm is not None:
+            return stats
+
+        texts: list[str] = []
+        chunks: list[list[Any]] = []
+        postings: dict[str, list[int]] = {}
+        remap: dict[int, int] = {}
+
+        # 変更のないファイルのチャンクを引き継ぐ
+        for old_id, (rel, _, _, doc_len) in enumerate(self._chunks):
+            if rel in unchanged:
+                remap[old_id] = len(chunks)
+                texts.append(self.chunk_text(old_id))
+                chunks.append([rel, 0, 0, doc_len])
+        for term, (start, count) in self._terms.items():
+            kept = postings.setdefault(term, [])
+            for i in range(start, start + count):
+                new_id = remap.get(self._postings[2 * i])
+                if new_id is not None:
+                    kept.append(new_id)
+                    kept.append(self._postings[2 * i + 1])
+
+        # 新規・変更ファイルをチャンク分割してトークン化
+        for rel in sorted(scanned):
+            if rel in unchanged:
+                continue
+            content = (root / rel).read_text(encoding="utf-8", errors="replace")
+            for chunk in chunk_document(content, max_chars, overlap_chars):
+                chunk_id = len(chunks)
+                counts = Counter(tokenize(chunk))
+                texts.append(chunk)
+                chunks.append([rel, 0, 0, sum(counts.values())])
+                for term, tf in counts.items():
+                    postings.setdefault(term, []).extend((chunk_id, tf))
+
+        files = {
+            rel: {
+                **stat,
+                "chunking": [max_chars, overlap_chars],
+                "attributes": (
+                    self._files[rel].get("attributes", {}) if rel in unchanged
+                    else _read_metadata_attributes(root / rel)
+                ),
+            }
+            for rel, stat in scanned.items()
+        }
+        self._write(root, files, chunks, texts, postings)
+        self.load()
+        return stats
+
+    def _write(
+        self,
+        root: Path,
+        files: dict[str, dict[str, Any]],
+        chunks: list[list[Any]],
+        texts: list[str],
+        postings: dict[str, list[int]],
+    ) -> None:
+        """インデックスを一時ファイルに書き出し、アトミックに置き換える。"""
+        text_blob = bytearray()
+        for chunk, text in zip(chunks, texts):
+            encoded = text.encode("utf-8")
+            chunk[1], chunk[2] = len(text_blob), len(encoded)
+            text_blob += encoded
+
+        flat = array("I")
+        terms: dict[str, list[int]] = {}
+        for term in sorted(postings):
+            pairs = postings[term]
+            if not pairs:
+                continue
+            terms[term] = [len(flat) // 2, len(pairs) // 2]
+            flat.extend(pairs)
+        if sys.byteorder != "little":
+            flat.byteswap()
+
+        total_len = sum(chunk[3] for chunk in chunks)
+        meta = json.dumps({
+            "source_dir": str(root),
+            "files": files,
+            "chunks": chunks,
+            "terms": terms,
+            "avgdl": total_len / len(chunks) if chunks else 0.0,
+        }, ensure_ascii=False).encode("utf-8")
+        post_blob = flat.tobytes()
+
+        meta_off = _HEADER.size
+        text_off = meta_off + len(meta)
+        post_off = text_off + len(text_blob)
+        header = _HEADER.pack(
+            _MAGIC, meta_off, len(meta), text_off, len(text_blob),
+            post_off, len(post_blob),
+        )
+
+        # Windows では mmap 中のファイルを置き換えられないため先に閉じる
+        self.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 同時に再構築する別プロセス（ブローカーと bedrock-kb-local-index など）と
+        # 一時ファイルを共有しないよう、一意な名前で書き込んでから置き換える
+        with tempfile.NamedTemporaryFile(
+            dir=self.path.parent, prefix=self.path.name + ".", suffix=".tmp", delete=False
+        ) as f:
+            tmp_path = f.name
+            try:
+                f.write(header)
+                f.write(meta)
+                f.write(text_blob)
+                f.write(post_blob)
+            except BaseException:
+                f.close()
+                os.unlink(tmp_path)
+                raise
+        os.replace(tmp_path, self.path)
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        predicate: Callable[[int], bool] | None = None,
+    ) -> list[tuple[int, float]]:
+        """
+        BM25 でクエリに関連するチャンクを検索する。
+
+        スコアはクエリ語がすべて最大限一致した場合の理論上限値で割り、
+        Bedrock の関連性スコアと同じ 0.0-1.0 の範囲に正規化する。
+
+        Args:
+            query: 検索クエリ
+            top_k: 返却する最大件数
+            predicate: 上位件数の選択前に適用するチャンク ID の絞り込み条件
+
+        Returns:
+            list[tuple[int, float]]: (chunk_id, score) のリスト（スコア降順）
+        """
+        n_docs = len(self._chunks)
+        query_terms = Counter(tokenize(query))
+        if not n_docs or not query_terms or top_k < 1:
+            return []
+
+        scores: dict[int, float] = {}
+        upper_bound = 0.0
+        for term, qtf in query_terms.items():
+            entry = self._terms.get(term)
+            if entry is None:
+                continue
+            start, df = entry
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            upper_bound += qtf * idf * (BM25_K1 + 1.0)
+            for i in range(start, start + df):
+                chunk_id = self._postings[2 * i]
+                tf = self._postings[2 * i + 1]
+                doc_len = self._chunks[chunk_id][3]
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * doc_len / (self._avgdl or 1.0))
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + (
+                    qtf * idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+                )
+        if predicate is not None:
+            scores = {chunk_id: score for chunk_id, score in scores.items() if predicate(chunk_id)}
+        if not scores or upper_bound <= 0.0:
+            return []
+        top = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(chunk_id, min(1.0, score / upper_bound)) for chunk_id, score in top]
+
+
+class LocalKnowledgeBase:
+    """
+    ローカルインデックスを Retrieve API 互換のインターフェースで提供するクライアント。
+
+    boto3 の bedrock-agent-runtime クライアントの代わりに
+    query_knowledge_base へ渡すことができる。
+
+    Attributes:
+        index: 検索に使用する LocalIndex
+        bucket: location.s3Location.uri に使用する仮想バケット名
+    """
+
+    def __init__(self, index: LocalIndex, bucket: str = "local-kb") -> None:
+        self.index = index
+        self.bucket = bucket
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(
+        cls,
+        source_dir: str | os.PathLike[str],
+        index_path: str | os.PathLike[str] | None = None,
+    ) -> "LocalKnowledgeBase":
+        """
+        インデックスを開き、コーパスの変更分を差分インデックスしてクライアントを返す。
+
+        Args:
+            source_dir: コーパスディレクトリ
+            index_path: インデックスファイルのパス（省略時はコーパス直下）
+
+        Returns:
+            LocalKnowledgeBase: 検索可能なクライアント
+        """
+        if index_path is None:
+            index_path = Path(source_dir) / DEFAULT_INDEX_FILENAME
+        index = LocalIndex(index_path)
+        index.load()
+        index.update(source_dir)
+        return cls(index)
+
+    def retrieve(self, **params: Any) -> dict[str, Any]:
+        """
+        Retrieve API と同じ形式のリクエストを受け取り、同じ形式のレスポンスを返す。
+
+        Args:
+            **params: build_retrieve_request が生成するリクエストパラメータ
+
+        Returns:
+            dict: retrievalResults を含むレスポンス辞書
+
+        Raises:
+            ClientError: リクエストが不正な場合（ValidationException）
+        """
+        query = params.get("retrievalQuery", {}).get("text")
+        vector_config = (
+            params.get("retrievalConfiguration", {}).get("vectorSearchConfiguration", {})
+        )
+        top_k = vector_config.get("numberOfResults", 5)
+        metadata_filter = vector_config.get("filter")
+        if not isinstance(query, str) or not query.strip():
+            raise ClientError(
+                error_response={
+                    "Error": {
+                        "Code": "ValidationException",
+                        "Message": "retrievalQuery.text must not be empty",
+                    }
+                },
+                operation_name="Retrieve",
+            )
+
+        predicate = None
+        if metadata_filter:
+            def predicate(chunk_id: int) -> bool:
+                return matches_filter(metadata_filter, self._chunk_metadata(chunk_id))
+
+        with self._lock:
+            hits = self.index.search(query, top_k, predicate)
+            results = [
+                self._build_result(chunk_id, score) for chunk_id, score in hits
+            ]
+        return {"retrievalResults": results}
+
+    def _chunk_metadata(self, chunk_id: int) -> dict[str, Any]:
+        """チャンクのメタデータ（組み込み属性とサイドカー属性）を返す。"""
+        uri = f"s3://{self.bucket}/{self.index.chunk_source(chunk_id)}"
+        return {
+            **self.index.chunk_attributes(chunk_id),
+            "x-amz-bedrock-kb-source-uri": uri,
+            "x-amz-bedrock-kb-chunk-id": str(chunk_id),
+        }
+
+    def _build_result(self, chunk_id: int, score: float) -> dict[str, Any]:
+        """単一チャンクを retrievalResults の要素形式に変換する。"""
+        metadata = self._chunk_metadata(chunk_id)
+        return {
+            "content": {"text": self.index.chunk_text(chunk_id)},
+            "location": {
+                "type": "S3",
+                "s3Location": {"uri": metadata["x-amz-bedrock-kb-source-uri"]},
+            },
+            "score": score,
+            "metadata": metadata,
+        }
+
+
+# プロセス内で共有するローカルナレッジベース（インデックス読み込みは 1 回のみ）
+_local_kbs: dict[tuple[str, str | None], LocalKnowledgeBase] = {}
+_local_kbs_lock = threading.Lock()
+
+
+def get_local_knowledge_base(
+    source_dir: str,
+    index_path: str | None = None,
+) -> LocalKnowledgeBase:
+    """
+    コーパスディレクトリごとに共有される LocalKnowledgeBase を返す。
+
+    Args:
+        source_dir: コーパスディレクトリ
+        index_path: インデックスファイルのパス（省略時はコーパス直下）
+
+    Returns:
+        LocalKnowledgeBase: プロセス内で共有されるクライアント
+    """
+    key = (source_dir, index_path)
+    with _local_kbs_lock:
+        kb = _local_kbs.get(key)
+        if kb is None:
+            kb = LocalKnowledgeBase.open(source_dir, index_path)
+            _local_kbs[key] = kb
+        return kb
+
+
+def main() -> None:
+    """
+    ローカルインデックス構築 CLI のエントリーポイント。
+
+    使用方法:
+        bedrock-kb-local-index <corpus_dir> [index_path]
+    """
+    if len(sys.argv) < 2:
+        print("使用方法: bedrock-kb-local-index <corpus_dir> [index_path]", file=sys.stderr)
+        sys.exit(2)
+    source_dir = sys.argv[1]
+    index_path = sys.argv[2] if len(sys.argv) > 2 else str(
+        Path(source_dir) / DEFAULT_INDEX_FILENAME
+    )
+    index = LocalIndex(index_path)
+    index.load()
+    stats = index.update(source_dir)
+    print(json.dumps({
+        **stats,
+        "files": index.file_count,
+        "chunks": index.chunk_count,
+        "index_path": str(index.path),
+    }, ensure_ascii=False))
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+メモリ診断モジュール
+
+長時間稼働するサーバーのメモリ使用量を外部から確認するため、
+RSS・tracemalloc の上位割り当て箇所を取得する。
+
+MemoryBudget は RSS を定期的に確認し、予算を超えた場合は登録された
+キャッシュ類を古い順に一定割合ずつ削除して、OOM で強制終了される前に
+メモリを解放する。Python のアロケーターは解放したメモリを即座に OS に
+返さないことがあるため、1 回の確認で削除するのは一定割合のみとし、
+次回の確認でも超過していれば再度削除する。
+
+メトリクス:
+    memory.rss_bytes: 直近に確認した RSS（ゲージ）
+    memory.budget_exceeded: 予算の超過を検出した回数
+    memory.shed.<名前>: 予算超過時に削除したエントリ数
+    memory.check_failures: バックグラウンドの確認で例外が発生した回数
+"""
+
+import gc
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+from typing import Any, Callable
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+from src.metrics import Metrics, metrics
+from src.structured_log import log_event
+
+
+# 予算超過時に各キャッシュから削除する割合
+DEFAULT_SHED_FRACTION = 0.5
+
+# 上位割り当て箇所の集計から除外するファイル
+_IGNORED_TRACES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def peak_rss_bytes() -> int | None:
+    """
+    プロセス開始以降の最大 RSS を返す。
+
+    Returns:
+        int | None: 最大 RSS（バイト、取得できない環境では None）
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト、Linux はキロバイト単位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def rss_bytes() -> int | None:
+    """
+    現在の RSS を返す。
+
+    /proc/self/statm を読めない環境（macOS など）では最大 RSS で代用する。
+
+    Returns:
+        int | None: RSS（バイト、取得できない環境では None）
+    """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return peak_rss_bytes()
+
+
+def top_allocations(limit: int = 10) -> list[dict[str, Any]]:
+    """
+    tracemalloc で追跡中のメモリ割り当てを行番号ごとに集計し、上位を返す。
+
+    Args:
+        limit: 返す件数
+
+    Returns:
+        list[dict]: location / size_bytes / count を含む辞書のリスト
+            （tracemalloc が追跡中でない場合は空）
+    """
+    if limit < 1 or not tracemalloc.is_tracing():
+        return []
+    snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+    return [
+        {
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_bytes": stat.size,
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+
+
+class MemoryBudget:
+    """
+    RSS がメモリ予算を超えた場合にキャッシュ類を削除する。
+
+    Attributes:
+        max_bytes: メモリ予算（バイト）
+        check_interval_seconds: バックグラウンドで確認する間隔（秒）
+        shed_fraction: 1 回の超過で各キャッシュから削除する割合
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        shedders: list[tuple[str, Callable[[float], int]]],
+        check_interval_seconds: float = 10.0,
+        shed_fraction: float = DEFAULT_SHED_FRACTION,
+        measure: Callable[[], int | None] = rss_bytes,
+        registry: Metrics = metrics,
+    ) -> None:
+        if max_bytes < 1:
+            raise ValueError("max_bytes は 1 以上である必要があります")
+        self.max_bytes = max_bytes
+        self.check_interval_seconds = check_interval_seconds
+        self.shed_fraction = shed_fraction
+        self._shedders = list(shedders)
+        self._measure = measure
+        self._metrics = registry
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def check(self) -> int:
+        """
+        RSS を確認し、予算を超えていれば各キャッシュから shed_fraction の割合を削除する。
+
+        Returns:
+            int: 削除したエントリ数の合計
+        """
+        used = self._measure()
+        if used is None:
+            return 0
+        self._metrics.set_gauge("memory.rss_bytes", used)
+        if used <= self.max_bytes:
+            return 0
+
+        self._metrics.increment("memory.budget_exceeded")
+        shed = 0
+        for name, shed_fn in self._shedders:
+            removed = shed_fn(self.shed_fraction)
+            self._metrics.increment(f"memory.shed.{name}", removed)
+            shed += removed
+        # 削除したエントリの循環参照も回収する
+        gc.collect()
+        return shed
+
+    def stats(self) -> dict[str, Any]:
+        """
+        予算の設定を返す。
+
+        Returns:
+            dict: max_bytes / check_interval_seconds / shed_fraction を含む辞書
+        """
+        return {
+            "max_bytes": self.max_bytes,
+            "check_interval_seconds": self.check_interval_seconds,
+            "shed_fraction": self.shed_fraction,
+        }
+
+    def start(self) -> None:
+        """バックグラウンドの確認スレッドを開始する（間隔が 0 または開始済みの場合は何もしない）。"""
+        if self.check_interval_seconds <= 0 or (
+            self._thread is not None and self._thread.is_alive()
+        ):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="kb-memory-budget", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """バックグラウンドの確認スレッドを停止する。"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        """check_interval_seconds ごとに check() を実行する。"""
+        while not self._stop_event.wait(self.check_interval_seconds):
+            try:
+                self.check()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # RSS の取得やキャッシュの削除に失敗しても監視スレッドは継続する
+                self._metrics.increment("memory.check_failures")
+                log_event(
+                    "memory.check_failed", logging.WARNING,
+                    error_type=type(e).__name__, message=str(e),
+                )
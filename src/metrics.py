@@ -0,0 +1,96 @@
+"""
+メトリクスモジュール
+
+プロセス内のカウンター・ゲージ・観測値（レイテンシなど）を集計する。
+kb_metrics ツールからスナップショットを取得できる。
+"""
+
+import threading
+from typing import Any
+
+
+class Metrics:
+    """
+    スレッドセーフなメトリクスレジストリ。
+
+    - counter: 単調増加する回数（increment）
+    - gauge: 最新の値（set_gauge）
+    - summary: 観測値の件数・合計・最小・最大・直近値（observe）
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._gauges: dict[str, float] = {}
+        self._summaries: dict[str, dict[str, float]] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """
+        カウンターを加算する。
+
+        Args:
+            name: メトリクス名
+            value: 加算する値
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """
+        ゲージに最新値を設定する。
+
+        Args:
+            name: メトリクス名
+            value: 設定する値
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """
+        観測値を記録する。
+
+        Args:
+            name: メトリクス名
+            value: 観測値
+        """
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                self._summaries[name] = {
+                    "count": 1, "sum": value, "min": value, "max": value, "last": value,
+                }
+                return
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["min"] = min(summary["min"], value)
+            summary["max"] = max(summary["max"], value)
+            summary["last"] = value
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        現在の全メトリクスのコピーを返す。
+
+        Returns:
+            dict: counters / gauges / summaries を含む辞書（summary には mean を付与）
+        """
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": {
+                    name: {**summary, "mean": summary["sum"] / summary["count"]}
+                    for name, summary in self._summaries.items()
+                },
+            }
+
+    def reset(self) -> None:
+        """全メトリクスを削除する。"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+
+# プロセス全体で共有するメトリクスレジストリ
+metrics = Metrics()
@@ -0,0 +1,362 @@
+"""
+botocore モデルバンドルモジュール
+
+botocore はクライアントの作成時にデータディレクトリを走査してサービスの
+API バージョンを決定し、サービスモデル・エンドポイントルールセットなどの
+JSON を OrderedDict として解析する。初回の kb_answer ではこれが
+クライアント作成時間の半分近くを占める。
+
+このモジュールは bedrock-agent-runtime のクライアント作成で読み込まれる
+データ（サービスモデル・エンドポイントルールセット・endpoints.json など）だけを記録し、
+ドキュメント文字列を除いて marshal 形式の 1 ファイル（バンドル）に書き出す。
+BundledLoader はバンドルに含まれるデータをディレクトリ走査と JSON 解析なしで返し、
+含まれないデータは通常の Loader で読み込む。
+
+バンドルは botocore のバージョンごとに作成し、バージョンが異なるバンドルは
+使用しない。marshal はコードを実行しない基本型のみを扱うため、pickle と異なり
+読み込み時に任意のコードが実行されることはない。
+
+使用方法:
+    bedrock-kb-model-bundle                 # デフォルトの場所にバンドルを作成
+    bedrock-kb-model-bundle --benchmark 10  # バンドルの有無でクライアント作成時間を比較
+"""
+
+import argparse
+import json
+import marshal
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any
+
+import botocore
+import botocore.session
+from botocore.loaders import Loader
+
+
+# バンドルの形式のバージョン（形式を変更した場合に増やす）
+BUNDLE_FORMAT = 1
+
+# バンドルに含めるサービス
+BUNDLED_SERVICES = ("bedrock-agent-runtime",)
+
+# バンドルを使用しない場合に BEDROCK_KB_MODEL_BUNDLE に指定する値
+BUNDLE_OFF = "off"
+
+# ベンチマークで子プロセスとして実行するスクリプト（クライアント作成時間をミリ秒で出力）
+_BENCHMARK_SCRIPT = """
+import sys, time
+import boto3
+from src.model_bundle import install_bundle
+started = time.perf_counter()
+session = boto3.Session(
+    region_name="us-east-1", aws_access_key_id="benchmark", aws_secret_access_key="benchmark",
+)
+if sys.argv[1]:
+    install_bundle(session, sys.argv[1])
+session.client("bedrock-agent-runtime")
+print((time.perf_counter() - started) * 1000)
+"""
+
+
+def default_bundle_path() -> str:
+    """
+    botocore のバージョンごとのデフォルトのバンドルの場所を返す。
+
+    Returns:
+        str: $XDG_CACHE_HOME（未設定時は ~/.cache）/bedrock-kb-mcp/ 配下のパス
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(
+        cache_home, "bedrock-kb-mcp", f"botocore-{botocore.__version__}.bundle"
+    )
+
+
+def _plain(value: Any) -> Any:
+    """
+    OrderedDict を含む値を marshal で書き出せる dict / list に変換する。
+
+    クライアントの help() でのみ使われるドキュメント文字列（"documentation"）は除く。
+    """
+    if isinstance(value, (dict, OrderedDict)):
+        return {
+            key: _plain(item)
+            for key, item in value.items()
+            if not (key == "documentation" and isinstance(item, str))
+        }
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _extra_search_paths(session: botocore.session.Session) -> list[str]:
+    """セッションの data_path（AWS_DATA_PATH）を botocore.loaders.create_loader と同じく解釈する。"""
+    data_path = session.get_config_variable("data_path")
+    if not data_path:
+        return []
+    return [
+        os.path.expanduser(os.path.expandvars(path)) for path in data_path.split(os.pathsep)
+    ]
+
+
+class _RecordingLoader(Loader):
+    """読み込んだデータを記録する Loader（バンドルの作成に使用）。"""
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.data: dict[str, Any] = {}
+        self.services: dict[str, Any] = {}
+
+    def load_data_with_path(self, name: str) -> tuple[Any, str]:
+        loaded, path = super().load_data_with_path(name)
+        self.data[name] = [_plain(loaded), path]
+        return loaded, path
+
+    def load_service_model(
+        self, service_name: str, type_name: str, api_version: str | None = None
+    ) -> Any:
+        loaded = super().load_service_model(service_name, type_name, api_version)
+        if api_version is None:
+            self.services[f"{service_name}/{type_name}"] = _plain(loaded)
+        return loaded
+
+
+class BundledLoader(Loader):
+    """
+    バンドルに含まれるデータをディレクトリ走査・JSON 解析なしで返す Loader。
+
+    バンドルに含まれないデータ（他のサービスなど）は通常の Loader と同じく
+    データディレクトリから読み込む。
+    """
+
+    def __init__(self, bundle: dict[str, Any], **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._data: dict[str, Any] = bundle["data"]
+        self._services: dict[str, Any] = bundle["services"]
+
+    def load_data_with_path(self, name: str) -> tuple[Any, str]:
+        if name in self._data:
+            data, path = self._data[name]
+            return data, path
+        return super().load_data_with_path(name)
+
+    def load_service_model(
+        self, service_name: str, type_name: str, api_version: str | None = None
+    ) -> Any:
+        key = f"{service_name}/{type_name}"
+        if api_version is None and key in self._services:
+            return self._services[key]
+        return super().load_service_model(service_name, type_name, api_version)
+
+
+def build_bundle(services: tuple[str, ...] = BUNDLED_SERVICES) -> dict[str, Any]:
+    """
+    services のクライアント作成で読み込まれるデータを記録したバンドルを作成する。
+
+    Args:
+        services: バンドルに含めるサービス
+
+    Returns:
+        dict: format / botocore / data / services を含む辞書
+    """
+    session = botocore.session.get_session()
+    loader = _RecordingLoader(extra_search_paths=_extra_search_paths(session))
+    session.register_component("data_loader", loader)
+    for service in services:
+        # 認証情報の解決・通信は行わない（ダミーの認証情報でクライアントを作成するのみ）
+        session.create_client(
+            service,
+            region_name="us-east-1",
+            aws_access_key_id="bundle",
+            aws_secret_access_key="bundle",
+        )
+    return {
+        "format": BUNDLE_FORMAT,
+        "botocore": botocore.__version__,
+        # サービスごとのファイル（"サービス/バージョン/種類"）は services から返すため含めない
+        "data": {name: value for name, value in loader.data.items() if "/" not in name},
+        "services": loader.services,
+    }
+
+
+def write_bundle(path: str, services: tuple[str, ...] = BUNDLED_SERVICES) -> str:
+    """
+    バンドルを作成してファイルに書き出す（一時ファイルからの置き換えで書き込む）。
+
+    Args:
+        path: 書き出し先のパス
+        services: バンドルに含めるサービス
+
+    Returns:
+        str: 書き出したパス
+    """
+    data = marshal.dumps(build_bundle(services))
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".bundle-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+
+def load_bundle(path: str) -> dict[str, Any] | None:
+    """
+    バンドルを読み込む。
+
+    Args:
+        path: バンドルのパス
+
+    Returns:
+        dict | None: バンドル（存在しない・壊れている・botocore のバージョンが
+            異なる場合は None）
+    """
+    try:
+        # marshal.load はファイルから少しずつ読み込むため、まとめて読んでから解析する
+        with open(path, "rb") as f:
+            bundle = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if (
+        not isinstance(bundle, dict)
+        or bundle.get("format") != BUNDLE_FORMAT
+        or bundle.get("botocore") != botocore.__version__
+    ):
+        return None
+    return bundle
+
+
+def install_bundle(session: Any, path: str) -> bool:
+    """
+    boto3（または botocore）セッションのデータローダーを BundledLoader に置き換える。
+
+    Args:
+        session: boto3.Session または botocore.session.Session
+        path: バンドルのパス
+
+    Returns:
+        bool: 置き換えた場合は True（バンドルを使用できない場合は False）
+    """
+    core_session = getattr(session, "_session", session)
+    if not isinstance(core_session, botocore.session.Session):
+        return False
+    bundle = load_bundle(path)
+    if bundle is None:
+        return False
+    core_session.register_component(
+        "data_loader",
+        BundledLoader(bundle, extra_search_paths=_extra_search_paths(core_session)),
+    )
+    return True
+
+
+def start_bundle_build(path: str) -> threading.Thread | None:
+    """
+    バンドルが無い（または使用できない）場合、バックグラウンドで作成する。
+
+    作成したバンドルは次回の起動から使用される。
+
+    Args:
+        path: バンドルのパス
+
+    Returns:
+        threading.Thread | None: 開始したスレッド（バンドルが使用できる場合は None）
+    """
+    if load_bundle(path) is not None:
+        return None
+
+    def build() -> None:
+        try:
+            write_bundle(path)
+        except Exception:  # pylint: disable=broad-exception-caught
+            # バンドルは高速化のためのもので、作成できなくても動作に影響しない
+            return
+
+    thread = threading.Thread(target=build, name="kb-model-bundle", daemon=True)
+    thread.start()
+    return thread
+
+
+def benchmark(path: str, runs: int = 10) -> dict[str, Any]:
+    """
+    新しいプロセスでのクライアント作成時間をバンドルの有無で比較する。
+
+    Args:
+        path: バンドルのパス
+        runs: それぞれの実行回数
+
+    Returns:
+        dict: without_bundle_ms / with_bundle_ms（mean / p50）と speedup を含む辞書
+    """
+    # 循環 import を避けるため、ベンチマーク時のみ読み込む
+    from src.replay import percentile  # pylint: disable=import-outside-toplevel
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def measure(bundle_path: str) -> dict[str, float]:
+        samples = [
+            float(subprocess.run(
+                [sys.executable, "-c", _BENCHMARK_SCRIPT, bundle_path],
+                cwd=root, check=True, capture_output=True, text=True,
+            ).stdout.strip())
+            for _ in range(runs)
+        ]
+        return {
+            "mean": round(sum(samples) / len(samples), 3),
+            "p50": round(percentile(samples, 0.50), 3),
+        }
+
+    without = measure("")
+    with_bundle = measure(path)
+    return {
+        "runs": runs,
+        "botocore": botocore.__version__,
+        "without_bundle_ms": without,
+        "with_bundle_ms": with_bundle,
+        "speedup": round(without["p50"] / with_bundle["p50"], 2) if with_bundle["p50"] else None,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    バンドル作成 CLI のエントリーポイント。
+
+    バンドルを作成し、--benchmark を指定した場合はクライアント作成時間の比較を
+    JSON で標準出力に書き出す。
+    """
+    parser = argparse.ArgumentParser(
+        prog="bedrock-kb-model-bundle",
+        description="bedrock-agent-runtime の botocore モデルバンドルを作成する",
+    )
+    parser.add_argument(
+        "--output", default=None,
+        help="書き出し先（デフォルト: BEDROCK_KB_MODEL_BUNDLE またはキャッシュディレクトリ）",
+    )
+    parser.add_argument(
+        "--benchmark", type=int, default=0, metavar="RUNS",
+        help="作成後にバンドルの有無でクライアント作成時間を RUNS 回ずつ計測する",
+    )
+    args = parser.parse_args(argv)
+
+    path = args.output or os.environ.get("BEDROCK_KB_MODEL_BUNDLE") or default_bundle_path()
+    if path == BUNDLE_OFF:
+        print("BEDROCK_KB_MODEL_BUNDLE=off のためバンドルを作成しません", file=sys.stderr)
+        sys.exit(2)
+    write_bundle(path)
+    print(f"バンドルを作成しました: {path}", file=sys.stderr)
+    if args.benchmark > 0:
+        print(json.dumps(benchmark(path, args.benchmark), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -38,6 +38,9 @@ class KBResponse:
     
     Attributes:
         results: 検索結果（RetrievalResult）のリスト
+        partial: デッドライン超過により一部の結果のみを含む場合は True
+        next_token: 続きのページを取得するための nextToken
+            （要求した件数ちょうどで打ち切り、さらに結果がある場合のみ）
         
     Note:
         answer と citations は後方互換性のために残されています。
@@ -45,6 +48,8 @@ class KBResponse:
     """
     # Retrieve API 用の新しいフィールド
     results: list[RetrievalResult] = field(default_factory=list)
+    partial: bool = False
+    next_token: str | None = None
     
     # 後方互換性のためのフィールド（タスク 4 完了後に削除予定）
     answer: str = ""
@@ -9,7 +9,10 @@ from typing import Any
 from src.models import RetrievalResult, KBResponse
 
 
-def parse_retrieve_response(response: dict[str, Any]) -> KBResponse:
+def parse_retrieve_response(
+    response: dict[str, Any],
+    min_score: float | None = None,
+) -> KBResponse:
     """
     Bedrock Retrieve API レスポンスをパースし、KBResponse を返す。
 
@@ -24,8 +27,12 @@ def parse_retrieve_response(response: dict[str, Any]) -> KBResponse:
         ]
     }
 
+    Retrieve API は結果をスコアの降順で返すため、min_score を指定した場合は
+    スコアが min_score 未満の結果に達した時点で解析を打ち切る。
+
     Args:
         response: Bedrock Retrieve API からの生レスポンス辞書
+        min_score: スコアの下限（オプション）
 
     Returns:
         KBResponse: パース済みの検索結果を含むオブジェクト
@@ -41,8 +48,11 @@ def parse_retrieve_response(response: dict[str, Any]) -> KBResponse:
                 continue
 
             result = _parse_retrieval_result(item)
-            if result is not None:
-                results.append(result)
+            if result is None:
+                continue
+            if min_score is not None and result.score is not None and result.score < min_score:
+                break
+            results.append(result)
 
     return KBResponse(results=results)
 
@@ -0,0 +1,235 @@
+"""
+KB プロファイルモジュール
+
+BEDROCK_KB_PROFILES で指定した JSON ファイルから名前付きの検索先
+（Knowledge Base ID・リージョン・AWS プロファイル・検索のデフォルト値）を読み込み、
+kb_answer の kb パラメータで選択できるようにする。1 つのプロセスで
+複数チームの Knowledge Base を扱う場合に使用する。
+
+ファイルの形式:
+    {
+      "default": "support",
+      "profiles": {
+        "support": {"kb_id": "KB1", "region": "ap-northeast-1", "aws_profile": "support"},
+        "legal": {"kb_id": "KB2", "region": "us-east-1", "search_type": "SEMANTIC",
+                  "metadata_filter": {"equals": {"key": "lang", "value": "ja"}}}
+      }
+    }
+
+選択したプロファイルは環境変数の設定（KBConfig）を dataclasses.replace で
+上書きした KBConfig として返す。profile_name が設定されるため、
+クライアントプールと検索結果キャッシュのキーはプロファイルごとに分かれる。
+ファイルは更新時刻が変わった場合のみ読み直す。
+"""
+
+import json
+import os
+import threading
+from dataclasses import replace
+from typing import Any
+
+from src.config import KBConfig, Replica, parse_replicas
+from src.validation import (
+    ValidationError,
+    validate_fetch_limit,
+    validate_metadata_filter,
+    validate_search_type,
+    validate_timeout_ms,
+)
+
+
+# プロファイルに指定できるキー
+PROFILE_KEYS = (
+    "kb_id",
+    "region",
+    "aws_profile",
+    "replicas",
+    "search_type",
+    "metadata_filter",
+    "timeout_ms",
+    "fetch_limit",
+    "snippet",
+    "decompose",
+)
+
+
+class ProfileNotFoundError(Exception):
+    """指定された KB プロファイルが存在しないことを示す例外"""
+
+
+def _profile_replicas(name: str, raw: Any) -> tuple[Replica, ...]:
+    """プロファイルの replicas（"リージョン:KB ID[:プロファイル]" のリスト）を解釈する。"""
+    if not isinstance(raw, list) or not all(isinstance(item, str) for item in raw):
+        raise ValueError(f"KB プロファイル '{name}' の replicas は文字列のリストで指定してください")
+    return parse_replicas(",".join(raw))
+
+
+def _profile_overrides(name: str, raw: Any) -> dict[str, Any]:
+    """
+    プロファイル 1 件を検証し、KBConfig に上書きするフィールドを返す。
+
+    Raises:
+        ValueError: 形式が不正な場合
+    """
+    if not isinstance(raw, dict):
+        raise ValueError(f"KB プロファイル '{name}' はオブジェクトで指定してください")
+    unknown = sorted(set(raw) - set(PROFILE_KEYS))
+    if unknown:
+        raise ValueError(f"KB プロファイル '{name}' に不明なキーがあります: {', '.join(unknown)}")
+    kb_id = raw.get("kb_id")
+    if not isinstance(kb_id, str) or not kb_id.strip():
+        raise ValueError(f"KB プロファイル '{name}' に kb_id がありません")
+
+    aws_profile = raw.get("aws_profile") or None
+    overrides: dict[str, Any] = {
+        "profile_name": name,
+        "kb_id": kb_id.strip(),
+        "aws_profile": aws_profile,
+        # 環境変数の複製はプロファイルの Knowledge Base には適用しない。AWS プロファイルを
+        # 指定していない複製はプロファイルの aws_profile で呼び出す（既定の認証情報を使わない）
+        "replicas": tuple(
+            replica if replica.profile is not None else replace(replica, profile=aws_profile)
+            for replica in _profile_replicas(name, raw.get("replicas", []))
+        ),
+        "default_search_type": None,
+        "default_metadata_filter": None,
+    }
+    if raw.get("region"):
+        overrides["aws_region"] = raw["region"]
+    try:
+        if raw.get("search_type") is not None:
+            overrides["default_search_type"] = validate_search_type(raw["search_type"])
+        if raw.get("metadata_filter") is not None:
+            overrides["default_metadata_filter"] = validate_metadata_filter(
+                raw["metadata_filter"]
+            )
+        if raw.get("timeout_ms") is not None:
+            overrides["request_timeout_ms"] = validate_timeout_ms(raw["timeout_ms"])
+        if raw.get("fetch_limit") is not None:
+            overrides["fetch_limit"] = validate_fetch_limit(raw["fetch_limit"])
+    except ValidationError as e:
+        raise ValueError(f"KB プロファイル '{name}' の値が不正です: {e}") from e
+    if raw.get("snippet") is not None:
+        overrides["snippet_mode"] = bool(raw["snippet"])
+    if raw.get("decompose") is not None:
+        overrides["decompose_queries"] = bool(raw["decompose"])
+    return overrides
+
+
+def parse_profiles(data: Any) -> tuple[str | None, dict[str, dict[str, Any]]]:
+    """
+    プロファイルファイルの内容を検証する。
+
+    Args:
+        data: JSON を読み込んだ値
+
+    Returns:
+        tuple: (デフォルトのプロファイル名, プロファイル名 -> KBConfig の上書きフィールド)
+
+    Raises:
+        ValueError: 形式が不正な場合
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("profiles"), dict):
+        raise ValueError("KB プロファイルファイルには profiles オブジェクトが必要です")
+    profiles = {
+        name: _profile_overrides(name, raw) for name, raw in data["profiles"].items()
+    }
+    default = data.get("default")
+    if default is not None and default not in profiles:
+        raise ValueError(f"default の KB プロファイルが存在しません: '{default}'")
+    return default, profiles
+
+
+# 読み込み済みのプロファイルファイル（パス, 更新時刻, 内容）
+_loaded: tuple[str, float, tuple[str | None, dict[str, dict[str, Any]]]] | None = None
+_loaded_lock = threading.Lock()
+
+
+def load_profiles(path: str) -> tuple[str | None, dict[str, dict[str, Any]]]:
+    """
+    プロファイルファイルを読み込む（更新時刻が変わっていない場合は前回の内容を返す）。
+
+    Args:
+        path: プロファイルファイルのパス
+
+    Returns:
+        tuple: parse_profiles の戻り値
+
+    Raises:
+        ValueError: ファイルを読めない場合、または形式が不正な場合
+    """
+    global _loaded  # pylint: disable=global-statement
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError as e:
+        raise ValueError(f"KB プロファイルファイルを読み込めません: {path}（{e}）") from e
+    with _loaded_lock:
+        if _loaded is not None and _loaded[:2] == (path, mtime):
+            return _loaded[2]
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"KB プロファイルファイルを読み込めません: {path}（{e}）") from e
+    parsed = parse_profiles(data)
+    with _loaded_lock:
+        _loaded = (path, mtime, parsed)
+    return parsed
+
+
+def profile_configs(config: KBConfig) -> list[KBConfig]:
+    """
+    読み込んだ全ての KB プロファイルの設定を返す（バックグラウンド処理で全ての検索先を扱う場合に使用する）。
+
+    Args:
+        config: 環境変数から読み込んだ設定
+
+    Returns:
+        list[KBConfig]: BEDROCK_KB_ID が設定されている場合は config と、各プロファイルを
+            反映した設定（プロファイルファイルが無い場合は [config]）
+
+    Raises:
+        ValueError: プロファイルファイルを読めない場合、または形式が不正な場合
+    """
+    if config.profiles_path is None:
+        return [config]
+    _, profiles = load_profiles(config.profiles_path)
+    configs = [config] if config.kb_id else []
+    configs.extend(replace(config, **overrides) for overrides in profiles.values())
+    return configs
+
+
+def select_profile(config: KBConfig, name: str | None) -> KBConfig:
+    """
+    KB プロファイルを選択し、その検索先とデフォルト値を反映した設定を返す。
+
+    Args:
+        config: 環境変数から読み込んだ設定
+        name: プロファイル名（None の場合はファイルの default、それも無ければ config のまま）
+
+    Returns:
+        KBConfig: プロファイルを反映した設定
+
+    Raises:
+        ProfileNotFoundError: プロファイルファイルが無い、または name が存在しない場合
+        ValueError: プロファイルファイルを読めない場合、または形式が不正な場合
+    """
+    if config.profiles_path is None:
+        if name is not None:
+            raise ProfileNotFoundError(
+                "KB プロファイルが設定されていません（BEDROCK_KB_PROFILES を指定してください）"
+            )
+        return config
+    default, profiles = load_profiles(config.profiles_path)
+    name = name if name is not None else default
+    if name is None:
+        if not config.kb_id:
+            raise ProfileNotFoundError(
+                f"kb を指定してください（{' / '.join(sorted(profiles))}）"
+            )
+        return config
+    if name not in profiles:
+        raise ProfileNotFoundError(
+            f"KB プロファイルが存在しません: '{name}'（{' / '.join(sorted(profiles))}）"
+        )
+    return replace(config, **profiles[name])
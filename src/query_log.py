@@ -0,0 +1,230 @@
+"""
+クエリログモジュール
+
+kb_answer の呼び出し内容と結果を追記専用の JSONL ファイルに記録する。
+書き込みはキューを介してバックグラウンドスレッドがまとめて行うため、
+ツール呼び出しのパスでファイル I/O によるブロックは発生しない。
+
+1 行 1 エントリの形式（ウォームアップ・リプレイと共通）:
+    {"ts": 1718000000.123, "query": "返品ポリシー", "max_results": 4, "fetch_limit": null,
+     "metadata_filter": null, "search_type": null, "latency_ms": 182.4,
+     "result_count": 4, "scores": [0.82, 0.77, 0.61, 0.55],
+     "cache": "miss", "error_type": null, "partial": false,
+     "sub_queries": null, "kb": "support"}
+kb は検索先の KB プロファイル名（プロファイルを使わない場合は null）。
+hash_queries が有効な場合は query の代わりに query_hash（SHA-256）を記録する。
+"""
+
+import hashlib
+import json
+import os
+import queue
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+
+# キャッシュ結果の記録値
+CACHE_HIT = "hit"
+CACHE_MISS = "miss"
+CACHE_OFF = "off"
+
+
+def hash_query(query: str) -> str:
+    """
+    クエリ文字列をプライバシー保護のためにハッシュ化する。
+
+    Args:
+        query: クエリ文字列
+
+    Returns:
+        str: SHA-256 の 16 進文字列
+    """
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+def _rotated_paths(path: Path, backup_count: int) -> list[Path]:
+    """ローテーション済みファイルを古い順に、最後に現行ファイルを並べて返す。"""
+    return [
+        path.with_name(f"{path.name}.{i}") for i in range(backup_count, 0, -1)
+    ] + [path]
+
+
+def read_query_log(
+    path: str | os.PathLike[str],
+    include_rotated: bool = True,
+) -> Iterator[dict[str, Any]]:
+    """
+    JSONL 形式のクエリログを 1 エントリずつ読み込む。
+
+    include_rotated が True の場合は <path>.N ... <path>.1, <path> の順に、
+    存在するローテーション済みファイルも古いものから読み込む。
+
+    Args:
+        path: クエリログのパス
+        include_rotated: ローテーション済みファイルも読み込むかどうか
+
+    Yields:
+        dict: 解釈できたログエントリ（不正な行は読み飛ばす）
+    """
+    path = Path(path)
+    if include_rotated:
+        backups = sorted(
+            (
+                p for p in path.parent.glob(f"{path.name}.*")
+                if p.suffix[1:].isdigit()
+            ),
+            key=lambda p: int(p.suffix[1:]),
+            reverse=True,
+        )
+        paths = backups + [path]
+    else:
+        paths = [path]
+
+    for log_path in paths:
+        if not log_path.is_file():
+            continue
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict):
+                    yield entry
+
+
+class QueryLogWriter:
+    """
+    バッチ化・非同期書き込みを行う追記専用クエリログ。
+
+    record() はキューに積むだけで即座に戻る。キューが満杯の場合は
+    エントリを破棄して dropped を加算する（ツール呼び出しを待たせない）。
+
+    Attributes:
+        path: ログファイルのパス
+        max_bytes: ローテーションするファイルサイズ（0 でローテーションしない）
+        backup_count: 保持するローテーション済みファイル数
+        hash_queries: クエリを SHA-256 で記録するかどうか
+        written: 書き込んだエントリ数
+        dropped: キュー溢れで破棄したエントリ数
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        hash_queries: bool = False,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        batch_size: int = 256,
+        thread_name: str = "kb-query-log",
+    ) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.hash_queries = hash_queries
+        self.written = 0
+        self.dropped = 0
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._queue: queue.Queue[dict[str, Any] | None] = queue.Queue(maxsize=max_queue)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=thread_name, daemon=True
+        )
+        self._thread.start()
+
+    def record(self, entry: dict[str, Any]) -> None:
+        """
+        エントリを書き込みキューに積む（ブロックしない）。
+
+        Args:
+            entry: 記録するエントリ（query を含む場合は hash_queries に従って変換）
+        """
+        if self._closed.is_set():
+            return
+        if self.hash_queries and "query" in entry:
+            entry = dict(entry)
+            entry["query_hash"] = hash_query(entry.pop("query"))
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        キューに残ったエントリを書き出して停止する。
+
+        Args:
+            timeout: 書き込みスレッドの終了を待つ最大秒数
+        """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        """キューからエントリを取り出し、バッチでファイルに追記する。"""
+        stop = False
+        while not stop:
+            try:
+                first = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                continue
+            batch: list[dict[str, Any]] = []
+            if first is None:
+                stop = True
+            else:
+                batch.append(first)
+            # 溜まっているエントリをまとめて取り出す
+            while len(batch) < self._batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except OSError:
+                    # ログ書き込みの失敗でサーバーを止めない
+                    self.dropped += len(batch)
+
+    def _write_batch(self, batch: list[dict[str, Any]]) -> None:
+        """バッチを 1 回の書き込みで追記し、必要に応じてローテーションする。"""
+        data = "".join(
+            json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for entry in batch
+        ).encode("utf-8")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.max_bytes > 0 and self.path.exists() and (
+            self.path.stat().st_size + len(data) > self.max_bytes
+        ):
+            self._rotate()
+        with open(self.path, "ab") as f:
+            f.write(data)
+        self.written += len(batch)
+
+    def _rotate(self) -> None:
+        """<path> を <path>.1 に、<path>.N を <path>.N+1 に繰り下げる。"""
+        if self.backup_count <= 0:
+            self.path.unlink(missing_ok=True)
+            return
+        paths = _rotated_paths(self.path, self.backup_count)
+        paths[0].unlink(missing_ok=True)
+        for older, newer in zip(paths, paths[1:]):
+            if newer.exists():
+                os.replace(newer, older)
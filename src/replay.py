@@ -0,0 +1,229 @@
+"""
+クエリログリプレイモジュール
+
+記録されたクエリログを任意のバックエンドに対して再実行し、
+レイテンシや結果件数を集計する。記録時と同じ間隔、または
+speed 倍に加速した間隔で再生できる（speed=0 で待機なし）。
+
+使用方法:
+    bedrock-kb-replay queries.jsonl --speed 10
+    bedrock-kb-replay queries.jsonl --backend local --local-dir ./samlpe --speed 0
+    bedrock-kb-replay queries.jsonl --speed 0 --cache --overfetch 10
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter
+from collections.abc import Iterable
+from typing import Any, Callable
+
+from src.bedrock_client import (
+    create_client,
+    query_knowledge_base,
+    BedrockAuthenticationError,
+    BedrockKBNotFoundError,
+    BedrockServiceError,
+)
+from src.cache import ResultCache
+from src.chunk_store import ChunkStore
+from src.config import KBConfig, load_config
+from src.profiles import ProfileNotFoundError, select_profile
+from src.query_log import read_query_log
+from src.warmup import parse_logged_query
+
+
+def percentile(values: list[float], ratio: float) -> float:
+    """
+    最近傍順位法でパーセンタイル値を求める。
+
+    Args:
+        values: 値のリスト
+        ratio: 0.0-1.0 の順位（0.95 で p95）
+
+    Returns:
+        float: パーセンタイル値（values が空の場合は 0.0）
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(ratio * len(ordered)) - 1))
+    return ordered[index]
+
+
+def replay(
+    entries: Iterable[dict[str, Any]],
+    client: Any,
+    config: KBConfig,
+    speed: float = 1.0,
+    cache: ResultCache | None = None,
+    limit: int | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+    clock: Callable[[], float] = time.monotonic,
+    target_for: Callable[[str | None], tuple[Any, KBConfig]] | None = None,
+) -> dict[str, Any]:
+    """
+    クエリログのエントリを順に再実行し、集計結果を返す。
+
+    Args:
+        entries: クエリログのエントリ（記録順）
+        client: retrieve(**params) を持つクライアント
+        config: Knowledge Base の設定
+        speed: 再生速度の倍率（1.0 で記録時と同じ間隔、0 で待機なし）
+        cache: 再生時に使用する検索結果キャッシュ（オプション）
+        limit: 再生する最大エントリ数
+        sleep: 待機関数（テスト用）
+        clock: 単調増加する時計（テスト用）
+        target_for: エントリの kb（KB プロファイル名）から (クライアント, 設定) を返す関数
+            （オプション）。指定時は記録時のプロファイルの検索先で再実行し、存在しない
+            プロファイルのエントリは skipped に数える
+
+    Returns:
+        dict: replayed / skipped / errors / latency_ms / mean_result_count を含む集計
+    """
+    latencies: list[float] = []
+    result_counts: list[int] = []
+    errors: Counter[str] = Counter()
+    skipped = 0
+    first_ts: float | None = None
+    started = clock()
+
+    for entry in entries:
+        if limit is not None and len(latencies) + sum(errors.values()) >= limit:
+            break
+        logged = parse_logged_query(entry)
+        target = (client, config)
+        if logged is not None and target_for is not None:
+            try:
+                target = target_for(logged.kb)
+            except (ValueError, ProfileNotFoundError):
+                logged = None
+        if logged is None:
+            skipped += 1
+            continue
+
+        # 記録時の間隔を speed 倍に縮めて待機
+        ts = entry.get("ts")
+        if speed > 0 and isinstance(ts, (int, float)):
+            first_ts = ts if first_ts is None else first_ts
+            delay = started + (ts - first_ts) / speed - clock()
+            if delay > 0:
+                sleep(delay)
+
+        call_started = clock()
+        try:
+            response = query_knowledge_base(
+                client=target[0],
+                config=target[1],
+                query=logged.query,
+                max_results=logged.max_results,
+                metadata_filter=logged.metadata_filter,
+                search_type=logged.search_type,
+                cache=cache,
+            )
+        except (BedrockAuthenticationError, BedrockKBNotFoundError, BedrockServiceError) as e:
+            errors[type(e).__name__] += 1
+            continue
+        latencies.append((clock() - call_started) * 1000)
+        result_counts.append(len(response.results))
+
+    summary: dict[str, Any] = {
+        "replayed": len(latencies),
+        "skipped": skipped,
+        "errors": dict(errors),
+        "elapsed_seconds": round(clock() - started, 3),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+        },
+        "mean_result_count": (
+            round(sum(result_counts) / len(result_counts), 3) if result_counts else 0.0
+        ),
+    }
+    if cache is not None:
+        summary["cache"] = cache.stats()
+    return summary
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    リプレイ CLI のエントリーポイント。
+
+    バックエンドは環境変数（BEDROCK_KB_BACKEND など）から読み込み、
+    --backend / --local-dir で上書きできる。結果は JSON で標準出力に書き出す。
+    """
+    parser = argparse.ArgumentParser(
+        prog="bedrock-kb-replay",
+        description="クエリログを Knowledge Base に対して再実行する",
+    )
+    parser.add_argument("log", help="クエリログ（JSONL）のパス")
+    parser.add_argument(
+        "--speed", type=float, default=1.0,
+        help="再生速度の倍率（1: 記録時と同じ間隔、0: 待機なし、デフォルト: 1）",
+    )
+    parser.add_argument("--limit", type=int, default=None, help="再生する最大エントリ数")
+    parser.add_argument("--backend", choices=["bedrock", "local"], help="バックエンドの上書き")
+    parser.add_argument("--local-dir", help="local バックエンドのコーパスディレクトリ")
+    parser.add_argument(
+        "--cache", action="store_true",
+        help="設定されたキャッシュを有効にして再生する（デフォルトはキャッシュなし）",
+    )
+    parser.add_argument(
+        "--overfetch", type=int, default=None,
+        help="キャッシュ使用時に取得する件数の上限（BEDROCK_KB_OVERFETCH の上書き）",
+    )
+    args = parser.parse_args(argv)
+
+    if args.backend:
+        os.environ["BEDROCK_KB_BACKEND"] = args.backend
+    if args.local_dir:
+        os.environ["BEDROCK_KB_LOCAL_DIR"] = args.local_dir
+    if args.overfetch is not None:
+        os.environ["BEDROCK_KB_OVERFETCH"] = str(args.overfetch)
+    try:
+        config = load_config()
+        client = create_client(config)
+    except (OSError, ValueError) as e:
+        print(f"設定エラー: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    cache = None
+    if args.cache and config.cache_ttl_seconds > 0:
+        try:
+            chunk_store = ChunkStore(config.cache_compression)
+        except ValueError as e:
+            print(f"設定エラー: {e}", file=sys.stderr)
+            sys.exit(2)
+        cache = ResultCache(
+            config.cache_max_entries, config.cache_ttl_seconds, chunk_store=chunk_store,
+            max_bytes=config.cache_max_bytes,
+        )
+
+    # KB プロファイルを使用する場合は、エントリの kb のプロファイルに対して再実行する
+    targets: dict[str | None, tuple[Any, KBConfig]] = {}
+
+    def target_for(kb: str | None) -> tuple[Any, KBConfig]:
+        if kb not in targets:
+            profile = select_profile(config, kb)
+            targets[kb] = (create_client(profile), profile)
+        return targets[kb]
+
+    summary = replay(
+        read_query_log(args.log),
+        client,
+        config,
+        speed=args.speed,
+        cache=cache,
+        limit=args.limit,
+        target_for=target_for if config.profiles_path else None,
+    )
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
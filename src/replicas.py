@@ -0,0 +1,250 @@
+"""
+レプリカルーティングモジュール
+
+複数のリージョン・アカウントに複製した Knowledge Base について、
+レイテンシとエラー率の指数移動平均（EWMA）を記録し、呼び出しごとに
+最も良い複製から順に検索先を選ぶ。スロットリングが発生した複製は
+一定時間、候補の最後に回す。
+
+しばらく使われていない複製はバックグラウンドで計測（プローブ）し、
+劣化から回復した複製にも再びトラフィックが戻るようにする。
+
+メトリクス:
+    replicas.<リージョン:KB ID>.latency_ms: レイテンシの EWMA（ゲージ）
+    replicas.<リージョン:KB ID>.error_rate: エラー率の EWMA（ゲージ）
+    replicas.failover: 先頭以外の複製で成功した回数
+    replicas.probes: プローブの実行回数
+"""
+
+import threading
+import time
+from typing import Any, Callable
+
+from src.config import Replica
+from src.metrics import Metrics, metrics
+
+
+# EWMA の平滑化係数（新しい観測値の重み）
+DEFAULT_ALPHA = 0.2
+
+# エラー率をレイテンシに換算する係数（score = latency × (1 + ERROR_PENALTY × error_rate)）
+ERROR_PENALTY = 4.0
+
+# スロットリングが発生した複製を候補の最後に回す時間（秒）
+THROTTLE_COOLDOWN_SECONDS = 5.0
+
+
+class _ReplicaState:
+    """複製ごとの計測値（ReplicaRouter のロック内でのみ更新する）。"""
+
+    def __init__(self) -> None:
+        self.latency_ms: float | None = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.throttles = 0
+        self.last_used = float("-inf")
+        self.cooldown_until = float("-inf")
+
+
+class ReplicaRouter:
+    """
+    EWMA レイテンシとエラー率で複製 Knowledge Base を順位付けする（スレッドセーフ）。
+
+    Attributes:
+        replicas: 複製 Knowledge Base（先頭が同順位時の優先）
+        alpha: EWMA の平滑化係数
+        probe_interval_seconds: 使われていない複製を計測する間隔（秒、0 で無効）
+    """
+
+    def __init__(
+        self,
+        replicas: tuple[Replica, ...],
+        alpha: float = DEFAULT_ALPHA,
+        probe_interval_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        registry: Metrics = metrics,
+    ) -> None:
+        if not replicas:
+            raise ValueError("replicas を 1 つ以上指定してください")
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha は 0 より大きく 1 以下である必要があります")
+        self.replicas = tuple(replicas)
+        self.alpha = alpha
+        self.probe_interval_seconds = probe_interval_seconds
+        self._clock = clock
+        self._metrics = registry
+        self._states = {replica: _ReplicaState() for replica in self.replicas}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def ranked(self) -> list[Replica]:
+        """
+        検索先の候補を良い順に返す。
+
+        計測値の無い複製を優先して試し、それ以外はエラー率で補正した
+        EWMA レイテンシの昇順とする。スロットリング後の待機中の複製は最後に回す。
+
+        Returns:
+            list[Replica]: 順位付けした複製
+        """
+        now = self._clock()
+        with self._lock:
+            def key(indexed: tuple[int, Replica]) -> tuple[bool, float, int]:
+                index, replica = indexed
+                state = self._states[replica]
+                score = (
+                    0.0 if state.latency_ms is None
+                    else state.latency_ms * (1 + ERROR_PENALTY * state.error_rate)
+                )
+                return (state.cooldown_until > now, score, index)
+
+            return [replica for _index, replica in sorted(enumerate(self.replicas), key=key)]
+
+    def record_success(self, replica: Replica, latency_ms: float) -> None:
+        """
+        呼び出しの成功を記録する。
+
+        Args:
+            replica: 呼び出した複製
+            latency_ms: 呼び出しのレイテンシ（ミリ秒）
+        """
+        with self._lock:
+            state = self._states[replica]
+            state.latency_ms = (
+                latency_ms if state.latency_ms is None
+                else self.alpha * latency_ms + (1 - self.alpha) * state.latency_ms
+            )
+            state.error_rate *= 1 - self.alpha
+            state.requests += 1
+            state.last_used = self._clock()
+            self._publish(replica, state)
+
+    def record_failure(self, replica: Replica, throttled: bool = False) -> None:
+        """
+        呼び出しの失敗を記録する。
+
+        Args:
+            replica: 呼び出した複製
+            throttled: スロットリングによる失敗かどうか（一定時間、候補の最後に回す）
+        """
+        with self._lock:
+            state = self._states[replica]
+            state.error_rate = self.alpha + (1 - self.alpha) * state.error_rate
+            state.requests += 1
+            state.failures += 1
+            state.last_used = self._clock()
+            if throttled:
+                state.throttles += 1
+                state.cooldown_until = state.last_used + THROTTLE_COOLDOWN_SECONDS
+            self._publish(replica, state)
+
+    def record_failover(self) -> None:
+        """先頭以外の候補で成功したことを記録する。"""
+        self._metrics.increment("replicas.failover")
+
+    def idle_replicas(self) -> list[Replica]:
+        """
+        probe_interval_seconds 以上使われていない複製を返す。
+
+        Returns:
+            list[Replica]: 計測が必要な複製
+        """
+        now = self._clock()
+        with self._lock:
+            return [
+                replica for replica in self.replicas
+                if now - self._states[replica].last_used >= self.probe_interval_seconds
+            ]
+
+    def probe(
+        self,
+        probe_fn: Callable[[Replica], Any],
+        is_throttling: Callable[[BaseException], bool] = lambda _error: False,
+    ) -> int:
+        """
+        使われていない複製を 1 回ずつ呼び出して計測値を更新する。
+
+        Args:
+            probe_fn: 複製を呼び出す関数（失敗時は例外を送出する）
+            is_throttling: 例外がスロットリングによるものか判定する関数
+
+        Returns:
+            int: 計測した複製の数
+        """
+        idle = self.idle_replicas()
+        for replica in idle:
+            self._metrics.increment("replicas.probes")
+            started = time.perf_counter()
+            try:
+                probe_fn(replica)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self.record_failure(replica, throttled=is_throttling(e))
+                continue
+            self.record_success(replica, (time.perf_counter() - started) * 1000)
+        return len(idle)
+
+    def start(
+        self,
+        probe_fn: Callable[[Replica], Any],
+        is_throttling: Callable[[BaseException], bool] = lambda _error: False,
+    ) -> None:
+        """
+        バックグラウンドのプローブスレッドを開始する（間隔が 0 または開始済みの場合は何もしない）。
+
+        Args:
+            probe_fn: 複製を呼び出す関数
+            is_throttling: 例外がスロットリングによるものか判定する関数
+        """
+        if self.probe_interval_seconds <= 0 or (
+            self._thread is not None and self._thread.is_alive()
+        ):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(probe_fn, is_throttling),
+            name="kb-replica-probe", daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """バックグラウンドのプローブスレッドを停止する。"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self) -> dict[str, Any]:
+        """
+        複製ごとの計測値を返す。
+
+        Returns:
+            dict: 複製の識別名 -> latency_ms / error_rate / requests / failures / throttles
+        """
+        with self._lock:
+            return {
+                replica.name: {
+                    "latency_ms": state.latency_ms,
+                    "error_rate": state.error_rate,
+                    "requests": state.requests,
+                    "failures": state.failures,
+                    "throttles": state.throttles,
+                }
+                for replica, state in self._states.items()
+            }
+
+    def _run(
+        self,
+        probe_fn: Callable[[Replica], Any],
+        is_throttling: Callable[[BaseException], bool],
+    ) -> None:
+        """probe_interval_seconds ごとに probe() を実行する。"""
+        while not self._stop_event.wait(self.probe_interval_seconds):
+            self.probe(probe_fn, is_throttling)
+
+    def _publish(self, replica: Replica, state: _ReplicaState) -> None:
+        """計測値をゲージに反映する（ロック取得済みで呼び出す）。"""
+        if state.latency_ms is not None:
+            self._metrics.set_gauge(f"replicas.{replica.name}.latency_ms", state.latency_ms)
+        self._metrics.set_gauge(f"replicas.{replica.name}.error_rate", state.error_rate)
@@ -0,0 +1,186 @@
+"""
+結果セットモジュール
+
+kb_answer で多めに取得（オーバーフェッチ）した検索結果をサーバー側に保持し、
+ハンドルを介して kb_more でページ単位に返す。続きのページは Retrieve API を
+再度呼び出さずにローカルで返すため、エージェントのコンテキストには
+新しいチャンクのみが追加される。
+
+保持する結果セットは TTL・件数上限・合計バイト数上限で制限し、
+上限を超えた場合は最も古く使われた結果セットから削除する。
+"""
+
+import math
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from src.models import RetrievalResult
+
+
+@dataclass(frozen=True)
+class ResultPage:
+    """
+    結果セットの 1 ページ。
+
+    Attributes:
+        handle: 結果セットのハンドル
+        results: このページの検索結果
+        offset: このページの先頭位置
+        total: 結果セット全体の件数
+        query: 結果セットを取得したクエリ（スニペットの作成に使用）
+    """
+    handle: str
+    results: list[RetrievalResult]
+    offset: int
+    total: int
+    query: str = ""
+
+    @property
+    def next_offset(self) -> int | None:
+        """次のページの先頭位置（最後のページの場合は None）"""
+        end = self.offset + len(self.results)
+        return end if end < self.total else None
+
+
+def _result_bytes(result: RetrievalResult) -> int:
+    """検索結果が保持するテキストのおおよそのバイト数を返す。"""
+    return len(result.content.encode("utf-8")) + len(repr(result.location))
+
+
+class ResultSetStore:
+    """
+    TTL・件数・バイト数で制限された結果セットの保管庫（スレッドセーフ）。
+
+    Attributes:
+        ttl_seconds: 結果セットの有効期間（秒、最後のアクセスから）
+        max_sets: 保持する最大結果セット数
+        max_bytes: 保持する結果セットの合計バイト数の上限
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 600.0,
+        max_sets: int = 128,
+        max_bytes: int = 16 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if ttl_seconds <= 0:
+            raise ValueError("ttl_seconds は正の値である必要があります")
+        if max_sets < 1:
+            raise ValueError("max_sets は 1 以上である必要があります")
+        self.ttl_seconds = ttl_seconds
+        self.max_sets = max_sets
+        self.max_bytes = max_bytes
+        self._clock = clock
+        # ハンドル -> (有効期限, 結果, バイト数, クエリ)
+        self._sets: OrderedDict[str, tuple[float, list[RetrievalResult], int, str]] = (
+            OrderedDict()
+        )
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sets)
+
+    def create(self, results: list[RetrievalResult], query: str = "") -> str:
+        """
+        結果セットを保持し、ハンドルを返す。
+
+        1 つの結果セットが max_bytes を超える場合は、収まる件数まで切り詰める。
+
+        Args:
+            results: 保持する検索結果（順位順）
+            query: 結果セットを取得したクエリ
+
+        Returns:
+            str: 結果セットのハンドル
+        """
+        kept: list[RetrievalResult] = []
+        size = 0
+        for result in results:
+            result_size = _result_bytes(result)
+            if kept and size + result_size > self.max_bytes:
+                break
+            kept.append(result)
+            size += result_size
+
+        handle = secrets.token_urlsafe(12)
+        with self._lock:
+            self._purge_expired()
+            self._sets[handle] = (self._clock() + self.ttl_seconds, kept, size, query)
+            self._bytes += size
+            while len(self._sets) > self.max_sets or (
+                self._bytes > self.max_bytes and len(self._sets) > 1
+            ):
+                _handle, evicted = self._sets.popitem(last=False)
+                self._bytes -= evicted[2]
+        return handle
+
+    def page(self, handle: str, offset: int, limit: int) -> ResultPage | None:
+        """
+        結果セットの指定範囲を返し、有効期限を延長する。
+
+        Args:
+            handle: 結果セットのハンドル
+            offset: 先頭位置（0 始まり）
+            limit: 最大件数
+
+        Returns:
+            ResultPage | None: ページ（ハンドルが存在しないか期限切れの場合は None）
+        """
+        with self._lock:
+            entry = self._sets.get(handle)
+            if entry is None:
+                return None
+            expires_at, results, size, query = entry
+            if expires_at <= self._clock():
+                del self._sets[handle]
+                self._bytes -= size
+                return None
+            self._sets[handle] = (self._clock() + self.ttl_seconds, results, size, query)
+            self._sets.move_to_end(handle)
+        return ResultPage(
+            handle=handle,
+            results=results[offset:offset + limit],
+            offset=offset,
+            total=len(results),
+            query=query,
+        )
+
+    def shrink(self, fraction: float = 0.5) -> int:
+        """
+        最も古く使われた結果セットから fraction の割合を削除する（メモリ予算の超過時に使用）。
+
+        Args:
+            fraction: 削除する割合（0 から 1）
+
+        Returns:
+            int: 削除した結果セット数
+        """
+        with self._lock:
+            count = math.ceil(len(self._sets) * min(max(fraction, 0.0), 1.0))
+            for _ in range(count):
+                _handle, evicted = self._sets.popitem(last=False)
+                self._bytes -= evicted[2]
+            return count
+
+    def stats(self) -> dict[str, Any]:
+        """
+        保管庫の統計情報を返す。
+
+        Returns:
+            dict: sets / bytes を含む辞書
+        """
+        with self._lock:
+            return {"sets": len(self._sets), "bytes": self._bytes}
+
+    def _purge_expired(self) -> None:
+        """期限切れの結果セットを削除する（ロック取得済みで呼び出す）。"""
+        now = self._clock()
+        for handle in [h for h, entry in self._sets.items() if entry[0] <= now]:
+            self._bytes -= self._sets.pop(handle)[2]
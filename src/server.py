@@ -5,26 +5,652 @@ FastMCP を使用して Bedrock Knowledge Base 検索ツールを提供する。
 Retrieve API を使用し、純粋な検索機能のみを提供（回答生成なし）。
 """
 
+import atexit
+import functools
+import inspect
 import json
-import boto3
+import logging
+import threading
+import time
+import tracemalloc
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    TimeoutError as FutureTimeoutError,
+    wait,
+)
+from typing import Any, Callable
+
+import anyio.to_thread
 from fastmcp import FastMCP
+from fastmcp.exceptions import ResourceError
 
-from src.config import load_config
-from src.validation import validate_query, ValidationError
+from src.broker import (
+    BrokerClient,
+    BrokerError,
+    BrokerRemoteError,
+    BrokerUnavailableError,
+    connect_or_start,
+    is_supported as broker_supported,
+)
+from src.adaptive import (
+    AUTO_INITIAL_RESULTS,
+    AUTO_MAX_RESULTS,
+    adaptive_retrieve,
+    cut_below,
+    score_threshold,
+)
+from src.admission import PRIORITY_NORMAL, AdmissionController, OverloadedError
+from src.cache import NegativeCache, ResultCache
+from src.chunk_store import ChunkStore, RecentChunkCache, chunk_hash
+from src.config import BACKEND_LOCAL, KBConfig, load_config
+from src.deadline import Deadline, DeadlineExceededError
+from src.decompose import decompose_query, merge_sub_results
+from src.ingestion import IngestionJob, IngestionWatcher
+from src.keepalive import connection_stats
+from src.memory import MemoryBudget, peak_rss_bytes, rss_bytes, top_allocations
+from src.metrics import metrics
+from src.model_bundle import start_bundle_build
+from src.models import KBResponse, RetrievalResult
+from src.profiles import ProfileNotFoundError, profile_configs, select_profile
+from src.validation import (
+    validate_fetch_limit,
+    validate_max_results,
+    validate_metadata_filter,
+    validate_min_score,
+    validate_offset,
+    validate_priority,
+    validate_query,
+    validate_search_type,
+    validate_session,
+    validate_timeout_ms,
+    ValidationError,
+)
 from src.bedrock_client import (
+    build_cache_key,
+    client_pool_stats,
+    concurrency_stats,
+    create_agent_client,
+    create_client,
+    is_cache_key_for,
     query_knowledge_base,
+    replica_stats,
     BedrockAuthenticationError,
     BedrockKBNotFoundError,
     BedrockServiceError,
 )
+from src.client_pool import CLIENT_ESTIMATED_BYTES
+from src.result_sets import ResultPage, ResultSetStore
+from src.sessions import SessionStore
+from src.snippet import CHUNK_URI_PREFIX, make_snippet
+from src.structured_log import (
+    StructuredLogHandler,
+    configure_logging,
+    error_fields,
+    is_enabled as log_enabled,
+    log_event,
+)
+from src.query_log import (
+    CACHE_HIT,
+    CACHE_MISS,
+    CACHE_OFF,
+    QueryLogWriter,
+    read_query_log,
+)
+from src.warmup import CacheWarmer, WarmupQuery, select_warmup_queries
 
 
 # FastMCP サーバーを初期化（要件 4.1: stdio トランスポートモード）
 mcp = FastMCP("kk-bedrock-agent-hub-mcp")
 
 
+# ブローカーデーモンへの転送（シムとして動作する場合のみ start_broker_shim で設定）
+_broker: BrokerClient | None = None
+
+# デーモンで送出された例外のうち、シムで同じ種類の例外として送出するもの
+_REMOTE_ERRORS: dict[str, type[Exception]] = {"ResourceError": ResourceError}
+
+# ブローカーデーモンが受け付けるツール・リソースの関数（_brokered で登録）
+_broker_handlers: dict[str, Callable[..., Any]] = {}
+
+
+def _brokered(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    シムとして動作している場合、ツール・リソースの呼び出しをブローカーデーモンに転送する。
+
+    デーモンに接続できない（起動し直せない）場合はこのプロセスで実行する。
+    デーモン自身では _broker が None のため、常にこのプロセスで実行する。
+    """
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        broker = _broker
+        if broker is None:
+            return fn(*args, **kwargs)
+        arguments = dict(signature.bind(*args, **kwargs).arguments)
+        try:
+            return broker.call(fn.__name__, arguments)
+        except BrokerUnavailableError:
+            metrics.increment("broker.fallbacks")
+            return fn(*args, **kwargs)
+        except BrokerRemoteError as e:
+            raise _REMOTE_ERRORS.get(e.error_type, BrokerError)(str(e)) from None
+
+    _broker_handlers[fn.__name__] = wrapper
+    return wrapper
+
+
+def _in_worker_thread(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    ブロックする同期関数を、ワーカースレッドで実行するコルーチン関数にする。
+
+    FastMCP は同期関数のツールをイベントループ上でそのまま呼び出すため、stdio モードでは
+    呼び出しが 1 件ずつ直列に実行され、同時に届いた呼び出しがアドミッション制御に届かない。
+    """
+
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs))
+
+    return wrapper
+
+
+# プロセス内で共有する検索結果キャッシュ（初回使用時に作成）
+_result_cache: ResultCache | None = None
+_result_cache_lock = threading.Lock()
+
+
+def _get_result_cache(config: KBConfig) -> ResultCache | None:
+    """
+    プロセス内で共有する検索結果キャッシュを返す。
+
+    チャンク本文は ChunkStore で重複排除し、cache_compression に従って圧縮する。
+
+    Args:
+        config: Knowledge Base の設定
+
+    Returns:
+        ResultCache | None: キャッシュ（cache_ttl_seconds が 0 の場合は None）
+
+    Raises:
+        ValueError: 圧縮方式が利用できない場合（zstandard 未インストールなど）
+    """
+    global _result_cache  # pylint: disable=global-statement
+    if config.cache_ttl_seconds <= 0:
+        return None
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(
+                max_entries=config.cache_max_entries,
+                ttl_seconds=config.cache_ttl_seconds,
+                chunk_store=ChunkStore(config.cache_compression),
+                max_bytes=config.cache_max_bytes,
+            )
+        return _result_cache
+
+
+# プロセス内で共有する失敗キャッシュ（初回使用時に作成）
+_negative_cache: NegativeCache | None = None
+_negative_cache_lock = threading.Lock()
+
+
+def _get_negative_cache(config: KBConfig) -> NegativeCache | None:
+    """
+    プロセス内で共有する失敗キャッシュを返す。
+
+    Args:
+        config: Knowledge Base の設定
+
+    Returns:
+        NegativeCache | None: キャッシュ（negative_cache_ttl_seconds が 0 の場合は None）
+    """
+    global _negative_cache  # pylint: disable=global-statement
+    if config.negative_cache_ttl_seconds <= 0:
+        return None
+    with _negative_cache_lock:
+        if _negative_cache is None:
+            _negative_cache = NegativeCache(ttl_seconds=config.negative_cache_ttl_seconds)
+        return _negative_cache
+
+
+# プロセス内で共有するクエリログ（BEDROCK_KB_QUERY_LOG 設定時のみ作成）
+_query_log: QueryLogWriter | None = None
+_query_log_lock = threading.Lock()
+
+
+def _get_query_log(config: KBConfig) -> QueryLogWriter | None:
+    """
+    プロセス内で共有するクエリログを返す。
+
+    Args:
+        config: Knowledge Base の設定
+
+    Returns:
+        QueryLogWriter | None: クエリログ（query_log_path 未設定の場合は None）
+    """
+    global _query_log  # pylint: disable=global-statement
+    if not config.query_log_path:
+        return None
+    with _query_log_lock:
+        if _query_log is None:
+            _query_log = QueryLogWriter(
+                config.query_log_path,
+                max_bytes=config.query_log_max_bytes,
+                backup_count=config.query_log_backups,
+                hash_queries=config.query_log_hash,
+            )
+            # 終了時にキューに残ったエントリを書き出す
+            atexit.register(_query_log.close)
+        return _query_log
+
+
+# プロセス内で共有する構造化ログのハンドラー（BEDROCK_KB_LOG 設定時のみ start_logging で作成）
+_log_handler: StructuredLogHandler | None = None
+_log_handler_lock = threading.Lock()
+
+
+def start_logging() -> StructuredLogHandler | None:
+    """
+    BEDROCK_KB_LOG が設定されている場合、構造化ログのファイルへの記録を開始する。
+
+    stdio サーバー・シム・ブローカーデーモンの起動時に呼び出す（2 回目以降は何もしない）。
+
+    Returns:
+        StructuredLogHandler | None: 追加したハンドラー（無効な場合は None）
+    """
+    global _log_handler  # pylint: disable=global-statement
+    try:
+        config = load_config()
+    except ValueError:
+        return None
+    if not config.log_path:
+        return None
+    with _log_handler_lock:
+        if _log_handler is None:
+            _log_handler = configure_logging(
+                config.log_path,
+                level=config.log_level,
+                sample_rates=dict(config.log_sample_rates),
+                max_bytes=config.log_max_bytes,
+                backup_count=config.log_backups,
+            )
+            # 終了時にキューに残ったレコードを書き出す
+            atexit.register(_log_handler.close)
+        return _log_handler
+
+
+# プロセス内で共有するページング用結果セット（初回使用時に作成）
+_result_sets: ResultSetStore | None = None
+_result_sets_lock = threading.Lock()
+
+
+def _get_result_sets(config: KBConfig) -> ResultSetStore:
+    """
+    プロセス内で共有するページング用結果セットの保管庫を返す。
+
+    Args:
+        config: Knowledge Base の設定
+
+    Returns:
+        ResultSetStore: 結果セットの保管庫
+    """
+    global _result_sets  # pylint: disable=global-statement
+    with _result_sets_lock:
+        if _result_sets is None:
+            _result_sets = ResultSetStore(
+                ttl_seconds=config.result_set_ttl_seconds,
+                max_sets=config.result_set_max_sets,
+                max_bytes=config.result_set_max_bytes,
+            )
+        return _result_sets
+
+
+# スニペットモードで返したチャンクの全文（kb://chunk/<hash> リソースで参照）
+_recent_chunks = RecentChunkCache()
+
+
+# セッションごとの送信済みチャンク（session を指定した呼び出しで使用）
+_sessions: SessionStore | None = None
+_sessions_lock = threading.Lock()
+
+
+def _get_sessions(config: KBConfig) -> SessionStore:
+    """
+    プロセス内で共有するセッションの送信済みチャンクの記録を返す。
+
+    Args:
+        config: Knowledge Base の設定
+
+    Returns:
+        SessionStore: 送信済みチャンクの記録
+    """
+    global _sessions  # pylint: disable=global-statement
+    with _sessions_lock:
+        if _sessions is None:
+            _sessions = SessionStore(
+                ttl_seconds=config.session_ttl_seconds,
+                max_sessions=config.session_max_sessions,
+            )
+        return _sessions
+
+
+def _delivered_before(
+    config: KBConfig,
+    session: str | None,
+    delta: bool,
+    results: list[RetrievalResult],
+) -> set[str]:
+    """
+    返す検索結果をセッションの送信済みとして記録し、参照のみで返すチャンクのハッシュを返す。
+
+    Args:
+        config: Knowledge Base の設定
+        session: セッション ID（None の場合は記録しない）
+        delta: 送信済みのチャンクを参照のみで返すかどうか（False でも記録は行う）
+        results: 今回返す検索結果
+
+    Returns:
+        set[str]: 参照のみで返すチャンクのハッシュ
+    """
+    if session is None:
+        return set()
+    store = _get_sessions(config)
+    hashes = [chunk_hash(result.content, result.location) for result in results]
+    repeated = store.deliver(session, hashes)
+    if not delta:
+        # 全文で返すが、以降の呼び出しのために送信済みとして記録する
+        repeated = set()
+    omitted = [result for h, result in zip(hashes, results) if h in repeated]
+    store.record_omitted(
+        len(omitted), sum(len(result.content.encode("utf-8")) for result in omitted)
+    )
+    store.record_delivered(len(results) - len(omitted))
+    return repeated
+
+
+# デッドライン付きの検索を実行するワーカー数（max_in_flight が大きい場合はそれに合わせる）
+_RETRIEVE_WORKERS = 16
+
+# デッドライン付きの検索を実行するスレッドプール（初回使用時に作成）
+_retrieve_executor: ThreadPoolExecutor | None = None
+_retrieve_executor_lock = threading.Lock()
+
+# Retrieve API の同時実行数を制限するアドミッション制御（初回使用時に作成）
+_admission: AdmissionController | None = None
+_admission_lock = threading.Lock()
+
+
+def _get_retrieve_executor(max_workers: int = _RETRIEVE_WORKERS) -> ThreadPoolExecutor:
+    """
+    デッドライン付きの検索を実行する共有スレッドプールを返す。
+
+    Args:
+        max_workers: 初回作成時のワーカー数
+
+    Returns:
+        ThreadPoolExecutor: 共有スレッドプール
+    """
+    global _retrieve_executor  # pylint: disable=global-statement
+    with _retrieve_executor_lock:
+        if _retrieve_executor is None:
+            _retrieve_executor = ThreadPoolExecutor(
+                max_workers=max(max_workers, _RETRIEVE_WORKERS),
+                thread_name_prefix="kb-retrieve",
+            )
+        return _retrieve_executor
+
+
+def _get_admission(config: KBConfig) -> AdmissionController | None:
+    """
+    プロセス内で共有するアドミッション制御を返す。
+
+    Args:
+        config: Knowledge Base の設定
+
+    Returns:
+        AdmissionController | None: アドミッション制御（max_in_flight が 0 の場合は None）
+    """
+    global _admission  # pylint: disable=global-statement
+    if config.max_in_flight <= 0:
+        return None
+    with _admission_lock:
+        if _admission is None:
+            _admission = AdmissionController(
+                max_in_flight=config.max_in_flight,
+                max_queue=config.max_queue,
+            )
+        return _admission
+
+
+def _start_retrieval(
+    fn: Callable[[], KBResponse],
+    deadline: Deadline,
+    admission: AdmissionController | None = None,
+    priority: str = PRIORITY_NORMAL,
+) -> Future:
+    """
+    実行枠を取得してから共有スレッドプールで fn を開始する。
+
+    実行枠の待機は呼び出し元のスレッドで行うため、待ち行列が満杯の場合は
+    スレッドプールに投入する前に拒否される。実行枠は fn の完了時に返却する
+    （デッドラインで待機を打ち切った後も、実行中の間は枠を占有する）。
+
+    Args:
+        fn: 実行する検索処理
+        deadline: 呼び出しのデッドライン（実行枠の待機にも適用する）
+        admission: アドミッション制御（None の場合は待機しない）
+        priority: 実行枠を待機する優先度
+
+    Returns:
+        Future: fn の実行結果
+
+    Raises:
+        OverloadedError: 待ち行列が満杯の場合
+        DeadlineExceededError: 実行枠を待機中にデッドラインを超過した場合
+    """
+    if admission is not None:
+        admission.acquire(priority, deadline.remaining_seconds())
+    workers = admission.max_in_flight if admission is not None else _RETRIEVE_WORKERS
+    try:
+        future = _get_retrieve_executor(workers).submit(fn)
+    except BaseException:
+        if admission is not None:
+            admission.release()
+        raise
+    if admission is not None:
+        future.add_done_callback(lambda _future: admission.release())
+    return future
+
+
+def _call_with_deadline(
+    fn: Callable[[], KBResponse],
+    deadline: Deadline,
+    admission: AdmissionController | None = None,
+    priority: str = PRIORITY_NORMAL,
+) -> KBResponse:
+    """
+    デッドラインまでに完了しない場合は待機を打ち切って fn を実行する。
+
+    botocore のタイムアウトは残り時間から導出しているが、リトライ間の
+    待機なども含めて確実に打ち切るため、ワーカースレッドで実行して待つ。
+
+    Args:
+        fn: 実行する検索処理
+        deadline: 呼び出しのデッドライン
+        admission: アドミッション制御（None の場合は待機しない）
+        priority: 実行枠を待機する優先度
+
+    Returns:
+        KBResponse: fn の戻り値
+
+    Raises:
+        OverloadedError: 待ち行列が満杯の場合
+        DeadlineExceededError: デッドラインまでに完了しなかった場合
+    """
+    if deadline.unlimited:
+        if admission is None:
+            return fn()
+        with admission.admit(priority):
+            return fn()
+    future = _start_retrieval(fn, deadline, admission, priority)
+    try:
+        return future.result(timeout=deadline.remaining_seconds())
+    except FutureTimeoutError:
+        future.cancel()
+        raise DeadlineExceededError(
+            f"タイムアウトしました（timeout_ms={deadline.timeout_ms:g}）"
+        ) from None
+
+
+def _retrieve_decomposed(
+    sub_queries: list[str],
+    retrieve: Callable[[str, list[RetrievalResult]], KBResponse],
+    max_results: int,
+    deadline: Deadline,
+    admission_for: Callable[[str], AdmissionController | None] = lambda _sub_query: None,
+    priority: str = PRIORITY_NORMAL,
+) -> KBResponse:
+    """
+    サブクエリを並列に検索し、割り当て数に従って統合する。
+
+    デッドラインまでに完了しなかったサブクエリは取得済みの結果のみを、
+    失敗した（または過負荷で拒否された）サブクエリは結果なしとして統合し、
+    partial=True とする。
+
+    Args:
+        sub_queries: サブクエリのリスト
+        retrieve: (サブクエリ, 途中結果を追加するリスト) を受け取る検索関数
+        max_results: 統合後の最大結果数
+        deadline: 呼び出しのデッドライン
+        admission_for: サブクエリごとのアドミッション制御を返す関数
+            （キャッシュ済みのサブクエリは None を返して実行枠を待たない）
+        priority: 実行枠を待機する優先度
+
+    Returns:
+        KBResponse: 統合したレスポンス
+
+    Raises:
+        BedrockAuthenticationError, BedrockKBNotFoundError, BedrockServiceError,
+        OverloadedError:
+            全てのサブクエリが失敗した場合（最初のサブクエリの例外）
+    """
+    partials: list[list[RetrievalResult]] = [[] for _ in sub_queries]
+    futures: list[Future | BaseException] = []
+    for sub_query, partial in zip(sub_queries, partials):
+        try:
+            futures.append(_start_retrieval(
+                lambda q=sub_query, p=partial: retrieve(q, p),
+                deadline,
+                admission_for(sub_query),
+                priority,
+            ))
+        except (OverloadedError, DeadlineExceededError) as e:
+            futures.append(e)
+    done, _pending = wait(
+        [f for f in futures if isinstance(f, Future)], timeout=deadline.remaining_seconds()
+    )
+
+    responses: list[KBResponse | None] = []
+    errors: list[BaseException] = []
+    for future, partial in zip(futures, partials):
+        if isinstance(future, DeadlineExceededError):
+            responses.append(KBResponse(results=[], partial=True))
+            continue
+        if isinstance(future, BaseException):
+            errors.append(future)
+            responses.append(None)
+            continue
+        if future not in done:
+            future.cancel()
+            responses.append(KBResponse(results=list(partial), partial=True))
+            continue
+        error = future.exception()
+        if error is None:
+            responses.append(future.result())
+        elif isinstance(error, DeadlineExceededError):
+            responses.append(KBResponse(results=list(partial), partial=True))
+        else:
+            errors.append(error)
+            responses.append(None)
+
+    if errors and len(errors) == len(futures):
+        raise errors[0]
+    return merge_sub_results(responses, max_results)
+
+
+def _format_results(
+    results: list[RetrievalResult],
+    query: str = "",
+    snippet_chars: int | None = None,
+    repeated: set[str] | None = None,
+) -> list[dict[str, Any]]:
+    """
+    検索結果を content / location / score の辞書のリストに変換する（要件 2.2, 2.3, 2.5）。
+
+    snippet_chars を指定した場合は content の代わりにクエリ周辺のスニペットと
+    全文を読み込むための kb://chunk/<hash> リソース URI を返す。
+    repeated に含まれるチャンク（セッションで送信済み）は本文を含めず、
+    uri / location / score と "repeated": true のみを返す。
+    """
+    formatted = []
+    for result in results:
+        if repeated and chunk_hash(result.content, result.location) in repeated:
+            formatted.append({
+                "uri": CHUNK_URI_PREFIX + _recent_chunks.put(result),
+                "location": result.location,
+                "score": result.score,
+                "repeated": True,
+            })
+        elif snippet_chars is None:
+            formatted.append({
+                "content": result.content,
+                "location": result.location,
+                "score": result.score
+            })
+        else:
+            formatted.append({
+                "snippet": make_snippet(result.content, query, snippet_chars),
+                "uri": CHUNK_URI_PREFIX + _recent_chunks.put(result),
+                "location": result.location,
+                "score": result.score
+            })
+    return formatted
+
+
+def _format_page(
+    page: ResultPage,
+    snippet_chars: int | None = None,
+    repeated: set[str] | None = None,
+) -> str:
+    """結果セットのページを JSON 文字列に変換する。"""
+    return json.dumps({
+        "handle": page.handle,
+        "offset": page.offset,
+        "next_offset": page.next_offset,
+        "total": page.total,
+        "results": _format_results(page.results, page.query, snippet_chars, repeated),
+    }, ensure_ascii=False, indent=2)
+
+
 @mcp.tool()
-def kb_answer(query: str, max_results: int = 4) -> str:
+@_in_worker_thread
+@_brokered
+def kb_answer(
+    query: str,
+    max_results: int | str = 4,
+    metadata_filter: dict[str, Any] | None = None,
+    search_type: str | None = None,
+    timeout_ms: int | None = None,
+    decompose: bool | None = None,
+    fetch_limit: int | None = None,
+    snippet: bool | None = None,
+    priority: str | None = None,
+    kb: str | None = None,
+    session: str | None = None,
+    delta: bool = True,
+    min_score: float | None = None,
+) -> str:
     """
     Amazon Bedrock Knowledge Base を検索し、関連するドキュメントチャンクを返す。
     
@@ -33,81 +659,752 @@ def kb_answer(query: str, max_results: int = 4) -> str:
     
     Args:
         query: Knowledge Base に送信する検索クエリ文字列
-        max_results: 取得するソースチャンクの最大数（デフォルト: 4、範囲: 1-10）
+        max_results: 取得するソースチャンクの最大数（デフォルト: 4、範囲: 1-10）、または "auto"。
+            "auto" の場合は 3 件から検索し、スコア分布の裾が平坦な（最後のチャンクも
+            先頭のスコアの 0.8 倍以上の）場合のみ最大 10 件まで広げ、
+            先頭のスコアの 0.8 倍以上のチャンクのみを返す
+        metadata_filter: メタデータによる絞り込み条件（オプション）。
+            equals / in / startsWith / andAll / orAll をサポート。
+            例: {"equals": {"key": "category", "value": "faq"}}
+        search_type: 検索タイプの上書き（"HYBRID" または "SEMANTIC"、オプション）
+        timeout_ms: 呼び出し全体の時間予算（ミリ秒、オプション）。
+            未指定の場合は BEDROCK_KB_TIMEOUT_MS を使用する
+        decompose: 複合的な質問をサブクエリに分解して並列に検索するかどうか
+            （オプション、未指定の場合は BEDROCK_KB_DECOMPOSE を使用する）。
+            例: "返品ポリシーと保証期間と送料について" は 3 つのサブクエリになる
+        fetch_limit: まとめて取得してサーバー側に保持する件数（オプション、最大 100、
+            未指定の場合は BEDROCK_KB_FETCH_LIMIT を使用する）。max_results より大きい場合は
+            {"handle": ..., "next_offset": ..., "results": [...]} の形式で先頭 max_results 件を返し、
+            続きは kb_more(handle, offset, limit) で Retrieve API を呼ばずに取得できる
+        snippet: content の代わりにクエリ周辺のスニペットと全文のリソース URI
+            （kb://chunk/<hash>）を返すかどうか（オプション、未指定の場合は BEDROCK_KB_SNIPPET）
+        priority: 同時実行数の上限に達している場合の待機の優先度
+            （"high" / "normal" / "low"、デフォルト: "normal"）。
+            待ち行列が満杯の場合は error_type "Overloaded" で即座にエラーを返す
+        kb: 検索先の KB プロファイル名（オプション、BEDROCK_KB_PROFILES のファイルで定義）。
+            未指定の場合はファイルの default、それも無ければ BEDROCK_KB_ID を検索する。
+            プロファイルの search_type / metadata_filter / timeout_ms などは
+            引数を省略した場合のデフォルト値になる
+        session: エージェントのセッション ID（オプション、1-128 文字、UUID など一意な値）。
+            指定した場合、同じセッションで既に返したチャンクは本文を含めず
+            {"uri", "location", "score", "repeated": true} の参照のみを返す。
+            全文が必要な場合は uri（kb://chunk/<hash>）のリソースを読み込む
+        delta: False の場合は session を指定しても送信済みのチャンクを全文で返す
+            （デフォルト: True）
+        min_score: スコアの下限（オプション）。下限未満のチャンクは返さない
     
     Returns:
         str: 検索結果を含む JSON 形式の文字列。各結果には content, location, score を含む。
+            時間予算を超過した場合は {"partial": true, "results": [...]} の形式で
+            取得済みの結果のみを返す（一部のサブクエリが失敗した場合も同様）。
     """
+    # デッドラインはバリデーションを含む呼び出し全体に適用する
+    entered = time.monotonic()
+
     # 入力バリデーション（要件 3.4）
+    # フィルターと検索タイプも API 呼び出し前に検証する
     try:
         validated_query = validate_query(query)
+        validated_filter = (
+            validate_metadata_filter(metadata_filter) if metadata_filter is not None else None
+        )
+        validated_search_type = validate_search_type(search_type)
+        validated_timeout_ms = validate_timeout_ms(timeout_ms)
+        validated_fetch_limit = validate_fetch_limit(fetch_limit)
+        validated_priority = validate_priority(priority)
+        validated_session = validate_session(session)
+        # max_results の範囲チェック（要件 2.4、範囲外は丸める）
+        validated_max_results = validate_max_results(max_results)
+        validated_min_score = validate_min_score(min_score)
     except ValidationError as e:
         return json.dumps({
             "error": True,
             "error_type": "ValidationError",
             "message": str(e)
         }, ensure_ascii=False)
-    
-    # max_results の範囲チェック（要件 2.4）
-    if max_results < 1:
-        max_results = 1
-    elif max_results > 10:
-        max_results = 10
+
+    # auto の場合は最大件数まで広げ得る（返す件数はスコアで決まる）
+    auto = validated_max_results is None
+    max_results = AUTO_MAX_RESULTS if auto else validated_max_results
     
     # 設定を読み込み（要件 1.1, 1.2, 1.3）
     try:
-        config = load_config()
+        config = select_profile(load_config(), kb)
+    except ProfileNotFoundError as e:
+        return json.dumps({
+            "error": True,
+            "error_type": "ValidationError",
+            "message": str(e)
+        }, ensure_ascii=False)
     except ValueError as e:
         return json.dumps({
             "error": True,
             "error_type": "ConfigurationError",
             "message": str(e)
         }, ensure_ascii=False)
+
+    # 引数を省略した場合は KB プロファイルのデフォルト値を使用する
+    if metadata_filter is None:
+        validated_filter = config.default_metadata_filter
+    if search_type is None:
+        validated_search_type = config.default_search_type
+    
+    deadline = Deadline(
+        validated_timeout_ms if validated_timeout_ms is not None else config.request_timeout_ms,
+        started_at=entered,
+    )
+
+    # Bedrock クライアント（またはローカルバックエンド）を作成
+    try:
+        client = create_client(config, deadline)
+        cache = _get_result_cache(config)
+    except (OSError, ValueError) as e:
+        return json.dumps({
+            "error": True,
+            "error_type": "ConfigurationError",
+            "message": str(e)
+        }, ensure_ascii=False)
     
-    # Bedrock クライアントを作成
-    client = boto3.client(
-        "bedrock-agent-runtime",
-        region_name=config.aws_region
+    snippet_chars = (
+        config.snippet_chars
+        if (config.snippet_mode if snippet is None else bool(snippet)) else None
+    )
+
+    # オーバーフェッチする場合は fetch_count 件を取得し、先頭 max_results 件を返す
+    fetch_count = max(
+        max_results,
+        validated_fetch_limit if validated_fetch_limit is not None else config.fetch_limit,
     )
+
+    # 複合的な質問はサブクエリに分解する（分解できない場合は元のクエリのみ）
+    use_decompose = config.decompose_queries if decompose is None else bool(decompose)
+    sub_queries = (
+        decompose_query(validated_query, config.decompose_max_sub_queries)
+        if use_decompose else [validated_query]
+    )
+
+    # auto で分解・オーバーフェッチしない場合は少ない件数から広げる
+    # （それ以外の auto は最大件数で検索してスコアで絞り込む）
+    adaptive = auto and len(sub_queries) == 1 and fetch_count == max_results
+    first_count = AUTO_INITIAL_RESULTS if adaptive else fetch_count
+
+    query_log = _get_query_log(config)
+    cache_outcome = CACHE_OFF
+    if cache is not None:
+        # キャッシュ結果はクエリログ・構造化ログの記録時のみ判定する
+        # （全サブクエリがヒットした場合のみ hit）
+        cache_outcome = CACHE_HIT if (query_log is not None or log_enabled()) and all(
+            cache.contains(build_cache_key(
+                config, sub_query, first_count, validated_filter, validated_search_type
+            ))
+            for sub_query in sub_queries
+        ) else CACHE_MISS
     
     # Knowledge Base に Retrieve API でクエリを実行（要件 2.1）
-    try:
-        response = query_knowledge_base(
+    started = time.perf_counter()
+    response = None
+    error_type = None
+    error_message = ""
+    error_detail: dict[str, Any] = {}
+    partial_results: list[RetrievalResult] = []
+
+    def retrieve(
+        sub_query: str,
+        collected: list[RetrievalResult],
+        count: int = fetch_count,
+        next_token: str | None = None,
+    ) -> KBResponse:
+        return query_knowledge_base(
             client=client,
             config=config,
-            query=validated_query,
-            max_results=max_results
+            query=sub_query,
+            max_results=count,
+            metadata_filter=validated_filter,
+            search_type=validated_search_type,
+            cache=cache,
+            negative_cache=_get_negative_cache(config),
+            deadline=deadline,
+            partial_results=collected,
+            min_score=validated_min_score,
+            next_token=next_token,
         )
+
+    def retrieve_round(count: int, next_token: str | None) -> KBResponse:
+        if next_token is not None:
+            # 追加分のページの取得中に時間切れになった場合は取得済みの結果を途中結果とする
+            return retrieve(validated_query, [], count, next_token)
+        # 件数を広げて検索し直す場合、途中結果は今回の検索のもののみを保持する
+        partial_results.clear()
+        return retrieve(validated_query, partial_results, count)
+
+    admission = _get_admission(config)
+
+    def admission_for(sub_query: str) -> AdmissionController | None:
+        # キャッシュ済みのクエリは Retrieve API を呼ばないため実行枠を待たない
+        if admission is not None and cache is not None and cache.contains(build_cache_key(
+            config, sub_query, first_count, validated_filter, validated_search_type
+        )):
+            return None
+        return admission
+
+    try:
+        if len(sub_queries) > 1:
+            response = _retrieve_decomposed(
+                sub_queries, retrieve, fetch_count, deadline, admission_for, validated_priority
+            )
+        elif adaptive:
+            response = _call_with_deadline(
+                lambda: adaptive_retrieve(retrieve_round, validated_min_score),
+                deadline,
+                admission_for(validated_query),
+                validated_priority,
+            )
+        else:
+            response = _call_with_deadline(
+                lambda: retrieve(validated_query, partial_results),
+                deadline,
+                admission_for(validated_query),
+                validated_priority,
+            )
+    except DeadlineExceededError as e:
+        # 取得済みの結果があればそれを返す
+        error_message = str(e)
+        response = KBResponse(results=list(partial_results)[:fetch_count], partial=True)
+    except OverloadedError as e:
+        error_type, error_message = "Overloaded", str(e)
     except BedrockAuthenticationError as e:
+        error_type, error_message, error_detail = "AuthenticationError", str(e), error_fields(e)
+    except BedrockKBNotFoundError as e:
+        error_type, error_message, error_detail = "NotFoundError", str(e), error_fields(e)
+    except BedrockServiceError as e:
+        error_type, error_message, error_detail = "ServiceError", str(e), error_fields(e)
+    if response is not None and (auto or validated_min_score is not None):
+        # 分解・オーバーフェッチ・途中結果の場合もスコアの下限で絞り込む
+        response = KBResponse(
+            results=cut_below(
+                response.results, score_threshold(response.results, validated_min_score, auto)
+            ),
+            partial=response.partial,
+        )
+    if response is not None and response.partial:
+        if error_message or deadline.expired():
+            error_type = "DeadlineExceeded"
+            error_message = error_message or (
+                f"タイムアウトしました（timeout_ms={deadline.timeout_ms:g}）"
+            )
+        else:
+            error_type = "PartialFailure"
+            error_message = "一部のサブクエリの検索に失敗しました"
+    
+    latency_ms = round((time.perf_counter() - started) * 1000, 3)
+    # 構造化ログ（成功はサンプリング、エラーは常に記録。キューに積むのみでブロックしない）
+    if error_type is None:
+        log_event(
+            "kb_answer.ok",
+            kb=config.profile_name,
+            latency_ms=latency_ms,
+            result_count=len(response.results) if response is not None else 0,
+            cache=cache_outcome,
+            sub_queries=len(sub_queries),
+        )
+    else:
+        log_event(
+            "kb_answer.error",
+            logging.WARNING if response is not None else logging.ERROR,
+            kb=config.profile_name,
+            latency_ms=latency_ms,
+            error_type=error_type,
+            message=error_message,
+            result_count=len(response.results) if response is not None else 0,
+            **error_detail,
+        )
+
+    if query_log is not None:
+        query_log.record({
+            "ts": time.time(),
+            "query": validated_query,
+            "max_results": first_count if adaptive else max_results,
+            "fetch_limit": fetch_count if fetch_count > max_results else None,
+            "metadata_filter": validated_filter,
+            "search_type": validated_search_type,
+            "latency_ms": latency_ms,
+            "result_count": len(response.results) if response is not None else 0,
+            "scores": [r.score for r in response.results] if response is not None else [],
+            "cache": cache_outcome,
+            "error_type": error_type,
+            "partial": response.partial if response is not None else False,
+            "sub_queries": sub_queries if len(sub_queries) > 1 else None,
+            "kb": config.profile_name,
+        })
+    
+    if response is None:
         return json.dumps({
             "error": True,
-            "error_type": "AuthenticationError",
-            "message": str(e)
+            "error_type": error_type,
+            "message": error_message
         }, ensure_ascii=False)
-    except BedrockKBNotFoundError as e:
+    
+    if response.partial:
+        results = response.results[:max_results]
+        return json.dumps({
+            "partial": True,
+            "error_type": error_type,
+            "message": f"{error_message}。取得済みの結果のみを返します",
+            "results": _format_results(
+                results,
+                validated_query,
+                snippet_chars,
+                _delivered_before(config, validated_session, delta, results),
+            ),
+        }, ensure_ascii=False, indent=2)
+    
+    if fetch_count > max_results:
+        # 続きは kb_more でローカルに返す
+        handle = _get_result_sets(config).create(response.results, validated_query)
+        page = _get_result_sets(config).page(handle, 0, max_results)
+        if page is not None:
+            return _format_page(
+                page,
+                snippet_chars,
+                _delivered_before(config, validated_session, delta, page.results),
+            )
+    
+    return json.dumps(
+        _format_results(
+            response.results,
+            validated_query,
+            snippet_chars,
+            _delivered_before(config, validated_session, delta, response.results),
+        ),
+        ensure_ascii=False,
+        indent=2,
+    )
+
+
+@mcp.tool()
+@_brokered
+def kb_more(
+    handle: str,
+    offset: int = 0,
+    limit: int = 4,
+    snippet: bool | None = None,
+    session: str | None = None,
+    delta: bool = True,
+) -> str:
+    """
+    kb_answer が返したハンドルの結果セットから続きの検索結果を返す。
+
+    Retrieve API は呼び出さず、サーバー側に保持した結果をページ単位で返す。
+
+    Args:
+        handle: kb_answer が返した結果セットのハンドル
+        offset: 取得を開始する位置（0 始まり、通常は前回の next_offset）
+        limit: 取得する最大件数（デフォルト: 4、範囲: 1-10）
+        snippet: content の代わりにスニペットとリソース URI を返すかどうか
+            （オプション、未指定の場合は BEDROCK_KB_SNIPPET）
+        session: エージェントのセッション ID（オプション、kb_answer と同じ）。
+            同じセッションで既に返したチャンクは参照のみを返す
+        delta: False の場合は送信済みのチャンクも全文で返す（デフォルト: True）
+
+    Returns:
+        str: {"handle", "offset", "next_offset", "total", "results"} を含む JSON 文字列。
+            next_offset が null の場合は最後のページ。ハンドルが期限切れの場合はエラー。
+    """
+    try:
+        validated_offset = validate_offset(offset)
+        validated_session = validate_session(session)
+        if not isinstance(handle, str) or not handle:
+            raise ValidationError("handle を指定してください")
+    except ValidationError as e:
         return json.dumps({
             "error": True,
-            "error_type": "NotFoundError",
+            "error_type": "ValidationError",
             "message": str(e)
         }, ensure_ascii=False)
-    except BedrockServiceError as e:
+    limit = min(max(limit, 1), 10)
+
+    try:
+        config = load_config()
+    except ValueError as e:
         return json.dumps({
             "error": True,
-            "error_type": "ServiceError",
+            "error_type": "ConfigurationError",
             "message": str(e)
         }, ensure_ascii=False)
-    
-    # 検索結果をフォーマット（要件 2.2, 2.3, 2.5）
-    results_output = []
-    for result in response.results:
-        result_dict = {
-            "content": result.content,
-            "location": result.location,
-            "score": result.score
+
+    page = _get_result_sets(config).page(handle, validated_offset, limit)
+    if page is None:
+        log_event("kb_more.expired", logging.WARNING, offset=validated_offset)
+        return json.dumps({
+            "error": True,
+            "error_type": "HandleNotFound",
+            "message": (
+                f"結果セットが見つからないか期限切れです: '{handle}'"
+                "（kb_answer を再度呼び出してください）"
+            ),
+        }, ensure_ascii=False)
+    snippet_chars = (
+        config.snippet_chars
+        if (config.snippet_mode if snippet is None else bool(snippet)) else None
+    )
+    log_event("kb_more.ok", offset=validated_offset, result_count=len(page.results))
+    return _format_page(
+        page, snippet_chars, _delivered_before(config, validated_session, delta, page.results)
+    )
+
+
+@mcp.resource(CHUNK_URI_PREFIX + "{chunk_hash}", mime_type="text/plain")
+@_brokered
+def kb_chunk(chunk_hash: str) -> str:
+    """
+    スニペットモードで返したチャンクの全文を返す（kb://chunk/<hash>）。
+
+    最近返したチャンク、または検索結果キャッシュのチャンクストアから読み込むため、
+    Retrieve API は呼び出さない。
+
+    Args:
+        chunk_hash: チャンクの内容ハッシュ
+
+    Returns:
+        str: チャンクの全文
+
+    Raises:
+        ResourceError: チャンクが保持されていない場合
+    """
+    result = _recent_chunks.get(chunk_hash)
+    if result is None and _result_cache is not None and _result_cache.chunk_store is not None:
+        try:
+            result = _result_cache.chunk_store.get(chunk_hash)
+        except KeyError:
+            result = None
+    if result is None:
+        raise ResourceError(
+            f"チャンクが見つかりません: '{chunk_hash}'（kb_answer を再度呼び出してください）"
+        )
+    return result.content
+
+
+@mcp.tool()
+@_brokered
+def kb_metrics() -> str:
+    """
+    サーバー内部のメトリクスを返す（運用・診断用）。
+
+    認証情報の先行更新（回数・失敗数・レイテンシ・有効期限までの秒数）、
+    アドミッション制御（実行中・待機中の数、待機時間、拒否数）、
+    適応的な同時実行数の制限（現在の上限、最小レイテンシ）、
+    複製 Knowledge Base ごとのレイテンシ・エラー率、KB プロファイルごとの
+    プール済みクライアント数や検索結果キャッシュの統計を含む。
+
+    Returns:
+        str: counters / gauges / summaries / caches（アドミッション制御の使用後は
+            admission、複製の使用後は replicas、クライアント作成後は client_pools、
+            構造化ログの有効時は log、適応的な同時実行数の制限の使用後は concurrency も）と
+            connections（接続の確立数・再利用率）を含む JSON 文字列
+    """
+    snapshot = metrics.snapshot()
+    caches: dict[str, Any] = {}
+    if _result_cache is not None:
+        caches["result"] = _result_cache.stats()
+    if _negative_cache is not None:
+        caches["negative"] = {"entries": len(_negative_cache), "hits": _negative_cache.hits}
+    if _result_sets is not None:
+        caches["result_sets"] = _result_sets.stats()
+    if _sessions is not None:
+        caches["sessions"] = _sessions.stats()
+    if _admission is not None:
+        snapshot["admission"] = _admission.stats()
+    replicas = replica_stats()
+    if replicas is not None:
+        snapshot["replicas"] = replicas
+    concurrency = concurrency_stats()
+    if concurrency is not None:
+        snapshot["concurrency"] = concurrency
+    pools = client_pool_stats()
+    if pools:
+        snapshot["client_pools"] = pools
+    caches["recent_chunks"] = _recent_chunks.stats()
+    snapshot["caches"] = caches
+    snapshot["connections"] = connection_stats()
+    if _log_handler is not None:
+        snapshot["log"] = {
+            "written": _log_handler.writer.written,
+            "dropped": _log_handler.writer.dropped,
         }
-        results_output.append(result_dict)
-    
-    return json.dumps(results_output, ensure_ascii=False, indent=2)
+    return json.dumps(snapshot, ensure_ascii=False, indent=2)
+
+
+def _memory_estimates() -> dict[str, int]:
+    """サブシステムごとに保持しているデータのおおよそのバイト数を返す。"""
+    estimates: dict[str, int] = {}
+    if _result_cache is not None:
+        estimates["result_cache"] = _result_cache.stats()["bytes"]
+    if _result_sets is not None:
+        estimates["result_sets"] = _result_sets.stats()["bytes"]
+    estimates["recent_chunks"] = _recent_chunks.stats()["bytes"]
+    if _sessions is not None:
+        estimates["sessions"] = _sessions.stats()["bytes"]
+    # クライアントの内部状態は測れないため、クライアント数 × 計測した 1 つあたりの値で見積もる
+    estimates["client_pools"] = sum(client_pool_stats().values()) * CLIENT_ESTIMATED_BYTES
+    return estimates
+
+
+def _shedders() -> list[tuple[str, Callable[[float], int]]]:
+    """メモリ予算の超過時にエントリを削除するキャッシュ類を返す。"""
+    return [
+        ("result_cache", lambda f: _result_cache.shrink(f) if _result_cache is not None else 0),
+        ("result_sets", lambda f: _result_sets.shrink(f) if _result_sets is not None else 0),
+        ("recent_chunks", _recent_chunks.shrink),
+        ("sessions", lambda f: _sessions.shrink(f) if _sessions is not None else 0),
+    ]
+
+
+# RSS がメモリ予算を超えた場合にキャッシュを削除する監視（start_memory_budget で作成）
+_memory_budget: MemoryBudget | None = None
+
+
+@mcp.tool()
+@_brokered
+def kb_memory(top: int = 0, trace: bool | None = None) -> str:
+    """
+    サーバーのメモリ使用状況を返す（運用・診断用）。
+
+    RSS、サブシステムごとのおおよそのバイト数（検索結果キャッシュのチャンク本文、
+    ページング用結果セット、スニペットモードのチャンク、セッションの送信済みチャンクの記録、
+    プール済みの boto3 クライアント）、メモリ予算の設定、
+    tracemalloc による上位の割り当て箇所を含む。
+
+    Args:
+        top: tracemalloc の上位割り当て箇所を返す件数（0 の場合は返さない）
+        trace: True で tracemalloc の追跡を開始、False で停止する（オプション）。
+            追跡中はメモリ割り当てが遅くなるため、診断が終わったら停止する
+
+    Returns:
+        str: rss_bytes / peak_rss_bytes / subsystems / budget / tracemalloc を含む JSON 文字列
+    """
+    if trace is True and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif trace is False and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    tracing = tracemalloc.is_tracing()
+    traced_bytes, traced_peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+    return json.dumps({
+        "rss_bytes": rss_bytes(),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "subsystems": _memory_estimates(),
+        "budget": _memory_budget.stats() if _memory_budget is not None else None,
+        "tracemalloc": {
+            "tracing": tracing,
+            "traced_bytes": traced_bytes,
+            "peak_traced_bytes": traced_peak,
+            "top": top_allocations(min(max(top, 0), 50)),
+        },
+    }, ensure_ascii=False, indent=2)
+
+
+def _run_warmup() -> None:
+    """
+    クエリログから上位クエリを選び、検索結果キャッシュを温める。
+
+    クエリは記録時の KB プロファイル（kb）の検索先で実行する。
+    バックグラウンドスレッドで実行されるため、設定・ログ読み込みの
+    エラーはウォームアップを中止するだけでサーバーには影響しない。
+    """
+    try:
+        base = load_config()
+        cache = _get_result_cache(base)
+        if cache is None or not base.warmup_log_path:
+            return
+        queries = select_warmup_queries(
+            read_query_log(base.warmup_log_path),
+            base.warmup_top_n,
+        )
+    except (OSError, ValueError):
+        return
+    by_profile: dict[str | None, list[WarmupQuery]] = {}
+    for warmup_query in queries:
+        by_profile.setdefault(warmup_query.kb, []).append(warmup_query)
+    for kb, profile_queries in by_profile.items():
+        try:
+            config = select_profile(base, kb)
+        except (ValueError, ProfileNotFoundError):
+            # 削除されたプロファイルのクエリは温めない
+            continue
+        warmer = CacheWarmer(
+            client_factory=lambda config=config: create_client(config),
+            config=config,
+            cache=cache,
+            queries=profile_queries,
+            rate_per_second=config.warmup_rate_per_second,
+        )
+        try:
+            warmer.run()
+        except (OSError, ValueError):
+            continue
+
+
+def start_warmup() -> threading.Thread:
+    """
+    キャッシュウォームアップをデーモンスレッドで開始する。
+
+    設定読み込みからクエリ実行まで全てスレッド内で行うため、
+    MCP ハンドシェイクを遅らせない。
+
+    Returns:
+        threading.Thread: 開始したスレッド
+    """
+    thread = threading.Thread(target=_run_warmup, name="kb-cache-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+# 同期完了を検出して検索結果キャッシュを無効化する監視（start_ingestion_watchers で作成）
+_ingestion_watchers: list[IngestionWatcher] = []
+
+
+def _invalidate_synced(config: KBConfig, job: IngestionJob) -> None:
+    """
+    同期が完了した Knowledge Base の検索結果キャッシュを無効化する。
+
+    Args:
+        config: Knowledge Base の設定
+        job: 完了した取り込みジョブ
+    """
+    del job  # どのデータソースの同期でも Knowledge Base 全体の結果が変わり得る
+    if _result_cache is None:
+        return
+    removed = _result_cache.invalidate(lambda key: is_cache_key_for(key, config))
+    metrics.increment("ingestion.invalidated_entries", removed)
+
+
+def start_ingestion_watchers() -> list[IngestionWatcher]:
+    """
+    BEDROCK_KB_INGESTION_POLL_INTERVAL が設定されている場合、取り込みジョブの
+    監視をデーモンスレッドで開始する。
+
+    KB プロファイルを使用する場合は、全てのプロファイルの (リージョン, KB ID,
+    AWS プロファイル) ごとに 1 つの監視を開始する。API の呼び出しは全てスレッド内で
+    行うため、MCP ハンドシェイクを遅らせない。
+
+    Returns:
+        list[IngestionWatcher]: 開始した監視（無効な場合は空）
+    """
+    try:
+        configs = profile_configs(load_config())
+    except ValueError:
+        return []
+    started: dict[tuple[str, str, str | None], IngestionWatcher] = {}
+    for config in configs:
+        key = (config.aws_region, config.kb_id, config.aws_profile)
+        if (
+            key in started
+            or config.backend == BACKEND_LOCAL
+            or not config.kb_id
+            or config.ingestion_poll_interval_seconds <= 0
+            or config.cache_ttl_seconds <= 0
+        ):
+            continue
+        watcher = started[key] = IngestionWatcher(
+            client_factory=lambda config=config: create_agent_client(config),
+            kb_id=config.kb_id,
+            on_sync=lambda job, config=config: _invalidate_synced(config, job),
+            data_source_ids=config.data_source_ids,
+            poll_interval_seconds=config.ingestion_poll_interval_seconds,
+        )
+        watcher.start()
+    _ingestion_watchers.extend(started.values())
+    return list(started.values())
+
+
+def start_memory_budget() -> MemoryBudget | None:
+    """
+    BEDROCK_KB_MEMORY_BUDGET_MB が設定されている場合、メモリ予算の監視を
+    デーモンスレッドで開始する。
+
+    Returns:
+        MemoryBudget | None: 開始した監視（無効な場合は None）
+    """
+    global _memory_budget  # pylint: disable=global-statement
+    try:
+        config = load_config()
+    except ValueError:
+        return None
+    if config.memory_budget_bytes <= 0:
+        return None
+    _memory_budget = MemoryBudget(
+        config.memory_budget_bytes,
+        _shedders(),
+        check_interval_seconds=config.memory_check_interval_seconds,
+    )
+    _memory_budget.start()
+    return _memory_budget
+
+
+def start_model_bundle_build() -> threading.Thread | None:
+    """
+    botocore モデルバンドルが無い場合、バックグラウンドで作成する。
+
+    BEDROCK_KB_MODEL_BUNDLE=off の場合、ローカルバックエンドの場合、
+    または設定を読み込めない場合は何もしない。
+
+    Returns:
+        threading.Thread | None: 開始したスレッド（開始しなかった場合は None）
+    """
+    try:
+        config = load_config()
+    except ValueError:
+        return None
+    if config.backend == BACKEND_LOCAL or not config.model_bundle_path:
+        return None
+    return start_bundle_build(config.model_bundle_path)
+
+
+def broker_handlers() -> dict[str, Callable[..., Any]]:
+    """
+    ブローカーデーモンが受け付けるツール・リソースの関数を返す。
+
+    Returns:
+        dict: 関数名 -> 関数
+    """
+    return dict(_broker_handlers)
+
+
+def start_broker_shim() -> BrokerClient | None:
+    """
+    BEDROCK_KB_BROKER が有効な場合、ブローカーデーモンに接続する（起動していない場合は起動する）。
+
+    以降のツール・リソースの呼び出しはデーモンに転送される。デーモンを使用できない
+    場合はこのプロセスで実行する（通常の stdio サーバーとして動作する）。
+
+    Returns:
+        BrokerClient | None: 接続したクライアント（シムとして動作しない場合は None）
+    """
+    global _broker  # pylint: disable=global-statement
+    try:
+        config = load_config()
+    except ValueError:
+        return None
+    if not config.broker_mode or not config.broker_socket_path or not broker_supported():
+        return None
+    try:
+        _broker = connect_or_start(config.broker_socket_path)
+    except BrokerError:
+        metrics.increment("broker.fallbacks")
+        return None
+    return _broker
+
+
+def start_background_tasks() -> None:
+    """
+    モデルバンドル作成・ウォームアップ・取り込みジョブ監視・メモリ予算監視を開始する。
+
+    通常の stdio サーバーとブローカーデーモンで使用する（シムでは開始しない）。
+    """
+    start_model_bundle_build()
+    start_warmup()
+    start_ingestion_watchers()
+    start_memory_budget()
 
 
 def main() -> None:
@@ -115,7 +1412,18 @@ def main() -> None:
     MCP サーバーのエントリーポイント。
     
     stdio モードでサーバーを起動する（要件 4.1）。
+    BEDROCK_KB_WARMUP_LOG が設定されている場合はバックグラウンドで
+    キャッシュウォームアップを開始する。BEDROCK_KB_INGESTION_POLL_INTERVAL が
+    設定されている場合は取り込みジョブの監視を、BEDROCK_KB_MEMORY_BUDGET_MB が
+    設定されている場合はメモリ予算の監視を開始する。botocore モデルバンドルが
+    無い場合はバックグラウンドで作成し、次回の起動から使用する。
+    BEDROCK_KB_BROKER が有効な場合はシムとして動作し、これらはブローカーデーモンで行う。
+    BEDROCK_KB_LOG が設定されている場合は構造化ログをファイルに記録する
+    （標準出力には書き込まない）。
     """
+    start_logging()
+    if start_broker_shim() is None:
+        start_background_tasks()
     mcp.run()
 
 
@@ -0,0 +1,157 @@
+"""
+セッションモジュール
+
+長いエージェントのセッションでは、同じ上位チャンクがクエリのたびに返され、
+kb_answer はその全文を毎回送り直す。kb_answer / kb_more に session を指定すると、
+セッションごとに送信済みチャンクのハッシュを記録し、2 回目以降は全文の代わりに
+参照（kb://chunk/<hash>・location・score）のみを返す。全文が必要になった場合は
+kb://chunk リソースで読み込める。
+
+セッションは最後の使用から TTL で期限切れになり、セッション数と
+セッションごとの記録チャンク数の上限を超えた場合は最も古いものから削除する。
+削除された記録のチャンクは次回全文で返す（送り過ぎることはあっても、
+未送信のチャンクを参照で返すことはない）。
+
+メトリクス:
+    session.chunks_delivered: 全文で返したチャンク数
+    session.chunks_omitted: 送信済みのため参照で返したチャンク数
+    session.bytes_omitted: 参照で返したことで送らなかった本文のバイト数
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
+
+from src.metrics import Metrics, metrics
+
+
+# 記録したチャンクのハッシュ 1 件あたりのおおよそのメモリ使用量（バイト）。
+# 64 文字の 16 進ハッシュを OrderedDict に記録した場合を tracemalloc で計測した値
+CHUNK_RECORD_ESTIMATED_BYTES = 180
+
+
+class SessionStore:
+    """
+    セッションごとの送信済みチャンクを記録する（スレッドセーフ）。
+
+    Attributes:
+        ttl_seconds: セッションの有効期間（秒、最後の使用から）
+        max_sessions: 保持する最大セッション数
+        max_chunks_per_session: セッションごとに記録する最大チャンク数
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 3600.0,
+        max_sessions: int = 256,
+        max_chunks_per_session: int = 1024,
+        clock: Callable[[], float] = time.monotonic,
+        registry: Metrics = metrics,
+    ) -> None:
+        if ttl_seconds <= 0:
+            raise ValueError("ttl_seconds は正の値である必要があります")
+        if max_sessions < 1 or max_chunks_per_session < 1:
+            raise ValueError("max_sessions と max_chunks_per_session は 1 以上である必要があります")
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_chunks_per_session = max_chunks_per_session
+        self._clock = clock
+        self._metrics = registry
+        # セッション ID -> (有効期限, 送信済みチャンクのハッシュ（古い順）)
+        self._sessions: OrderedDict[str, tuple[float, OrderedDict[str, None]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def deliver(self, session_id: str, hashes: Iterable[str]) -> set[str]:
+        """
+        チャンクを送信済みとして記録し、この呼び出しより前に送信済みだったものを返す。
+
+        同じ呼び出しに同じハッシュが複数含まれていても、送信済みとはみなさない。
+
+        Args:
+            session_id: セッション ID
+            hashes: 今回返すチャンクのハッシュ
+
+        Returns:
+            set[str]: 以前に送信済みのハッシュ
+        """
+        hashes = list(hashes)
+        now = self._clock()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            delivered = (
+                entry[1] if entry is not None and entry[0] > now else OrderedDict()
+            )
+            repeated = {h for h in hashes if h in delivered}
+            for h in hashes:
+                delivered[h] = None
+                delivered.move_to_end(h)
+            while len(delivered) > self.max_chunks_per_session:
+                delivered.popitem(last=False)
+            self._sessions[session_id] = (now + self.ttl_seconds, delivered)
+            self._purge(now)
+        return repeated
+
+    def forget(self, session_id: str) -> bool:
+        """
+        セッションの記録を削除する（以降は全てのチャンクを全文で返す）。
+
+        Returns:
+            bool: 記録が存在した場合は True
+        """
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def record_omitted(self, count: int, omitted_bytes: int) -> None:
+        """参照で返したチャンク数とバイト数をメトリクスに記録する。"""
+        if count:
+            self._metrics.increment("session.chunks_omitted", count)
+            self._metrics.increment("session.bytes_omitted", omitted_bytes)
+
+    def record_delivered(self, count: int) -> None:
+        """全文で返したチャンク数をメトリクスに記録する。"""
+        if count:
+            self._metrics.increment("session.chunks_delivered", count)
+
+    def shrink(self, fraction: float = 0.5) -> int:
+        """
+        最も古く使われたセッションから fraction の割合を削除する（メモリ予算の超過時に使用）。
+
+        Args:
+            fraction: 削除する割合（0 から 1）
+
+        Returns:
+            int: 削除したセッション数
+        """
+        with self._lock:
+            count = math.ceil(len(self._sessions) * min(max(fraction, 0.0), 1.0))
+            for _ in range(count):
+                self._sessions.popitem(last=False)
+            return count
+
+    def stats(self) -> dict[str, Any]:
+        """
+        記録の統計情報を返す。
+
+        Returns:
+            dict: sessions / chunks / bytes（記録のおおよそのバイト数）を含む辞書
+        """
+        with self._lock:
+            chunks = sum(len(entry[1]) for entry in self._sessions.values())
+            return {
+                "sessions": len(self._sessions),
+                "chunks": chunks,
+                "bytes": chunks * CHUNK_RECORD_ESTIMATED_BYTES,
+            }
+
+    def _purge(self, now: float) -> None:
+        """期限切れのセッションと上限を超えたセッションを削除する（ロック取得済みで呼び出す）。"""
+        for session_id in [s for s, entry in self._sessions.items() if entry[0] <= now]:
+            del self._sessions[session_id]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
@@ -0,0 +1,85 @@
+"""
+スニペットモジュール
+
+検索結果のチャンクから、クエリの文字 n-gram が最も多く一致する範囲を
+切り出してスニペットを作成する。全文は kb://chunk/<hash> リソースとして
+必要になった時点で読み込める。
+"""
+
+import unicodedata
+
+
+# chunk リソースの URI プレフィックス
+CHUNK_URI_PREFIX = "kb://chunk/"
+
+# スニペットの一致判定に使用する n-gram の長さ
+NGRAM_SIZE = 2
+
+# 省略を示す記号
+ELLIPSIS = "…"
+
+
+def _is_word_char(char: str) -> bool:
+    """n-gram に含める文字か判定する（空白・記号は除外）。"""
+    return unicodedata.category(char)[0] in ("L", "N")
+
+
+def _ngrams(text: str) -> set[str]:
+    """テキストに含まれる文字 n-gram の集合を返す（大文字小文字は区別しない）。"""
+    text = text.lower()
+    return {
+        text[i:i + NGRAM_SIZE]
+        for i in range(len(text) - NGRAM_SIZE + 1)
+        if all(_is_word_char(c) for c in text[i:i + NGRAM_SIZE])
+    }
+
+
+def make_snippet(content: str, query: str, max_chars: int = 240) -> str:
+    """
+    クエリに最も関連する範囲を切り出したスニペットを返す。
+
+    クエリの文字 n-gram と一致する位置を数え、max_chars 文字の窓に含まれる
+    一致数が最大になる範囲を選ぶ（一致が無い場合は先頭）。切り詰めた側には
+    省略記号を付ける。
+
+    Args:
+        content: チャンクの全文
+        query: 検索クエリ
+        max_chars: スニペットの最大文字数（省略記号を除く）
+
+    Returns:
+        str: スニペット（content が max_chars 以下の場合は全文）
+    """
+    if len(content) <= max_chars:
+        return content
+
+    grams = _ngrams(query)
+    lowered = content.lower()
+    positions = [
+        i for i in range(len(lowered) - NGRAM_SIZE + 1)
+        if lowered[i:i + NGRAM_SIZE] in grams
+    ]
+
+    start = 0
+    if positions:
+        # 窓に収まる一致位置の数が最大になる先頭の一致位置を尺取り法で求める
+        best_count = 0
+        best_first = positions[0]
+        left = 0
+        for right, position in enumerate(positions):
+            while position + NGRAM_SIZE - positions[left] > max_chars:
+                left += 1
+            if right - left + 1 > best_count:
+                best_count = right - left + 1
+                best_first = positions[left]
+        # 一致範囲の前に少し文脈を残す
+        start = max(0, best_first - max_chars // 5)
+    start = min(start, len(content) - max_chars)
+    end = start + max_chars
+
+    snippet = content[start:end]
+    if start > 0:
+        snippet = ELLIPSIS + snippet
+    if end < len(content):
+        snippet = snippet + ELLIPSIS
+    return snippet
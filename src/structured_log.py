@@ -0,0 +1,310 @@
+"""
+構造化ログモジュール
+
+stdio サーバーでは標準出力が MCP のトランスポートであるため、ログを標準出力に
+書き込むとプロトコルが壊れる。また、ハンドラーの無いロガーの警告は
+logging.lastResort により標準エラー出力へ同期的に書き込まれる。
+
+configure_logging はルートロガーに StructuredLogHandler を追加し、
+サーバー・botocore などのライブラリのログを 1 行 1 レコードの JSONL ファイルに記録する。
+ハンドラーはレコードを辞書に変換してキューに積むだけで、ファイルへの書き込み・
+ローテーションはクエリログと同じ QueryLogWriter のバックグラウンドスレッドが行う
+（キューが満杯の場合は破棄する）ため、kb_answer のパスでブロックする I/O は発生しない。
+標準出力に書き込むハンドラーは設定時に取り除く。
+
+成功時の大量のイベント（kb_answer.ok など）はイベントごとの割合でサンプリングし、
+記録したレコードには sample_rate を付ける（件数の推定は 1 / sample_rate 倍）。
+WARNING 以上のレコードはサンプリングせず常に記録し、AWS のエラーの場合は
+エラーコード・リクエスト ID・HTTP ステータスを含める。
+
+1 行 1 レコードの形式:
+    {"ts": 1718000000.123, "level": "ERROR", "logger": "bedrock_kb",
+     "event": "kb_answer.error", "error_type": "ServiceError",
+     "error_code": "ValidationException", "request_id": "3f2a...", "http_status": 400,
+     "latency_ms": 182.4}
+
+メトリクス:
+    log.records: ファイルに書き込むためキューに積んだレコード数
+    log.sampled_out: サンプリングにより記録しなかったレコード数
+"""
+
+import logging
+import random
+import sys
+from typing import Any, Callable
+
+from src.metrics import Metrics, metrics
+from src.query_log import QueryLogWriter
+
+
+# サーバーのイベントを記録するロガー名
+LOGGER_NAME = "bedrock_kb"
+
+# BEDROCK_KB_LOG_SAMPLE が未設定の場合のサンプリング割合（成功時のイベントのみ）
+DEFAULT_SAMPLE_RATES = "kb_answer.ok=0.1,kb_more.ok=0.1"
+
+# BEDROCK_KB_LOG_LEVEL に指定できるレベル
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+# レコードの属性のうち、構造化ログに含めない標準の属性
+_RECORD_ATTRIBUTES = frozenset(
+    vars(logging.LogRecord("", logging.INFO, "", 0, "", None, None))
+) | {"message", "asctime", "fields", "sample_rate"}
+
+# そのまま JSON に書き込む値の型（それ以外は repr で記録する）
+_JSON_TYPES = (str, int, float, bool, type(None), list, dict)
+
+logger = logging.getLogger(LOGGER_NAME)
+# 未設定の場合に logging.lastResort で標準エラー出力へ書き込まない
+logger.addHandler(logging.NullHandler())
+
+
+def parse_sample_rates(raw: str) -> tuple[tuple[str, float], ...]:
+    """
+    BEDROCK_KB_LOG_SAMPLE の値（"イベント名=割合" のカンマ区切り）を解析する。
+
+    Args:
+        raw: 環境変数の値（例: "kb_answer.ok=0.1,kb_more.ok=0.5"）
+
+    Returns:
+        tuple: (イベント名, 割合) の組
+
+    Raises:
+        ValueError: 形式が不正、または割合が 0 から 1 の範囲外の場合
+    """
+    rates: list[tuple[str, float]] = []
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        event, sep, value = item.partition("=")
+        try:
+            rate = float(value)
+        except ValueError:
+            rate = -1.0
+        if not sep or not event.strip() or not 0.0 <= rate <= 1.0:
+            raise ValueError(
+                "BEDROCK_KB_LOG_SAMPLE は 'イベント名=割合（0 から 1）' のカンマ区切りで"
+                f"指定してください: '{item}'"
+            )
+        rates.append((event.strip(), rate))
+    return tuple(rates)
+
+
+def error_fields(error: BaseException | None) -> dict[str, Any]:
+    """
+    例外（または原因の例外）が AWS のエラーの場合、エラーコードとリクエスト ID を返す。
+
+    botocore の ClientError は response にエラーコードと ResponseMetadata を持つ。
+    Bedrock クライアントの例外は元の ClientError を __cause__ に保持している。
+
+    Args:
+        error: 例外
+
+    Returns:
+        dict: error_code / request_id / http_status（取得できたもののみ）
+    """
+    seen: set[int] = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        response = getattr(error, "response", None)
+        if isinstance(response, dict):
+            metadata = response.get("ResponseMetadata") or {}
+            fields = {
+                "error_code": (response.get("Error") or {}).get("Code"),
+                "request_id": metadata.get("RequestId"),
+                "http_status": metadata.get("HTTPStatusCode"),
+            }
+            return {key: value for key, value in fields.items() if value}
+        error = error.__cause__ or error.__context__
+    return {}
+
+
+def log_event(event: str, level: int = logging.INFO, **fields: Any) -> None:
+    """
+    構造化ログのイベントを記録する（ログが無効なレベルの場合は何もしない）。
+
+    Args:
+        event: イベント名（例: "kb_answer.ok"、サンプリングの単位）
+        level: ログレベル
+        **fields: レコードに含める値（JSON で表せる値）
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+def is_enabled(level: int = logging.INFO) -> bool:
+    """サーバーのイベントを level で記録する設定の場合は True を返す。"""
+    return logger.isEnabledFor(level)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    WARNING 未満のレコードをイベントごとの割合でサンプリングするフィルター。
+
+    イベント名はレコードのメッセージ（log_event の event）で、割合の指定が無い
+    イベントは全て記録する。
+    """
+
+    def __init__(
+        self,
+        rates: dict[str, float] | None = None,
+        rand: Callable[[], float] = random.random,
+        registry: Metrics = metrics,
+    ) -> None:
+        super().__init__()
+        self.rates = dict(rates or {})
+        self._rand = rand
+        self._metrics = registry
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(str(record.msg))
+        if rate is None or rate >= 1.0:
+            return True
+        if rate > 0.0 and self._rand() < rate:
+            record.sample_rate = rate
+            return True
+        self._metrics.increment("log.sampled_out")
+        return False
+
+
+def format_record(record: logging.LogRecord) -> dict[str, Any]:
+    """
+    ログレコードを構造化ログの 1 レコード（辞書）に変換する。
+
+    Args:
+        record: ログレコード
+
+    Returns:
+        dict: ts / level / logger / event と、log_event のフィールド・extra の値
+    """
+    entry: dict[str, Any] = {
+        "ts": record.created,
+        "level": record.levelname,
+        "logger": record.name,
+        "event": record.getMessage(),
+    }
+    fields = dict(getattr(record, "fields", None) or {})
+    for key, value in vars(record).items():
+        if key not in _RECORD_ATTRIBUTES:
+            fields.setdefault(key, value)
+    for key, value in fields.items():
+        if key not in entry:
+            entry[key] = value if isinstance(value, _JSON_TYPES) else repr(value)
+    sample_rate = getattr(record, "sample_rate", None)
+    if sample_rate is not None:
+        entry["sample_rate"] = sample_rate
+    if record.exc_info and record.exc_info[1] is not None:
+        error = record.exc_info[1]
+        entry.setdefault("exc_type", type(error).__name__)
+        entry.setdefault("exc_message", str(error))
+        for key, value in error_fields(error).items():
+            entry.setdefault(key, value)
+    return entry
+
+
+class StructuredLogHandler(logging.Handler):
+    """
+    レコードを JSONL ファイルのキューに積むハンドラー（ブロックしない）。
+
+    Attributes:
+        writer: 書き込み・ローテーションを行う QueryLogWriter
+    """
+
+    def __init__(
+        self,
+        writer: QueryLogWriter,
+        level: int = logging.NOTSET,
+        registry: Metrics = metrics,
+    ) -> None:
+        super().__init__(level)
+        self.writer = writer
+        self._metrics = registry
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            entry = format_record(record)
+        except Exception:  # pylint: disable=broad-exception-caught
+            # ログの変換の失敗でツール呼び出しを失敗させない
+            return
+        self.writer.record(entry)
+        self._metrics.increment("log.records")
+
+    def close(self) -> None:
+        """キューに残ったレコードを書き出してファイルを閉じる。"""
+        self.writer.close()
+        super().close()
+
+
+def _writes_to_stdout(handler: logging.Handler) -> bool:
+    """ハンドラーが標準出力に書き込むかどうか。"""
+    stream = getattr(handler, "stream", None)
+    return stream is not None and stream in (sys.stdout, sys.__stdout__)
+
+
+def remove_stdout_handlers() -> int:
+    """
+    ルートロガーと既存のロガーから標準出力に書き込むハンドラーを取り除く。
+
+    Returns:
+        int: 取り除いたハンドラー数
+    """
+    loggers = [logging.getLogger()] + [
+        item for item in logging.Logger.manager.loggerDict.values()
+        if isinstance(item, logging.Logger)
+    ]
+    removed = 0
+    for target in loggers:
+        for handler in [h for h in target.handlers if _writes_to_stdout(h)]:
+            target.removeHandler(handler)
+            removed += 1
+    return removed
+
+
+def configure_logging(
+    path: str,
+    level: str = "INFO",
+    sample_rates: dict[str, float] | None = None,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    registry: Metrics = metrics,
+) -> StructuredLogHandler:
+    """
+    構造化ログをファイルに記録するハンドラーをルートロガーに追加する。
+
+    サーバーのイベントは level 以上、他のライブラリのログと warnings の警告は
+    WARNING 以上を記録する。
+
+    Args:
+        path: ログファイルのパス
+        level: サーバーのイベントを記録する最小のレベル（LOG_LEVELS のいずれか）
+        sample_rates: イベント名 -> サンプリング割合（WARNING 未満のレコードに適用）
+        max_bytes: ローテーションするファイルサイズ（0 でローテーションしない）
+        backup_count: 保持するローテーション済みファイル数
+        registry: メトリクス
+
+    Returns:
+        StructuredLogHandler: 追加したハンドラー（停止時は remove_handler で取り除く）
+    """
+    handler = StructuredLogHandler(
+        QueryLogWriter(
+            path, max_bytes=max_bytes, backup_count=backup_count, thread_name="kb-log",
+        ),
+        registry=registry,
+    )
+    handler.addFilter(SamplingFilter(sample_rates, registry=registry))
+    remove_stdout_handlers()
+    root = logging.getLogger()
+    root.addHandler(handler)
+    logger.setLevel(level.upper())
+    logging.captureWarnings(True)
+    return handler
+
+
+def remove_handler(handler: StructuredLogHandler) -> None:
+    """configure_logging で追加したハンドラーを取り除き、残りを書き出して閉じる。"""
+    logging.getLogger().removeHandler(handler)
+    logging.captureWarnings(False)
+    handler.close()
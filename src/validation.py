@@ -1,9 +1,11 @@
 """
 入力バリデーションモジュール
 
-クエリ文字列のバリデーションを担当する。
+クエリ文字列・メタデータフィルター・検索タイプのバリデーションを担当する。
 """
 
+from typing import Any
+
 
 class ValidationError(ValueError):
     """
@@ -46,3 +48,288 @@ def validate_query(query: str) -> str:
         raise ValidationError("クエリ文字列が空です")
     
     return trimmed
+
+
+# Retrieve API がサポートする検索タイプ
+SUPPORTED_SEARCH_TYPES = ("HYBRID", "SEMANTIC")
+
+# 比較演算子（{"key": ..., "value": ...} を取る）
+_COMPARISON_OPERATORS = ("equals", "in", "startsWith")
+
+# 論理演算子（2-5 個のフィルターのリストを取る）
+_LOGICAL_OPERATORS = ("andAll", "orAll")
+_LOGICAL_MIN_FILTERS = 2
+_LOGICAL_MAX_FILTERS = 5
+
+
+def _is_scalar(value: Any) -> bool:
+    """メタデータ値として使用できるスカラー値か判定する。"""
+    return isinstance(value, (str, int, float, bool))
+
+
+def validate_metadata_filter(metadata_filter: Any) -> dict[str, Any]:
+    """
+    Retrieve API のメタデータフィルターをバリデーションし、正規化済みのコピーを返す。
+
+    サポートする演算子:
+        equals:     {"equals": {"key": "category", "value": "faq"}}
+        in:         {"in": {"key": "category", "value": ["faq", "guide"]}}
+        startsWith: {"startsWith": {"key": "x-amz-bedrock-kb-source-uri", "value": "s3://docs/"}}
+        andAll:     {"andAll": [<filter>, <filter>, ...]}（2-5 個）
+        orAll:      {"orAll": [<filter>, <filter>, ...]}（2-5 個）
+
+    Args:
+        metadata_filter: バリデーション対象のフィルター
+
+    Returns:
+        dict: 正規化済みのフィルター（入力とは独立したコピー）
+
+    Raises:
+        ValidationError: フィルターの構造が不正な場合
+    """
+    if not isinstance(metadata_filter, dict) or len(metadata_filter) != 1:
+        raise ValidationError(
+            "フィルターは演算子を 1 つだけ含むオブジェクトである必要があります"
+        )
+
+    operator, operand = next(iter(metadata_filter.items()))
+
+    if operator in _LOGICAL_OPERATORS:
+        if not isinstance(operand, list) or not (
+            _LOGICAL_MIN_FILTERS <= len(operand) <= _LOGICAL_MAX_FILTERS
+        ):
+            raise ValidationError(
+                f"{operator} には {_LOGICAL_MIN_FILTERS}-{_LOGICAL_MAX_FILTERS} 個の"
+                "フィルターのリストを指定してください"
+            )
+        return {operator: [validate_metadata_filter(item) for item in operand]}
+
+    if operator not in _COMPARISON_OPERATORS:
+        supported = ", ".join(_COMPARISON_OPERATORS + _LOGICAL_OPERATORS)
+        raise ValidationError(
+            f"未対応のフィルター演算子です: '{operator}'（対応: {supported}）"
+        )
+
+    if not isinstance(operand, dict) or set(operand) != {"key", "value"}:
+        raise ValidationError(
+            f"{operator} には key と value のみを含むオブジェクトを指定してください"
+        )
+    key = operand["key"]
+    value = operand["value"]
+    if not isinstance(key, str) or not key.strip():
+        raise ValidationError(f"{operator} の key は空でない文字列である必要があります")
+
+    if operator == "in":
+        if not isinstance(value, list) or not value or not all(_is_scalar(v) for v in value):
+            raise ValidationError("in の value は空でないスカラー値のリストである必要があります")
+        value = list(value)
+    elif operator == "startsWith":
+        if not isinstance(value, str) or not value:
+            raise ValidationError("startsWith の value は空でない文字列である必要があります")
+    elif not _is_scalar(value):
+        raise ValidationError("equals の value は文字列・数値・真偽値である必要があります")
+
+    return {operator: {"key": key.strip(), "value": value}}
+
+
+def validate_search_type(search_type: str | None) -> str | None:
+    """
+    overrideSearchType をバリデーションし、大文字に正規化して返す。
+
+    Args:
+        search_type: "HYBRID" / "SEMANTIC"（大文字小文字は区別しない）または None
+
+    Returns:
+        str | None: 正規化済みの検索タイプ（未指定の場合は None）
+
+    Raises:
+        ValidationError: 未対応の検索タイプが指定された場合
+    """
+    if search_type is None or (isinstance(search_type, str) and not search_type.strip()):
+        return None
+    normalized = search_type.strip().upper() if isinstance(search_type, str) else None
+    if normalized not in SUPPORTED_SEARCH_TYPES:
+        raise ValidationError(
+            f"未対応の検索タイプです: '{search_type}'"
+            f"（{' / '.join(SUPPORTED_SEARCH_TYPES)} のいずれかを指定してください）"
+        )
+    return normalized
+
+
+# timeout_ms の上限（10 分）
+MAX_TIMEOUT_MS = 600_000
+
+
+def validate_timeout_ms(timeout_ms: Any) -> int | None:
+    """
+    timeout_ms をバリデーションする。
+
+    Args:
+        timeout_ms: 1 から MAX_TIMEOUT_MS までの整数（ミリ秒）または None
+
+    Returns:
+        int | None: 検証済みのタイムアウト（未指定の場合は None）
+
+    Raises:
+        ValidationError: 整数でない場合、または範囲外の場合
+    """
+    if timeout_ms is None:
+        return None
+    if isinstance(timeout_ms, bool) or not isinstance(timeout_ms, int):
+        raise ValidationError(f"timeout_ms は整数で指定してください: {timeout_ms!r}")
+    if not 1 <= timeout_ms <= MAX_TIMEOUT_MS:
+        raise ValidationError(
+            f"timeout_ms は 1 から {MAX_TIMEOUT_MS} の範囲で指定してください: {timeout_ms}"
+        )
+    return timeout_ms
+
+
+# fetch_limit の上限（Retrieve API の numberOfResults の上限）
+MAX_FETCH_LIMIT = 100
+
+
+def validate_fetch_limit(fetch_limit: Any) -> int | None:
+    """
+    fetch_limit（オーバーフェッチする件数）をバリデーションする。
+
+    Args:
+        fetch_limit: 1 から MAX_FETCH_LIMIT までの整数または None
+
+    Returns:
+        int | None: 検証済みの件数（未指定の場合は None）
+
+    Raises:
+        ValidationError: 整数でない場合、または範囲外の場合
+    """
+    if fetch_limit is None:
+        return None
+    if isinstance(fetch_limit, bool) or not isinstance(fetch_limit, int):
+        raise ValidationError(f"fetch_limit は整数で指定してください: {fetch_limit!r}")
+    if not 1 <= fetch_limit <= MAX_FETCH_LIMIT:
+        raise ValidationError(
+            f"fetch_limit は 1 から {MAX_FETCH_LIMIT} の範囲で指定してください: {fetch_limit}"
+        )
+    return fetch_limit
+
+
+def validate_offset(offset: Any) -> int:
+    """
+    kb_more の offset をバリデーションする。
+
+    Args:
+        offset: 0 以上の整数
+
+    Returns:
+        int: 検証済みの offset
+
+    Raises:
+        ValidationError: 整数でない場合、または負の値の場合
+    """
+    if isinstance(offset, bool) or not isinstance(offset, int):
+        raise ValidationError(f"offset は整数で指定してください: {offset!r}")
+    if offset < 0:
+        raise ValidationError(f"offset は 0 以上で指定してください: {offset}")
+    return offset
+
+
+def validate_max_results(max_results: Any) -> int | None:
+    """
+    kb_answer の max_results をバリデーションする。
+
+    整数は 1 から 10 の範囲に丸める（範囲外でもエラーにしない）。
+
+    Args:
+        max_results: 整数または "auto"（大文字小文字は区別しない）
+
+    Returns:
+        int | None: 検証済みの件数（"auto" の場合は None）
+
+    Raises:
+        ValidationError: 整数・"auto" 以外の場合
+    """
+    if isinstance(max_results, str) and max_results.strip().lower() == "auto":
+        return None
+    if isinstance(max_results, bool) or not isinstance(max_results, int):
+        raise ValidationError(
+            f"max_results は 1 から 10 の整数または \"auto\" で指定してください: {max_results!r}"
+        )
+    return min(max(max_results, 1), 10)
+
+
+def validate_min_score(min_score: Any) -> float | None:
+    """
+    kb_answer の min_score（スコアの下限）をバリデーションする。
+
+    Args:
+        min_score: 0 以上の数値または None
+
+    Returns:
+        float | None: 検証済みの下限（未指定の場合は None）
+
+    Raises:
+        ValidationError: 数値でない場合、または負の値の場合
+    """
+    if min_score is None:
+        return None
+    if isinstance(min_score, bool) or not isinstance(min_score, (int, float)):
+        raise ValidationError(f"min_score は数値で指定してください: {min_score!r}")
+    if not min_score >= 0:
+        raise ValidationError(f"min_score は 0 以上で指定してください: {min_score}")
+    return float(min_score)
+
+
+# session（セッション ID）の最大文字数
+MAX_SESSION_LENGTH = 128
+
+
+def validate_session(session: Any) -> str | None:
+    """
+    kb_answer / kb_more の session（セッション ID）をバリデーションする。
+
+    Args:
+        session: 1 から MAX_SESSION_LENGTH 文字の文字列または None
+
+    Returns:
+        str | None: トリム済みのセッション ID（未指定の場合は None）
+
+    Raises:
+        ValidationError: 文字列でない場合、または空・長すぎる場合
+    """
+    if session is None:
+        return None
+    if not isinstance(session, str):
+        raise ValidationError(f"session は文字列で指定してください: {session!r}")
+    session = session.strip()
+    if not 1 <= len(session) <= MAX_SESSION_LENGTH:
+        raise ValidationError(
+            f"session は 1 から {MAX_SESSION_LENGTH} 文字で指定してください"
+        )
+    return session
+
+
+# サポートする優先度（高い順）
+SUPPORTED_PRIORITIES = ("high", "normal", "low")
+
+
+def validate_priority(priority: Any) -> str:
+    """
+    kb_answer の priority をバリデーションし、小文字に正規化して返す。
+
+    Args:
+        priority: "high" / "normal" / "low"（大文字小文字は区別しない）または None
+
+    Returns:
+        str: 正規化済みの優先度（未指定の場合は "normal"）
+
+    Raises:
+        ValidationError: 未対応の優先度が指定された場合
+    """
+    if priority is None or (isinstance(priority, str) and not priority.strip()):
+        return "normal"
+    normalized = priority.strip().lower() if isinstance(priority, str) else None
+    if normalized not in SUPPORTED_PRIORITIES:
+        raise ValidationError(
+            f"未対応の優先度です: {priority!r}"
+            f"（{' / '.join(SUPPORTED_PRIORITIES)} のいずれかを指定してください）"
+        )
+    return normalized
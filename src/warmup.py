@@ -0,0 +1,223 @@
+"""
+キャッシュウォームアップモジュール
+
+クエリログから頻度と新しさで上位のクエリを選び、サーバー起動時に
+バックグラウンドで query_knowledge_base を実行して検索結果キャッシュを温める。
+
+クエリログの形式は query_log モジュールを参照。query を含まないエントリ
+（ハッシュ化されたクエリなど）や解釈できない行は無視する。
+"""
+
+import json
+import math
+import threading
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from src.bedrock_client import (
+    build_cache_key,
+    query_knowledge_base,
+    BedrockAuthenticationError,
+    BedrockKBNotFoundError,
+    BedrockServiceError,
+    BedrockThrottlingError,
+)
+from src.cache import ResultCache
+from src.config import KBConfig
+from src.validation import (
+    validate_metadata_filter,
+    validate_query,
+    validate_search_type,
+    ValidationError,
+)
+
+
+# 新しさの重みが半分になるまでの時間（秒）
+DEFAULT_HALF_LIFE_SECONDS = 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class WarmupQuery:
+    """
+    ウォームアップで事前実行するクエリ。
+
+    Attributes:
+        query: バリデーション済みのクエリ文字列
+        max_results: 取得するソースチャンクの最大数
+        metadata_filter: バリデーション済みのメタデータフィルター
+        search_type: overrideSearchType
+        kb: 記録時の KB プロファイル名（None の場合はデフォルトの検索先）
+    """
+    query: str
+    max_results: int = 4
+    metadata_filter: dict[str, Any] | None = None
+    search_type: str | None = None
+    kb: str | None = None
+
+
+def parse_logged_query(entry: dict[str, Any]) -> WarmupQuery | None:
+    """
+    クエリログのエントリを実行可能なクエリに変換する。
+
+    Args:
+        entry: クエリログのエントリ
+
+    Returns:
+        WarmupQuery | None: 変換結果（query を含まない・不正なエントリは None）
+    """
+    try:
+        query = validate_query(entry.get("query"))
+        metadata_filter = entry.get("metadata_filter")
+        if metadata_filter is not None:
+            metadata_filter = validate_metadata_filter(metadata_filter)
+        search_type = validate_search_type(entry.get("search_type"))
+        max_results = min(max(int(entry.get("max_results", 4)), 1), 10)
+        # オーバーフェッチした呼び出しは実際に取得した件数でキャッシュされる
+        if entry.get("fetch_limit") is not None:
+            max_results = min(max(int(entry["fetch_limit"]), max_results), 100)
+    except (ValidationError, TypeError, ValueError, AttributeError):
+        return None
+    kb = entry.get("kb")
+    return WarmupQuery(
+        query=query,
+        max_results=max_results,
+        metadata_filter=metadata_filter,
+        search_type=search_type,
+        kb=kb if isinstance(kb, str) and kb else None,
+    )
+
+
+def select_warmup_queries(
+    entries: Iterable[dict[str, Any]],
+    top_n: int,
+    now: float | None = None,
+    half_life_seconds: float = DEFAULT_HALF_LIFE_SECONDS,
+) -> list[WarmupQuery]:
+    """
+    頻度と新しさを組み合わせたスコアで上位 top_n 件のクエリを選ぶ。
+
+    各出現は経過時間に応じて指数減衰した重み（半減期 half_life_seconds）を持ち、
+    その合計をスコアとする。同じ条件のクエリは 1 件にまとめられる。
+
+    Args:
+        entries: クエリログのエントリ
+        top_n: 選択する最大件数
+        now: 現在時刻（UNIX 秒、省略時は現在時刻）
+        half_life_seconds: 重みの半減期（秒）
+
+    Returns:
+        list[WarmupQuery]: スコア降順のクエリ
+    """
+    if top_n < 1:
+        return []
+    now = time.time() if now is None else now
+    decay = math.log(2) / half_life_seconds if half_life_seconds > 0 else 0.0
+
+    scores: dict[str, float] = {}
+    queries: dict[str, WarmupQuery] = {}
+    for entry in entries:
+        warmup_query = parse_logged_query(entry)
+        if warmup_query is None:
+            continue
+        key = json.dumps(
+            [warmup_query.query, warmup_query.max_results,
+             warmup_query.metadata_filter, warmup_query.search_type, warmup_query.kb],
+            sort_keys=True, ensure_ascii=False,
+        )
+        try:
+            age = max(0.0, now - float(entry.get("ts", now)))
+        except (TypeError, ValueError):
+            age = 0.0
+        scores[key] = scores.get(key, 0.0) + math.exp(-decay * age)
+        queries[key] = warmup_query
+
+    ranked = sorted(scores, key=lambda k: scores[k], reverse=True)
+    return [queries[key] for key in ranked[:top_n]]
+
+
+class CacheWarmer:
+    """
+    選択されたクエリをレート制限付きで順に実行し、キャッシュを温める。
+
+    スロットリング・認証エラー・KB 未検出が発生した時点で停止する。
+    その他のサービスエラーは件数のみ記録して次のクエリへ進む。
+
+    Attributes:
+        stats: executed / cached / errors / stopped_reason を含む実行結果
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        config: KBConfig,
+        cache: ResultCache,
+        queries: list[WarmupQuery],
+        rate_per_second: float = 2.0,
+    ) -> None:
+        self._client_factory = client_factory
+        self._config = config
+        self._cache = cache
+        self._queries = queries
+        self._interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._stop_event = threading.Event()
+        self.stats: dict[str, Any] = {
+            "executed": 0,
+            "cached": 0,
+            "errors": 0,
+            "stopped_reason": None,
+        }
+
+    def stop(self) -> None:
+        """実行中のウォームアップを停止する。"""
+        self._stop_event.set()
+
+    def run(self) -> dict[str, Any]:
+        """
+        ウォームアップを同期的に実行する。
+
+        Returns:
+            dict: 実行結果の統計
+        """
+        client = None
+        issued = 0
+        for warmup_query in self._queries:
+            if self._stop_event.is_set():
+                self.stats["stopped_reason"] = "stopped"
+                break
+            # 既にキャッシュ済みのクエリは API を呼ばない
+            if self._cache.contains(build_cache_key(
+                self._config, warmup_query.query, warmup_query.max_results,
+                warmup_query.metadata_filter, warmup_query.search_type,
+            )):
+                continue
+            # レート制限（停止要求があれば待機を中断）
+            if issued and self._interval and self._stop_event.wait(self._interval):
+                self.stats["stopped_reason"] = "stopped"
+                break
+            if client is None:
+                client = self._client_factory()
+            issued += 1
+            try:
+                query_knowledge_base(
+                    client=client,
+                    config=self._config,
+                    query=warmup_query.query,
+                    max_results=warmup_query.max_results,
+                    metadata_filter=warmup_query.metadata_filter,
+                    search_type=warmup_query.search_type,
+                    cache=self._cache,
+                )
+            except BedrockThrottlingError:
+                self.stats["stopped_reason"] = "throttled"
+                break
+            except (BedrockAuthenticationError, BedrockKBNotFoundError) as e:
+                self.stats["stopped_reason"] = type(e).__name__
+                break
+            except BedrockServiceError:
+                self.stats["errors"] += 1
+                continue
+            self.stats["executed"] += 1
+        self.stats["cached"] = len(self._cache)
+        return self.stats
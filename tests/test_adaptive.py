@@ -0,0 +1,278 @@
+"""
+適応的な検索件数とスコア下限のテスト
+
+**Feature: adaptive-results, Property 29: auto は固定 10 件の検索と同じ閾値以上のチャンクを返す**
+"""
+
+import asyncio
+import json
+
+import pytest
+from hypothesis import given, strategies as st, settings
+
+from src import server
+from src.adaptive import (
+    AUTO_INITIAL_RESULTS,
+    AUTO_MAX_RESULTS,
+    adaptive_retrieve,
+    cut_below,
+    score_threshold,
+)
+from src.bedrock_client import query_knowledge_base
+from src.cache import ResultCache
+from src.config import KBConfig
+from src.deadline import DeadlineExceededError
+from src.metrics import Metrics
+from src.models import KBResponse, RetrievalResult
+from src.parser import parse_retrieve_response
+from src.server import mcp
+
+
+def _ranking(scores: list[float]) -> list[RetrievalResult]:
+    return [
+        RetrievalResult(content=f"チャンク{i}", location={"uri": f"s3://kb/{i}"}, score=score)
+        for i, score in enumerate(scores)
+    ]
+
+
+class RankedRetriever:
+    """スコアの降順のランキングから nextToken の位置以降の count 件を返す検索関数"""
+
+    def __init__(self, ranking: list[RetrievalResult], paged: bool = True) -> None:
+        self.ranking = ranking
+        self.paged = paged
+        self.pages: list[tuple[int, int]] = []
+
+    @property
+    def requested(self) -> list[int]:
+        """各呼び出しの後に取得済みの件数"""
+        return [offset + count for offset, count in self.pages]
+
+    def __call__(self, count: int, next_token: str | None) -> KBResponse:
+        offset = int(next_token) if next_token is not None else 0
+        self.pages.append((offset, count))
+        end = offset + count
+        more = self.paged and end < len(self.ranking)
+        return KBResponse(
+            results=self.ranking[offset:end], next_token=str(end) if more else None
+        )
+
+
+class TestProperty29AutoMatchesFixedK:
+    """
+    **Feature: adaptive-results, Property 29: auto は固定 10 件の検索と同じ閾値以上のチャンクを返す**
+    """
+
+    @settings(max_examples=100)
+    @given(
+        st.lists(st.floats(min_value=0.0, max_value=1.0), max_size=20),
+        st.none() | st.floats(min_value=0.0, max_value=1.0),
+    )
+    def test_auto_returns_fixed_k_results_above_threshold(self, scores, min_score) -> None:
+        """閾値以上のチャンクは固定 10 件の検索と同じで、件数は必要な場合のみ広げる"""
+        ranking = _ranking(sorted(scores, reverse=True))
+        retriever = RankedRetriever(ranking)
+
+        response = adaptive_retrieve(retriever, min_score, registry=Metrics())
+
+        fixed = ranking[:AUTO_MAX_RESULTS]
+        expected = cut_below(fixed, score_threshold(fixed, min_score, True), Metrics())
+        assert response.results == expected
+        assert retriever.requested[0] == AUTO_INITIAL_RESULTS
+        assert retriever.requested == sorted(set(retriever.requested))
+        assert retriever.requested[-1] <= AUTO_MAX_RESULTS
+        # 続きのページがある限り、取得済みのチャンクを取り直さずに続きのみを取得する
+        for (offset, _), previous in zip(retriever.pages[1:], retriever.requested):
+            assert offset == previous or (offset == 0 and previous >= len(ranking))
+        # 広げたのは直前の結果の最後のチャンクがまだ閾値以上だった場合のみ
+        for previous in retriever.requested[:-1]:
+            page = ranking[:previous]
+            assert len(page) == previous
+            assert page[-1].score >= score_threshold(page, min_score, True)
+
+
+class TestAdaptive:
+    """適応的な検索件数の個別のテスト"""
+
+    def test_sharp_query_uses_one_round(self) -> None:
+        """先頭のスコアが突出したクエリは最初の検索のみで 1 件を返す"""
+        retriever = RankedRetriever(_ranking([0.9, 0.4, 0.3, 0.2]))
+
+        response = adaptive_retrieve(retriever, registry=Metrics())
+
+        assert retriever.requested == [3]
+        assert [r.score for r in response.results] == [0.9]
+
+    def test_flat_query_expands_to_max(self) -> None:
+        """スコア分布が平坦なクエリは最大件数まで広げる"""
+        retriever = RankedRetriever(_ranking([0.60 - i / 1000 for i in range(20)]))
+
+        response = adaptive_retrieve(retriever, registry=Metrics())
+
+        assert retriever.pages == [(0, 3), (3, 3), (6, 4)]
+        assert len(response.results) == 10
+
+    def test_without_next_token_retrieves_again(self) -> None:
+        """nextToken が無い場合は広げた件数で検索し直す"""
+        retriever = RankedRetriever(_ranking([0.60 - i / 1000 for i in range(20)]), paged=False)
+
+        response = adaptive_retrieve(retriever, registry=Metrics())
+
+        assert retriever.pages == [(0, 3), (0, 6), (0, 10)]
+        assert len(response.results) == 10
+
+    def test_deadline_in_later_round_returns_previous_results(self) -> None:
+        """広げた検索で時間予算を使い切った場合は前回の結果を返す"""
+        ranking = _ranking([0.6] * 10)
+
+        def retrieve(count: int, next_token: str | None) -> KBResponse:
+            if next_token is not None:
+                raise DeadlineExceededError("timeout")
+            return KBResponse(results=ranking[:count], next_token="3")
+
+        assert len(adaptive_retrieve(retrieve, registry=Metrics()).results) == 3
+
+    def test_parser_stops_at_min_score(self) -> None:
+        """解析はスコアが min_score 未満になった時点で打ち切る"""
+        response = {"retrievalResults": [
+            {"content": {"text": "a"}, "score": 0.9},
+            {"content": {"text": "b"}, "score": 0.5},
+            {"content": {"text": "c"}, "score": 0.8},
+        ]}
+
+        assert [r.content for r in parse_retrieve_response(response, 0.6).results] == ["a"]
+        assert len(parse_retrieve_response(response).results) == 3
+
+    def test_min_score_stops_paging_without_cache(self) -> None:
+        """キャッシュを使わない場合、下限未満に達したら続きのページを取得しない"""
+        class PagedClient:
+            def __init__(self) -> None:
+                self.calls = 0
+
+            def retrieve(self, **params):
+                self.calls += 1
+                return {
+                    "retrievalResults": [
+                        {"content": {"text": "a"}, "score": 0.9},
+                        {"content": {"text": "b"}, "score": 0.2},
+                    ],
+                    "nextToken": "next",
+                }
+
+        client = PagedClient()
+        config = KBConfig(aws_region="r", kb_id="KB1")
+
+        response = query_knowledge_base(client, config, "q", max_results=10, min_score=0.5)
+
+        assert client.calls == 1
+        assert [r.content for r in response.results] == ["a"]
+
+    def test_cache_holds_full_results_for_other_cutoffs(self) -> None:
+        """キャッシュには全件を格納し、下限の異なる呼び出しで共有する"""
+        class Client:
+            calls = 0
+
+            def retrieve(self, **params):
+                Client.calls += 1
+                return {"retrievalResults": [
+                    {"content": {"text": "a"}, "score": 0.9},
+                    {"content": {"text": "b"}, "score": 0.4},
+                ]}
+
+        config = KBConfig(aws_region="r", kb_id="KB1")
+        cache = ResultCache(ttl_seconds=60)
+
+        strict = query_knowledge_base(Client(), config, "q", max_results=4, cache=cache, min_score=0.5)
+        loose = query_knowledge_base(Client(), config, "q", max_results=4, cache=cache)
+
+        assert [r.content for r in strict.results] == ["a"]
+        assert [r.content for r in loose.results] == ["a", "b"]
+        assert Client.calls == 1
+
+
+class TestKbAnswerAdaptive:
+    """kb_answer の max_results="auto" / min_score のテスト"""
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        class ScoredClient:
+            def __init__(self) -> None:
+                self.scores = [0.9, 0.85, 0.3, 0.2, 0.1]
+                self.paged = False
+                self.requested: list[int] = []
+                self.tokens: list[str | None] = []
+
+            def retrieve(self, **params):
+                count = params["retrievalConfiguration"]["vectorSearchConfiguration"][
+                    "numberOfResults"
+                ]
+                self.requested.append(count)
+                self.tokens.append(params.get("nextToken"))
+                offset = int(params.get("nextToken", 0))
+                response = {"retrievalResults": [
+                    {"content": {"text": f"チャンク{i}"}, "location": {}, "score": self.scores[i]}
+                    for i in range(offset, min(offset + count, len(self.scores)))
+                ]}
+                if self.paged and offset + count < len(self.scores):
+                    response["nextToken"] = str(offset + count)
+                return response
+
+        scored = ScoredClient()
+        monkeypatch.setenv("BEDROCK_KB_ID", "kb")
+        monkeypatch.setenv("BEDROCK_KB_BACKEND", "bedrock")
+        monkeypatch.setenv("BEDROCK_KB_CACHE_TTL", "0")
+        monkeypatch.delenv("BEDROCK_KB_QUERY_LOG", raising=False)
+        monkeypatch.delenv("BEDROCK_KB_FETCH_LIMIT", raising=False)
+        monkeypatch.delenv("BEDROCK_KB_PROFILES", raising=False)
+        monkeypatch.setattr(server, "_negative_cache", None)
+        monkeypatch.setattr(server, "create_client", lambda config, deadline: scored)
+        return scored
+
+    @staticmethod
+    def _answer(**kwargs):
+        kb_answer = mcp._tool_manager._tools["kb_answer"].fn
+        return json.loads(asyncio.run(kb_answer(query="返品", **kwargs)))
+
+    def test_auto_returns_only_high_scoring_chunks(self, client) -> None:
+        """auto は少ない件数から検索し、先頭に近いスコアのチャンクのみを返す"""
+        result = self._answer(max_results="auto")
+
+        assert [r["score"] for r in result] == [0.9, 0.85]
+        assert client.requested == [AUTO_INITIAL_RESULTS]
+
+    def test_auto_expands_flat_distribution(self, client) -> None:
+        """裾が平坦な場合は件数を広げて検索し直す"""
+        client.scores = [0.7] * 12
+
+        result = self._answer(max_results="AUTO")
+
+        assert len(result) == 10
+        assert client.requested == [3, 6, 10]
+
+    def test_auto_fetches_only_the_next_page(self, client) -> None:
+        """nextToken がある場合は取得済みのチャンクを取り直さず、追加分のページのみを取得する"""
+        client.scores = [0.7] * 12
+        client.paged = True
+
+        result = self._answer(max_results="auto")
+
+        assert [r["content"] for r in result] == [f"チャンク{i}" for i in range(10)]
+        assert client.requested == [3, 3, 4]
+        assert client.tokens == [None, "3", "6"]
+
+    def test_min_score_with_fixed_count(self, client) -> None:
+        """min_score のみの場合は max_results 件を検索して下限未満を除く"""
+        result = self._answer(max_results=5, min_score=0.25)
+
+        assert [r["score"] for r in result] == [0.9, 0.85, 0.3]
+        assert client.requested == [5]
+
+    @pytest.mark.parametrize("kwargs", [
+        {"max_results": "many"},
+        {"max_results": 2.5},
+        {"min_score": -0.1},
+        {"min_score": "0.5"},
+    ])
+    def test_invalid_values_return_validation_error(self, client, kwargs) -> None:
+        """"auto" 以外の文字列・負の下限などはバリデーションエラー"""
+        assert self._answer(**kwargs)["error_type"] == "ValidationError"
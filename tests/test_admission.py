@@ -0,0 +1,245 @@
+"""
+アドミッション制御のテスト
+
+**Feature: admission-control, Property 20: 同時実行数と待ち行列の上限**
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from fastmcp import Client
+from hypothesis import given, strategies as st, settings
+
+from src import server
+from src.admission import AdmissionController, OverloadedError
+from src.deadline import DeadlineExceededError
+from src.metrics import Metrics
+from src.models import KBResponse
+from src.server import mcp
+
+
+def _wait_for(predicate, timeout: float = 5.0) -> None:
+    """predicate が真になるまで待つ"""
+    limit = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > limit:
+            pytest.fail("条件が満たされませんでした")
+        time.sleep(0.005)
+
+
+class TestProperty20AdmissionLimits:
+    """
+    **Feature: admission-control, Property 20: 同時実行数と待ち行列の上限**
+    """
+
+    @settings(max_examples=100, deadline=None)
+    @given(
+        st.integers(min_value=1, max_value=4),
+        st.integers(min_value=0, max_value=4),
+        st.lists(st.sampled_from(["high", "normal", "low"]), min_size=1, max_size=12),
+    )
+    def test_in_flight_and_queue_are_bounded(self, max_in_flight, max_queue, priorities) -> None:
+        """実行中は max_in_flight 以下、待機中は max_queue 以下で、超過分は即座に拒否される"""
+        registry = Metrics()
+        controller = AdmissionController(max_in_flight, max_queue, registry=registry)
+        admitted = []
+        rejected = 0
+        for priority in priorities:
+            try:
+                controller.acquire(priority, timeout=0)
+                admitted.append(priority)
+            except OverloadedError:
+                rejected += 1
+            except DeadlineExceededError:
+                pass
+            assert controller.in_flight <= max_in_flight
+            assert controller.queue_depth <= max_queue
+
+        # timeout=0 の呼び出しは待機しないため、実行枠を得たのは先頭 max_in_flight 件のみ
+        assert len(admitted) == min(max_in_flight, len(priorities))
+        assert controller.queue_depth == 0
+        for _ in admitted:
+            controller.release()
+        assert controller.in_flight == 0
+        assert registry.snapshot()["counters"].get("admission.rejected", 0) == rejected
+
+
+class TestAdmissionController:
+    """AdmissionController のユニットテスト"""
+
+    def _enqueue(self, controller, priority, order, errors):
+        def run():
+            try:
+                with controller.admit(priority, timeout=5):
+                    order.append(priority)
+            except (OverloadedError, DeadlineExceededError) as e:
+                errors.append((priority, type(e).__name__))
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def test_waiters_are_admitted_in_priority_order(self) -> None:
+        """実行枠が空くと優先度の高い順（同順位は到着順）に実行される"""
+        controller = AdmissionController(max_in_flight=1, max_queue=4, registry=Metrics())
+        controller.acquire()
+        order: list[str] = []
+        errors: list = []
+        threads = []
+        for count, priority in enumerate(["low", "normal", "high", "normal"], start=1):
+            threads.append(self._enqueue(controller, priority, order, errors))
+            _wait_for(lambda c=count: controller.queue_depth == c)
+
+        controller.release()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        assert order == ["high", "normal", "normal", "low"]
+        assert errors == []
+        assert controller.in_flight == 0
+
+    def test_full_queue_rejects_fast(self) -> None:
+        """待ち行列が満杯の場合は待たずに OverloadedError となる"""
+        registry = Metrics()
+        controller = AdmissionController(max_in_flight=1, max_queue=1, registry=registry)
+        controller.acquire()
+        order: list[str] = []
+        errors: list = []
+        thread = self._enqueue(controller, "normal", order, errors)
+        _wait_for(lambda: controller.queue_depth == 1)
+
+        started = time.monotonic()
+        with pytest.raises(OverloadedError):
+            controller.acquire("normal", timeout=5)
+        assert time.monotonic() - started < 1
+
+        controller.release()
+        thread.join(timeout=5)
+        assert order == ["normal"]
+        assert registry.snapshot()["counters"]["admission.rejected"] == 1
+
+    def test_higher_priority_displaces_lowest_waiter(self) -> None:
+        """待ち行列が満杯でも、優先度の低い待機中の呼び出しを拒否して並べる"""
+        controller = AdmissionController(max_in_flight=1, max_queue=1, registry=Metrics())
+        controller.acquire()
+        order: list[str] = []
+        errors: list = []
+        low = self._enqueue(controller, "low", order, errors)
+        _wait_for(lambda: controller.queue_depth == 1)
+        high = self._enqueue(controller, "high", order, errors)
+        low.join(timeout=5)
+
+        assert errors == [("low", "OverloadedError")]
+        controller.release()
+        high.join(timeout=5)
+        assert order == ["high"]
+
+    def test_wait_timeout_raises_deadline_exceeded(self) -> None:
+        """待機時間が timeout を超えると DeadlineExceededError となり待ち行列から外れる"""
+        registry = Metrics()
+        controller = AdmissionController(max_in_flight=1, max_queue=2, registry=registry)
+        controller.acquire()
+
+        with pytest.raises(DeadlineExceededError):
+            controller.acquire("normal", timeout=0.05)
+
+        assert controller.queue_depth == 0
+        snapshot = registry.snapshot()
+        assert snapshot["counters"]["admission.timeouts"] == 1
+        assert snapshot["gauges"]["admission.queue_depth"] == 0
+
+    def test_wait_time_is_observed(self) -> None:
+        """実行枠を得るまでの待機時間がサマリーに記録される"""
+        registry = Metrics()
+        controller = AdmissionController(max_in_flight=1, max_queue=1, registry=registry)
+        controller.acquire()
+        order: list[str] = []
+        thread = self._enqueue(controller, "normal", order, [])
+        _wait_for(lambda: controller.queue_depth == 1)
+        time.sleep(0.02)
+        controller.release()
+        thread.join(timeout=5)
+
+        summary = registry.snapshot()["summaries"]["admission.wait_ms"]
+        assert summary["count"] == 2
+        assert summary["max"] >= 10
+
+
+class TestOverloadedKbAnswer:
+    """kb_answer のアドミッション制御のテスト"""
+
+    @pytest.fixture
+    def configured(self, monkeypatch):
+        monkeypatch.setenv("BEDROCK_KB_ID", "kb")
+        monkeypatch.setenv("BEDROCK_KB_BACKEND", "bedrock")
+        monkeypatch.setenv("BEDROCK_KB_MAX_IN_FLIGHT", "1")
+        monkeypatch.setenv("BEDROCK_KB_MAX_QUEUE", "0")
+        monkeypatch.delenv("BEDROCK_KB_QUERY_LOG", raising=False)
+        monkeypatch.setattr(server, "_result_cache", None)
+        monkeypatch.setattr(server, "_negative_cache", None)
+        monkeypatch.setattr(server, "_admission", None)
+        monkeypatch.setattr(server, "create_client", lambda config, deadline: object())
+        monkeypatch.setattr(
+            server, "query_knowledge_base", lambda **_kwargs: KBResponse(results=[])
+        )
+
+    @pytest.fixture
+    def saturated(self, configured):
+        admission = server._get_admission(server.load_config())
+        admission.acquire()
+        yield admission
+        admission.release()
+
+    def test_full_queue_returns_overloaded(self, saturated) -> None:
+        """待ち行列が満杯の場合は error_type Overloaded を返す"""
+        result = json.loads(asyncio.run(mcp._tool_manager._tools["kb_answer"].fn(query="返品")))
+
+        assert result["error"] is True
+        assert result["error_type"] == "Overloaded"
+
+    def test_cached_query_bypasses_admission(self, saturated, monkeypatch) -> None:
+        """キャッシュ済みのクエリは実行枠を待たずに返す"""
+        monkeypatch.setattr(server.ResultCache, "contains", lambda self, key: True)
+
+        result = json.loads(asyncio.run(mcp._tool_manager._tools["kb_answer"].fn(query="返品")))
+
+        assert result == []
+
+    def test_concurrent_tool_calls_reach_admission(self, configured, monkeypatch) -> None:
+        """同時に届いたツール呼び出しはイベントループで直列化されず、枠が無ければ Overloaded になる"""
+        entered = threading.Event()
+        release = threading.Event()
+
+        def slow_query(**_kwargs) -> KBResponse:
+            entered.set()
+            release.wait(5)
+            return KBResponse(results=[])
+
+        monkeypatch.setattr(server, "query_knowledge_base", slow_query)
+
+        async def call_concurrently() -> tuple[str, str]:
+            async with Client(mcp) as client:
+                first = asyncio.create_task(client.call_tool("kb_answer", {"query": "返品"}))
+                await asyncio.to_thread(entered.wait, 5)
+                try:
+                    second = await asyncio.wait_for(
+                        client.call_tool("kb_answer", {"query": "送料"}), timeout=5
+                    )
+                finally:
+                    release.set()
+                return (await first).content[0].text, second.content[0].text
+
+        first, second = asyncio.run(call_concurrently())
+
+        assert json.loads(first) == []
+        assert json.loads(second)["error_type"] == "Overloaded"
+
+    def test_invalid_priority_returns_validation_error(self) -> None:
+        """未対応の優先度は ValidationError となる"""
+        result = json.loads(asyncio.run(mcp._tool_manager._tools["kb_answer"].fn(
+            query="返品", priority="urgent",
+        )))
+
+        assert result["error_type"] == "ValidationError"
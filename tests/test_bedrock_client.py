@@ -6,6 +6,8 @@ Bedrock クライアントのプロパティテスト
 
 **Feature: bedrock-kb-mcp-server, Property 6: APIエラーで例外詳細を保持**
 **検証対象: 要件 3.3**
+
+**Feature: retrieval-filters, Property 10: フィルターと検索タイプをリクエストとキャッシュキーに反映**
 """
 
 from unittest.mock import MagicMock
@@ -16,11 +18,13 @@ from hypothesis import given, strategies as st, settings
 
 from src.config import KBConfig
 from src.bedrock_client import (
+    build_cache_key,
     build_retrieve_request,
     query_knowledge_base,
     BedrockAuthenticationError,
     BedrockKBNotFoundError,
     BedrockServiceError,
+    BedrockThrottlingError,
 )
 
 
@@ -561,3 +565,113 @@ class TestKBNotFoundErrorHandling:
 
         # KB ID 確認のガイダンスが含まれていることを確認
         assert "確認してください" in str(exc_info.value)
+
+
+class TestProperty10FilterPushdown:
+    """
+    **Feature: retrieval-filters, Property 10: フィルターと検索タイプをリクエストとキャッシュキーに反映**
+
+    メタデータフィルターと overrideSearchType は vectorSearchConfiguration に設定され、
+    キャッシュキーにも含まれる。
+    """
+
+    def _create_config(self) -> KBConfig:
+        """テスト用の設定を作成"""
+        return KBConfig(
+            aws_region="ap-northeast-1",
+            kb_id="test-kb-id",
+        )
+
+    def test_filter_and_search_type_are_pushed_down(self):
+        """フィルターと検索タイプが vectorSearchConfiguration に設定される"""
+        metadata_filter = {"equals": {"key": "category", "value": "faq"}}
+        request = build_retrieve_request(
+            self._create_config(), "返品", 4, metadata_filter, "HYBRID"
+        )
+
+        vector_config = request["retrievalConfiguration"]["vectorSearchConfiguration"]
+        assert vector_config["filter"] == metadata_filter
+        assert vector_config["overrideSearchType"] == "HYBRID"
+
+    def test_omitted_options_are_not_sent(self):
+        """フィルター・検索タイプ未指定時はキー自体が含まれない"""
+        request = build_retrieve_request(self._create_config(), "返品", 4)
+
+        vector_config = request["retrievalConfiguration"]["vectorSearchConfiguration"]
+        assert vector_config == {"numberOfResults": 4}
+
+    def test_query_knowledge_base_sends_filter(self):
+        """query_knowledge_base はフィルターを retrieve に渡す"""
+        metadata_filter = {"in": {"key": "category", "value": ["faq", "guide"]}}
+        mock_client = MagicMock()
+        mock_client.retrieve.return_value = {"retrievalResults": []}
+
+        query_knowledge_base(
+            mock_client, self._create_config(), "返品",
+            metadata_filter=metadata_filter, search_type="SEMANTIC",
+        )
+
+        sent = mock_client.retrieve.call_args.kwargs
+        vector_config = sent["retrievalConfiguration"]["vectorSearchConfiguration"]
+        assert vector_config["filter"] == metadata_filter
+        assert vector_config["overrideSearchType"] == "SEMANTIC"
+
+    @given(
+        query=query_strategy,
+        key=st.text(min_size=1, max_size=20),
+        value_a=st.text(max_size=20),
+        value_b=st.text(max_size=20),
+    )
+    @settings(max_examples=100)
+    def test_cache_key_distinguishes_filters(
+        self, query: str, key: str, value_a: str, value_b: str
+    ):
+        """フィルター内容が異なればキャッシュキーも異なる"""
+        config = self._create_config()
+        key_a = build_cache_key(config, query, 4, {"equals": {"key": key, "value": value_a}})
+        key_b = build_cache_key(config, query, 4, {"equals": {"key": key, "value": value_b}})
+
+        assert (key_a == key_b) == (value_a == value_b)
+        assert key_a != build_cache_key(config, query, 4)
+
+    def test_cache_key_ignores_dict_ordering(self):
+        """フィルターの辞書キー順はキャッシュキーに影響しない"""
+        config = self._create_config()
+        key_a = build_cache_key(config, "q", 4, {"equals": {"key": "a", "value": 1}})
+        key_b = build_cache_key(config, "q", 4, {"equals": {"value": 1, "key": "a"}})
+
+        assert key_a == key_b
+
+    def test_cache_key_includes_search_type(self):
+        """検索タイプが異なればキャッシュキーも異なる"""
+        config = self._create_config()
+        assert build_cache_key(config, "q", 4, None, "HYBRID") != (
+            build_cache_key(config, "q", 4, None, "SEMANTIC")
+        )
+
+
+class TestThrottlingErrorHandling:
+    """
+    スロットリングエラーハンドリングのユニットテスト
+    """
+
+    @pytest.mark.parametrize("error_code", [
+        "ThrottlingException",
+        "TooManyRequestsException",
+        "ServiceQuotaExceededException",
+    ])
+    def test_throttling_raises_throttling_error(self, error_code: str):
+        """スロットリング系のエラーコードは BedrockThrottlingError になる"""
+        config = KBConfig(aws_region="ap-northeast-1", kb_id="test-kb-id")
+        mock_client = MagicMock()
+        mock_client.retrieve.side_effect = ClientError(
+            error_response={"Error": {"Code": error_code, "Message": "Rate exceeded"}},
+            operation_name="Retrieve",
+        )
+
+        with pytest.raises(BedrockThrottlingError) as exc_info:
+            query_knowledge_base(mock_client, config, "test query")
+
+        # 既存の BedrockServiceError のハンドリングとも互換
+        assert isinstance(exc_info.value, BedrockServiceError)
+        assert error_code in str(exc_info.value)
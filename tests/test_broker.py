@@ -0,0 +1,338 @@
+"""
+ブローカーデーモンのテスト
+
+**Feature: broker, Property 27: ブローカー経由の呼び出しは直接の呼び出しと同じ結果を返す**
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+from fastmcp.exceptions import ResourceError
+from hypothesis import given, strategies as st, settings
+
+from src import broker, server
+from src.broker import (
+    BrokerClient,
+    BrokerError,
+    BrokerRemoteError,
+    BrokerServer,
+    BrokerUnavailableError,
+    config_fingerprint,
+    default_socket_path,
+)
+from src.config import load_config
+from src.metrics import Metrics, metrics
+
+from tests.test_config import env_vars
+
+
+def _echo(**arguments):
+    return arguments
+
+
+def _fail(message: str):
+    raise ResourceError(message)
+
+
+def _serve(socket_path: str, handlers=None, idle_timeout_seconds: float = 0.0) -> BrokerServer:
+    """BrokerServer をバックグラウンドスレッドで起動する。"""
+    daemon = BrokerServer(
+        socket_path,
+        handlers or {"echo": _echo, "fail": _fail},
+        idle_timeout_seconds=idle_timeout_seconds,
+        registry=Metrics(),
+    )
+    daemon.bind()
+    threading.Thread(target=daemon.serve_forever, daemon=True).start()
+    return daemon
+
+
+@pytest.fixture(scope="module")
+def echo_broker(tmp_path_factory):
+    socket_path = str(tmp_path_factory.mktemp("broker") / "echo.sock")
+    daemon = _serve(socket_path)
+    yield BrokerClient(socket_path, timeout_seconds=5)
+    daemon.stop()
+
+
+JSON_VALUES = st.recursive(
+    st.none() | st.booleans() | st.integers() | st.text(),
+    lambda children: st.lists(children, max_size=3)
+    | st.dictionaries(st.text(max_size=5), children, max_size=3),
+    max_leaves=10,
+)
+
+
+class TestProperty27BrokerRoundTrip:
+    """
+    **Feature: broker, Property 27: ブローカー経由の呼び出しは直接の呼び出しと同じ結果を返す**
+    """
+
+    @settings(max_examples=100, deadline=None)
+    @given(st.dictionaries(st.text(min_size=1, max_size=10), JSON_VALUES, max_size=5))
+    def test_arguments_and_results_round_trip(self, echo_broker, arguments) -> None:
+        """引数と戻り値は JSON で表せる値であれば変わらずに受け渡される"""
+        assert echo_broker.call("echo", arguments) == _echo(**arguments)
+
+
+class TestBroker:
+    """ブローカーデーモン・クライアントのテスト"""
+
+    def test_remote_errors_keep_their_type(self, echo_broker) -> None:
+        """ツールの例外は例外クラス名とメッセージがシムに返る"""
+        with pytest.raises(BrokerRemoteError) as exc_info:
+            echo_broker.call("fail", {"message": "チャンクが見つかりません"})
+
+        assert exc_info.value.error_type == "ResourceError"
+        assert str(exc_info.value) == "チャンクが見つかりません"
+
+        with pytest.raises(BrokerRemoteError):
+            echo_broker.call("unknown", {})
+
+    def test_unavailable_without_daemon(self, tmp_path) -> None:
+        """デーモンが無い場合は送信前の BrokerUnavailableError になる"""
+        client = BrokerClient(str(tmp_path / "missing.sock"))
+
+        assert client.ping() is False
+        with pytest.raises(BrokerUnavailableError):
+            client.call("echo", {})
+
+    def test_second_daemon_refuses_to_bind(self, tmp_path) -> None:
+        """同じソケットで応答するデーモンがある場合は起動しない"""
+        socket_path = str(tmp_path / "b.sock")
+        daemon = _serve(socket_path)
+        try:
+            with pytest.raises(BrokerError):
+                BrokerServer(socket_path, {}).bind()
+            assert BrokerClient(socket_path).ping()
+        finally:
+            daemon.stop()
+
+    def test_stale_socket_is_replaced(self, tmp_path) -> None:
+        """応答しない古いソケットファイルは削除して作り直す"""
+        socket_path = str(tmp_path / "stale.sock")
+        with open(socket_path, "w", encoding="utf-8"):
+            pass
+
+        daemon = _serve(socket_path)
+        try:
+            assert BrokerClient(socket_path).call("echo", {"a": 1}) == {"a": 1}
+            assert oct(os.stat(socket_path).st_mode & 0o077) == oct(0)
+        finally:
+            daemon.stop()
+
+    def test_idle_daemon_exits_and_removes_socket(self, tmp_path) -> None:
+        """リクエストが無ければ idle_timeout_seconds 後に終了してソケットを削除する"""
+        socket_path = str(tmp_path / "idle.sock")
+        daemon = BrokerServer(socket_path, {"echo": _echo}, idle_timeout_seconds=0.2)
+        thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+        thread.start()
+        time.sleep(0.05)
+        assert BrokerClient(socket_path).call("echo", {}) == {}
+
+        thread.join(timeout=5)
+
+        assert not thread.is_alive()
+        assert not os.path.exists(socket_path)
+
+    def test_stalled_client_does_not_block_idle_shutdown(self, tmp_path) -> None:
+        """リクエストを送り切らないクライアントは io_timeout_seconds で切断し、アイドル終了を妨げない"""
+        socket_path = str(tmp_path / "stall.sock")
+        registry = Metrics()
+
+        def slow(**arguments):
+            time.sleep(0.5)
+            return arguments
+
+        daemon = BrokerServer(
+            socket_path, {"slow": slow}, idle_timeout_seconds=0.3,
+            registry=registry, io_timeout_seconds=0.2,
+        )
+        daemon.bind()
+        thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+        thread.start()
+
+        # ツールの実行は io_timeout_seconds より長くても打ち切らない
+        assert BrokerClient(socket_path).call("slow", {"a": 1}) == {"a": 1}
+
+        stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            stalled.connect(socket_path)
+            stalled.sendall(b'{"tool": "slow"')
+            thread.join(timeout=5)
+        finally:
+            stalled.close()
+
+        assert not thread.is_alive()
+        assert registry.snapshot()["counters"]["broker.read_timeouts"] == 1
+
+    def test_autostart_restarts_exited_daemon(self, tmp_path, monkeypatch) -> None:
+        """autostart のクライアントはデーモンが終了していれば起動し直して再試行する"""
+        socket_path = str(tmp_path / "restart.sock")
+        spawned: list[BrokerServer] = []
+        monkeypatch.setattr(broker, "spawn_broker", lambda path: spawned.append(_serve(path)))
+        registry = Metrics()
+        client = BrokerClient(socket_path, autostart=True, registry=registry)
+
+        try:
+            assert client.call("echo", {"q": "x"}) == {"q": "x"}
+            assert client.call("echo", {}) == {}
+        finally:
+            for daemon in spawned:
+                daemon.stop()
+
+        assert len(spawned) == 1
+        assert registry.snapshot()["counters"]["broker.spawned"] == 1
+
+    def test_fingerprint_separates_configurations(self) -> None:
+        """Knowledge Base・認証情報の設定が異なればソケットを共有しない"""
+        base = {"BEDROCK_KB_ID": "KB1", "AWS_PROFILE": "dev", "HOME": "/home/a"}
+
+        assert config_fingerprint(base) == config_fingerprint(
+            {**base, "HOME": "/home/b", "BEDROCK_KB_BROKER": "1"}
+        )
+        assert config_fingerprint(base) != config_fingerprint({**base, "BEDROCK_KB_ID": "KB2"})
+        assert config_fingerprint(base) != config_fingerprint({**base, "AWS_PROFILE": "prod"})
+        assert default_socket_path({**base, "XDG_RUNTIME_DIR": "/run/user/1"}).startswith(
+            "/run/user/1/bedrock-kb-mcp-"
+        )
+
+    def test_default_socket_is_in_private_directory(self, tmp_path, monkeypatch) -> None:
+        """XDG_RUNTIME_DIR が無い場合は一時ディレクトリ直下ではなくユーザーごとのディレクトリに置く"""
+        monkeypatch.setattr(broker.tempfile, "gettempdir", lambda: str(tmp_path))
+        socket_path = default_socket_path({"BEDROCK_KB_ID": "KB1"})
+
+        assert os.path.dirname(socket_path) == str(tmp_path / f"bedrock-kb-mcp-{os.getuid()}")
+
+        previous_umask = os.umask(0)
+        try:
+            daemon = _serve(socket_path)
+        finally:
+            os.umask(previous_umask)
+        try:
+            assert BrokerClient(socket_path).call("echo", {"a": 1}) == {"a": 1}
+            assert os.stat(os.path.dirname(socket_path)).st_mode & 0o777 == 0o700
+            assert os.stat(socket_path).st_mode & 0o077 == 0
+            assert os.stat(socket_path + ".lock").st_mode & 0o077 == 0
+        finally:
+            daemon.stop()
+
+    def test_insecure_directory_is_refused(self, tmp_path, monkeypatch) -> None:
+        """他のユーザーが所有・アクセスできるディレクトリでは接続もデーモンの起動もしない"""
+        shared = tmp_path / "shared"
+        shared.mkdir(mode=0o700)
+        socket_path = str(shared / "b.sock")
+        daemon = _serve(socket_path)
+        monkeypatch.setattr(broker, "spawn_broker", lambda path: pytest.fail("spawned"))
+        client = BrokerClient(socket_path, autostart=True)
+        try:
+            shared.chmod(0o777)
+            with pytest.raises(BrokerUnavailableError):
+                BrokerServer(str(shared / "c.sock"), {}).bind()
+            with pytest.raises(BrokerUnavailableError):
+                client.call("echo", {})
+
+            shared.chmod(0o700)
+            assert client.call("echo", {}) == {}
+            other_uid = os.getuid() + 1
+            monkeypatch.setattr(broker.os, "getuid", lambda: other_uid)
+            with pytest.raises(BrokerUnavailableError):
+                client.call("echo", {})
+        finally:
+            monkeypatch.undo()
+            shared.chmod(0o700)
+            daemon.stop()
+
+    def test_symlinked_directory_is_refused(self, tmp_path) -> None:
+        """シンボリックリンクのディレクトリは差し替えられる可能性があるため使用しない"""
+        target = tmp_path / "target"
+        target.mkdir(mode=0o700)
+        link = tmp_path / "link"
+        link.symlink_to(target)
+
+        with pytest.raises(BrokerUnavailableError):
+            BrokerServer(str(link / "b.sock"), {}).bind()
+
+    def test_config(self) -> None:
+        """BEDROCK_KB_BROKER を有効にした場合のみソケットのパスを決定する"""
+        with env_vars(BEDROCK_KB_ID="KB1", BEDROCK_KB_BROKER=None, BEDROCK_KB_BROKER_SOCKET=None):
+            assert load_config().broker_socket_path is None
+        with env_vars(BEDROCK_KB_ID="KB1", BEDROCK_KB_BROKER="1", BEDROCK_KB_BROKER_SOCKET=None):
+            config = load_config()
+            assert config.broker_mode is True
+            assert config.broker_socket_path == default_socket_path()
+        with env_vars(BEDROCK_KB_ID="KB1", BEDROCK_KB_BROKER_IDLE_TIMEOUT="-1"):
+            with pytest.raises(ValueError):
+                load_config()
+
+
+class TestBrokerShim:
+    """シムとして動作するサーバーのツール転送のテスト"""
+
+    @pytest.fixture
+    def shim(self, tmp_path, monkeypatch):
+        """サーバーのツール（転送前の関数）を提供するデーモンに接続したシム"""
+        monkeypatch.setenv("BEDROCK_KB_ID", "KB1")
+        socket_path = str(tmp_path / "shim.sock")
+        handlers = {
+            name: fn.__wrapped__ for name, fn in server.broker_handlers().items()
+        }
+        daemon = _serve(socket_path, handlers)
+        monkeypatch.setattr(server, "_broker", BrokerClient(socket_path, timeout_seconds=5))
+        yield daemon
+        daemon.stop()
+
+    def test_tools_are_forwarded(self, shim, monkeypatch) -> None:
+        """ツールの呼び出しはデーモンで実行され、同じ戻り値を返す"""
+        calls: list[dict] = []
+        handler = shim._handlers["kb_memory"]
+        shim._handlers["kb_memory"] = lambda **kwargs: calls.append(kwargs) or handler(**kwargs)
+
+        result = json.loads(server.mcp._tool_manager._tools["kb_memory"].fn(top=0))
+
+        assert calls == [{"top": 0}]
+        assert "rss_bytes" in json.dumps(result)
+
+    def test_resource_errors_are_raised_in_shim(self, shim) -> None:
+        """デーモンで保持していないチャンクはシムでも ResourceError になる"""
+        with pytest.raises(ResourceError):
+            server.broker_handlers()["kb_chunk"](chunk_hash="0" * 64)
+
+    def test_falls_back_to_local_when_daemon_is_gone(self, shim) -> None:
+        """デーモンに接続できない場合はシムのプロセスで実行する"""
+        shim.stop()
+        time.sleep(0.6)
+        before = metrics.snapshot()["counters"].get("broker.fallbacks", 0)
+
+        result = json.loads(server.mcp._tool_manager._tools["kb_metrics"].fn())
+
+        assert "counters" in result
+        assert metrics.snapshot()["counters"]["broker.fallbacks"] == before + 1
+
+
+class TestBrokerDaemonProcess:
+    """実際にデーモンプロセスを起動するテスト"""
+
+    def test_shim_starts_daemon_process(self, tmp_path, monkeypatch) -> None:
+        """シムはデーモンを起動し、デーモンはアイドル終了する"""
+        socket_path = str(tmp_path / "daemon.sock")
+        monkeypatch.setenv("BEDROCK_KB_ID", "KB1")
+        monkeypatch.setenv("BEDROCK_KB_MODEL_BUNDLE", "off")
+        monkeypatch.setenv("BEDROCK_KB_BROKER_IDLE_TIMEOUT", "1")
+        monkeypatch.setenv("BEDROCK_KB_BROKER", "1")
+        monkeypatch.setenv("BEDROCK_KB_BROKER_SOCKET", socket_path)
+        monkeypatch.setattr(server, "_broker", None)
+
+        client = server.start_broker_shim()
+        assert client is not None
+        result = json.loads(client.call("kb_metrics", {}))
+
+        assert "broker.requests" in result["counters"]
+        deadline = time.monotonic() + 10
+        while os.path.exists(socket_path) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        assert not os.path.exists(socket_path)
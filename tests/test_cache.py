@@ -0,0 +1,339 @@
+"""
+検索結果キャッシュのテスト
+
+**Feature: result-cache, Property 11: TTL と容量上限の遵守**
+**Feature: superset-overfetch, Property 25: 上限以下の max_results は先頭の切り出しで返す**
+"""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from botocore.exceptions import ClientError
+from hypothesis import given, strategies as st, settings
+
+from src import bedrock_client
+from src.bedrock_client import (
+    create_client,
+    credential_identity,
+    query_knowledge_base,
+    BedrockAuthenticationError,
+    BedrockKBNotFoundError,
+    BedrockServiceError,
+)
+from src.cache import NegativeCache, ResultCache
+from src.config import KBConfig, Replica
+from src.models import KBResponse, RetrievalResult
+
+
+class FakeClock:
+    """テスト用の手動で進める時計"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _response(text: str) -> KBResponse:
+    """テスト用のレスポンスを作成する"""
+    return KBResponse(results=[RetrievalResult(content=text, location={}, score=0.5)])
+
+
+class TestProperty11CacheBounds:
+    """
+    **Feature: result-cache, Property 11: TTL と容量上限の遵守**
+
+    任意の put 操作列に対して、エントリ数は max_entries を、バイト数は max_bytes を超えず、
+    TTL を過ぎたエントリは返されない。
+    """
+
+    @given(
+        max_entries=st.integers(min_value=1, max_value=10),
+        keys=st.lists(st.integers(min_value=0, max_value=20), max_size=50),
+    )
+    @settings(max_examples=100)
+    def test_entries_never_exceed_capacity(self, max_entries: int, keys: list[int]):
+        """エントリ数は常に max_entries 以下"""
+        cache = ResultCache(max_entries=max_entries, ttl_seconds=60)
+        for key in keys:
+            cache.put(key, _response(str(key)))
+            assert len(cache) <= max_entries
+
+    @given(
+        max_bytes=st.integers(min_value=1, max_value=4096),
+        texts=st.lists(st.text(max_size=300), max_size=50),
+    )
+    @settings(max_examples=100)
+    def test_bytes_never_exceed_budget(self, max_bytes: int, texts: list[str]):
+        """バイト数は max_bytes 以下（格納したエントリだけで超える場合はそのエントリのみ残す）"""
+        cache = ResultCache(max_entries=100, ttl_seconds=60, max_bytes=max_bytes)
+        for key, text in enumerate(texts):
+            cache.put(key, _response(text))
+            assert cache.stats()["bytes"] <= max_bytes or len(cache) == 1
+            assert cache.contains(key)
+
+    @given(ttl=st.floats(min_value=0.1, max_value=1000), elapsed=st.floats(min_value=0, max_value=2000))
+    @settings(max_examples=100)
+    def test_expired_entries_are_not_returned(self, ttl: float, elapsed: float):
+        """TTL を過ぎたエントリは None になる"""
+        clock = FakeClock()
+        cache = ResultCache(max_entries=4, ttl_seconds=ttl, clock=clock)
+        response = _response("a")
+        cache.put("k", response)
+
+        clock.now = elapsed
+        assert (cache.get("k") is response) == (elapsed < ttl)
+
+    def test_least_recently_used_is_evicted(self):
+        """最も古く使われたエントリから削除される"""
+        cache = ResultCache(max_entries=2, ttl_seconds=60)
+        cache.put("a", _response("a"))
+        cache.put("b", _response("b"))
+        cache.get("a")
+        cache.put("c", _response("c"))
+
+        assert cache.contains("a")
+        assert not cache.contains("b")
+        assert cache.contains("c")
+
+    def test_stats_track_hits_and_misses(self):
+        """ヒット・ミス数とヒット率が記録される"""
+        cache = ResultCache(max_entries=2, ttl_seconds=60)
+        cache.get("a")
+        cache.put("a", _response("a"))
+        cache.get("a")
+
+        stats = cache.stats()
+        assert stats.pop("bytes") > 0
+        assert stats == {
+            "entries": 1, "max_bytes": 0, "hits": 1, "misses": 1, "hit_rate": 0.5,
+        }
+
+    @pytest.mark.parametrize(
+        "kwargs", [{"max_entries": 0}, {"ttl_seconds": 0}, {"max_bytes": -1}]
+    )
+    def test_invalid_parameters_are_rejected(self, kwargs):
+        """不正なパラメータは ValueError"""
+        with pytest.raises(ValueError):
+            ResultCache(**kwargs)
+
+
+class TestQueryKnowledgeBaseCaching:
+    """query_knowledge_base のキャッシュ連携テスト"""
+
+    def test_second_call_is_served_from_cache(self):
+        """同じ条件の 2 回目の呼び出しは API を呼ばない"""
+        config = KBConfig(aws_region="ap-northeast-1", kb_id="kb")
+        client = MagicMock()
+        client.retrieve.return_value = {
+            "retrievalResults": [{"content": {"text": "返品"}, "location": {}, "score": 0.9}]
+        }
+        cache = ResultCache()
+
+        first = query_knowledge_base(client, config, "返品", cache=cache)
+        second = query_knowledge_base(client, config, "返品", cache=cache)
+
+        assert client.retrieve.call_count == 1
+        assert second is first
+
+    def test_different_filters_are_cached_separately(self):
+        """フィルターが異なる呼び出しは別々にキャッシュされる"""
+        config = KBConfig(aws_region="ap-northeast-1", kb_id="kb")
+        client = MagicMock()
+        client.retrieve.return_value = {"retrievalResults": []}
+        cache = ResultCache()
+
+        query_knowledge_base(client, config, "返品", cache=cache)
+        query_knowledge_base(
+            client, config, "返品", cache=cache,
+            metadata_filter={"equals": {"key": "category", "value": "faq"}},
+        )
+
+        assert client.retrieve.call_count == 2
+        assert len(cache) == 2
+
+
+class RankedClient:
+    """numberOfResults 件の順位付き結果を返す Retrieve 互換クライアント"""
+
+    def __init__(self, available: int) -> None:
+        self.available = available
+        self.requested: list[int] = []
+
+    def retrieve(self, **params):
+        count = params["retrievalConfiguration"]["vectorSearchConfiguration"]["numberOfResults"]
+        self.requested.append(count)
+        return {"retrievalResults": [
+            {"content": {"text": f"chunk-{rank}"}, "location": {}, "score": 1.0 - rank / 100}
+            for rank in range(min(count, self.available))
+        ]}
+
+
+class TestProperty25SupersetOverfetch:
+    """
+    **Feature: superset-overfetch, Property 25: 上限以下の max_results は先頭の切り出しで返す**
+    """
+
+    @settings(max_examples=100)
+    @given(
+        st.lists(st.integers(min_value=1, max_value=10), min_size=1, max_size=10),
+        st.integers(min_value=1, max_value=10),
+        st.integers(min_value=0, max_value=15),
+    )
+    def test_smaller_requests_are_prefix_slices(self, sizes, ceiling, available):
+        """結果は常に順位の先頭 max_results 件で、取得は正規化した件数ごとに 1 回のみ"""
+        config = KBConfig(aws_region="r", kb_id="kb", overfetch_results=ceiling)
+        client = RankedClient(available)
+        cache = ResultCache()
+
+        for size in sizes:
+            response = query_knowledge_base(client, config, "q", max_results=size, cache=cache)
+            assert [r.content for r in response.results] == [
+                f"chunk-{rank}" for rank in range(min(size, available))
+            ]
+
+        # 上限以下の件数は全て上限件数の 1 回の取得にまとまる
+        assert sorted(client.requested) == sorted({max(size, ceiling) for size in sizes})
+
+    def test_disabled_overfetch_keeps_exact_keys(self):
+        """上限が 0 の場合は max_results ごとに取得する"""
+        config = KBConfig(aws_region="r", kb_id="kb")
+        client = RankedClient(10)
+        cache = ResultCache()
+
+        query_knowledge_base(client, config, "q", max_results=4, cache=cache)
+        query_knowledge_base(client, config, "q", max_results=8, cache=cache)
+
+        assert client.requested == [4, 8]
+
+    def test_without_cache_only_requested_count_is_fetched(self):
+        """キャッシュを使用しない場合はオーバーフェッチしない"""
+        config = KBConfig(aws_region="r", kb_id="kb", overfetch_results=10)
+        client = RankedClient(10)
+
+        query_knowledge_base(client, config, "q", max_results=2)
+
+        assert client.requested == [2]
+
+
+class FakeBotoClient:
+    """認証情報を差し替えられる boto3 クライアント相当のテストダブル"""
+
+    def __init__(self, access_key: str, error_code: str) -> None:
+        self._request_signer = SimpleNamespace(
+            _credentials=SimpleNamespace(access_key=access_key)
+        )
+        self.error_code = error_code
+        self.calls = 0
+
+    def retrieve(self, **_kwargs):
+        self.calls += 1
+        raise ClientError(
+            error_response={"Error": {"Code": self.error_code, "Message": "failed"}},
+            operation_name="Retrieve",
+        )
+
+
+class TestNegativeCaching:
+    """失敗キャッシュのテスト"""
+
+    def _config(self, kb_id: str = "kb") -> KBConfig:
+        return KBConfig(aws_region="ap-northeast-1", kb_id=kb_id)
+
+    @pytest.mark.parametrize("error_code,error_type", [
+        ("ResourceNotFoundException", BedrockKBNotFoundError),
+        ("ExpiredTokenException", BedrockAuthenticationError),
+    ])
+    def test_repeated_failures_are_answered_locally(self, error_code, error_type):
+        """決定的な失敗は 2 回目以降 API を呼ばずに同じ例外になる"""
+        client = FakeBotoClient("AKIAOLD", error_code)
+        negative_cache = NegativeCache()
+
+        for _ in range(3):
+            with pytest.raises(error_type) as exc_info:
+                query_knowledge_base(client, self._config(), "q", negative_cache=negative_cache)
+
+        assert client.calls == 1
+        assert negative_cache.hits == 2
+        assert "kb" in str(exc_info.value) or "認証エラー" in str(exc_info.value)
+
+    def test_credential_change_invalidates(self):
+        """認証情報が変わると記憶した失敗は使われない"""
+        client = FakeBotoClient("AKIAOLD", "ExpiredTokenException")
+        negative_cache = NegativeCache()
+        with pytest.raises(BedrockAuthenticationError):
+            query_knowledge_base(client, self._config(), "q", negative_cache=negative_cache)
+
+        client._request_signer._credentials.access_key = "AKIANEW"
+        with pytest.raises(BedrockAuthenticationError):
+            query_knowledge_base(client, self._config(), "q", negative_cache=negative_cache)
+
+        assert client.calls == 2
+
+    def test_config_change_invalidates(self):
+        """KB ID が変わると記憶した失敗は使われない"""
+        client = FakeBotoClient("AKIA", "ResourceNotFoundException")
+        negative_cache = NegativeCache()
+        with pytest.raises(BedrockKBNotFoundError):
+            query_knowledge_base(client, self._config("old"), "q", negative_cache=negative_cache)
+        with pytest.raises(BedrockKBNotFoundError):
+            query_knowledge_base(client, self._config("new"), "q", negative_cache=negative_cache)
+
+        assert client.calls == 2
+
+    def test_transient_errors_are_not_cached(self):
+        """スロットリングなど一時的な失敗は記憶しない"""
+        client = FakeBotoClient("AKIA", "ThrottlingException")
+        negative_cache = NegativeCache()
+        for _ in range(2):
+            with pytest.raises(BedrockServiceError):
+                query_knowledge_base(client, self._config(), "q", negative_cache=negative_cache)
+
+        assert client.calls == 2
+        assert len(negative_cache) == 0
+
+    def test_entries_expire_after_ttl(self):
+        """TTL を過ぎると再び API を呼ぶ"""
+        clock = FakeClock()
+        client = FakeBotoClient("AKIA", "ResourceNotFoundException")
+        negative_cache = NegativeCache(ttl_seconds=10, clock=clock)
+        with pytest.raises(BedrockKBNotFoundError):
+            query_knowledge_base(client, self._config(), "q", negative_cache=negative_cache)
+
+        clock.now = 11
+        with pytest.raises(BedrockKBNotFoundError):
+            query_knowledge_base(client, self._config(), "q", negative_cache=negative_cache)
+
+        assert client.calls == 2
+
+    def test_replica_clients_share_negative_cache(self, monkeypatch):
+        """複製を設定した場合も、呼び出しごとに作成されるクライアントで失敗キャッシュがヒットする"""
+        pooled = {}
+
+        def replica_client(config, replica, deadline):
+            return pooled.setdefault(replica, FakeBotoClient("AKIA", "AccessDeniedException"))
+
+        monkeypatch.setattr(bedrock_client, "_replica_routers", {})
+        monkeypatch.setattr(bedrock_client, "_create_replica_client", replica_client)
+        config = KBConfig(
+            aws_region="ap-northeast-1", kb_id="KB1",
+            replicas=(Replica("us-east-1", "KB2"),), replica_probe_interval_seconds=0,
+        )
+        negative_cache = NegativeCache(ttl_seconds=30)
+
+        for _ in range(2):
+            with pytest.raises(BedrockAuthenticationError):
+                query_knowledge_base(
+                    create_client(config), config, "q", negative_cache=negative_cache
+                )
+
+        assert [client.calls for client in pooled.values()] == [1, 1]
+        assert credential_identity(create_client(config)) == credential_identity(create_client(config))
+
+    def test_credential_identity_does_not_expose_access_key(self):
+        """識別子に生のアクセスキーは含まれない"""
+        identity = credential_identity(FakeBotoClient("AKIASECRET", "x"))
+        assert "AKIASECRET" not in identity
+        assert identity == credential_identity(FakeBotoClient("AKIASECRET", "y"))
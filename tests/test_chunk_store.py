@@ -0,0 +1,167 @@
+"""
+チャンクストアのテスト
+
+**Feature: chunk-store, Property 16: 重複排除キャッシュの往復と参照カウント**
+"""
+
+import pytest
+from hypothesis import given, strategies as st, settings
+
+from src.cache import ResultCache
+from src.chunk_store import ChunkStore, chunk_hash
+from src.models import KBResponse, RetrievalResult
+
+
+class FakeClock:
+    """テスト用の手動で進める時計"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# 少数のチャンクから選ぶことで、レスポンス間の重複を起こしやすくする
+_chunks = st.sampled_from([
+    RetrievalResult(content="返品は30日以内に受け付けます。" * 10, location={"type": "S3", "uri": "a"}),
+    RetrievalResult(content="保証期間は購入日から1年間です。" * 10, location={"type": "S3", "uri": "b"}),
+    RetrievalResult(content="送料は全国一律500円です。" * 10, location={"type": "S3", "uri": "c"}),
+    RetrievalResult(content="送料は全国一律500円です。" * 10, location={"type": "S3", "uri": "d"}),
+])
+_responses = st.builds(
+    lambda items, scores: KBResponse(results=[
+        RetrievalResult(content=item.content, location=item.location, score=score)
+        for item, score in zip(items, scores)
+    ]),
+    st.lists(_chunks, max_size=5),
+    st.lists(st.one_of(st.none(), st.floats(0, 1)), min_size=5, max_size=5),
+)
+
+
+class TestProperty16DedupRoundTrip:
+    """
+    **Feature: chunk-store, Property 16: 重複排除キャッシュの往復と参照カウント**
+    """
+
+    @settings(max_examples=100)
+    @given(
+        st.lists(st.tuples(st.integers(0, 9), _responses), max_size=30),
+        st.sampled_from(["none", "zlib"]),
+        st.integers(min_value=1, max_value=5),
+    )
+    def test_cached_responses_round_trip_and_release_chunks(
+        self, operations, compression, max_entries
+    ) -> None:
+        """キャッシュから取り出したレスポンスは格納時と等しく、削除後はチャンクが残らない"""
+        store = ChunkStore(compression)
+        cache = ResultCache(max_entries=max_entries, chunk_store=store)
+        latest: dict[int, KBResponse] = {}
+        for key, response in operations:
+            cache.put(key, response)
+            latest[key] = response
+
+        for key, response in latest.items():
+            cached = cache.get(key)
+            if cached is not None:
+                assert cached == response
+
+        # 参照数はキャッシュ内の全結果数と一致する
+        stats = store.stats()
+        assert stats["references"] == sum(
+            len(stored[1][0]) for stored in cache._entries.values()  # pylint: disable=protected-access
+        )
+
+        cache.clear()
+        assert len(store) == 0
+
+
+class TestChunkStore:
+    """ChunkStore のユニットテスト"""
+
+    def test_identical_chunks_are_stored_once(self) -> None:
+        """同じ本文・場所のチャンクは 1 つだけ格納され、重複排除率に反映される"""
+        store = ChunkStore("zlib")
+        chunk = RetrievalResult(content="同じチャンク" * 50, location={"uri": "s3://kb/a"})
+        cache = ResultCache(chunk_store=store)
+        for i in range(4):
+            cache.put(("q", i), KBResponse(results=[chunk]))
+
+        stats = store.stats()
+        assert stats["chunks"] == 1
+        assert stats["references"] == 4
+        assert stats["dedup_ratio"] == 4.0
+        assert stats["space_saving_ratio"] > 4.0
+        assert cache.stats()["chunk_store"]["chunks"] == 1
+
+    def test_scores_are_kept_per_reference(self) -> None:
+        """同じチャンクでもレスポンスごとのスコアを保持する"""
+        store = ChunkStore()
+        cache = ResultCache(chunk_store=store)
+        cache.put("a", KBResponse(results=[RetrievalResult("本文", {"uri": "x"}, 0.9)]))
+        cache.put("b", KBResponse(results=[RetrievalResult("本文", {"uri": "x"}, 0.2)]))
+
+        assert cache.get("a").results[0].score == 0.9
+        assert cache.get("b").results[0].score == 0.2
+        assert len(store) == 1
+
+    def test_expired_entries_release_chunks(self) -> None:
+        """期限切れで削除されたエントリのチャンクは解放される"""
+        clock = FakeClock()
+        store = ChunkStore()
+        cache = ResultCache(ttl_seconds=10, clock=clock, chunk_store=store)
+        cache.put("a", KBResponse(results=[RetrievalResult("本文", {"uri": "x"})]))
+
+        clock.now = 11
+        assert cache.get("a") is None
+        assert len(store) == 0
+
+    def test_byte_budget_holds_more_overlapping_queries_with_store(self) -> None:
+        """同じバイト数の上限でも、重複排除・圧縮したキャッシュはより多くのクエリを保持する"""
+        corpus = [
+            RetrievalResult(
+                content=f"第{i}条 返品・交換の条件について説明します。" * 40,
+                location={"uri": f"s3://kb/{i}"},
+            )
+            for i in range(10)
+        ]
+        # 各クエリは 10 チャンクのうち 5 つを返す（クエリ間で大きく重複する）
+        responses = [
+            KBResponse(results=[corpus[(q + j) % 10] for j in range(5)]) for q in range(200)
+        ]
+        budget = 256 * 1024
+        plain = ResultCache(max_entries=1000, max_bytes=budget)
+        deduplicated = ResultCache(
+            max_entries=1000, max_bytes=budget, chunk_store=ChunkStore("zlib")
+        )
+        for q, response in enumerate(responses):
+            plain.put(q, response)
+            deduplicated.put(q, response)
+
+        assert plain.stats()["bytes"] <= budget
+        assert deduplicated.stats()["bytes"] <= budget
+        assert len(deduplicated) >= 10 * len(plain)
+        assert deduplicated.get(199) == responses[199]
+
+    def test_hash_distinguishes_location(self) -> None:
+        """同じ本文でも場所が異なれば別のチャンクとして扱う"""
+        assert chunk_hash("本文", {"uri": "a"}) != chunk_hash("本文", {"uri": "b"})
+        assert chunk_hash("本文", {"a": 1, "b": 2}) == chunk_hash("本文", {"b": 2, "a": 1})
+
+    def test_unknown_compression_raises(self) -> None:
+        """未対応の圧縮方式はエラー"""
+        with pytest.raises(ValueError):
+            ChunkStore("lz4")
+
+    def test_zstd_requires_optional_dependency(self) -> None:
+        """zstandard が無い環境では zstd を指定するとエラー"""
+        try:
+            import zstandard  # noqa: F401  # pylint: disable=import-outside-toplevel,unused-import
+        except ImportError:
+            with pytest.raises(ValueError) as exc_info:
+                ChunkStore("zstd")
+            assert "zstandard" in str(exc_info.value)
+        else:
+            store = ChunkStore("zstd")
+            key = store.acquire(RetrievalResult("本文", {"uri": "x"}))
+            assert store.get(key).content == "本文"
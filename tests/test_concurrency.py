@@ -0,0 +1,295 @@
+"""
+適応的な同時実行数制限のテスト
+
+**Feature: adaptive-concurrency, Property 33: 上限は範囲内にとどまり、成功で加算的に増え、混雑で乗算的に減る**
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+from hypothesis import given, strategies as st, settings
+
+from src import bedrock_client, server
+from src.bedrock_client import _limited_retrieve, get_concurrency_limiter
+from src.concurrency import (
+    OUTCOME_ERROR,
+    OUTCOME_OK,
+    OUTCOME_THROTTLED,
+    AdaptiveConcurrencyLimiter,
+)
+from src.config import BACKEND_LOCAL, KBConfig, Replica
+from src.deadline import DeadlineExceededError
+from src.metrics import Metrics
+from src.server import mcp
+
+from tests.test_result_sets import FakeClock
+
+
+def _throttle() -> ClientError:
+    return ClientError(
+        {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, "Retrieve"
+    )
+
+
+class QuotaClient:
+    """同時実行数が quota を超えた呼び出しをスロットリングするクライアント（スレッドセーフ）"""
+
+    def __init__(self, quota: int, latency: float = 0.005) -> None:
+        self.quota = quota
+        self.latency = latency
+        self.calls = 0
+        self.throttled = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def retrieve(self, **params):
+        with self._lock:
+            self.calls += 1
+            self._in_flight += 1
+            over = self._in_flight > self.quota
+            if over:
+                self.throttled += 1
+        try:
+            if over:
+                raise _throttle()
+            time.sleep(self.latency)
+            return {"retrievalResults": []}
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+def _run_load(client, limiter, workers: int = 16, calls: int = 25) -> None:
+    """workers 個のスレッドから calls 回ずつ呼び出す（スロットリングは無視する）"""
+    def work():
+        for _ in range(calls):
+            try:
+                _limited_retrieve(client, {}, limiter, None)
+            except ClientError:
+                pass
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class TestProperty33AimdLimit:
+    """
+    **Feature: adaptive-concurrency, Property 33: 上限は範囲内にとどまり、成功で加算的に増え、混雑で乗算的に減る**
+    """
+
+    @settings(max_examples=100)
+    @given(
+        st.integers(min_value=1, max_value=4),
+        st.integers(min_value=4, max_value=32),
+        st.lists(st.sampled_from([OUTCOME_OK, OUTCOME_THROTTLED, OUTCOME_ERROR]), max_size=60),
+    )
+    def test_limit_follows_outcomes(self, min_limit, max_limit, outcomes) -> None:
+        """成功で 1 / limit ずつ増え、スロットリングで半分になり、エラーでは変わらない"""
+        clock = FakeClock()
+        limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=4, min_limit=min_limit, max_limit=max_limit,
+            latency_tolerance=0.0, registry=Metrics(), clock=clock,
+        )
+        expected = 4.0
+
+        for outcome in outcomes:
+            clock.now += 1
+            started = limiter.acquire(timeout=0)
+            limiter.release(started, outcome)
+            if outcome == OUTCOME_THROTTLED:
+                expected = max(min_limit, expected * 0.5)
+            elif outcome == OUTCOME_OK and 2 >= expected:
+                # 上限の半分以上を使っている場合のみ増やす
+                expected = min(max_limit, expected + 1 / expected)
+            assert limiter.limit == int(expected)
+            assert min_limit <= limiter.limit <= max_limit
+
+
+class TestAdaptiveConcurrencyLimiter:
+    """適応的な同時実行数制限の個別のテスト"""
+
+    def test_concurrent_throttles_decrease_once(self) -> None:
+        """同じ混雑で実行中の呼び出しが一斉にスロットリングされても 1 回のみ下げる"""
+        clock = FakeClock()
+        registry = Metrics()
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=8, registry=registry, clock=clock)
+        started = [limiter.acquire() for _ in range(8)]
+
+        clock.now = 1
+        for value in started:
+            limiter.release(value, OUTCOME_THROTTLED)
+
+        assert limiter.limit == 4
+        assert registry.snapshot()["counters"]["concurrency.throttled"] == 1
+        assert registry.snapshot()["gauges"]["concurrency.limit"] == 4
+
+    def test_latency_inflation_decreases_limit(self) -> None:
+        """レイテンシが最小値の latency_tolerance 倍を超えた場合は上限を下げる"""
+        clock = FakeClock()
+        registry = Metrics()
+        limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=8, latency_tolerance=2.0, registry=registry, clock=clock,
+        )
+        for _ in range(10):
+            started = limiter.acquire()
+            clock.now += 0.1
+            limiter.release(started, OUTCOME_OK)
+        assert limiter.limit == 8
+        assert limiter.stats()["base_latency_ms"] == pytest.approx(100.0)
+
+        started = limiter.acquire()
+        clock.now += 0.3
+        limiter.release(started, OUTCOME_OK)
+
+        assert limiter.limit == 4
+        assert registry.snapshot()["counters"]["concurrency.latency_inflated"] == 1
+
+    def test_acquire_waits_for_a_slot(self) -> None:
+        """上限まで実行中の場合は返却まで待機し、timeout で打ち切る"""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1, registry=Metrics())
+        started = limiter.acquire()
+
+        with pytest.raises(DeadlineExceededError):
+            limiter.acquire(timeout=0.01)
+
+        timer = threading.Timer(0.05, lambda: limiter.release(started))
+        timer.start()
+        limiter.acquire(timeout=5)
+        timer.join()
+        assert limiter.stats()["in_flight"] == 1
+
+    def test_converges_below_quota(self) -> None:
+        """固定の上限を超えるクォータでは、適応的な上限の方がスロットリングが少ない"""
+        unlimited = QuotaClient(quota=4)
+        _run_load(unlimited, None)
+
+        adaptive = QuotaClient(quota=4)
+        limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=16, max_limit=16, latency_tolerance=0.0, registry=Metrics(),
+        )
+        _run_load(adaptive, limiter)
+
+        assert adaptive.throttled < unlimited.throttled / 2
+        assert limiter.limit <= 8
+
+    def test_limiter_is_created_only_when_enabled(self, monkeypatch) -> None:
+        """BEDROCK_KB_ADAPTIVE_CONCURRENCY が 0 の場合、またはローカルバックエンドでは作成しない"""
+        monkeypatch.setattr(bedrock_client, "_concurrency_limiters", {})
+        assert get_concurrency_limiter(KBConfig(aws_region="r", kb_id="k")) is None
+        assert get_concurrency_limiter(KBConfig(
+            aws_region="r", kb_id="k", backend=BACKEND_LOCAL, adaptive_concurrency_max=8,
+        )) is None
+
+        limiter = get_concurrency_limiter(
+            KBConfig(aws_region="r", kb_id="k", adaptive_concurrency_max=8)
+        )
+        assert limiter is not None and limiter.max_limit == 8
+
+    def test_limiters_are_separate_per_account_and_region(self, monkeypatch) -> None:
+        """(AWS プロファイル, リージョン) ごとに制限を分け、スロットリングは他の上限を下げない"""
+        monkeypatch.setattr(bedrock_client, "_concurrency_limiters", {})
+        support = KBConfig(
+            aws_region="r", kb_id="KB1", aws_profile="support", adaptive_concurrency_max=8,
+        )
+        legal = KBConfig(aws_region="r", kb_id="KB2", aws_profile="legal", adaptive_concurrency_max=8)
+        same_account = KBConfig(
+            aws_region="r", kb_id="KB3", aws_profile="support", adaptive_concurrency_max=8,
+        )
+
+        with pytest.raises(ClientError):
+            _limited_retrieve(QuotaClient(quota=0), {}, get_concurrency_limiter(support), None)
+
+        assert get_concurrency_limiter(same_account) is get_concurrency_limiter(support)
+        assert bedrock_client.concurrency_stats()["support:r"]["limit"] == 2
+        assert get_concurrency_limiter(legal).limit == 4
+        assert set(bedrock_client.concurrency_stats()) == {"support:r", "legal:r"}
+
+    def test_throttled_attempts_are_retried_inside_the_limiter(self, monkeypatch) -> None:
+        """botocore ではなく _limited_retrieve が再試行し、スロットリングされた試行ごとに反映する"""
+        monkeypatch.setattr(bedrock_client, "RETRY_BASE_SECONDS", 0.0)
+        clock = FakeClock()
+        registry = Metrics()
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=8, registry=registry, clock=clock)
+        results = iter([_throttle(), _throttle(), {"retrievalResults": []}])
+
+        class FlakyClient:
+            def retrieve(self, **params):
+                clock.now += 1
+                result = next(results)
+                if isinstance(result, Exception):
+                    raise result
+                return result
+
+        def sleep(seconds: float) -> None:
+            clock.now += 1
+
+        assert _limited_retrieve(
+            FlakyClient(), {}, limiter, None, max_attempts=3, sleep=sleep
+        ) == {"retrievalResults": []}
+        assert limiter.limit == 2
+        assert registry.snapshot()["counters"]["concurrency.throttled_calls"] == 2
+
+    def test_limiter_applies_per_replica(self, monkeypatch) -> None:
+        """切り替え先の複製のスロットリングは元の複製の上限を下げず、元の複製のスロットリングは隠れない"""
+        monkeypatch.setattr(bedrock_client, "_concurrency_limiters", {})
+        monkeypatch.setattr(bedrock_client, "_client_pools", {})
+        monkeypatch.setattr(bedrock_client, "_replica_routers", {})
+        monkeypatch.setattr(bedrock_client, "RETRY_BASE_SECONDS", 0.0)
+        client_configs: list = []
+
+        class Manager:
+            def create_client(self, service, region, client_config=None):
+                client_configs.append(client_config)
+                return QuotaClient(quota=0) if region == "us-east-1" else QuotaClient(quota=8)
+
+        monkeypatch.setattr(bedrock_client, "get_credential_manager", lambda **_kwargs: Manager())
+        config = KBConfig(
+            aws_region="us-east-1", kb_id="KB1", adaptive_concurrency_max=8,
+            replicas=(Replica(region="us-west-2", kb_id="KB2"),),
+        )
+
+        response = bedrock_client.create_client(config).retrieve(knowledgeBaseId="KB1")
+
+        assert response == {"retrievalResults": []}
+        stats = bedrock_client.concurrency_stats()
+        assert stats["default:us-east-1"]["limit"] < 4
+        assert stats["default:us-west-2"]["limit"] == 4
+        # botocore のリトライは無効にする
+        assert {c.retries["total_max_attempts"] for c in client_configs} == {1}
+
+    def test_kb_answer_throttling_lowers_reported_limit(self, monkeypatch) -> None:
+        """kb_answer のスロットリングは上限を下げ、kb_metrics の concurrency に反映される"""
+        monkeypatch.setenv("BEDROCK_KB_ID", "kb")
+        monkeypatch.setenv("BEDROCK_KB_BACKEND", "bedrock")
+        monkeypatch.setenv("BEDROCK_KB_CACHE_TTL", "0")
+        monkeypatch.setenv("BEDROCK_KB_ADAPTIVE_CONCURRENCY", "16")
+        monkeypatch.delenv("BEDROCK_KB_PROFILES", raising=False)
+        monkeypatch.delenv("BEDROCK_KB_REPLICAS", raising=False)
+        monkeypatch.setattr(bedrock_client, "_concurrency_limiters", {})
+        monkeypatch.setattr(bedrock_client, "_client_pools", {})
+        monkeypatch.setattr(bedrock_client, "RETRY_BASE_SECONDS", 0.0)
+        monkeypatch.setattr(server, "_negative_cache", None)
+
+        class ThrottledClient:
+            def retrieve(self, **params):
+                raise _throttle()
+
+        class Manager:
+            def create_client(self, service, region, client_config=None):
+                return ThrottledClient()
+
+        monkeypatch.setattr(bedrock_client, "get_credential_manager", lambda **_kwargs: Manager())
+        result = json.loads(asyncio.run(mcp._tool_manager._tools["kb_answer"].fn(query="返品")))
+        metrics_result = json.loads(mcp._tool_manager._tools["kb_metrics"].fn())
+
+        assert result["error_type"] == "ServiceError"
+        (stats,) = metrics_result["concurrency"].values()
+        assert stats["limit"] < 4
+        assert stats["in_flight"] == 0
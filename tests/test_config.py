@@ -158,3 +158,75 @@ class TestProperty2MissingConfigError:
             
             error_message = str(exc_info.value)
             assert "BEDROCK_KB_ID" in error_message
+
+
+class TestLocalBackendConfig:
+    """
+    ローカルバックエンド設定のユニットテスト
+    """
+
+    def test_local_backend_does_not_require_kb_id(self):
+        """local バックエンドでは BEDROCK_KB_ID が無くても読み込める"""
+        with env_vars(
+            BEDROCK_KB_ID=None,
+            BEDROCK_KB_BACKEND="local",
+            BEDROCK_KB_LOCAL_DIR="/tmp/corpus",
+            BEDROCK_KB_LOCAL_INDEX=None,
+        ):
+            config = load_config()
+
+            assert config.backend == "local"
+            assert config.kb_id == "local"
+            assert config.local_corpus_dir == "/tmp/corpus"
+            assert config.local_index_path is None
+
+    def test_local_backend_requires_corpus_dir(self):
+        """local バックエンドで BEDROCK_KB_LOCAL_DIR が無い場合はエラー"""
+        with env_vars(
+            BEDROCK_KB_BACKEND="local",
+            BEDROCK_KB_LOCAL_DIR=None,
+        ):
+            with pytest.raises(ValueError) as exc_info:
+                load_config()
+
+            assert "BEDROCK_KB_LOCAL_DIR" in str(exc_info.value)
+
+    def test_unknown_backend_raises_error(self):
+        """未知のバックエンド名はエラー"""
+        with env_vars(BEDROCK_KB_ID="kb", BEDROCK_KB_BACKEND="opensearch"):
+            with pytest.raises(ValueError) as exc_info:
+                load_config()
+
+            assert "BEDROCK_KB_BACKEND" in str(exc_info.value)
+
+    def test_default_backend_is_bedrock(self):
+        """BEDROCK_KB_BACKEND 未設定時は bedrock バックエンド"""
+        with env_vars(BEDROCK_KB_ID="kb", BEDROCK_KB_BACKEND=None):
+            assert load_config().backend == "bedrock"
+
+    def test_credential_refresh_settings(self):
+        """認証情報の先行更新設定を読み込み、不正値はエラーにする"""
+        with env_vars(
+            BEDROCK_KB_ID="kb",
+            BEDROCK_KB_BACKEND=None,
+            BEDROCK_KB_CREDENTIAL_REFRESH_MARGIN="600",
+            BEDROCK_KB_CREDENTIAL_CHECK_INTERVAL="0",
+        ):
+            config = load_config()
+            assert config.credential_refresh_margin_seconds == 600.0
+            assert config.credential_check_interval_seconds == 0.0
+
+        with env_vars(BEDROCK_KB_ID="kb", BEDROCK_KB_CREDENTIAL_REFRESH_MARGIN="soon"):
+            with pytest.raises(ValueError) as exc_info:
+                load_config()
+            assert "BEDROCK_KB_CREDENTIAL_REFRESH_MARGIN" in str(exc_info.value)
+
+    def test_cache_compression_setting(self):
+        """キャッシュ圧縮方式を読み込み、未対応の値はエラーにする"""
+        with env_vars(BEDROCK_KB_ID="kb", BEDROCK_KB_CACHE_COMPRESSION="ZLIB"):
+            assert load_config().cache_compression == "zlib"
+
+        with env_vars(BEDROCK_KB_ID="kb", BEDROCK_KB_CACHE_COMPRESSION="brotli"):
+            with pytest.raises(ValueError) as exc_info:
+                load_config()
+            assert "BEDROCK_KB_CACHE_COMPRESSION" in str(exc_info.value)
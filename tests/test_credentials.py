@@ -0,0 +1,195 @@
+"""
+認証情報の先行更新とメトリクスのテスト
+
+**Feature: credential-refresh, Property 14: メトリクス集計の整合性**
+"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+from botocore.credentials import RefreshableCredentials
+from hypothesis import given, strategies as st, settings
+
+from src.credentials import CredentialManager
+from src.metrics import Metrics
+
+
+class StubRefresher:
+    """呼び出し回数を記録し、指定秒数後に失効する認証情報を返す更新関数"""
+
+    def __init__(self, lifetime_seconds: float, fail: bool = False) -> None:
+        self.lifetime_seconds = lifetime_seconds
+        self.fail = fail
+        self.calls = 0
+
+    def __call__(self) -> dict[str, str]:
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("STS に接続できません")
+        expiry = datetime.now(timezone.utc) + timedelta(seconds=self.lifetime_seconds)
+        return {
+            "access_key": f"AKIA{self.calls:04d}",
+            "secret_key": "secret",
+            "token": "token",
+            "expiry_time": expiry.isoformat(),
+        }
+
+
+class FakeSession:
+    """get_credentials / client を持つ boto3.Session 相当のテストダブル"""
+
+    def __init__(self, credentials: object) -> None:
+        self.credentials = credentials
+        self.clients: list[tuple[str, str]] = []
+
+    def get_credentials(self) -> object:
+        return self.credentials
+
+    def client(self, service_name: str, region_name: str) -> object:
+        self.clients.append((service_name, region_name))
+        return object()
+
+
+def _refreshable(refresher: StubRefresher, lifetime_seconds: float) -> RefreshableCredentials:
+    """指定秒数後に失効する RefreshableCredentials を作成する"""
+    expiry = datetime.now(timezone.utc) + timedelta(seconds=lifetime_seconds)
+    return RefreshableCredentials.create_from_metadata(
+        metadata={
+            "access_key": "AKIA0000",
+            "secret_key": "secret",
+            "token": "token",
+            "expiry_time": expiry.isoformat(),
+        },
+        refresh_using=refresher,
+        method="test",
+    )
+
+
+def _manager(credentials: object, registry: Metrics, **kwargs) -> CredentialManager:
+    return CredentialManager(
+        session_factory=lambda: FakeSession(credentials),
+        registry=registry,
+        **kwargs,
+    )
+
+
+class TestProperty14MetricsAggregation:
+    """
+    **Feature: credential-refresh, Property 14: メトリクス集計の整合性**
+    """
+
+    @settings(max_examples=100)
+    @given(st.lists(st.floats(min_value=0, max_value=1e6), min_size=1, max_size=50))
+    def test_summary_matches_observations(self, values: list[float]) -> None:
+        """summary の count / sum / min / max / last は観測値と一致する"""
+        registry = Metrics()
+        for value in values:
+            registry.observe("latency", value)
+
+        summary = registry.snapshot()["summaries"]["latency"]
+        assert summary["count"] == len(values)
+        assert summary["sum"] == sum(values)
+        assert summary["min"] == min(values)
+        assert summary["max"] == max(values)
+        assert summary["last"] == values[-1]
+
+    @settings(max_examples=50)
+    @given(st.integers(min_value=1, max_value=8), st.integers(min_value=1, max_value=50))
+    def test_concurrent_increments_are_not_lost(self, threads: int, per_thread: int) -> None:
+        """並行して加算してもカウンターの値が失われない"""
+        registry = Metrics()
+
+        def work() -> None:
+            for _ in range(per_thread):
+                registry.increment("calls")
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        assert registry.snapshot()["counters"]["calls"] == threads * per_thread
+
+
+class TestCredentialManager:
+    """CredentialManager の先行更新のテスト"""
+
+    def test_refreshes_before_botocore_advisory_window(self) -> None:
+        """botocore が更新しない残り時間でも、余裕時間を切っていれば先行更新する"""
+        refresher = StubRefresher(lifetime_seconds=3600)
+        # 残り 1000 秒は botocore の advisory 閾値（900 秒）より長い
+        credentials = _refreshable(refresher, lifetime_seconds=1000)
+        registry = Metrics()
+        manager = _manager(credentials, registry, refresh_margin_seconds=1200)
+
+        assert manager.check() is True
+        assert refresher.calls == 1
+        assert credentials.get_frozen_credentials().access_key == "AKIA0001"
+
+        snapshot = registry.snapshot()
+        assert snapshot["counters"]["credentials.refresh.count"] == 1
+        assert snapshot["summaries"]["credentials.refresh.latency_ms"]["count"] == 1
+        assert snapshot["gauges"]["credentials.seconds_to_expiry"] > 3000
+
+    def test_does_not_refresh_when_margin_remains(self) -> None:
+        """有効期限まで余裕がある場合は更新しない"""
+        refresher = StubRefresher(lifetime_seconds=3600)
+        credentials = _refreshable(refresher, lifetime_seconds=3600)
+        registry = Metrics()
+        manager = _manager(credentials, registry, refresh_margin_seconds=1200)
+
+        assert manager.check() is False
+        assert refresher.calls == 0
+        assert "credentials.refresh.count" not in registry.snapshot()["counters"]
+
+    def test_refresh_failure_is_counted_and_keeps_old_credentials(self) -> None:
+        """更新に失敗した場合は失敗数を記録し、既存の認証情報を使い続ける"""
+        refresher = StubRefresher(lifetime_seconds=3600, fail=True)
+        credentials = _refreshable(refresher, lifetime_seconds=1000)
+        registry = Metrics()
+        manager = _manager(credentials, registry, refresh_margin_seconds=1200)
+
+        assert manager.check() is False
+        snapshot = registry.snapshot()
+        assert snapshot["counters"]["credentials.refresh.failures"] == 1
+        assert snapshot["summaries"]["credentials.refresh.latency_ms"]["count"] == 1
+        assert credentials.get_frozen_credentials().access_key == "AKIA0000"
+
+    def test_static_credentials_are_ignored(self) -> None:
+        """有効期限の無い認証情報（静的キー・認証情報なし）は何もしない"""
+        registry = Metrics()
+        assert _manager(None, registry).check() is False
+        assert registry.snapshot() == {"counters": {}, "gauges": {}, "summaries": {}}
+
+    def test_clients_share_session_credentials(self) -> None:
+        """クライアントは共有セッションから作成される"""
+        registry = Metrics()
+        manager = _manager(None, registry)
+        manager.create_client("bedrock-agent-runtime", "ap-northeast-1")
+        manager.create_client("bedrock-agent-runtime", "us-east-1")
+
+        assert manager.session.clients == [
+            ("bedrock-agent-runtime", "ap-northeast-1"),
+            ("bedrock-agent-runtime", "us-east-1"),
+        ]
+
+    def test_background_thread_refreshes_and_stops(self) -> None:
+        """バックグラウンドスレッドが更新を実行し、stop() で終了する"""
+        refresher = StubRefresher(lifetime_seconds=3600)
+        credentials = _refreshable(refresher, lifetime_seconds=1000)
+        registry = Metrics()
+        manager = _manager(
+            credentials, registry, refresh_margin_seconds=1200, check_interval_seconds=0.01
+        )
+
+        manager.start()
+        try:
+            deadline = datetime.now() + timedelta(seconds=5)
+            while refresher.calls == 0 and datetime.now() < deadline:
+                threading.Event().wait(0.01)
+        finally:
+            manager.stop()
+
+        assert refresher.calls == 1
+        assert manager._thread is None  # pylint: disable=protected-access
@@ -0,0 +1,222 @@
+"""
+デッドライン（時間予算）のテスト
+
+**Feature: deadline-budget, Property 15: botocore タイムアウトは残り時間を超えない**
+"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+from botocore.exceptions import ReadTimeoutError
+from hypothesis import given, strategies as st, settings
+
+from src import server
+from src.bedrock_client import query_knowledge_base
+from src.cache import ResultCache
+from src.config import KBConfig
+from src.deadline import (
+    MAX_CONNECT_TIMEOUT_SECONDS,
+    MAX_READ_TIMEOUT_SECONDS,
+    MIN_SECONDS_FOR_RETRIES,
+    Deadline,
+    DeadlineExceededError,
+)
+from src.server import mcp
+
+
+class FakeClock:
+    """テスト用の手動で進める時計"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _item(text: str, score: float) -> dict:
+    return {"content": {"text": text}, "location": {"type": "S3"}, "score": score}
+
+
+class PagedClient:
+    """nextToken でページングし、各ページの取得ごとに時計を進めるテストダブル"""
+
+    def __init__(self, pages: list[list[dict]], clock: FakeClock, page_seconds: float) -> None:
+        self.pages = pages
+        self.clock = clock
+        self.page_seconds = page_seconds
+        self.requests: list[dict] = []
+
+    def retrieve(self, **params):
+        self.requests.append(params)
+        index = int(params.get("nextToken", "0"))
+        self.clock.now += self.page_seconds
+        response = {"retrievalResults": self.pages[index]}
+        if index + 1 < len(self.pages):
+            response["nextToken"] = str(index + 1)
+        return response
+
+
+class TestProperty15BotocoreConfig:
+    """
+    **Feature: deadline-budget, Property 15: botocore タイムアウトは残り時間を超えない**
+    """
+
+    @settings(max_examples=100)
+    @given(
+        st.integers(min_value=1, max_value=600_000),
+        st.floats(min_value=0, max_value=700, allow_nan=False),
+    )
+    def test_timeouts_are_bounded_by_remaining(self, timeout_ms: int, elapsed: float) -> None:
+        """接続・読み取りタイムアウトは残り時間と上限値の小さい方に収まる"""
+        clock = FakeClock()
+        deadline = Deadline(timeout_ms, clock=clock)
+        clock.now = elapsed
+        remaining = deadline.remaining_seconds()
+        config = deadline.botocore_config()
+
+        assert 0 <= remaining <= timeout_ms / 1000
+        assert 0 < config.connect_timeout <= max(0.05, min(remaining, MAX_CONNECT_TIMEOUT_SECONDS))
+        assert 0 < config.read_timeout <= max(0.05, min(remaining, MAX_READ_TIMEOUT_SECONDS))
+        expected_attempts = 3 if remaining >= MIN_SECONDS_FOR_RETRIES else 1
+        assert config.retries["total_max_attempts"] == expected_attempts
+
+    @pytest.mark.parametrize("timeout_ms", [None, 0, -5])
+    def test_unlimited_deadline(self, timeout_ms) -> None:
+        """timeout_ms が未指定・0 以下の場合は無制限"""
+        deadline = Deadline(timeout_ms)
+        assert deadline.unlimited
+        assert deadline.remaining_seconds() is None
+        assert not deadline.expired()
+        assert deadline.botocore_config() is None
+
+
+class TestQueryKnowledgeBaseDeadline:
+    """query_knowledge_base のデッドライン処理のテスト"""
+
+    def _config(self) -> KBConfig:
+        return KBConfig(aws_region="ap-northeast-1", kb_id="kb")
+
+    def test_pages_until_max_results(self) -> None:
+        """nextToken がある場合は max_results に達するまでページを取得する"""
+        clock = FakeClock()
+        client = PagedClient(
+            [[_item("a", 0.9), _item("b", 0.8)], [_item("c", 0.7), _item("d", 0.6)]],
+            clock, page_seconds=0.1,
+        )
+
+        response = query_knowledge_base(
+            client, self._config(), "q", max_results=3, deadline=Deadline(10_000, clock=clock)
+        )
+
+        assert [r.content for r in response.results] == ["a", "b", "c"]
+        assert not response.partial
+        assert client.requests[1]["nextToken"] == "1"
+
+    def test_returns_partial_when_deadline_expires_between_pages(self) -> None:
+        """ページ間でデッドラインを過ぎた場合は取得済みの結果を partial として返す"""
+        clock = FakeClock()
+        client = PagedClient(
+            [[_item("a", 0.9)], [_item("b", 0.8)], [_item("c", 0.7)]],
+            clock, page_seconds=1.0,
+        )
+        cache = ResultCache()
+
+        response = query_knowledge_base(
+            client, self._config(), "q", max_results=3,
+            cache=cache, deadline=Deadline(1_500, clock=clock),
+        )
+
+        assert [r.content for r in response.results] == ["a", "b"]
+        assert response.partial
+        # 途中結果はキャッシュしない
+        assert len(cache) == 0
+
+    def test_expired_deadline_skips_api_call(self) -> None:
+        """呼び出し前にデッドラインを過ぎている場合は API を呼ばない"""
+        clock = FakeClock()
+        deadline = Deadline(100, clock=clock)
+        clock.now = 1.0
+        client = PagedClient([[_item("a", 0.9)]], clock, page_seconds=0)
+
+        with pytest.raises(DeadlineExceededError):
+            query_knowledge_base(client, self._config(), "q", deadline=deadline)
+        assert client.requests == []
+
+    def test_botocore_timeout_after_deadline_is_deadline_exceeded(self) -> None:
+        """残り時間から導出したタイムアウトによる失敗は DeadlineExceededError になる"""
+        clock = FakeClock()
+
+        class TimingOutClient:
+            def retrieve(self, **_params):
+                clock.now = 5.0
+                raise ReadTimeoutError(endpoint_url="https://bedrock")
+
+        with pytest.raises(DeadlineExceededError):
+            query_knowledge_base(
+                TimingOutClient(), self._config(), "q", deadline=Deadline(1_000, clock=clock)
+            )
+
+
+class TestKbAnswerDeadline:
+    """kb_answer の timeout_ms のテスト"""
+
+    @pytest.fixture(autouse=True)
+    def _env(self, monkeypatch):
+        monkeypatch.setenv("BEDROCK_KB_ID", "kb")
+        monkeypatch.setenv("BEDROCK_KB_BACKEND", "bedrock")
+        monkeypatch.delenv("BEDROCK_KB_QUERY_LOG", raising=False)
+        monkeypatch.setenv("BEDROCK_KB_CACHE_TTL", "0")
+        monkeypatch.setattr(server, "_negative_cache", None)
+
+    def test_slow_retrieve_returns_partial_results(self, monkeypatch) -> None:
+        """時間予算を超えた場合は待機を打ち切り、取得済みの結果を partial として返す"""
+        release = threading.Event()
+
+        class SlowClient:
+            def __init__(self) -> None:
+                self.calls = 0
+
+            def retrieve(self, **_params):
+                self.calls += 1
+                if self.calls == 1:
+                    return {"retrievalResults": [_item("first", 0.9)], "nextToken": "1"}
+                release.wait(5)
+                return {"retrievalResults": [_item("late", 0.5)]}
+
+        monkeypatch.setattr(server, "create_client", lambda config, deadline: SlowClient())
+        kb_answer = mcp._tool_manager._tools["kb_answer"].fn
+        try:
+            result = json.loads(asyncio.run(kb_answer(query="q", max_results=4, timeout_ms=200)))
+        finally:
+            release.set()
+
+        assert result["partial"] is True
+        assert result["error_type"] == "DeadlineExceeded"
+        assert [r["content"] for r in result["results"]] == ["first"]
+
+    def test_fast_retrieve_returns_plain_list(self, monkeypatch) -> None:
+        """時間予算内に完了した場合は従来どおり結果のリストを返す"""
+
+        class FastClient:
+            def retrieve(self, **_params):
+                return {"retrievalResults": [_item("a", 0.9)]}
+
+        monkeypatch.setattr(server, "create_client", lambda config, deadline: FastClient())
+        result = json.loads(
+            asyncio.run(mcp._tool_manager._tools["kb_answer"].fn(query="q", timeout_ms=5_000))
+        )
+
+        assert [r["content"] for r in result] == ["a"]
+
+    @pytest.mark.parametrize("timeout_ms", [0, -1, 600_001, "100", True])
+    def test_invalid_timeout_returns_validation_error(self, timeout_ms) -> None:
+        """範囲外・整数以外の timeout_ms はバリデーションエラー"""
+        result = json.loads(
+            asyncio.run(mcp._tool_manager._tools["kb_answer"].fn(query="q", timeout_ms=timeout_ms))
+        )
+
+        assert result["error"] is True
+        assert result["error_type"] == "ValidationError"
@@ -0,0 +1,156 @@
+"""
+クエリ分解のテスト
+
+**Feature: query-decomposition, Property 17: サブクエリ統合の割り当て数と重複排除**
+"""
+
+import asyncio
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+from hypothesis import given, strategies as st, settings
+
+from src import server
+from src.chunk_store import chunk_hash
+from src.decompose import decompose_query, merge_sub_results, sub_query_quotas
+from src.models import KBResponse, RetrievalResult
+from src.server import mcp
+
+
+def _result(text: str, score: float) -> RetrievalResult:
+    return RetrievalResult(content=text, location={"uri": f"s3://kb/{text}"}, score=score)
+
+
+_sub_responses = st.lists(
+    st.lists(
+        st.builds(_result, st.sampled_from("abcdefghijkl"), st.floats(0, 1)),
+        max_size=10,
+    ),
+    min_size=1,
+    max_size=5,
+)
+
+
+class TestProperty17MergeQuotas:
+    """
+    **Feature: query-decomposition, Property 17: サブクエリ統合の割り当て数と重複排除**
+    """
+
+    @settings(max_examples=100)
+    @given(_sub_responses, st.integers(min_value=1, max_value=10))
+    def test_merge_respects_limit_quota_and_uniqueness(self, result_lists, max_results) -> None:
+        """統合結果は上限以内・重複なしで、各サブクエリの固有結果を割り当て数まで含む"""
+        responses = [KBResponse(results=results) for results in result_lists]
+        merged = merge_sub_results(responses, max_results)
+        keys = [chunk_hash(r.content, r.location) for r in merged.results]
+
+        assert len(merged.results) <= max_results
+        assert len(keys) == len(set(keys))
+        assert not merged.partial
+
+        # 全体のユニークな結果数が十分なら上限まで埋まる
+        unique = {chunk_hash(r.content, r.location) for rs in result_lists for r in rs}
+        assert len(merged.results) == min(max_results, len(unique))
+
+        # 先頭のサブクエリは自分の上位結果を割り当て数まで必ず含む
+        first_unique = list(dict.fromkeys(
+            chunk_hash(r.content, r.location) for r in result_lists[0]
+        ))
+        quota = sub_query_quotas(len(result_lists), max_results)[0]
+        assert set(first_unique[:quota]) <= set(keys)
+
+    @settings(max_examples=100)
+    @given(st.integers(min_value=1, max_value=10), st.integers(min_value=1, max_value=10))
+    def test_quotas_sum_to_max_results(self, count, max_results) -> None:
+        """割り当て数の合計は max_results で、差は最大 1"""
+        quotas = sub_query_quotas(count, max_results)
+        assert sum(quotas) == max_results
+        assert max(quotas) - min(quotas) <= 1
+
+
+class TestDecomposeQuery:
+    """decompose_query のユニットテスト"""
+
+    @pytest.mark.parametrize("query,expected", [
+        (
+            "返品ポリシーと保証期間と送料について",
+            ["返品ポリシーについて", "保証期間について", "送料について"],
+        ),
+        ("返品、交換、送料", ["返品", "交換", "送料"]),
+        ("送料はいくら？返品はできる？", ["送料はいくら", "返品はできる"]),
+        ("領収書および納品書の発行", ["領収書", "納品書の発行"]),
+        ("会員登録やログインの方法", ["会員登録の方法", "ログインの方法"]),
+        ("請求書と領収書は再発行できますか", ["請求書は再発行できますか", "領収書は再発行できますか"]),
+    ])
+    def test_compound_queries_are_split(self, query, expected) -> None:
+        """接続詞・列挙記号・疑問符で分割し、共通の述部を各サブクエリに付与する"""
+        assert decompose_query(query) == expected
+
+    @pytest.mark.parametrize("query", [
+        "返品ポリシーについて",
+        "ひとりでできること",
+        "もっと知りたい",
+        "AWSとAzureの違い",
+        "A、B",
+        "RAGとは何ですか",
+        "トークンとはどういう意味ですか",
+        "データと一緒に送る方法",
+        "返品と交換",
+    ])
+    def test_simple_queries_are_kept(self, query) -> None:
+        """単一の質問・並列でない「と」・名詞句の並列でない「と」「や」・比較・短すぎる要素は分割しない"""
+        assert decompose_query(query) == [query]
+
+    def test_overflow_is_folded_into_last_sub_query(self) -> None:
+        """最大数を超えるサブクエリは最後のサブクエリにまとめる"""
+        assert decompose_query("返品、交換、送料、保証", max_sub_queries=3) == [
+            "返品", "交換", "送料、保証",
+        ]
+
+
+class TestDecomposedKbAnswer:
+    """kb_answer の decompose パラメータのテスト（ローカルバックエンドを使用）"""
+
+    @pytest.fixture
+    def corpus(self, tmp_path, monkeypatch):
+        corpus = tmp_path / "corpus"
+        corpus.mkdir()
+        (corpus / "returns.md").write_text("返品ポリシー: 返品は30日以内に受け付けます。", encoding="utf-8")
+        (corpus / "warranty.md").write_text("保証期間: 保証期間は購入日から1年間です。", encoding="utf-8")
+        (corpus / "shipping.md").write_text("送料: 送料は全国一律500円です。", encoding="utf-8")
+        monkeypatch.setenv("BEDROCK_KB_BACKEND", "local")
+        monkeypatch.setenv("BEDROCK_KB_LOCAL_DIR", str(corpus))
+        monkeypatch.delenv("BEDROCK_KB_QUERY_LOG", raising=False)
+        monkeypatch.setattr(server, "_result_cache", None)
+        return corpus
+
+    def test_each_sub_query_contributes_results(self, corpus) -> None:
+        """分解したサブクエリごとの結果が 1 回の呼び出しで返る"""
+        result = json.loads(asyncio.run(mcp._tool_manager._tools["kb_answer"].fn(
+            query="返品ポリシーと保証期間と送料について", max_results=3, decompose=True,
+        )))
+
+        sources = sorted(r["location"]["s3Location"]["uri"].rsplit("/", 1)[-1] for r in result)
+        assert sources == ["returns.md", "shipping.md", "warranty.md"]
+
+    def test_all_sub_queries_failing_returns_error(self, monkeypatch) -> None:
+        """全てのサブクエリが失敗した場合はエラーを返す"""
+        class FailingClient:
+            def retrieve(self, **_params):
+                raise ClientError(
+                    {"Error": {"Code": "InternalServerException", "Message": "boom"}}, "Retrieve"
+                )
+
+        monkeypatch.setenv("BEDROCK_KB_ID", "kb")
+        monkeypatch.setenv("BEDROCK_KB_BACKEND", "bedrock")
+        monkeypatch.setenv("BEDROCK_KB_CACHE_TTL", "0")
+        monkeypatch.delenv("BEDROCK_KB_QUERY_LOG", raising=False)
+        monkeypatch.setattr(server, "create_client", lambda config, deadline: FailingClient())
+
+        result = json.loads(asyncio.run(mcp._tool_manager._tools["kb_answer"].fn(
+            query="返品と送料", decompose=True,
+        )))
+
+        assert result["error"] is True
+        assert result["error_type"] == "ServiceError"
@@ -0,0 +1,187 @@
+"""
+取り込みジョブ監視とキャッシュ無効化のテスト
+
+**Feature: ingestion-invalidation, Property 22: 無効化後に古い世代の結果が格納されない**
+"""
+
+from hypothesis import given, strategies as st, settings
+
+from src import server
+from src.bedrock_client import build_cache_key, query_knowledge_base
+from src.cache import ResultCache
+from src.config import KBConfig
+from src.ingestion import IngestionJob, IngestionWatcher
+from src.metrics import Metrics
+from src.models import KBResponse, RetrievalResult
+
+
+class StubAgentClient:
+    """bedrock-agent の ListDataSources / ListIngestionJobs のスタブ"""
+
+    def __init__(self, data_sources: list[str], page_size: int = 1) -> None:
+        self.jobs: dict[str, list[dict]] = {ds: [] for ds in data_sources}
+        self.page_size = page_size
+        self.calls: list[str] = []
+
+    def complete(self, data_source_id: str, job_id: str, status: str = "COMPLETE") -> None:
+        self.jobs[data_source_id].insert(0, {"ingestionJobId": job_id, "status": status})
+
+    def list_data_sources(self, knowledgeBaseId, nextToken=None):
+        self.calls.append("list_data_sources")
+        start = int(nextToken or 0)
+        ids = list(self.jobs)[start:start + self.page_size]
+        response = {"dataSourceSummaries": [{"dataSourceId": ds} for ds in ids]}
+        if start + self.page_size < len(self.jobs):
+            response["nextToken"] = str(start + self.page_size)
+        return response
+
+    def list_ingestion_jobs(self, knowledgeBaseId, dataSourceId, filters, sortBy, maxResults):
+        self.calls.append("list_ingestion_jobs")
+        statuses = filters[0]["values"]
+        jobs = [job for job in self.jobs[dataSourceId] if job["status"] in statuses]
+        return {"ingestionJobSummaries": jobs[:maxResults]}
+
+
+def _response(text: str) -> KBResponse:
+    return KBResponse(results=[RetrievalResult(content=text, location={"uri": text}, score=1.0)])
+
+
+class TestProperty22GenerationGuard:
+    """
+    **Feature: ingestion-invalidation, Property 22: 無効化後に古い世代の結果が格納されない**
+    """
+
+    @settings(max_examples=100)
+    @given(st.lists(
+        st.tuples(st.sampled_from(["start", "finish", "invalidate"]), st.sampled_from("abc")),
+        max_size=30,
+    ))
+    def test_stale_results_are_never_cached(self, operations) -> None:
+        """検索開始後に無効化された場合、その検索の結果はキャッシュに残らない"""
+        cache = ResultCache(max_entries=16, ttl_seconds=60)
+        started: dict[str, int] = {}
+        expected: set[str] = set()
+        for operation, key in operations:
+            if operation == "start":
+                started[key] = cache.generation
+            elif operation == "finish" and key in started:
+                generation = started.pop(key)
+                cache.put(key, _response(key), generation)
+                if generation == cache.generation:
+                    expected.add(key)
+            elif operation == "invalidate":
+                cache.invalidate()
+                expected.clear()
+
+        # 残っているのは最後の無効化より後に開始した検索の結果のみ
+        assert {key for key in "abc" if cache.contains(key)} == expected
+
+
+class TestResultCacheInvalidate:
+    """ResultCache.invalidate のユニットテスト"""
+
+    def test_predicate_selects_entries(self) -> None:
+        """条件に一致するエントリのみ削除し、世代番号を進める"""
+        cache = ResultCache(max_entries=8, ttl_seconds=60)
+        cache.put(("r", "KB1", "q"), _response("a"))
+        cache.put(("r", "KB2", "q"), _response("b"))
+
+        assert cache.invalidate(lambda key: key[1] == "KB1") == 1
+        assert not cache.contains(("r", "KB1", "q"))
+        assert cache.contains(("r", "KB2", "q"))
+        assert cache.generation == 1
+
+    def test_in_flight_query_is_not_cached_after_invalidation(self) -> None:
+        """検索中に無効化された場合、query_knowledge_base は結果を格納しない"""
+        config = KBConfig(aws_region="r", kb_id="KB1")
+        cache = ResultCache(max_entries=8, ttl_seconds=60)
+
+        class SyncingClient:
+            def retrieve(self, **_params):
+                cache.invalidate()
+                return {"retrievalResults": [{"content": {"text": "old"}, "location": {}}]}
+
+        response = query_knowledge_base(SyncingClient(), config, "q", cache=cache)
+
+        assert response.results[0].content == "old"
+        assert not cache.contains(build_cache_key(config, "q"))
+
+
+class TestIngestionWatcher:
+    """IngestionWatcher のテスト（bedrock-agent のスタブを使用）"""
+
+    def _watcher(self, client, synced, **kwargs) -> IngestionWatcher:
+        return IngestionWatcher(
+            client_factory=lambda: client,
+            kb_id="KB1",
+            on_sync=synced.append,
+            registry=Metrics(),
+            **kwargs,
+        )
+
+    def test_first_poll_records_baseline(self) -> None:
+        """初回のポーリングでは既存の完了ジョブでコールバックを呼ばない"""
+        client = StubAgentClient(["DS1", "DS2"])
+        client.complete("DS1", "job-1")
+        synced: list[IngestionJob] = []
+
+        assert self._watcher(client, synced).poll() == []
+        assert synced == []
+
+    def test_new_complete_job_triggers_callback(self) -> None:
+        """新しい完了ジョブを検出した場合のみコールバックを呼ぶ"""
+        client = StubAgentClient(["DS1", "DS2"])
+        client.complete("DS1", "job-1")
+        synced: list[IngestionJob] = []
+        watcher = self._watcher(client, synced)
+        watcher.poll()
+
+        client.complete("DS2", "job-2")
+        client.complete("DS1", "job-3", status="IN_PROGRESS")
+        watcher.poll()
+        watcher.poll()
+
+        assert [(job.data_source_id, job.ingestion_job_id) for job in synced] == [
+            ("DS2", "job-2"),
+        ]
+
+    def test_configured_data_sources_skip_listing(self) -> None:
+        """監視するデータソースを指定した場合は ListDataSources を呼ばない"""
+        client = StubAgentClient(["DS1", "DS2", "DS3"])
+        watcher = self._watcher(client, [], data_source_ids=("DS3",))
+
+        watcher.poll()
+
+        assert client.calls == ["list_ingestion_jobs"]
+
+    def test_data_sources_are_paginated(self) -> None:
+        """データソースの一覧は nextToken で全ページを取得する"""
+        client = StubAgentClient(["DS1", "DS2", "DS3"], page_size=2)
+        watcher = self._watcher(client, [])
+
+        watcher.poll()
+
+        assert client.calls.count("list_data_sources") == 2
+        assert client.calls.count("list_ingestion_jobs") == 3
+
+    def test_sync_invalidates_server_cache(self, monkeypatch) -> None:
+        """同期完了で該当 Knowledge Base の検索結果キャッシュのみ無効化される"""
+        config = KBConfig(aws_region="r", kb_id="KB1")
+        cache = ResultCache(max_entries=8, ttl_seconds=3600)
+        cache.put(build_cache_key(config, "q"), _response("a"))
+        cache.put(build_cache_key(KBConfig(aws_region="r", kb_id="KB9"), "q"), _response("b"))
+        monkeypatch.setattr(server, "_result_cache", cache)
+        client = StubAgentClient(["DS1"])
+        watcher = IngestionWatcher(
+            client_factory=lambda: client,
+            kb_id="KB1",
+            on_sync=lambda job: server._invalidate_synced(config, job),
+            registry=Metrics(),
+        )
+        watcher.poll()
+
+        client.complete("DS1", "job-1")
+        watcher.poll()
+
+        assert len(cache) == 1
+        assert not cache.contains(build_cache_key(config, "q"))
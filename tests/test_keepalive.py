@@ -0,0 +1,207 @@
+"""
+接続キープアライブのテスト
+
+**Feature: keepalive, Property 32: キープアライブは無通信の間のみ、上限の時間内に送る**
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+import pytest
+from botocore.config import Config
+from hypothesis import given, strategies as st, settings
+
+from src import bedrock_client
+from src.config import KBConfig
+from src.keepalive import KeepalivePinger, connection_stats, instrument_client
+from src.metrics import Metrics
+from src.server import mcp
+
+from tests.test_result_sets import FakeClock
+
+
+class IdleClosingHandler(BaseHTTPRequestHandler):
+    """Retrieve API の応答を返し、0.3 秒通信の無い接続を閉じるサーバー"""
+
+    protocol_version = "HTTP/1.1"
+    timeout = 0.3
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = b'{"retrievalResults": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        self.send_response(403)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class BareClient:
+    """ping を差し替えたキープアライブの対象"""
+
+
+@pytest.fixture
+def endpoint():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), IdleClosingHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _client(endpoint_url: str):
+    client = boto3.client(
+        "bedrock-agent-runtime",
+        region_name="us-east-1",
+        endpoint_url=endpoint_url,
+        aws_access_key_id="AKIATEST",
+        aws_secret_access_key="secret",
+        config=Config(retries={"max_attempts": 1}),
+    )
+    assert instrument_client(client)
+    return client
+
+
+def _retrieve(client) -> None:
+    client.retrieve(knowledgeBaseId="KB12345678", retrievalQuery={"text": "q"})
+
+
+def _delta(before: dict, key: str) -> int:
+    return connection_stats()[key] - before[key]
+
+
+class TestProperty32PingsOnlyWhileIdle:
+    """
+    **Feature: keepalive, Property 32: キープアライブは無通信の間のみ、上限の時間内に送る**
+    """
+
+    @settings(max_examples=100)
+    @given(
+        st.lists(
+            st.tuples(st.floats(min_value=0.0, max_value=30.0), st.booleans()),
+            max_size=40,
+        ),
+        st.floats(min_value=1.0, max_value=10.0),
+        st.floats(min_value=0.0, max_value=60.0),
+    )
+    def test_pings_follow_idle_and_cap(self, steps, interval, max_idle) -> None:
+        """通信から interval 以上経過し、最後の呼び出しから max_idle 以内の場合のみ送る"""
+        clock = FakeClock()
+        pings: list[float] = []
+        pinger = KeepalivePinger(
+            interval, max_idle, ping=lambda _client: pings.append(clock.now),
+            clock=clock, registry=Metrics(),
+        )
+        client = BareClient()
+        pinger._clients[client] = [0.0, 0.0]  # pylint: disable=protected-access
+        last_call = last_traffic = 0.0
+
+        for advance, call in steps:
+            clock.now += advance
+            if call:
+                pinger.touch(client)
+                last_call = last_traffic = clock.now
+            sent = pinger.tick()
+            due = clock.now - last_traffic >= interval and clock.now - last_call <= max_idle
+            assert sent == (1 if due else 0)
+            if due:
+                last_traffic = clock.now
+        assert all(later - earlier >= interval for earlier, later in zip(pings, pings[1:]))
+
+
+class TestKeepalive:
+    """キープアライブと接続の記録のテスト"""
+
+    def test_idle_connection_is_reestablished_without_keepalive(self, endpoint) -> None:
+        """サーバーがアイドル接続を閉じた後の呼び出しは接続を確立し直す"""
+        client = _client(endpoint)
+        before = connection_stats()
+
+        _retrieve(client)
+        _retrieve(client)
+        time.sleep(0.6)
+        _retrieve(client)
+
+        assert _delta(before, "handshakes") == 2
+        assert _delta(before, "reused") == 1
+
+    def test_keepalive_keeps_connection_warm(self, endpoint) -> None:
+        """キープアライブが有効な場合、無通信の後の呼び出しも接続を再利用する"""
+        client = _client(endpoint)
+        pinger = KeepalivePinger(0.1, max_idle_seconds=10.0)
+        pinger.track(client)
+        before = connection_stats()
+
+        _retrieve(client)
+        pinger.start()
+        try:
+            time.sleep(0.8)
+            _retrieve(client)
+        finally:
+            pinger.stop()
+
+        assert _delta(before, "handshakes") == 1
+        assert _delta(before, "reused") == 1
+        assert _delta(before, "pings") >= 3
+
+    def test_retrieve_calls_are_tracked(self, endpoint) -> None:
+        """Retrieve API の呼び出しは最後の呼び出し時刻を更新する"""
+        clock = FakeClock()
+        client = _client(endpoint)
+        pinger = KeepalivePinger(5.0, max_idle_seconds=20.0, ping=lambda _c: None, clock=clock)
+        pinger.track(client)
+
+        clock.now = 15
+        _retrieve(client)
+        clock.now = 30
+        assert pinger.tick() == 1
+        clock.now = 40
+        assert pinger.tick() == 0
+
+    def test_ping_failures_are_counted(self) -> None:
+        """キープアライブの失敗はメトリクスに記録し、例外を送出しない"""
+        clock = FakeClock()
+        registry = Metrics()
+
+        def fail(_client):
+            raise OSError("connection refused")
+
+        pinger = KeepalivePinger(1.0, ping=fail, clock=clock, registry=registry)
+        client = BareClient()
+        pinger._clients[client] = [0.0, 0.0]  # pylint: disable=protected-access
+        clock.now = 2
+
+        assert pinger.tick() == 1
+        assert registry.snapshot()["counters"]["keepalive.failures"] == 1
+
+    def test_pinger_is_created_only_when_enabled(self, monkeypatch) -> None:
+        """BEDROCK_KB_KEEPALIVE_INTERVAL が 0 の場合はキープアライブを作成しない"""
+        monkeypatch.setattr(bedrock_client, "_keepalive", None)
+        assert bedrock_client.get_keepalive_pinger(KBConfig(aws_region="r", kb_id="k")) is None
+
+        pinger = bedrock_client.get_keepalive_pinger(
+            KBConfig(aws_region="r", kb_id="k", keepalive_interval_seconds=20.0)
+        )
+        try:
+            assert pinger is not None and pinger.interval_seconds == 20.0
+            assert pinger._thread is not None  # pylint: disable=protected-access
+        finally:
+            pinger.stop()
+
+    def test_kb_metrics_reports_connections(self) -> None:
+        """kb_metrics は接続の確立数・再利用数・再利用率を返す"""
+        result = json.loads(mcp._tool_manager._tools["kb_metrics"].fn())
+
+        assert set(result["connections"]) == {"handshakes", "reused", "reuse_ratio", "pings"}
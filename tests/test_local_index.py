@@ -0,0 +1,320 @@
+"""
+ローカル転置インデックスのテスト
+
+**Feature: local-backend, Property 7: チャンク分割でテキストを失わない**
+**Feature: local-backend, Property 8: Retrieve 互換レスポンス**
+"""
+
+import os
+import struct
+from pathlib import Path
+
+import pytest
+from botocore.exceptions import ClientError
+from hypothesis import given, strategies as st, settings
+
+from src.config import KBConfig
+from src.bedrock_client import query_knowledge_base
+from src.local_index import (
+    LocalIndex,
+    LocalKnowledgeBase,
+    chunk_document,
+    matches_filter,
+    tokenize,
+)
+
+
+# 日本語・英数字・改行を含むドキュメントを生成するストラテジー
+document_strategy = st.text(
+    alphabet=st.sampled_from(list("あいうえお返品保証送料abcXYZ123 \n#。、")),
+    min_size=0,
+    max_size=2000,
+)
+
+
+def _write_corpus(root: Path, files: dict[str, str]) -> None:
+    """テスト用コーパスを作成する。"""
+    for name, content in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+
+
+def _retrieve_request(query: str, n: int = 4) -> dict:
+    """Retrieve API 形式のリクエストを作成する。"""
+    return {
+        "knowledgeBaseId": "local",
+        "retrievalQuery": {"text": query},
+        "retrievalConfiguration": {
+            "vectorSearchConfiguration": {"numberOfResults": n}
+        },
+    }
+
+
+class TestTokenize:
+    """トークナイザーのユニットテスト"""
+
+    def test_japanese_is_split_into_bigrams(self):
+        """日本語の連続部分は文字バイグラムに分割される"""
+        assert tokenize("返品保証") == ["返品", "品保", "保証"]
+
+    def test_ascii_words_are_lowercased(self):
+        """英数字は小文字化した単語として扱われる"""
+        assert tokenize("PDF Export v2") == ["pdf", "export", "v2"]
+
+    def test_mixed_script_boundaries(self):
+        """日本語と英数字の境界でトークンが分かれる"""
+        assert tokenize("API連携") == ["api", "連携"]
+
+    def test_fullwidth_is_normalized(self):
+        """全角英数字は NFKC 正規化される"""
+        assert tokenize("ＡＷＳ") == ["aws"]
+
+
+class TestProperty7Chunking:
+    """
+    **Feature: local-backend, Property 7: チャンク分割でテキストを失わない**
+
+    任意のドキュメントに対して、各チャンクは max_chars 以下であり、
+    元ドキュメントの非空白文字はいずれかのチャンクに含まれる。
+    """
+
+    @given(document=document_strategy, max_chars=st.integers(min_value=20, max_value=300))
+    @settings(max_examples=100)
+    def test_chunks_respect_max_chars(self, document: str, max_chars: int):
+        """全てのチャンクは max_chars 文字以下である"""
+        for chunk in chunk_document(document, max_chars, max_chars // 5):
+            assert 0 < len(chunk) <= max_chars
+
+    @given(document=document_strategy)
+    @settings(max_examples=100)
+    def test_all_characters_are_covered(self, document: str):
+        """元ドキュメントの非空白文字は全ていずれかのチャンクに現れる"""
+        joined = "".join(chunk_document(document, 80, 16))
+        assert {c for c in document if not c.isspace()} <= set(joined)
+
+    def test_heading_starts_new_chunk(self):
+        """見出し行では新しいチャンクが開始される"""
+        chunks = chunk_document("前文です。\n\n## 見出し\n\n本文です。", 600, 0)
+        assert chunks == ["前文です。", "## 見出し\n\n本文です。"]
+
+
+@pytest.fixture(scope="class")
+def kb(tmp_path_factory: pytest.TempPathFactory) -> LocalKnowledgeBase:
+    """3 ファイルのコーパスからクライアントを作成する"""
+    tmp_path = tmp_path_factory.mktemp("kb")
+    _write_corpus(tmp_path / "corpus", {
+        "returns.md": "# 返品ポリシー\n\n商品到着後30日以内であれば返品できます。",
+        "shipping.md": "# 送料\n\n5000円以上のご注文で送料無料です。",
+        "guide/warranty.txt": "保証期間は購入日から1年間です。",
+    })
+    kb = LocalKnowledgeBase.open(tmp_path / "corpus", tmp_path / "index.bin")
+    yield kb
+    kb.index.close()
+
+
+class TestProperty8RetrieveCompatibility:
+    """
+    **Feature: local-backend, Property 8: Retrieve 互換レスポンス**
+
+    LocalKnowledgeBase は Retrieve API と同じ形式のレスポンスを返し、
+    query_knowledge_base でそのまま KBResponse にパースできる。
+    """
+
+    def test_relevant_document_ranks_first(self, kb: LocalKnowledgeBase):
+        """クエリに最も関連するチャンクが先頭に返される"""
+        response = kb.retrieve(**_retrieve_request("返品できますか"))
+        top = response["retrievalResults"][0]
+        assert top["location"]["s3Location"]["uri"].endswith("/returns.md")
+        assert top["location"]["type"] == "S3"
+
+    def test_number_of_results_is_respected(self, kb: LocalKnowledgeBase):
+        """numberOfResults を超える件数は返されない"""
+        response = kb.retrieve(**_retrieve_request("です", n=2))
+        assert len(response["retrievalResults"]) <= 2
+
+    @given(query=st.text(
+        alphabet=st.sampled_from(list("返品送料保証期間abc ")), min_size=1
+    ).filter(lambda s: s.strip() != ""))
+    @settings(max_examples=100, deadline=None)
+    def test_scores_are_normalized_and_sorted(self, kb: LocalKnowledgeBase, query: str):
+        """スコアは 0.0-1.0 の範囲で降順に並ぶ"""
+        results = kb.retrieve(**_retrieve_request(query, n=10))["retrievalResults"]
+        scores = [result["score"] for result in results]
+        assert all(0.0 < score <= 1.0 for score in scores)
+        assert scores == sorted(scores, reverse=True)
+
+    def test_query_knowledge_base_returns_kb_response(self, kb: LocalKnowledgeBase):
+        """query_knowledge_base にクライアントとして渡せる"""
+        config = KBConfig(aws_region="ap-northeast-1", kb_id="local")
+        response = query_knowledge_base(kb, config, "保証期間", max_results=1)
+        assert len(response.results) == 1
+        assert "1年間" in response.results[0].content
+        assert response.results[0].location["s3Location"]["uri"] == (
+            "s3://local-kb/guide/warranty.txt"
+        )
+
+    def test_empty_query_raises_validation_exception(self, kb: LocalKnowledgeBase):
+        """空クエリは ValidationException の ClientError になる"""
+        with pytest.raises(ClientError) as exc_info:
+            kb.retrieve(**_retrieve_request(""))
+        assert exc_info.value.response["Error"]["Code"] == "ValidationException"
+
+
+class TestLocalMetadataFilter:
+    """ローカルバックエンドのメタデータフィルターのユニットテスト"""
+
+    def test_matches_filter_operators(self):
+        """各演算子がメタデータに正しく適用される"""
+        metadata = {"category": "faq", "year": 2024, "x-amz-bedrock-kb-source-uri": "s3://b/faq/a.md"}
+        assert matches_filter({"equals": {"key": "category", "value": "faq"}}, metadata)
+        assert not matches_filter({"equals": {"key": "category", "value": "guide"}}, metadata)
+        assert matches_filter({"in": {"key": "year", "value": [2023, 2024]}}, metadata)
+        assert matches_filter(
+            {"startsWith": {"key": "x-amz-bedrock-kb-source-uri", "value": "s3://b/faq/"}},
+            metadata,
+        )
+        assert matches_filter({"orAll": [
+            {"equals": {"key": "category", "value": "guide"}},
+            {"equals": {"key": "year", "value": 2024}},
+        ]}, metadata)
+        assert not matches_filter({"andAll": [
+            {"equals": {"key": "category", "value": "guide"}},
+            {"equals": {"key": "year", "value": 2024}},
+        ]}, metadata)
+
+    def test_sidecar_metadata_filters_results(self, tmp_path: Path):
+        """.metadata.json の属性でサーバー側と同様に絞り込まれる"""
+        corpus = tmp_path / "corpus"
+        _write_corpus(corpus, {
+            "faq.md": "返品は30日以内に受け付けます。",
+            "faq.md.metadata.json": '{"metadataAttributes": {"category": "faq"}}',
+            "policy.md": "返品ポリシーの詳細です。",
+        })
+        kb = LocalKnowledgeBase.open(corpus, tmp_path / "index.bin")
+        request = _retrieve_request("返品")
+        request["retrievalConfiguration"]["vectorSearchConfiguration"]["filter"] = {
+            "equals": {"key": "category", "value": "faq"}
+        }
+
+        results = kb.retrieve(**request)["retrievalResults"]
+
+        assert [r["location"]["s3Location"]["uri"] for r in results] == ["s3://local-kb/faq.md"]
+        assert results[0]["metadata"]["category"] == "faq"
+        kb.index.close()
+
+    def test_sidecar_change_triggers_reindex(self, tmp_path: Path):
+        """サイドカーのみの変更でも属性が更新される"""
+        corpus = tmp_path / "corpus"
+        _write_corpus(corpus, {
+            "a.md": "返品について",
+            "a.md.metadata.json": '{"metadataAttributes": {"category": "faq"}}',
+        })
+        index = LocalIndex(tmp_path / "index.bin")
+        index.update(corpus)
+
+        (corpus / "a.md.metadata.json").write_text(
+            '{"metadataAttributes": {"category": "guide"}}', encoding="utf-8"
+        )
+        os.utime(corpus / "a.md.metadata.json", ns=(1, 1))
+        stats = index.update(corpus)
+
+        assert stats["updated"] == 1
+        assert index.chunk_attributes(0) == {"category": "guide"}
+        index.close()
+
+
+class TestIncrementalIndexing:
+    """差分インデックスのユニットテスト"""
+
+    def test_unchanged_corpus_is_not_reindexed(self, tmp_path: Path):
+        """変更がなければ再インデックスされない"""
+        _write_corpus(tmp_path / "corpus", {"a.md": "返品について", "b.md": "送料について"})
+        index = LocalIndex(tmp_path / "index.bin")
+        assert index.update(tmp_path / "corpus")["added"] == 2
+
+        reopened = LocalIndex(tmp_path / "index.bin")
+        assert reopened.load()
+        stats = reopened.update(tmp_path / "corpus")
+        assert stats == {"added": 0, "updated": 0, "removed": 0, "unchanged": 2}
+        index.close()
+        reopened.close()
+
+    def test_changed_and_removed_files_are_reflected(self, tmp_path: Path):
+        """変更・削除されたファイルのみが検索結果に反映される"""
+        corpus = tmp_path / "corpus"
+        _write_corpus(corpus, {"a.md": "返品について", "b.md": "送料について"})
+        index = LocalIndex(tmp_path / "index.bin")
+        index.update(corpus)
+
+        (corpus / "a.md").write_text("保証期間について詳しく", encoding="utf-8")
+        (corpus / "b.md").unlink()
+        stats = index.update(corpus)
+
+        assert stats == {"added": 0, "updated": 1, "removed": 1, "unchanged": 0}
+        assert index.search("返品", 5) == []
+        assert index.search("送料", 5) == []
+        hits = index.search("保証期間", 5)
+        assert [index.chunk_source(chunk_id) for chunk_id, _ in hits] == ["a.md"]
+        index.close()
+
+    def test_unchanged_postings_survive_partial_update(self, tmp_path: Path):
+        """引き継がれたファイルのチャンクは引き続き検索できる"""
+        corpus = tmp_path / "corpus"
+        _write_corpus(corpus, {"a.md": "返品について", "b.md": "送料について"})
+        index = LocalIndex(tmp_path / "index.bin")
+        index.update(corpus)
+
+        _write_corpus(corpus, {"c.md": "保証について"})
+        stats = index.update(corpus)
+
+        assert stats["added"] == 1 and stats["unchanged"] == 2
+        hits = index.search("送料", 5)
+        assert [index.chunk_source(chunk_id) for chunk_id, _ in hits] == ["b.md"]
+        assert index.chunk_text(hits[0][0]) == "送料について"
+        index.close()
+
+    def test_missing_corpus_raises_value_error(self, tmp_path: Path):
+        """存在しないディレクトリは ValueError になる"""
+        with pytest.raises(ValueError):
+            LocalIndex(tmp_path / "index.bin").update(tmp_path / "missing")
+
+    def test_corrupt_metadata_is_treated_as_invalid(self, tmp_path: Path):
+        """メタデータが壊れたインデックスは読み込まれず、再構築される"""
+        corpus = tmp_path / "corpus"
+        _write_corpus(corpus, {"a.md": "返品について"})
+        index_path = tmp_path / "index.bin"
+        LocalIndex(index_path).update(corpus)
+        data = bytearray(index_path.read_bytes())
+        meta_off = struct.unpack_from("<8s6Q", data, 0)[1]
+        data[meta_off:meta_off + 4] = b"\xff\xfe{["
+        index_path.write_bytes(bytes(data))
+
+        index = LocalIndex(index_path)
+        assert index.load() is False
+        assert index.update(corpus)["added"] == 1
+        assert [index.chunk_source(c) for c, _ in index.search("返品", 5)] == ["a.md"]
+        index.close()
+
+    def test_truncated_index_is_treated_as_invalid(self, tmp_path: Path):
+        """途中で切れたインデックスファイルは読み込まれない"""
+        corpus = tmp_path / "corpus"
+        _write_corpus(corpus, {"a.md": "返品について", "b.md": "送料について"})
+        index_path = tmp_path / "index.bin"
+        LocalIndex(index_path).update(corpus)
+        data = index_path.read_bytes()
+        index_path.write_bytes(data[: len(data) // 2])
+
+        assert LocalIndex(index_path).load() is False
+
+    def test_build_leaves_no_temporary_files(self, tmp_path: Path):
+        """書き込みは一意な一時ファイル経由で行われ、後に残らない"""
+        corpus = tmp_path / "corpus"
+        _write_corpus(corpus, {"a.md": "返品について"})
+        index = LocalIndex(tmp_path / "index.bin")
+        index.update(corpus)
+        _write_corpus(corpus, {"b.md": "送料について"})
+        index.update(corpus)
+
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["corpus", "index.bin"]
+        index.close()
@@ -0,0 +1,215 @@
+"""
+メモリ診断・メモリ予算のテスト
+
+**Feature: memory-diagnostics, Property 23: 予算超過時の削除とチャンク参照の整合性**
+
+ソークテストの実行時間は BEDROCK_KB_SOAK_SECONDS（デフォルト: 3 秒）で延長できる。
+例: BEDROCK_KB_SOAK_SECONDS=7200 pytest tests/test_memory.py -k soak
+"""
+
+import asyncio
+import gc
+import json
+import math
+import os
+import time
+import tracemalloc
+
+import pytest
+from hypothesis import given, strategies as st, settings
+
+from src import server
+from src.cache import ResultCache
+from src.chunk_store import ChunkStore
+from src.client_pool import CLIENT_ESTIMATED_BYTES
+from src.memory import MemoryBudget, rss_bytes, top_allocations
+from src.metrics import Metrics
+from src.models import KBResponse, RetrievalResult
+from src.sessions import CHUNK_RECORD_ESTIMATED_BYTES, SessionStore
+from src.server import mcp
+
+
+def _response(texts: list[str]) -> KBResponse:
+    return KBResponse(results=[
+        RetrievalResult(content=text, location={"uri": text}, score=0.5) for text in texts
+    ])
+
+
+class TestProperty23Shedding:
+    """
+    **Feature: memory-diagnostics, Property 23: 予算超過時の削除とチャンク参照の整合性**
+    """
+
+    @settings(max_examples=100)
+    @given(
+        st.lists(st.lists(st.sampled_from("abcdef"), max_size=4), min_size=1, max_size=20),
+        st.floats(min_value=0, max_value=1),
+    )
+    def test_shrink_evicts_oldest_and_releases_chunks(self, responses, fraction) -> None:
+        """shrink は古い順に ceil(件数 × 割合) 件を削除し、残りのエントリの参照のみが残る"""
+        store = ChunkStore()
+        cache = ResultCache(max_entries=64, ttl_seconds=60, chunk_store=store)
+        for index, texts in enumerate(responses):
+            cache.put(index, _response(texts))
+
+        removed = cache.shrink(fraction)
+
+        assert removed == math.ceil(len(responses) * fraction)
+        kept = range(removed, len(responses))
+        assert [key for key in range(len(responses)) if cache.contains(key)] == list(kept)
+        assert store.stats()["references"] == sum(len(responses[key]) for key in kept)
+
+
+class TestMemoryBudget:
+    """MemoryBudget のユニットテスト"""
+
+    def test_sheds_only_when_over_budget(self) -> None:
+        """RSS が予算以下の場合は削除せず、超過した場合は各キャッシュを削除する"""
+        registry = Metrics()
+        usage = {"rss": 100}
+        shed_calls: list[float] = []
+
+        def shed(fraction: float) -> int:
+            shed_calls.append(fraction)
+            return 3
+
+        budget = MemoryBudget(
+            200, [("cache", shed)], measure=lambda: usage["rss"], registry=registry,
+        )
+
+        assert budget.check() == 0
+        usage["rss"] = 300
+        assert budget.check() == 3
+
+        snapshot = registry.snapshot()
+        assert shed_calls == [0.5]
+        assert snapshot["counters"]["memory.budget_exceeded"] == 1
+        assert snapshot["counters"]["memory.shed.cache"] == 3
+        assert snapshot["gauges"]["memory.rss_bytes"] == 300
+
+    def test_unknown_rss_is_ignored(self) -> None:
+        """RSS を取得できない環境では何もしない"""
+        budget = MemoryBudget(1, [("cache", lambda f: pytest.fail("shed"))], measure=lambda: None)
+        assert budget.check() == 0
+
+    def test_check_failures_do_not_stop_the_thread(self) -> None:
+        """確認中の例外は memory.check_failures で数え、監視スレッドは次の間隔で再度確認する"""
+        registry = Metrics()
+        calls: list[int] = []
+
+        def measure() -> int:
+            calls.append(1)
+            raise OSError("/proc/self/statm を読み込めません")
+
+        budget = MemoryBudget(
+            1, [], check_interval_seconds=0.01, measure=measure, registry=registry,
+        )
+        budget.start()
+        try:
+            deadline = time.monotonic() + 5
+            while len(calls) < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert budget._thread is not None and budget._thread.is_alive()
+        finally:
+            budget.stop()
+
+        assert len(calls) >= 3
+        assert registry.snapshot()["counters"]["memory.check_failures"] >= 3
+
+
+class TestMemoryTool:
+    """kb_memory ツールのテスト"""
+
+    def test_reports_rss_and_subsystems(self, monkeypatch) -> None:
+        """RSS とサブシステムごとのバイト数を返す"""
+        monkeypatch.setattr(server, "_result_cache", None)
+        monkeypatch.setattr(server, "_result_sets", None)
+
+        result = json.loads(mcp._tool_manager._tools["kb_memory"].fn())
+
+        assert set(result) == {
+            "rss_bytes", "peak_rss_bytes", "subsystems", "budget", "tracemalloc",
+        }
+        assert {"recent_chunks", "client_pools"} <= set(result["subsystems"])
+        if rss_bytes() is not None:
+            assert result["rss_bytes"] > 0
+
+    def test_estimates_client_pools_and_sessions(self, monkeypatch) -> None:
+        """プール済みクライアント数 × 1 つあたりの見積もりと、セッションの記録のバイト数を返す"""
+        sessions = SessionStore()
+        sessions.deliver("s1", ["a" * 64, "b" * 64])
+        monkeypatch.setattr(server, "_sessions", sessions)
+        monkeypatch.setattr(server, "client_pool_stats", lambda: {"default": 2, "legal": 1})
+
+        subsystems = json.loads(mcp._tool_manager._tools["kb_memory"].fn())["subsystems"]
+
+        assert subsystems["client_pools"] == 3 * CLIENT_ESTIMATED_BYTES
+        assert subsystems["sessions"] == 2 * CHUNK_RECORD_ESTIMATED_BYTES
+
+    def test_trace_toggles_tracemalloc(self) -> None:
+        """trace=True で追跡を開始して上位割り当て箇所を返し、trace=False で停止する"""
+        tool = mcp._tool_manager._tools["kb_memory"].fn
+        try:
+            started = json.loads(tool(trace=True))
+            payload = [bytearray(1024) for _ in range(100)]
+            result = json.loads(tool(top=5))
+        finally:
+            stopped = json.loads(tool(trace=False))
+        del payload
+
+        assert started["tracemalloc"]["tracing"] is True
+        assert 0 < len(result["tracemalloc"]["top"]) <= 5
+        assert {"location", "size_bytes", "count"} <= set(result["tracemalloc"]["top"][0])
+        assert stopped["tracemalloc"]["tracing"] is False
+        assert top_allocations(5) == []
+
+
+class TestSoak:
+    """kb_answer を繰り返し実行してもメモリが増え続けないことを確認する（ローカルバックエンド）"""
+
+    def test_soak_memory_is_flat(self, tmp_path, monkeypatch) -> None:
+        """キャッシュが上限に達した後は追跡中のメモリがほぼ一定になる"""
+        corpus = tmp_path / "corpus"
+        corpus.mkdir()
+        for index in range(20):
+            (corpus / f"doc{index}.md").write_text(
+                f"返品ポリシー {index}: 返品は購入日から{index + 10}日以内に受け付けます。"
+                f"送料は{index * 100}円です。" * 5,
+                encoding="utf-8",
+            )
+        monkeypatch.setenv("BEDROCK_KB_BACKEND", "local")
+        monkeypatch.setenv("BEDROCK_KB_LOCAL_DIR", str(corpus))
+        monkeypatch.setenv("BEDROCK_KB_CACHE_SIZE", "32")
+        monkeypatch.setenv("BEDROCK_KB_RESULT_SET_MAX", "16")
+        monkeypatch.delenv("BEDROCK_KB_QUERY_LOG", raising=False)
+        monkeypatch.setattr(server, "_result_cache", None)
+        monkeypatch.setattr(server, "_result_sets", None)
+        monkeypatch.setattr(server, "_query_log", None)
+        soak_seconds = float(os.environ.get("BEDROCK_KB_SOAK_SECONDS", "3"))
+        kb_answer = mcp._tool_manager._tools["kb_answer"].fn
+
+        def run(start: int, count: int) -> int:
+            for index in range(start, start + count):
+                asyncio.run(kb_answer(
+                    query=f"返品 送料 {index}",
+                    max_results=2,
+                    fetch_limit=6,
+                    snippet=index % 2 == 0,
+                ))
+            return start + count
+
+        tracemalloc.start()
+        try:
+            # キャッシュ・結果セットが上限に達するまで実行してから計測を始める
+            calls = run(0, 200)
+            gc.collect()
+            baseline = tracemalloc.get_traced_memory()[0]
+            deadline = time.monotonic() + soak_seconds
+            while calls < 600 or time.monotonic() < deadline:
+                calls = run(calls, 50)
+            gc.collect()
+            final = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        assert final - baseline < 512 * 1024, f"{calls} 回の呼び出しで {final - baseline} バイト増加"
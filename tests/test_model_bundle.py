@@ -0,0 +1,165 @@
+"""
+botocore モデルバンドルのテスト
+
+**Feature: model-bundle, Property 26: バンドルから作成したクライアントは通常のクライアントと同じ API 定義を持つ**
+"""
+
+import marshal
+
+import boto3
+import botocore
+import pytest
+from botocore.loaders import Loader
+from hypothesis import given, strategies as st, settings
+
+from src import model_bundle
+from src.config import load_config
+from src.credentials import CredentialManager
+from src.metrics import Metrics
+from src.model_bundle import (
+    BUNDLE_FORMAT,
+    build_bundle,
+    install_bundle,
+    load_bundle,
+    start_bundle_build,
+    write_bundle,
+)
+
+from tests.test_config import env_vars
+
+
+def _session(bundle_path: str | None = None) -> boto3.Session:
+    session = boto3.Session(
+        region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test",
+    )
+    if bundle_path is not None:
+        assert install_bundle(session, bundle_path)
+    return session
+
+
+@pytest.fixture(scope="module")
+def bundle_path(tmp_path_factory) -> str:
+    return write_bundle(str(tmp_path_factory.mktemp("bundle") / "botocore.bundle"))
+
+
+@pytest.fixture(scope="module")
+def clients(bundle_path):
+    plain = _session().client("bedrock-agent-runtime")
+    bundled = _session(bundle_path).client("bedrock-agent-runtime")
+    return plain, bundled
+
+
+OPERATIONS = sorted(
+    _session().client("bedrock-agent-runtime").meta.service_model.operation_names
+)
+
+
+class TestProperty26BundledClient:
+    """
+    **Feature: model-bundle, Property 26: バンドルから作成したクライアントは通常のクライアントと同じ API 定義を持つ**
+    """
+
+    @settings(max_examples=100)
+    @given(st.sampled_from(OPERATIONS))
+    def test_operation_models_match(self, clients, operation) -> None:
+        """操作の入出力の形と HTTP 定義がバンドルの有無で変わらない"""
+        plain, bundled = clients
+        expected = plain.meta.service_model.operation_model(operation)
+        actual = bundled.meta.service_model.operation_model(operation)
+
+        assert actual.http == expected.http
+        for name in ("input_shape", "output_shape"):
+            expected_shape = getattr(expected, name)
+            actual_shape = getattr(actual, name)
+            if expected_shape is None:
+                assert actual_shape is None
+            else:
+                assert list(actual_shape.members) == list(expected_shape.members)
+                assert actual_shape.required_members == expected_shape.required_members
+
+
+class TestModelBundle:
+    """バンドルの作成・読み込み・組み込みのテスト"""
+
+    def test_bundled_client_skips_data_directory(self, bundle_path, clients, monkeypatch) -> None:
+        """バンドルを使うとクライアント作成でデータファイルを読み込まない"""
+        loaded: list[str] = []
+        original = Loader.load_data_with_path
+
+        def recording(self, name):
+            loaded.append(name)
+            return original(self, name)
+
+        monkeypatch.setattr(Loader, "load_data_with_path", recording)
+
+        client = _session(bundle_path).client("bedrock-agent-runtime")
+
+        assert loaded == []
+        assert client.meta.endpoint_url == clients[0].meta.endpoint_url
+
+    def test_bundle_drops_documentation(self) -> None:
+        """バンドルにはドキュメント文字列を含めない"""
+        bundle = build_bundle()
+        service = bundle["services"]["bedrock-agent-runtime/service-2"]
+
+        assert bundle["format"] == BUNDLE_FORMAT
+        assert "endpoints" in bundle["data"]
+        assert all("documentation" not in op for op in service["operations"].values())
+
+    @pytest.mark.parametrize("content", [
+        b"not marshal",
+        marshal.dumps({"format": BUNDLE_FORMAT, "botocore": "0.0.0", "data": {}, "services": {}}),
+        marshal.dumps({"format": BUNDLE_FORMAT + 1, "botocore": botocore.__version__}),
+        marshal.dumps(["list"]),
+    ])
+    def test_unusable_bundle_is_ignored(self, tmp_path, content) -> None:
+        """壊れたバンドルや botocore のバージョンが異なるバンドルは使用しない"""
+        path = tmp_path / "broken.bundle"
+        path.write_bytes(content)
+
+        assert load_bundle(str(path)) is None
+        assert install_bundle(_session(), str(path)) is False
+        assert load_bundle(str(tmp_path / "missing.bundle")) is None
+
+    def test_fake_session_is_left_unchanged(self, bundle_path) -> None:
+        """botocore のセッションを持たないセッション（テストダブル）には組み込まない"""
+        assert install_bundle(object(), bundle_path) is False
+
+    def test_credential_manager_installs_bundle(self, bundle_path) -> None:
+        """CredentialManager はバンドルを指定するとセッションに組み込む"""
+        manager = CredentialManager(
+            session_factory=_session, registry=Metrics(), model_bundle_path=bundle_path,
+        )
+
+        assert manager.model_bundle_loaded is True
+        assert CredentialManager(session_factory=_session, registry=Metrics()).model_bundle_loaded is False
+
+    def test_start_build_writes_missing_bundle(self, tmp_path, bundle_path) -> None:
+        """バンドルが無い場合のみバックグラウンドで作成する"""
+        path = str(tmp_path / "cache" / "botocore.bundle")
+
+        thread = start_bundle_build(path)
+        assert thread is not None
+        thread.join(timeout=30)
+
+        assert load_bundle(path) is not None
+        assert start_bundle_build(path) is None
+
+    def test_config_bundle_path(self, tmp_path) -> None:
+        """BEDROCK_KB_MODEL_BUNDLE は未設定でデフォルトの場所、off で無効になる"""
+        with env_vars(BEDROCK_KB_ID="KB1", BEDROCK_KB_MODEL_BUNDLE=None, XDG_CACHE_HOME=str(tmp_path)):
+            assert load_config().model_bundle_path == model_bundle.default_bundle_path()
+            assert load_config().model_bundle_path.startswith(str(tmp_path))
+        with env_vars(BEDROCK_KB_ID="KB1", BEDROCK_KB_MODEL_BUNDLE="off"):
+            assert load_config().model_bundle_path is None
+        with env_vars(BEDROCK_KB_ID="KB1", BEDROCK_KB_MODEL_BUNDLE="/tmp/kb.bundle"):
+            assert load_config().model_bundle_path == "/tmp/kb.bundle"
+
+    def test_benchmark_reports_both_modes(self, bundle_path) -> None:
+        """ベンチマークはバンドルの有無それぞれの作成時間を返す"""
+        result = model_bundle.benchmark(bundle_path, runs=1)
+
+        assert result["runs"] == 1
+        assert result["without_bundle_ms"]["p50"] > 0
+        assert result["with_bundle_ms"]["p50"] > 0
+        assert result["speedup"] > 0
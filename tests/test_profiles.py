@@ -0,0 +1,328 @@
+"""
+KB プロファイルとクライアントプールのテスト
+
+**Feature: kb-profiles, Property 24: プロファイル間でクライアント・キャッシュを共有しない**
+"""
+
+import asyncio
+import json
+from collections import OrderedDict
+from dataclasses import replace
+
+import pytest
+from hypothesis import given, strategies as st, settings
+
+from src import bedrock_client, server
+from src.bedrock_client import _create_replica_client, build_cache_key
+from src.client_pool import ClientPool
+from src.config import KBConfig, Replica, load_config
+from src.deadline import Deadline
+from src.metrics import Metrics
+from src.profiles import ProfileNotFoundError, parse_profiles, select_profile
+from src.server import mcp
+
+from tests.test_config import env_vars
+
+
+PROFILES = {
+    "default": "support",
+    "profiles": {
+        "support": {"kb_id": "KB1", "region": "ap-northeast-1", "aws_profile": "support"},
+        "legal": {
+            "kb_id": "KB2",
+            "region": "us-east-1",
+            "search_type": "semantic",
+            "metadata_filter": {"equals": {"key": "lang", "value": "ja"}},
+            "timeout_ms": 5000,
+        },
+    },
+}
+
+
+def _write_profiles(tmp_path, data=None) -> str:
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps(data or PROFILES), encoding="utf-8")
+    return str(path)
+
+
+class _FakeManager:
+    """create_client の呼び出しを記録する CredentialManager のテストダブル"""
+
+    def __init__(self, created: list) -> None:
+        self._created = created
+
+    def create_client(self, service, region, client_config=None):
+        self._created.append((service, region, client_config))
+        return object()
+
+
+class TestProperty24Isolation:
+    """
+    **Feature: kb-profiles, Property 24: プロファイル間でクライアント・キャッシュを共有しない**
+    """
+
+    @settings(max_examples=100)
+    @given(
+        st.lists(st.integers(min_value=0, max_value=7), max_size=50),
+        st.integers(min_value=1, max_value=5),
+    )
+    def test_pool_matches_lru_model(self, keys, max_clients) -> None:
+        """プールは最大数以内で、最も長く使われていないクライアントから破棄する"""
+        pool = ClientPool(max_clients, registry=Metrics())
+        model: OrderedDict[int, object] = OrderedDict()
+        for key in keys:
+            client = pool.get(key, object)
+            if key in model:
+                assert client is model[key]
+                model.move_to_end(key)
+            else:
+                model[key] = client
+                while len(model) > max_clients:
+                    model.popitem(last=False)
+            assert len(pool) == len(model) <= max_clients
+
+    @settings(max_examples=100)
+    @given(
+        st.lists(
+            st.sampled_from(["a", "b", "c"]), min_size=2, max_size=3, unique=True,
+        ),
+        st.text(min_size=1, max_size=20),
+    )
+    def test_profiles_never_share_cache_keys(self, names, query) -> None:
+        """同じ Knowledge Base を指すプロファイル同士でもキャッシュキーは重ならない"""
+        _, profiles = parse_profiles({
+            "profiles": {name: {"kb_id": "KB1", "aws_profile": name} for name in names},
+        })
+        base = KBConfig(aws_region="ap-northeast-1", kb_id="", profiles_path="unused")
+        configs = [replace(base, **profiles[name]) for name in names]
+
+        keys = {build_cache_key(config, query) for config in configs}
+
+        assert len(keys) == len(names)
+        assert all(bedrock_client.is_cache_key_for(key, configs[0]) for key in keys)
+
+
+class TestProfiles:
+    """プロファイルファイルの読み込みと選択のテスト"""
+
+    def test_select_applies_profile(self, tmp_path) -> None:
+        """プロファイルの検索先とデフォルト値が設定に反映される"""
+        config = KBConfig(aws_region="eu-west-1", kb_id="ENV", profiles_path=_write_profiles(tmp_path))
+
+        legal = select_profile(config, "legal")
+
+        assert (legal.profile_name, legal.kb_id, legal.aws_region) == ("legal", "KB2", "us-east-1")
+        assert legal.default_search_type == "SEMANTIC"
+        assert legal.default_metadata_filter == {"equals": {"key": "lang", "value": "ja"}}
+        assert legal.request_timeout_ms == 5000
+        assert legal.replica_set == (Replica("us-east-1", "KB2"),)
+
+    def test_default_profile_is_used_when_kb_is_omitted(self, tmp_path) -> None:
+        """kb を省略した場合はファイルの default を使用する"""
+        config = KBConfig(aws_region="eu-west-1", kb_id="ENV", profiles_path=_write_profiles(tmp_path))
+
+        selected = select_profile(config, None)
+
+        assert selected.profile_name == "support"
+        assert selected.replica_set == (Replica("ap-northeast-1", "KB1", profile="support"),)
+
+    def test_unknown_profile_raises(self, tmp_path) -> None:
+        """存在しないプロファイル名は利用可能な名前を含むエラーになる"""
+        config = KBConfig(aws_region="r", kb_id="ENV", profiles_path=_write_profiles(tmp_path))
+
+        with pytest.raises(ProfileNotFoundError) as exc_info:
+            select_profile(config, "hr")
+        assert "legal / support" in str(exc_info.value)
+
+        with pytest.raises(ProfileNotFoundError):
+            select_profile(KBConfig(aws_region="r", kb_id="ENV"), "legal")
+
+    @pytest.mark.parametrize("profile", [
+        {"region": "us-east-1"},
+        {"kb_id": "KB1", "unknown": 1},
+        {"kb_id": "KB1", "search_type": "FUZZY"},
+        {"kb_id": "KB1", "replicas": "us-east-1:KB2"},
+    ])
+    def test_invalid_profile_raises(self, profile) -> None:
+        """kb_id の欠落・不明なキー・不正な値はプロファイル名を含むエラーになる"""
+        with pytest.raises(ValueError) as exc_info:
+            parse_profiles({"profiles": {"bad": profile}})
+        assert "'bad'" in str(exc_info.value)
+
+    def test_kb_id_is_optional_with_profiles(self, tmp_path) -> None:
+        """BEDROCK_KB_PROFILES を指定した場合は BEDROCK_KB_ID を省略できる"""
+        with env_vars(
+            BEDROCK_KB_ID=None,
+            BEDROCK_KB_BACKEND=None,
+            BEDROCK_KB_PROFILES=_write_profiles(tmp_path),
+        ):
+            config = load_config()
+
+        assert config.kb_id == ""
+        assert select_profile(config, None).kb_id == "KB1"
+
+
+class TestClientPooling:
+    """KB プロファイルごとのクライアントプールのテスト"""
+
+    @pytest.fixture(autouse=True)
+    def _pools(self, monkeypatch) -> list:
+        created: list = []
+        monkeypatch.setattr(bedrock_client, "_client_pools", {})
+        monkeypatch.setattr(
+            bedrock_client,
+            "get_credential_manager",
+            lambda **_kwargs: _FakeManager(created),
+        )
+        return created
+
+    def test_same_budget_reuses_client(self, _pools) -> None:
+        """時間予算がほぼ同じ呼び出しは同じクライアントを再利用する"""
+        config = KBConfig(aws_region="r", kb_id="KB1")
+        replica = config.replica_set[0]
+
+        first = _create_replica_client(config, replica, Deadline(30000))
+        second = _create_replica_client(config, replica, Deadline(29990))
+
+        assert first is second
+        assert len(_pools) == 1
+
+    def test_profiles_have_separate_pools(self, _pools) -> None:
+        """同じリージョン・設定でも KB プロファイルが異なればクライアントを共有しない"""
+        support = KBConfig(aws_region="r", kb_id="KB1", profile_name="support")
+        legal = KBConfig(aws_region="r", kb_id="KB1", profile_name="legal")
+
+        first = _create_replica_client(support, support.replica_set[0], None)
+        second = _create_replica_client(legal, legal.replica_set[0], None)
+
+        assert first is not second
+        assert bedrock_client.client_pool_stats() == {"support": 1, "legal": 1}
+
+    def test_bare_replicas_use_profile_credentials(self, monkeypatch) -> None:
+        """AWS プロファイルを指定していない複製もプロファイルの aws_profile で呼び出す"""
+        profile_names: list = []
+        monkeypatch.setattr(
+            bedrock_client,
+            "get_credential_manager",
+            lambda **kwargs: profile_names.append(kwargs["profile_name"]) or _FakeManager([]),
+        )
+        _, profiles = parse_profiles({"profiles": {"support": {
+            "kb_id": "KB1", "region": "ap-northeast-1", "aws_profile": "support",
+            "replicas": ["us-east-1:KB1US", "us-west-2:KB1W:other"],
+        }}})
+        config = replace(KBConfig(aws_region="r", kb_id=""), **profiles["support"])
+
+        for replica in config.replica_set:
+            _create_replica_client(config, replica, None)
+
+        assert profile_names == ["support", "support", "other"]
+
+
+class TestKbAnswerProfiles:
+    """kb_answer の kb パラメータのテスト"""
+
+    @pytest.fixture(autouse=True)
+    def _env(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("BEDROCK_KB_BACKEND", "bedrock")
+        monkeypatch.delenv("BEDROCK_KB_ID", raising=False)
+        monkeypatch.delenv("BEDROCK_KB_QUERY_LOG", raising=False)
+        monkeypatch.setenv("BEDROCK_KB_PROFILES", _write_profiles(tmp_path))
+        monkeypatch.setattr(server, "_result_cache", None)
+        monkeypatch.setattr(server, "_negative_cache", None)
+
+    def test_kb_selects_profile_and_defaults(self, monkeypatch) -> None:
+        """kb で選んだプロファイルの KB ID・検索タイプ・フィルターで検索する"""
+        requests: list[dict] = []
+
+        class RecordingClient:
+            def retrieve(self, **params):
+                requests.append(params)
+                return {"retrievalResults": [
+                    {"content": {"text": "条文"}, "location": {}, "score": 0.9},
+                ]}
+
+        monkeypatch.setattr(server, "create_client", lambda config, deadline: RecordingClient())
+        kb_answer = mcp._tool_manager._tools["kb_answer"].fn
+
+        asyncio.run(kb_answer(query="契約", kb="legal"))
+        asyncio.run(kb_answer(query="契約"))
+
+        assert [r["knowledgeBaseId"] for r in requests] == ["KB2", "KB1"]
+        search = requests[0]["retrievalConfiguration"]["vectorSearchConfiguration"]
+        assert search["overrideSearchType"] == "SEMANTIC"
+        assert search["filter"] == {"equals": {"key": "lang", "value": "ja"}}
+        assert "filter" not in requests[1]["retrievalConfiguration"]["vectorSearchConfiguration"]
+
+    def test_unknown_kb_is_validation_error(self) -> None:
+        """存在しないプロファイル名は ValidationError になる"""
+        kb_answer = mcp._tool_manager._tools["kb_answer"].fn
+        result = json.loads(asyncio.run(kb_answer(query="q", kb="hr")))
+
+        assert result["error"] is True
+        assert result["error_type"] == "ValidationError"
+
+
+class TestBackgroundProfiles:
+    """ウォームアップ・取り込みジョブ監視・クエリログの KB プロファイル対応のテスト"""
+
+    @pytest.fixture(autouse=True)
+    def _env(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("BEDROCK_KB_BACKEND", "bedrock")
+        monkeypatch.delenv("BEDROCK_KB_ID", raising=False)
+        monkeypatch.setenv("BEDROCK_KB_PROFILES", _write_profiles(tmp_path, {"profiles": {
+            **PROFILES["profiles"],
+            "support-ja": {"kb_id": "KB1", "region": "ap-northeast-1", "aws_profile": "support"},
+        }, "default": "support"}))
+        monkeypatch.setattr(server, "_result_cache", None)
+        monkeypatch.setattr(server, "_negative_cache", None)
+
+    def test_ingestion_watchers_cover_every_profile(self, monkeypatch) -> None:
+        """(リージョン, KB ID, AWS プロファイル) ごとに 1 つの監視を開始する"""
+        monkeypatch.setenv("BEDROCK_KB_INGESTION_POLL_INTERVAL", "60")
+        monkeypatch.setattr(server.IngestionWatcher, "start", lambda self: None)
+        monkeypatch.setattr(server, "_ingestion_watchers", [])
+
+        watchers = server.start_ingestion_watchers()
+
+        assert sorted(w.kb_id for w in watchers) == ["KB1", "KB2"]
+
+    def test_warmup_uses_the_logged_profile(self, tmp_path, monkeypatch) -> None:
+        """ウォームアップは記録時の kb のプロファイルの検索先でクエリを実行する"""
+        log_path = tmp_path / "queries.jsonl"
+        log_path.write_text(
+            json.dumps({"ts": 1, "query": "契約", "kb": "legal"}) + "\n"
+            + json.dumps({"ts": 1, "query": "返品", "kb": "support"}) + "\n"
+            + json.dumps({"ts": 1, "query": "削除済み", "kb": "hr"}) + "\n",
+            encoding="utf-8",
+        )
+        monkeypatch.setenv("BEDROCK_KB_WARMUP_LOG", str(log_path))
+        requests: list[tuple[str, str]] = []
+
+        class RecordingClient:
+            def retrieve(self, **params):
+                requests.append((params["knowledgeBaseId"], params["retrievalQuery"]["text"]))
+                return {"retrievalResults": []}
+
+        monkeypatch.setattr(server, "create_client", lambda config: RecordingClient())
+        server._run_warmup()
+
+        assert sorted(requests) == [("KB1", "返品"), ("KB2", "契約")]
+
+    def test_query_log_records_profile(self, tmp_path, monkeypatch) -> None:
+        """クエリログには検索先の KB プロファイル名を記録する"""
+        log_path = tmp_path / "queries.jsonl"
+        monkeypatch.setenv("BEDROCK_KB_QUERY_LOG", str(log_path))
+        monkeypatch.setattr(server, "_query_log", None)
+
+        class Client:
+            def retrieve(self, **params):
+                return {"retrievalResults": []}
+
+        monkeypatch.setattr(server, "create_client", lambda config, deadline: Client())
+        kb_answer = mcp._tool_manager._tools["kb_answer"].fn
+        asyncio.run(kb_answer(query="契約", kb="legal"))
+        asyncio.run(kb_answer(query="返品"))
+        server._query_log.close()  # pylint: disable=protected-access
+
+        entries = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+        assert [entry["kb"] for entry in entries] == ["legal", "support"]
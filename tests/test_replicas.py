@@ -0,0 +1,238 @@
+"""
+レプリカルーティングのテスト
+
+**Feature: replica-routing, Property 21: EWMA に基づく複製の順位付け**
+"""
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+from hypothesis import given, strategies as st, settings
+
+from src import bedrock_client
+from src.bedrock_client import ReplicaClient, create_client
+from src.config import KBConfig, Replica, load_config
+from src.metrics import Metrics
+from src.replicas import ReplicaRouter
+
+from tests.test_config import env_vars
+
+
+REPLICAS = (
+    Replica("ap-northeast-1", "KB1"),
+    Replica("us-east-1", "KB2"),
+    Replica("us-west-2", "KB3", profile="other"),
+)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _client_error(code: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, "Retrieve")
+
+
+class _FakeClient:
+    """複製ごとに応答またはエラーを返す Retrieve 互換クライアント"""
+
+    def __init__(self, outcome, calls: list) -> None:
+        self._outcome = outcome
+        self._calls = calls
+
+    def retrieve(self, **params):
+        self._calls.append(params)
+        if isinstance(self._outcome, Exception):
+            raise self._outcome
+        return self._outcome
+
+
+class TestProperty21ReplicaRanking:
+    """
+    **Feature: replica-routing, Property 21: EWMA に基づく複製の順位付け**
+    """
+
+    @settings(max_examples=100)
+    @given(st.lists(
+        st.lists(st.floats(min_value=1, max_value=5000), min_size=1, max_size=10),
+        min_size=len(REPLICAS), max_size=len(REPLICAS),
+    ))
+    def test_ranking_follows_ewma_latency(self, latencies) -> None:
+        """順位は EWMA レイテンシの昇順で、EWMA は観測値の範囲内にある"""
+        router = ReplicaRouter(REPLICAS, registry=Metrics(), clock=_Clock())
+        for replica, observations in zip(REPLICAS, latencies):
+            for latency in observations:
+                router.record_success(replica, latency)
+
+        stats = router.stats()
+        for replica, observations in zip(REPLICAS, latencies):
+            ewma = stats[replica.name]["latency_ms"]
+            assert min(observations) - 1e-6 <= ewma <= max(observations) + 1e-6
+
+        ranked = router.ranked()
+        ewmas = [stats[replica.name]["latency_ms"] for replica in ranked]
+        assert sorted(ranked, key=REPLICAS.index) == list(REPLICAS)
+        assert ewmas == sorted(ewmas)
+
+    @settings(max_examples=100)
+    @given(st.integers(min_value=1, max_value=20))
+    def test_errors_demote_replica(self, failures) -> None:
+        """同じレイテンシならエラー率の高い複製が後ろになる"""
+        router = ReplicaRouter(REPLICAS[:2], registry=Metrics(), clock=_Clock())
+        for replica in REPLICAS[:2]:
+            router.record_success(replica, 100.0)
+        for _ in range(failures):
+            router.record_failure(REPLICAS[0])
+
+        assert router.ranked() == [REPLICAS[1], REPLICAS[0]]
+
+
+class TestReplicaRouter:
+    """ReplicaRouter のユニットテスト"""
+
+    def test_unmeasured_replicas_are_tried_first(self) -> None:
+        """計測値の無い複製は計測済みの複製より先に試す"""
+        router = ReplicaRouter(REPLICAS, registry=Metrics(), clock=_Clock())
+        router.record_success(REPLICAS[0], 50.0)
+
+        assert router.ranked() == [REPLICAS[1], REPLICAS[2], REPLICAS[0]]
+
+    def test_throttled_replica_cools_down(self) -> None:
+        """スロットリングされた複製は一定時間、候補の最後に回る"""
+        clock = _Clock()
+        router = ReplicaRouter(REPLICAS[:2], registry=Metrics(), clock=clock)
+        router.record_success(REPLICAS[0], 10.0)
+        router.record_success(REPLICAS[1], 500.0)
+        router.record_failure(REPLICAS[0], throttled=True)
+
+        assert router.ranked()[0] == REPLICAS[1]
+        clock.now += 60
+        assert router.ranked()[0] == REPLICAS[0]
+
+    def test_probe_measures_idle_replicas_only(self) -> None:
+        """プローブは probe_interval_seconds 以上使われていない複製のみ計測する"""
+        clock = _Clock()
+        registry = Metrics()
+        router = ReplicaRouter(
+            REPLICAS, probe_interval_seconds=30, registry=registry, clock=clock,
+        )
+        router.record_success(REPLICAS[0], 10.0)
+        probed: list[Replica] = []
+
+        def probe(replica: Replica) -> None:
+            probed.append(replica)
+            if replica == REPLICAS[2]:
+                raise _client_error("ThrottlingException")
+
+        assert router.probe(probe, bedrock_client._is_throttling) == 2
+        assert probed == [REPLICAS[1], REPLICAS[2]]
+        stats = router.stats()
+        assert stats[REPLICAS[1].name]["latency_ms"] is not None
+        assert stats[REPLICAS[2].name]["throttles"] == 1
+        assert registry.snapshot()["counters"]["replicas.probes"] == 2
+
+
+class TestReplicaClient:
+    """ReplicaClient のフェイルオーバーのテスト"""
+
+    def _client(self, outcomes: dict, calls: dict, router=None) -> ReplicaClient:
+        router = router or ReplicaRouter(REPLICAS, registry=Metrics(), clock=_Clock())
+        return ReplicaClient(
+            router,
+            lambda replica: _FakeClient(outcomes[replica], calls.setdefault(replica, [])),
+        )
+
+    def test_fails_over_on_throttling_and_errors(self) -> None:
+        """スロットリング・接続エラーの場合は次の複製で成功するまで試す"""
+        calls: dict = {}
+        client = self._client({
+            REPLICAS[0]: _client_error("ThrottlingException"),
+            REPLICAS[1]: EndpointConnectionError(endpoint_url="https://example"),
+            REPLICAS[2]: {"retrievalResults": []},
+        }, calls)
+
+        response = client.retrieve(knowledgeBaseId="KB1", retrievalQuery={"text": "q"})
+
+        assert response == {"retrievalResults": []}
+        assert [c[0]["knowledgeBaseId"] for c in calls.values()] == ["KB1", "KB2", "KB3"]
+
+    def test_validation_error_is_not_retried(self) -> None:
+        """リクエスト自体の誤りは他の複製に送らずに送出する"""
+        calls: dict = {}
+        client = self._client({
+            replica: _client_error("ValidationException") for replica in REPLICAS
+        }, calls)
+
+        with pytest.raises(ClientError):
+            client.retrieve(knowledgeBaseId="KB1")
+
+        assert list(calls) == [REPLICAS[0]]
+
+    def test_all_replicas_failing_raises_last_error(self) -> None:
+        """全ての複製で失敗した場合は最後の例外を送出する"""
+        calls: dict = {}
+        client = self._client({
+            replica: _client_error("InternalServerException") for replica in REPLICAS
+        }, calls)
+
+        with pytest.raises(ClientError):
+            client.retrieve(knowledgeBaseId="KB1")
+
+        assert len(calls) == len(REPLICAS)
+
+    def test_next_page_stays_on_same_replica(self) -> None:
+        """nextToken による続きのページは最初のページを返した複製に送る"""
+        calls: dict = {}
+        router = ReplicaRouter(REPLICAS, registry=Metrics(), clock=_Clock())
+        client = self._client(
+            {replica: {"retrievalResults": []} for replica in REPLICAS}, calls, router,
+        )
+        client.retrieve(knowledgeBaseId="KB1")
+        first = next(iter(calls))
+        # 別の複製の方が速くなっても続きのページは同じ複製に送る
+        router.record_success(first, 10_000.0)
+
+        client.retrieve(knowledgeBaseId="KB1", nextToken="t")
+
+        assert calls[first][-1]["nextToken"] == "t"
+
+
+class TestReplicaConfig:
+    """BEDROCK_KB_REPLICAS の読み込みテスト"""
+
+    def test_replicas_are_parsed(self) -> None:
+        """リージョン:KB ID[:プロファイル] を読み込み、先頭は aws_region / kb_id になる"""
+        with env_vars(
+            BEDROCK_KB_ID="KB1",
+            AWS_REGION="ap-northeast-1",
+            BEDROCK_KB_BACKEND=None,
+            BEDROCK_KB_REPLICAS="us-east-1:KB2, us-west-2:KB3:other,ap-northeast-1:KB1",
+        ):
+            config = load_config()
+
+        assert config.replica_set == REPLICAS
+
+    def test_invalid_replicas_raise_error(self) -> None:
+        """形式が不正な場合は環境変数名を含むエラーになる"""
+        with env_vars(BEDROCK_KB_ID="KB1", BEDROCK_KB_REPLICAS="us-east-1"):
+            with pytest.raises(ValueError) as exc_info:
+                load_config()
+        assert "BEDROCK_KB_REPLICAS" in str(exc_info.value)
+
+    def test_create_client_routes_when_replicas_are_configured(self, monkeypatch) -> None:
+        """複製が設定されている場合は ReplicaClient を返す"""
+        monkeypatch.setattr(bedrock_client, "_replica_routers", {})
+        config = KBConfig(
+            aws_region="ap-northeast-1",
+            kb_id="KB1",
+            replicas=REPLICAS[1:],
+            replica_probe_interval_seconds=0,
+        )
+
+        client = create_client(config)
+
+        assert isinstance(client, ReplicaClient)
+        assert bedrock_client.replica_stats().keys() == {r.name for r in REPLICAS}
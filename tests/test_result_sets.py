@@ -0,0 +1,178 @@
+"""
+ページング用結果セットのテスト
+
+**Feature: result-paging, Property 18: ページを辿ると結果セット全体を順に重複なく取得できる**
+"""
+
+import asyncio
+import json
+
+import pytest
+from hypothesis import given, strategies as st, settings
+
+from src import server
+from src.models import RetrievalResult
+from src.result_sets import ResultSetStore
+from src.server import mcp
+
+
+class FakeClock:
+    """テスト用の手動で進める時計"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _results(count: int) -> list[RetrievalResult]:
+    return [
+        RetrievalResult(content=f"チャンク{i}", location={"uri": f"s3://kb/{i}"}, score=1 - i / 100)
+        for i in range(count)
+    ]
+
+
+class TestProperty18PagingCoversResultSet:
+    """
+    **Feature: result-paging, Property 18: ページを辿ると結果セット全体を順に重複なく取得できる**
+    """
+
+    @settings(max_examples=100)
+    @given(
+        st.integers(min_value=0, max_value=100),
+        st.integers(min_value=1, max_value=10),
+        st.integers(min_value=1, max_value=10),
+    )
+    def test_following_next_offset_returns_every_result_once(
+        self, count, first_page, limit
+    ) -> None:
+        """next_offset を辿ると全結果を元の順序で 1 回ずつ取得できる"""
+        store = ResultSetStore()
+        results = _results(count)
+        handle = store.create(results)
+
+        page = store.page(handle, 0, first_page)
+        collected = list(page.results)
+        while page.next_offset is not None:
+            assert page.next_offset == len(collected)
+            page = store.page(handle, page.next_offset, limit)
+            assert page.results
+            collected.extend(page.results)
+
+        assert collected == results
+        assert page.total == count
+
+
+class TestResultSetStore:
+    """ResultSetStore のユニットテスト"""
+
+    def test_expired_handle_returns_none(self) -> None:
+        """最後のアクセスから TTL を過ぎたハンドルは無効になる"""
+        clock = FakeClock()
+        store = ResultSetStore(ttl_seconds=60, clock=clock)
+        handle = store.create(_results(3))
+
+        clock.now = 50
+        assert store.page(handle, 0, 1) is not None
+        # アクセスで期限が延長される
+        clock.now = 100
+        assert store.page(handle, 1, 1) is not None
+        clock.now = 161
+        assert store.page(handle, 2, 1) is None
+        assert len(store) == 0
+
+    def test_max_sets_evicts_least_recently_used(self) -> None:
+        """結果セット数の上限を超えると最も古く使われたものから削除する"""
+        store = ResultSetStore(max_sets=2)
+        first = store.create(_results(1))
+        second = store.create(_results(1))
+        store.page(first, 0, 1)
+        third = store.create(_results(1))
+
+        assert store.page(second, 0, 1) is None
+        assert store.page(first, 0, 1) is not None
+        assert store.page(third, 0, 1) is not None
+
+    def test_byte_budget_truncates_and_evicts(self) -> None:
+        """合計バイト数の上限を超えないように切り詰め・削除する"""
+        big = [RetrievalResult(content="あ" * 1000, location={}) for _ in range(10)]
+        store = ResultSetStore(max_bytes=5000)
+
+        handle = store.create(big)
+        assert store.page(handle, 0, 100).total == 1
+        other = store.create(big[:1])
+
+        assert store.stats()["bytes"] <= 5000
+        assert store.page(handle, 0, 1) is None
+        assert store.page(other, 0, 1) is not None
+
+
+class TestKbMore:
+    """kb_answer の fetch_limit と kb_more のテスト"""
+
+    @pytest.fixture
+    def counting_client(self, monkeypatch):
+        class CountingClient:
+            def __init__(self) -> None:
+                self.requests = []
+
+            def retrieve(self, **params):
+                self.requests.append(params)
+                count = params["retrievalConfiguration"]["vectorSearchConfiguration"][
+                    "numberOfResults"
+                ]
+                return {"retrievalResults": [
+                    {"content": {"text": f"チャンク{i}"}, "location": {"type": "S3"}, "score": 0.9}
+                    for i in range(min(count, 7))
+                ]}
+
+        client = CountingClient()
+        monkeypatch.setenv("BEDROCK_KB_ID", "kb")
+        monkeypatch.setenv("BEDROCK_KB_BACKEND", "bedrock")
+        monkeypatch.setenv("BEDROCK_KB_CACHE_TTL", "0")
+        monkeypatch.delenv("BEDROCK_KB_QUERY_LOG", raising=False)
+        monkeypatch.delenv("BEDROCK_KB_FETCH_LIMIT", raising=False)
+        monkeypatch.setattr(server, "_negative_cache", None)
+        monkeypatch.setattr(server, "_result_sets", None)
+        monkeypatch.setattr(server, "create_client", lambda config, deadline: client)
+        return client
+
+    def test_pages_are_served_without_retrieve(self, counting_client) -> None:
+        """続きのページは Retrieve を呼ばずに新しいチャンクのみを返す"""
+        first = json.loads(asyncio.run(mcp._tool_manager._tools["kb_answer"].fn(
+            query="返品", max_results=3, fetch_limit=20,
+        )))
+        assert [r["content"] for r in first["results"]] == ["チャンク0", "チャンク1", "チャンク2"]
+        assert first["total"] == 7
+        assert first["next_offset"] == 3
+        numbers = counting_client.requests[0]["retrievalConfiguration"]["vectorSearchConfiguration"]
+        assert numbers["numberOfResults"] == 20
+
+        more = mcp._tool_manager._tools["kb_more"].fn
+        second = json.loads(more(handle=first["handle"], offset=first["next_offset"], limit=3))
+        third = json.loads(more(handle=first["handle"], offset=second["next_offset"], limit=3))
+
+        assert [r["content"] for r in second["results"]] == ["チャンク3", "チャンク4", "チャンク5"]
+        assert [r["content"] for r in third["results"]] == ["チャンク6"]
+        assert third["next_offset"] is None
+        assert len(counting_client.requests) == 1
+
+    def test_without_fetch_limit_returns_plain_list(self, counting_client) -> None:
+        """fetch_limit を指定しない場合は従来どおり結果のリストを返す"""
+        kb_answer = mcp._tool_manager._tools["kb_answer"].fn
+        result = json.loads(asyncio.run(kb_answer(query="返品", max_results=2)))
+        assert isinstance(result, list)
+        assert len(result) == 2
+
+    def test_unknown_handle_returns_error(self, counting_client) -> None:
+        """存在しないハンドルはエラー"""
+        result = json.loads(mcp._tool_manager._tools["kb_more"].fn(handle="missing"))
+        assert result["error"] is True
+        assert result["error_type"] == "HandleNotFound"
+
+    @pytest.mark.parametrize("kwargs", [{"offset": -1}, {"offset": "1"}])
+    def test_invalid_offset_returns_validation_error(self, counting_client, kwargs) -> None:
+        """負・整数以外の offset はバリデーションエラー"""
+        result = json.loads(mcp._tool_manager._tools["kb_more"].fn(handle="h", **kwargs))
+        assert result["error_type"] == "ValidationError"
@@ -5,9 +5,11 @@ MCP サーバーのユニットテスト
 要件 4.2: パラメータの説明を含む適切なスキーマドキュメントと共に kb_answer ツールを公開
 """
 
+import asyncio
 import json
 import pytest
 
+from src import bedrock_client, server
 from src.server import mcp
 
 
@@ -51,7 +53,8 @@ class TestToolRegistration:
         
         # max_results パラメータの存在確認
         assert "max_results" in properties
-        assert properties["max_results"]["type"] == "integer"
+        # 整数または "auto"
+        assert {t["type"] for t in properties["max_results"]["anyOf"]} == {"integer", "string"}
     
     def test_kb_answer_required_parameters(self):
         """kb_answer ツールの必須パラメータが正しく定義されていることを検証"""
@@ -106,7 +109,7 @@ class TestKbAnswerFunction:
                 break
         
         assert kb_answer_tool is not None
-        result = kb_answer_tool.fn(query="")
+        result = asyncio.run(kb_answer_tool.fn(query=""))
         
         # JSON 形式のエラーレスポンスを検証
         result_data = json.loads(result)
@@ -123,7 +126,7 @@ class TestKbAnswerFunction:
                 break
         
         assert kb_answer_tool is not None
-        result = kb_answer_tool.fn(query="   ")
+        result = asyncio.run(kb_answer_tool.fn(query="   "))
         
         # JSON 形式のエラーレスポンスを検証
         result_data = json.loads(result)
@@ -140,7 +143,7 @@ class TestKbAnswerFunction:
                 break
         
         assert kb_answer_tool is not None
-        result = kb_answer_tool.fn(query="")
+        result = asyncio.run(kb_answer_tool.fn(query=""))
         
         # JSON としてパース可能であることを確認
         result_data = json.loads(result)
@@ -149,3 +152,102 @@ class TestKbAnswerFunction:
         assert "error" in result_data
         assert "error_type" in result_data
         assert "message" in result_data
+
+    def test_invalid_metadata_filter_returns_validation_error(self):
+        """不正なメタデータフィルターは API 呼び出し前に ValidationError となる"""
+        tools = mcp._tool_manager._tools
+        kb_answer_tool = tools["kb_answer"]
+
+        result = asyncio.run(kb_answer_tool.fn(query="返品", metadata_filter={"notEquals": {}}))
+
+        result_data = json.loads(result)
+        assert result_data["error"] is True
+        assert result_data["error_type"] == "ValidationError"
+
+    def test_invalid_search_type_returns_validation_error(self):
+        """未対応の検索タイプは ValidationError となる"""
+        tools = mcp._tool_manager._tools
+        kb_answer_tool = tools["kb_answer"]
+
+        result = asyncio.run(kb_answer_tool.fn(query="返品", search_type="KEYWORD"))
+
+        result_data = json.loads(result)
+        assert result_data["error_type"] == "ValidationError"
+
+
+class TestWarmupStartup:
+    """
+    起動時キャッシュウォームアップのテスト
+    """
+
+    def test_start_warmup_does_not_block(self, monkeypatch):
+        """ウォームアップは別スレッドで実行され、呼び出し元をブロックしない"""
+        started = []
+        monkeypatch.setattr(server, "_run_warmup", lambda: started.append(True))
+
+        thread = server.start_warmup()
+        thread.join(timeout=5)
+
+        assert thread.daemon
+        assert started == [True]
+
+    def test_run_warmup_without_log_is_noop(self, monkeypatch):
+        """BEDROCK_KB_WARMUP_LOG 未設定時はクライアントを作成しない"""
+        monkeypatch.setenv("BEDROCK_KB_ID", "kb")
+        monkeypatch.delenv("BEDROCK_KB_WARMUP_LOG", raising=False)
+        monkeypatch.setattr(server, "create_client", lambda config: pytest.fail("created"))
+
+        server._run_warmup()
+
+
+class TestQueryLogging:
+    """
+    kb_answer のクエリログ記録テスト（ローカルバックエンドを使用）
+    """
+
+    def test_kb_answer_records_query_log(self, tmp_path, monkeypatch):
+        """kb_answer の呼び出しがクエリログに記録される"""
+        corpus = tmp_path / "corpus"
+        corpus.mkdir()
+        (corpus / "faq.md").write_text("返品は30日以内に受け付けます。", encoding="utf-8")
+        log_path = tmp_path / "queries.jsonl"
+        monkeypatch.setenv("BEDROCK_KB_BACKEND", "local")
+        monkeypatch.setenv("BEDROCK_KB_LOCAL_DIR", str(corpus))
+        monkeypatch.setenv("BEDROCK_KB_QUERY_LOG", str(log_path))
+        monkeypatch.setattr(server, "_query_log", None)
+        monkeypatch.setattr(server, "_result_cache", None)
+
+        kb_answer_tool = mcp._tool_manager._tools["kb_answer"]
+        asyncio.run(kb_answer_tool.fn(query="返品", max_results=2))
+        asyncio.run(kb_answer_tool.fn(query="返品", max_results=2))
+        server._query_log.close()
+
+        entries = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+        assert [e["cache"] for e in entries] == ["miss", "hit"]
+        assert entries[0]["query"] == "返品"
+        assert entries[0]["max_results"] == 2
+        assert entries[0]["result_count"] == 1
+        assert len(entries[0]["scores"]) == 1
+        assert entries[0]["latency_ms"] >= 0
+        assert entries[0]["error_type"] is None
+
+
+class TestMetricsTool:
+    """
+    kb_metrics ツールのテスト
+    """
+
+    def test_kb_metrics_returns_snapshot(self, monkeypatch):
+        """kb_metrics はメトリクスとキャッシュ統計を JSON で返す"""
+        monkeypatch.setattr(server, "_result_cache", None)
+        monkeypatch.setattr(server, "_negative_cache", None)
+        monkeypatch.setattr(server, "_result_sets", None)
+        monkeypatch.setattr(server, "_admission", None)
+        monkeypatch.setattr(bedrock_client, "_client_pools", {})
+        server.metrics.increment("credentials.refresh.count")
+
+        result = json.loads(mcp._tool_manager._tools["kb_metrics"].fn())
+
+        assert result["counters"]["credentials.refresh.count"] >= 1
+        assert set(result) == {"counters", "gauges", "summaries", "caches", "connections"}
+        assert set(result["caches"]) == {"recent_chunks"}
@@ -0,0 +1,181 @@
+"""
+セッションの送信済みチャンク記録（差分レスポンス）のテスト
+
+**Feature: session-delta, Property 28: 送信済みチャンクのみを参照で返す**
+"""
+
+import asyncio
+import json
+
+import pytest
+from hypothesis import given, strategies as st, settings
+
+from src import server
+from src.metrics import Metrics, metrics
+from src.server import mcp
+from src.sessions import SessionStore
+
+from tests.test_result_sets import FakeClock
+
+
+class TestProperty28OnlyDeliveredChunksAreOmitted:
+    """
+    **Feature: session-delta, Property 28: 送信済みチャンクのみを参照で返す**
+    """
+
+    @settings(max_examples=100)
+    @given(
+        st.lists(
+            st.tuples(
+                st.sampled_from(["s1", "s2", "s3"]),
+                st.lists(st.sampled_from("abcdefgh"), max_size=5),
+            ),
+            max_size=30,
+        ),
+    )
+    def test_repeated_iff_delivered_earlier(self, calls) -> None:
+        """上限内では、同じセッションの以前の呼び出しで返したチャンクのみが送信済みになる"""
+        store = SessionStore(registry=Metrics())
+        model: dict[str, set[str]] = {}
+        for session_id, hashes in calls:
+            repeated = store.deliver(session_id, hashes)
+            assert repeated == set(hashes) & model.get(session_id, set())
+            model.setdefault(session_id, set()).update(hashes)
+
+    @settings(max_examples=100)
+    @given(
+        st.lists(
+            st.tuples(
+                st.sampled_from(["s1", "s2", "s3", "s4"]),
+                st.lists(st.sampled_from("abcdefgh"), max_size=5),
+            ),
+            max_size=30,
+        ),
+        st.integers(min_value=1, max_value=3),
+        st.integers(min_value=1, max_value=4),
+    )
+    def test_eviction_never_omits_undelivered_chunks(
+        self, calls, max_sessions, max_chunks
+    ) -> None:
+        """上限で記録を削除しても、未送信のチャンクを送信済みとみなすことはない"""
+        store = SessionStore(
+            max_sessions=max_sessions, max_chunks_per_session=max_chunks, registry=Metrics(),
+        )
+        model: dict[str, set[str]] = {}
+        for session_id, hashes in calls:
+            repeated = store.deliver(session_id, hashes)
+            assert repeated <= set(hashes) & model.get(session_id, set())
+            model.setdefault(session_id, set()).update(hashes)
+        assert len(store) <= max_sessions
+        assert store.stats()["chunks"] <= max_sessions * max_chunks
+
+
+class TestSessionStore:
+    """SessionStore のテスト"""
+
+    def test_session_expires_after_ttl(self) -> None:
+        """最後の使用から TTL が経過したセッションは記録を失う"""
+        clock = FakeClock()
+        store = SessionStore(ttl_seconds=10, clock=clock, registry=Metrics())
+
+        store.deliver("s", ["a"])
+        clock.now = 9
+        assert store.deliver("s", ["a"]) == {"a"}
+        clock.now = 20
+        assert store.deliver("s", ["a"]) == set()
+
+    def test_forget_and_shrink(self) -> None:
+        """forget は記録を削除し、shrink は古いセッションから削除する"""
+        store = SessionStore(registry=Metrics())
+        for session_id in ("a", "b", "c", "d"):
+            store.deliver(session_id, ["x"])
+
+        assert store.forget("a") is True
+        assert store.forget("a") is False
+        assert store.shrink(0.5) == 2
+        assert store.deliver("d", ["x"]) == {"x"}
+        assert store.deliver("b", ["x"]) == set()
+
+
+class TestKbAnswerDelta:
+    """kb_answer / kb_more の session・delta のテスト"""
+
+    @pytest.fixture(autouse=True)
+    def _client(self, monkeypatch):
+        class FixedClient:
+            def retrieve(self, **params):
+                count = params["retrievalConfiguration"]["vectorSearchConfiguration"][
+                    "numberOfResults"
+                ]
+                return {"retrievalResults": [
+                    {
+                        "content": {"text": f"チャンク{i}" * 20},
+                        "location": {"type": "S3", "s3Location": {"uri": f"s3://kb/{i}"}},
+                        "score": 0.9 - i / 10,
+                    }
+                    for i in range(min(count, 6))
+                ]}
+
+        monkeypatch.setenv("BEDROCK_KB_ID", "kb")
+        monkeypatch.setenv("BEDROCK_KB_BACKEND", "bedrock")
+        monkeypatch.setenv("BEDROCK_KB_CACHE_TTL", "0")
+        monkeypatch.delenv("BEDROCK_KB_QUERY_LOG", raising=False)
+        monkeypatch.delenv("BEDROCK_KB_FETCH_LIMIT", raising=False)
+        monkeypatch.delenv("BEDROCK_KB_PROFILES", raising=False)
+        monkeypatch.setattr(server, "_negative_cache", None)
+        monkeypatch.setattr(server, "_result_sets", None)
+        monkeypatch.setattr(server, "_sessions", None)
+        monkeypatch.setattr(server, "create_client", lambda config, deadline: FixedClient())
+
+    @staticmethod
+    def _answer(**kwargs):
+        kb_answer = mcp._tool_manager._tools["kb_answer"].fn
+        return json.loads(asyncio.run(kb_answer(query="返品", **kwargs)))
+
+    def test_repeated_chunks_are_references(self) -> None:
+        """同じセッションで既に返したチャンクは本文を含まない参照になる"""
+        before = metrics.snapshot()["counters"].get("session.chunks_omitted", 0)
+        first = self._answer(max_results=2, session="agent-1")
+        second = self._answer(max_results=3, session="agent-1")
+
+        assert all("content" in r for r in first)
+        assert [r.get("repeated", False) for r in second] == [True, True, False]
+        assert "content" not in second[0] and "snippet" not in second[0]
+        assert second[0]["location"] == first[0]["location"]
+        assert second[0]["score"] == first[0]["score"]
+        assert second[2]["content"].startswith("チャンク2")
+        assert metrics.snapshot()["counters"]["session.chunks_omitted"] == before + 2
+
+        # 参照の uri で全文を読み込める
+        chunk_hash = second[0]["uri"].rsplit("/", 1)[1]
+        assert server.broker_handlers()["kb_chunk"](chunk_hash=chunk_hash) == first[0]["content"]
+
+    def test_sessions_are_independent_and_optional(self) -> None:
+        """別のセッションや session 未指定の呼び出しは全文を返す"""
+        self._answer(max_results=2, session="agent-1")
+
+        assert all("content" in r for r in self._answer(max_results=2, session="agent-2"))
+        assert all("content" in r for r in self._answer(max_results=2))
+
+    def test_delta_false_opts_out(self) -> None:
+        """delta=False は送信済みのチャンクも全文で返す"""
+        self._answer(max_results=2, session="agent-1")
+
+        assert all("content" in r for r in self._answer(max_results=2, session="agent-1", delta=False))
+        assert all(r.get("repeated") for r in self._answer(max_results=2, session="agent-1"))
+
+    def test_kb_more_pages_use_the_session(self) -> None:
+        """kb_more のページも同じセッションの送信済みチャンクを参照で返す"""
+        self._answer(max_results=2, session="agent-1")
+        page = self._answer(max_results=2, fetch_limit=6, session="agent-1")
+        more = json.loads(mcp._tool_manager._tools["kb_more"].fn(
+            handle=page["handle"], offset=0, limit=4, session="agent-1",
+        ))
+
+        assert all(r.get("repeated") for r in page["results"])
+        assert [r.get("repeated", False) for r in more["results"]] == [True, True, False, False]
+
+    @pytest.mark.parametrize("session", ["", " ", "x" * 129, 1])
+    def test_invalid_session_returns_validation_error(self, session) -> None:
+        """空・長すぎる・文字列以外の session はバリデーションエラー"""
+        assert self._answer(session=session)["error_type"] == "ValidationError"
@@ -0,0 +1,99 @@
+"""
+スニペットと chunk リソースのテスト
+
+**Feature: snippet-mode, Property 19: スニペットは全文の連続部分で上限文字数以内**
+"""
+
+import asyncio
+import json
+
+import pytest
+from hypothesis import given, strategies as st, settings
+
+from src import server
+from src.snippet import ELLIPSIS, make_snippet
+from src.server import mcp
+
+
+class TestProperty19SnippetBounds:
+    """
+    **Feature: snippet-mode, Property 19: スニペットは全文の連続部分で上限文字数以内**
+    """
+
+    @settings(max_examples=100)
+    @given(
+        st.text(min_size=0, max_size=2000),
+        st.text(min_size=0, max_size=50),
+        st.integers(min_value=20, max_value=500),
+    )
+    def test_snippet_is_bounded_substring(self, content, query, max_chars) -> None:
+        """スニペットは省略記号を除くと全文の連続部分で、max_chars 文字以内"""
+        snippet = make_snippet(content, query, max_chars)
+        body = snippet
+        if len(content) > max_chars:
+            body = body.removeprefix(ELLIPSIS).removesuffix(ELLIPSIS)
+            assert len(body) == max_chars
+        else:
+            assert snippet == content
+        assert body in content
+
+
+class TestMakeSnippet:
+    """make_snippet のユニットテスト"""
+
+    def test_window_centers_on_query_matches(self) -> None:
+        """クエリの n-gram が集中する範囲を切り出す"""
+        content = "前置き。" * 100 + "返品は購入日から30日以内に受け付けます。" + "後書き。" * 100
+        snippet = make_snippet(content, "返品の期限", max_chars=60)
+
+        assert "返品は購入日から30日以内" in snippet
+        assert snippet.startswith(ELLIPSIS) and snippet.endswith(ELLIPSIS)
+
+    def test_no_match_returns_head(self) -> None:
+        """一致が無い場合は先頭を返す"""
+        content = "あいうえお" * 100
+        assert make_snippet(content, "xyz", max_chars=30) == content[:30] + ELLIPSIS
+
+
+class TestSnippetMode:
+    """kb_answer のスニペットモードと kb://chunk リソースのテスト（ローカルバックエンドを使用）"""
+
+    @pytest.fixture
+    def corpus(self, tmp_path, monkeypatch):
+        corpus = tmp_path / "corpus"
+        corpus.mkdir()
+        text = "概要。" * 200 + "返品は購入日から30日以内に受け付けます。" + "補足。" * 200
+        (corpus / "returns.md").write_text(text, encoding="utf-8")
+        monkeypatch.setenv("BEDROCK_KB_BACKEND", "local")
+        monkeypatch.setenv("BEDROCK_KB_LOCAL_DIR", str(corpus))
+        monkeypatch.delenv("BEDROCK_KB_QUERY_LOG", raising=False)
+        monkeypatch.setattr(server, "_result_cache", None)
+        return corpus
+
+    def test_snippet_results_link_to_full_chunk(self, corpus) -> None:
+        """スニペットモードは content の代わりに snippet と uri を返し、uri で全文を読める"""
+        kb_answer = mcp._tool_manager._tools["kb_answer"].fn
+        full = json.loads(asyncio.run(kb_answer(query="返品", max_results=1)))
+        result = json.loads(asyncio.run(mcp._tool_manager._tools["kb_answer"].fn(
+            query="返品", max_results=1, snippet=True,
+        )))[0]
+
+        assert "content" not in result
+        assert len(result["snippet"]) < len(full[0]["content"])
+        assert result["uri"].startswith("kb://chunk/")
+
+        async def read():
+            resource = await mcp._resource_manager.get_resource(result["uri"])
+            return await resource.read()
+
+        assert asyncio.run(read()) == full[0]["content"]
+
+    def test_unknown_chunk_raises(self) -> None:
+        """保持していないチャンクはリソースエラー"""
+        async def read():
+            resource = await mcp._resource_manager.get_resource("kb://chunk/" + "0" * 64)
+            return await resource.read()
+
+        with pytest.raises(Exception) as exc_info:
+            asyncio.run(read())
+        assert "チャンクが見つかりません" in str(exc_info.value)
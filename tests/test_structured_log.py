@@ -0,0 +1,252 @@
+"""
+構造化ログのテスト
+
+**Feature: structured-log, Property 30: WARNING 以上のレコードはサンプリングせず常に記録する**
+"""
+
+import asyncio
+import json
+import logging
+import sys
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+from hypothesis import given, strategies as st, settings
+
+from src import server
+from src.bedrock_client import BedrockServiceError
+from src.config import load_config
+from src.metrics import Metrics
+from src.query_log import QueryLogWriter, read_query_log
+from src.server import mcp
+from src.structured_log import (
+    SamplingFilter,
+    StructuredLogHandler,
+    configure_logging,
+    error_fields,
+    log_event,
+    logger,
+    parse_sample_rates,
+    remove_handler,
+)
+
+from tests.test_config import env_vars
+
+
+LEVELS = [logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR]
+
+
+def _client_error() -> ClientError:
+    return ClientError(
+        {
+            "Error": {"Code": "ValidationException", "Message": "入力が不正です"},
+            "ResponseMetadata": {"RequestId": "req-123", "HTTPStatusCode": 400},
+        },
+        "Retrieve",
+    )
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    """構造化ログをファイルに記録し、終了時にハンドラーを取り除く。"""
+    path = tmp_path / "server.log"
+    handler = configure_logging(str(path), sample_rates={"noisy.ok": 0.0}, registry=Metrics())
+    yield path, handler
+    remove_handler(handler)
+    logger.setLevel(logging.NOTSET)
+
+
+class TestProperty30ErrorsAreNeverSampled:
+    """
+    **Feature: structured-log, Property 30: WARNING 以上のレコードはサンプリングせず常に記録する**
+    """
+
+    @settings(max_examples=100)
+    @given(
+        st.lists(st.tuples(st.sampled_from(["a.ok", "b.ok", "c.ok"]), st.sampled_from(LEVELS)),
+                 max_size=50),
+        st.dictionaries(st.sampled_from(["a.ok", "b.ok"]), st.floats(min_value=0.0, max_value=1.0)),
+        st.lists(st.floats(min_value=0.0, max_value=0.999), min_size=1, max_size=10),
+    )
+    def test_warnings_always_pass_and_info_follows_rate(self, records, rates, draws) -> None:
+        """WARNING 以上は常に、それ未満は乱数が割合未満の場合のみ記録する"""
+        sequence = iter(draws * 50)
+        sampling = SamplingFilter(rates, rand=lambda: next(sequence), registry=Metrics())
+
+        for event, level in records:
+            record = logging.makeLogRecord({"msg": event, "levelno": level})
+            kept = sampling.filter(record)
+            rate = rates.get(event)
+            if level >= logging.WARNING or rate is None or rate >= 1.0:
+                assert kept
+                assert not hasattr(record, "sample_rate")
+            elif rate == 0.0:
+                assert not kept
+            elif kept:
+                assert record.sample_rate == rate
+
+
+class TestStructuredLog:
+    """構造化ログのハンドラー・設定のテスト"""
+
+    def test_records_are_written_as_jsonl(self, log_file) -> None:
+        """イベントはフィールドと共に 1 行 1 レコードで記録し、サンプリング対象は記録しない"""
+        path, handler = log_file
+
+        log_event("kb_answer.ok", latency_ms=12.5, result_count=4)
+        log_event("noisy.ok", latency_ms=1.0)
+        log_event("noisy.ok", logging.ERROR, error_type="ServiceError")
+        logging.getLogger("botocore.test").warning("リトライします", extra={"attempt": 2})
+        handler.writer.close()
+
+        entries = list(read_query_log(path))
+        assert [(e["event"], e["level"]) for e in entries] == [
+            ("kb_answer.ok", "INFO"),
+            ("noisy.ok", "ERROR"),
+            ("リトライします", "WARNING"),
+        ]
+        assert entries[0]["latency_ms"] == 12.5 and entries[0]["logger"] == "bedrock_kb"
+        assert entries[2]["logger"] == "botocore.test" and entries[2]["attempt"] == 2
+
+    def test_error_fields_follow_the_cause(self) -> None:
+        """Bedrock クライアントの例外から元の ClientError のエラーコード・リクエスト ID を取り出す"""
+        try:
+            try:
+                raise _client_error()
+            except ClientError as e:
+                raise BedrockServiceError("Bedrock API エラー") from e
+        except BedrockServiceError as e:
+            fields = error_fields(e)
+
+        assert fields == {
+            "error_code": "ValidationException", "request_id": "req-123", "http_status": 400,
+        }
+        assert error_fields(ValueError("x")) == {}
+
+    def test_never_writes_to_stdout(self, tmp_path, capsys) -> None:
+        """標準出力に書き込むハンドラーは取り除き、ライブラリの警告もファイルに記録する"""
+        root = logging.getLogger()
+        stdout_handler = logging.StreamHandler(sys.stdout)
+        root.addHandler(stdout_handler)
+        handler = configure_logging(str(tmp_path / "server.log"), registry=Metrics())
+        try:
+            logging.getLogger("botocore.credentials").warning("認証情報を更新します")
+            log_event("kb_answer.error", logging.ERROR, error_type="ServiceError")
+        finally:
+            root.removeHandler(stdout_handler)
+            remove_handler(handler)
+            logger.setLevel(logging.NOTSET)
+
+        assert stdout_handler not in root.handlers
+        assert capsys.readouterr().out == ""
+        assert len(list(read_query_log(tmp_path / "server.log"))) == 2
+
+    def test_emit_does_not_block_when_writer_is_stuck(self, tmp_path) -> None:
+        """書き込みが止まってキューが満杯でも、レコードは破棄されて即座に戻る"""
+        release = threading.Event()
+        writer = QueryLogWriter(tmp_path / "server.log", max_queue=2, batch_size=1)
+        writer._write_batch = lambda batch: release.wait()  # pylint: disable=protected-access
+        handler = StructuredLogHandler(writer, registry=Metrics())
+        record = logging.makeLogRecord({"msg": "kb_answer.ok", "levelno": logging.INFO})
+
+        started = time.perf_counter()
+        for _ in range(100):
+            handler.emit(record)
+        elapsed = time.perf_counter() - started
+        release.set()
+        writer.close()
+
+        assert elapsed < 0.5
+        assert writer.dropped > 0
+
+    def test_config(self) -> None:
+        """サンプリング割合・レベルの不正な値は設定エラー"""
+        assert parse_sample_rates("kb_answer.ok=0.1, kb_more.ok=1") == (
+            ("kb_answer.ok", 0.1), ("kb_more.ok", 1.0),
+        )
+        for raw in ("kb_answer.ok", "kb_answer.ok=2", "=0.5", "kb_answer.ok=x"):
+            with pytest.raises(ValueError):
+                parse_sample_rates(raw)
+        with env_vars(BEDROCK_KB_ID="KB1", BEDROCK_KB_LOG=None, BEDROCK_KB_LOG_SAMPLE=None):
+            config = load_config()
+            assert config.log_path is None
+            assert dict(config.log_sample_rates)["kb_answer.ok"] == 0.1
+        with env_vars(BEDROCK_KB_ID="KB1", BEDROCK_KB_LOG_LEVEL="verbose"):
+            with pytest.raises(ValueError):
+                load_config()
+
+
+class TestKbAnswerLogging:
+    """kb_answer の構造化ログのテスト"""
+
+    @pytest.fixture
+    def log_path(self, tmp_path, monkeypatch):
+        path = tmp_path / "server.log"
+        monkeypatch.setenv("BEDROCK_KB_ID", "kb")
+        monkeypatch.setenv("BEDROCK_KB_BACKEND", "bedrock")
+        monkeypatch.setenv("BEDROCK_KB_CACHE_TTL", "0")
+        monkeypatch.setenv("BEDROCK_KB_LOG", str(path))
+        monkeypatch.setenv("BEDROCK_KB_LOG_SAMPLE", "kb_answer.ok=1")
+        monkeypatch.delenv("BEDROCK_KB_QUERY_LOG", raising=False)
+        monkeypatch.delenv("BEDROCK_KB_PROFILES", raising=False)
+        monkeypatch.setattr(server, "_negative_cache", None)
+        monkeypatch.setattr(server, "_log_handler", None)
+        handler = server.start_logging()
+        yield path
+        remove_handler(handler)
+        logger.setLevel(logging.NOTSET)
+
+    @staticmethod
+    def _answer(monkeypatch, client) -> dict:
+        monkeypatch.setattr(server, "create_client", lambda config, deadline: client)
+        kb_answer = mcp._tool_manager._tools["kb_answer"].fn
+        return json.loads(asyncio.run(kb_answer(query="返品", max_results=2)))
+
+    def test_errors_include_aws_error_code_and_request_id(self, log_path, monkeypatch, capsys) -> None:
+        """失敗した呼び出しはエラーコード・リクエスト ID と共に記録する"""
+        class FailingClient:
+            def retrieve(self, **params):
+                raise _client_error()
+
+        result = self._answer(monkeypatch, FailingClient())
+        server._log_handler.writer.close()  # pylint: disable=protected-access
+
+        assert result["error_type"] == "ServiceError"
+        (entry,) = [e for e in read_query_log(log_path) if e["event"] == "kb_answer.error"]
+        assert entry["level"] == "ERROR"
+        assert entry["error_code"] == "ValidationException"
+        assert entry["request_id"] == "req-123"
+        assert entry["http_status"] == 400
+        assert capsys.readouterr().out == ""
+
+    def test_success_is_logged_with_latency(self, log_path, monkeypatch) -> None:
+        """成功した呼び出しはレイテンシ・件数と共に記録する"""
+        class Client:
+            def retrieve(self, **params):
+                return {"retrievalResults": [{"content": {"text": "a"}, "score": 0.9}]}
+
+        self._answer(monkeypatch, Client())
+        server._log_handler.writer.close()  # pylint: disable=protected-access
+
+        (entry,) = [e for e in read_query_log(log_path) if e["event"] == "kb_answer.ok"]
+        assert entry["result_count"] == 1
+        assert entry["latency_ms"] >= 0
+        assert "sample_rate" not in entry
+
+    def test_cache_hit_is_logged_without_query_log(self, log_path, monkeypatch) -> None:
+        """クエリログが無効でも、構造化ログにはキャッシュのヒット・ミスを記録する"""
+        monkeypatch.setenv("BEDROCK_KB_CACHE_TTL", "300")
+        monkeypatch.setattr(server, "_result_cache", None)
+
+        class Client:
+            def retrieve(self, **params):
+                return {"retrievalResults": [{"content": {"text": "a"}, "score": 0.9}]}
+
+        self._answer(monkeypatch, Client())
+        self._answer(monkeypatch, Client())
+        server._log_handler.writer.close()  # pylint: disable=protected-access
+
+        entries = [e for e in read_query_log(log_path) if e["event"] == "kb_answer.ok"]
+        assert [entry["cache"] for entry in entries] == ["miss", "hit"]
@@ -3,12 +3,19 @@
 
 **Feature: bedrock-kb-mcp-server, Property 5: 空白のみのクエリを拒否**
 **検証対象: 要件 3.4**
+
+**Feature: retrieval-filters, Property 9: メタデータフィルターのバリデーション**
 """
 
 import pytest
 from hypothesis import given, strategies as st, settings
 
-from src.validation import validate_query, ValidationError
+from src.validation import (
+    validate_metadata_filter,
+    validate_query,
+    validate_search_type,
+    ValidationError,
+)
 
 
 # 空白文字のみで構成される文字列を生成するストラテジー
@@ -92,3 +99,102 @@ class TestProperty5WhitespaceValidation:
         """
         with pytest.raises(ValidationError):
             validate_query(None)
+
+
+# 比較演算子のフィルターを生成するストラテジー
+metadata_key_strategy = st.text(
+    alphabet=st.characters(whitelist_categories=("L", "N"), whitelist_characters="-_"),
+    min_size=1,
+    max_size=30,
+)
+scalar_strategy = st.one_of(
+    st.text(min_size=1, max_size=30),
+    st.integers(),
+    st.booleans(),
+)
+comparison_filter_strategy = st.one_of(
+    st.builds(lambda k, v: {"equals": {"key": k, "value": v}}, metadata_key_strategy, scalar_strategy),
+    st.builds(
+        lambda k, v: {"in": {"key": k, "value": v}},
+        metadata_key_strategy,
+        st.lists(scalar_strategy, min_size=1, max_size=5),
+    ),
+    st.builds(
+        lambda k, v: {"startsWith": {"key": k, "value": v}},
+        metadata_key_strategy,
+        st.text(min_size=1, max_size=30),
+    ),
+)
+metadata_filter_strategy = st.recursive(
+    comparison_filter_strategy,
+    lambda children: st.one_of(
+        st.builds(lambda items: {"andAll": items}, st.lists(children, min_size=2, max_size=5)),
+        st.builds(lambda items: {"orAll": items}, st.lists(children, min_size=2, max_size=5)),
+    ),
+    max_leaves=10,
+)
+
+
+class TestProperty9MetadataFilterValidation:
+    """
+    **Feature: retrieval-filters, Property 9: メタデータフィルターのバリデーション**
+
+    任意の正しい構造のフィルターはそのまま受理され、
+    構造が不正なフィルターは ValidationError となる。
+    """
+
+    @given(metadata_filter=metadata_filter_strategy)
+    @settings(max_examples=100)
+    def test_valid_filters_are_accepted_unchanged(self, metadata_filter: dict):
+        """正しい構造のフィルターは同じ内容で返される"""
+        assert validate_metadata_filter(metadata_filter) == metadata_filter
+
+    @given(metadata_filter=comparison_filter_strategy)
+    @settings(max_examples=100)
+    def test_single_filter_in_logical_operator_is_rejected(self, metadata_filter: dict):
+        """andAll / orAll に 1 個だけのフィルターは拒否される"""
+        with pytest.raises(ValidationError):
+            validate_metadata_filter({"andAll": [metadata_filter]})
+
+    @pytest.mark.parametrize("metadata_filter", [
+        None,
+        [],
+        {},
+        {"equals": {"key": "a", "value": 1}, "in": {"key": "b", "value": [1]}},
+        {"notEquals": {"key": "a", "value": 1}},
+        {"equals": {"key": "", "value": 1}},
+        {"equals": {"key": "a"}},
+        {"equals": {"key": "a", "value": None}},
+        {"equals": {"key": "a", "value": {"nested": 1}}},
+        {"in": {"key": "a", "value": []}},
+        {"in": {"key": "a", "value": "faq"}},
+        {"startsWith": {"key": "a", "value": 1}},
+        {"orAll": [{"equals": {"key": "a", "value": 1}}] * 6},
+    ])
+    def test_invalid_filters_are_rejected(self, metadata_filter):
+        """構造が不正なフィルターは ValidationError を発生させる"""
+        with pytest.raises(ValidationError):
+            validate_metadata_filter(metadata_filter)
+
+
+class TestSearchTypeValidation:
+    """
+    overrideSearchType バリデーションのユニットテスト
+    """
+
+    @pytest.mark.parametrize("search_type,expected", [
+        (None, None),
+        ("", None),
+        ("HYBRID", "HYBRID"),
+        ("semantic", "SEMANTIC"),
+        (" Hybrid ", "HYBRID"),
+    ])
+    def test_supported_values_are_normalized(self, search_type, expected):
+        """対応する検索タイプは大文字に正規化される"""
+        assert validate_search_type(search_type) == expected
+
+    @pytest.mark.parametrize("search_type", ["KEYWORD", "vector", 1])
+    def test_unsupported_values_are_rejected(self, search_type):
+        """未対応の検索タイプは ValidationError を発生させる"""
+        with pytest.raises(ValidationError):
+            validate_search_type(search_type)
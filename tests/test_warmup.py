@@ -0,0 +1,146 @@
+"""
+キャッシュウォームアップのテスト
+
+**Feature: cache-warmup, Property 12: 頻度と新しさによるクエリ選択**
+"""
+
+from unittest.mock import MagicMock
+
+from botocore.exceptions import ClientError
+from hypothesis import given, strategies as st, settings
+
+from src.cache import ResultCache
+from src.config import KBConfig
+from src.warmup import CacheWarmer, WarmupQuery, select_warmup_queries
+
+
+NOW = 1_700_000_000.0
+DAY = 24 * 60 * 60
+
+
+def _config() -> KBConfig:
+    """テスト用の設定を作成"""
+    return KBConfig(aws_region="ap-northeast-1", kb_id="kb")
+
+
+def _throttling_error() -> ClientError:
+    """ThrottlingException の ClientError を作成"""
+    return ClientError(
+        error_response={"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}},
+        operation_name="Retrieve",
+    )
+
+
+class TestProperty12QuerySelection:
+    """
+    **Feature: cache-warmup, Property 12: 頻度と新しさによるクエリ選択**
+
+    同じ時刻のエントリでは出現回数が多いクエリが優先され、
+    同じ回数では新しいクエリが優先される。
+    """
+
+    @given(counts=st.dictionaries(
+        st.text(alphabet="あいうえおabc", min_size=1, max_size=5),
+        st.integers(min_value=1, max_value=20),
+        min_size=1,
+        max_size=10,
+    ))
+    @settings(max_examples=100)
+    def test_more_frequent_queries_rank_higher(self, counts: dict[str, int]):
+        """出現回数の降順に並ぶ"""
+        entries = [
+            {"ts": NOW, "query": query}
+            for query, count in counts.items()
+            for _ in range(count)
+        ]
+        selected = select_warmup_queries(entries, top_n=len(counts), now=NOW)
+
+        selected_counts = [counts[q.query] for q in selected]
+        assert selected_counts == sorted(selected_counts, reverse=True)
+        assert len(selected) == len(counts)
+
+    def test_recent_queries_beat_old_queries(self):
+        """同じ回数なら新しいクエリが優先される"""
+        entries = [
+            {"ts": NOW - 30 * DAY, "query": "古い質問"},
+            {"ts": NOW - 60, "query": "新しい質問"},
+        ]
+        selected = select_warmup_queries(entries, top_n=1, now=NOW)
+
+        assert selected == [WarmupQuery(query="新しい質問")]
+
+    def test_invalid_entries_are_skipped(self):
+        """不正なエントリは無視され、max_results は 1-10 に丸められる"""
+        entries = [
+            {"ts": NOW, "query": "   "},
+            {"ts": NOW, "query_hash": "abc"},
+            {"ts": NOW, "query": "返品", "metadata_filter": {"bad": 1}},
+            {"ts": NOW, "query": "送料", "max_results": 50, "search_type": "hybrid"},
+        ]
+        selected = select_warmup_queries(entries, top_n=10, now=NOW)
+
+        assert selected == [WarmupQuery(query="送料", max_results=10, search_type="HYBRID")]
+
+
+class TestCacheWarmer:
+    """CacheWarmer のユニットテスト"""
+
+    def test_queries_are_cached(self):
+        """選択されたクエリがキャッシュに格納される"""
+        client = MagicMock()
+        client.retrieve.return_value = {"retrievalResults": []}
+        cache = ResultCache()
+        queries = [WarmupQuery(query="返品"), WarmupQuery(query="送料", max_results=8)]
+
+        stats = CacheWarmer(lambda: client, _config(), cache, queries, rate_per_second=1000).run()
+
+        assert stats["executed"] == 2
+        assert stats["stopped_reason"] is None
+        assert len(cache) == 2
+
+    def test_stops_on_throttling(self):
+        """スロットリング発生時点で停止する"""
+        client = MagicMock()
+        client.retrieve.side_effect = [{"retrievalResults": []}, _throttling_error()]
+        queries = [WarmupQuery(query=f"q{i}") for i in range(5)]
+
+        stats = CacheWarmer(
+            lambda: client, _config(), ResultCache(), queries, rate_per_second=1000
+        ).run()
+
+        assert stats["stopped_reason"] == "throttled"
+        assert stats["executed"] == 1
+        assert client.retrieve.call_count == 2
+
+    def test_already_cached_queries_are_skipped(self):
+        """キャッシュ済みのクエリは API を呼ばない"""
+        client = MagicMock()
+        client.retrieve.return_value = {"retrievalResults": []}
+        cache = ResultCache()
+        queries = [WarmupQuery(query="返品")]
+        CacheWarmer(lambda: client, _config(), cache, queries, rate_per_second=1000).run()
+
+        CacheWarmer(lambda: client, _config(), cache, queries, rate_per_second=1000).run()
+
+        assert client.retrieve.call_count == 1
+
+    def test_client_is_not_created_when_nothing_to_do(self):
+        """実行するクエリが無ければクライアントを作成しない"""
+        factory = MagicMock()
+
+        CacheWarmer(factory, _config(), ResultCache(), [], rate_per_second=1).run()
+
+        factory.assert_not_called()
+
+    def test_stop_interrupts_rate_limit_wait(self):
+        """stop() はレート制限の待機を中断する"""
+        client = MagicMock()
+        client.retrieve.return_value = {"retrievalResults": []}
+        queries = [WarmupQuery(query=f"q{i}") for i in range(3)]
+        warmer = CacheWarmer(lambda: client, _config(), ResultCache(), queries, rate_per_second=0.01)
+        client.retrieve.side_effect = lambda **_: warmer.stop() or {"retrievalResults": []}
+
+        stats = warmer.run()
+
+        assert stats["executed"] == 1
+        assert stats["stopped_reason"] == "stopped"